@@ -27,6 +27,7 @@ from models.config_integrity_models import (
     REPORT_SCHEDULE_DOC_ID,
 )
 from services.services_auth import get_current_user, require_permission
+from services.services_credentials import invalidate_host_credentials
 from services.services_config_integrity import (
     initialize_host,
     check_host,
@@ -36,6 +37,7 @@ from services.services_config_integrity_report import (
     generate_config_integrity_report,
     generate_config_integrity_report_pdf_bytes,
 )
+from scheduler.scheduler_timer import notify_config_integrity_schedule
 from utils.db_utils import prepare_for_mongo, parse_from_mongo
 from utils.audit_utils import log_audit
 
@@ -97,6 +99,7 @@ async def put_config_integrity_schedule(
         {"$set": payload},
         upsert=True,
     )
+    notify_config_integrity_schedule(next_run_at, body.enabled)
     log_audit(
         "config_integrity_schedule_updated",
         user_id=current_user.id,
@@ -155,7 +158,7 @@ async def put_config_integrity_report_schedule(
     # weekly/monthly intervals, but keep 9:00 wall-clock with shared helper
     next_run_at = (
         compute_next_config_integrity_run_at_iso(
-            "monthly" if body.interval == "monthly" else "weekly", now
+            "monthly" if body.interval == "monthly" else "weekly", now, report=True
         )
         if body.enabled
         else None
@@ -173,6 +176,7 @@ async def put_config_integrity_report_schedule(
         {"$set": payload},
         upsert=True,
     )
+    notify_config_integrity_schedule(next_run_at, body.enabled, report=True)
     log_audit(
         "config_integrity_report_schedule_updated",
         user_id=current_user.id,
@@ -321,6 +325,7 @@ async def delete_host(host_id: str, current_user: User = Depends(get_current_use
     result = await db.config_integrity_hosts.delete_one({"id": host_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Хост не найден")
+    invalidate_host_credentials(host_id)
     log_audit("config_integrity_host_deleted", user_id=current_user.id, username=current_user.username, details={"host_id": host_id})
     return {"ok": True}
 
@@ -3,36 +3,84 @@ API endpoints for project execution and execution results.
 Handles SSE streaming, legacy execution, sessions, and execution queries.
 """
 
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from typing import List, Optional, Dict, Any
 import asyncio
 import json
-import uuid
 
 from config.config_init import db, logger
 from models.models_init import (
-    User, Host, System, Script, ProjectTask, Execution, ExecuteRequest
+    User, Host, System, Script, Execution, ExecuteRequest
 )
 from services.services_init import (
     get_current_user, get_current_user_from_token,
     has_permission, can_access_project,
     execute_check_with_processor,
-    _check_network_access, _check_ssh_login_and_sudo,
-    _check_winrm_login, _check_admin_access,
-    save_failed_executions
+)
+from services.services_execution_runs import (
+    find_run, format_event_id, parse_event_id, start_project_run, stream_run_events,
 )
 from utils.db_utils import prepare_for_mongo, parse_from_mongo, decode_script_from_storage
 from utils.audit_utils import log_audit
-from utils.ssh_logger import clear_ssh_logs
-from utils.error_codes import get_error_code_for_check_type, get_error_description
+from utils.ssh_logger import read_session_log
 
 router = APIRouter()
 
 
+def _sse_response(session_id: str, after_seq: int) -> StreamingResponse:
+    """SSE stream of a run from after_seq; closing it does not affect the run."""
+    async def event_generator():
+        try:
+            async for seq, event in stream_run_events(session_id, after_seq):
+                yield f"id: {format_event_id(session_id, seq)}\ndata: {json.dumps(event)}\n\n"
+        except Exception as e:
+            logger.error(f"Error while streaming events of run {session_id}: {e}")
+            # Send a generic error message without exposing internal exception details
+            yield f"data: {json.dumps({'type': 'error', 'message': 'Произошла внутренняя ошибка при выполнении проекта. Обратитесь к администратору.'})}\n\n"
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+async def _resolve_session(project_id: str, session_id: Optional[str], last_event_id: Optional[str]):
+    """(session_id, after_seq) to resume from, or (None, 0); the run must belong to the project."""
+    event_session, after_seq = parse_event_id(last_event_id)
+    session_id = session_id or event_session
+    if not session_id:
+        return None, 0
+    if session_id != event_session:
+        after_seq = 0
+    run = await find_run(session_id)
+    if not run or run.get("project_id") != project_id:
+        raise HTTPException(status_code=404, detail="Сессия не найдена")
+    return session_id, after_seq
+
+
 @router.get("/projects/{project_id}/execute")
-async def execute_project(project_id: str, token: Optional[str] = None, skip_audit_log: bool = False):
-    """Execute project with real-time updates via Server-Sent Events (requires projects_execute permission and access to project)"""
+async def execute_project(
+    project_id: str,
+    token: Optional[str] = None,
+    skip_audit_log: bool = False,
+    parallel_hosts: Optional[int] = None,
+    session_id: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None),
+):
+    """Execute project with real-time updates via Server-Sent Events (requires projects_execute permission and access to project)
+
+    The run executes in the background: the stream only follows it.
+    parallel_hosts: number of hosts processed concurrently in this run
+    (defaults to EXECUTION_PARALLEL_HOSTS, capped by EXECUTION_GLOBAL_PARALLEL_HOSTS).
+    session_id / Last-Event-ID header: attach to a run already started instead of starting one;
+    events after Last-Event-ID are sent (EventSource reconnects send it automatically).
+    """
     logger.info(f"Execute endpoint called for project_id: {project_id}, token present: {bool(token)}")
     
     # Get current user from token parameter (for SSE which doesn't support headers)
@@ -55,6 +103,10 @@ async def execute_project(project_id: str, token: Optional[str] = None, skip_aud
     if not await can_access_project(current_user, project_id):
         raise HTTPException(status_code=403, detail="У вас нет доступа к текущему проекту")
 
+    attach_session, after_seq = await _resolve_session(project_id, session_id, last_event_id)
+    if attach_session:
+        return _sse_response(attach_session, after_seq)
+
     project_doc = await db.projects.find_one({"id": project_id})
     project_name = project_doc.get('name') if project_doc else "Неизвестный проект"
         
@@ -65,330 +117,32 @@ async def execute_project(project_id: str, token: Optional[str] = None, skip_aud
             username=current_user.username,
             details={"project_name": project_name}
         )
-    
-    async def event_generator():
-        try:
-            # Store user_id for executions
-            user_id = current_user.id
-            
-            # Get project
-            project = await db.projects.find_one({"id": project_id}, {"_id": 0})
-            if not project:
-                yield f"data: {json.dumps({'type': 'error', 'message': 'Проект не найден'})}\n\n"
-                return
-            
-            # Clear SSH logs before starting new execution
-            clear_ssh_logs()
-            
-            # Create unique session ID for this execution
-            session_id = str(uuid.uuid4())
-            
-            # Don't update project status - projects are reusable templates now
-            yield f"data: {json.dumps({'type': 'status', 'message': 'Начало выполнения проекта', 'session_id': session_id})}\n\n"
-            
-            # Get all tasks for this project
-            tasks_cursor = db.project_tasks.find({"project_id": project_id}, {"_id": 0})
-            tasks = await tasks_cursor.to_list(1000)
-            
-            if not tasks:
-                yield f"data: {json.dumps({'type': 'error', 'message': 'Нет заданий для выполнения'})}\n\n"
-                return
-            
-            total_tasks = len(tasks)
-            completed_tasks = 0
-            failed_tasks = 0
-            
-            yield f"data: {json.dumps({'type': 'info', 'message': f'Всего заданий: {total_tasks}'})}\n\n"
-            
-            # Process each task (each task = one host with multiple scripts)
-            for task in tasks:
-                task_obj = ProjectTask(**parse_from_mongo(task))
-                
-                # Get host
-                host_doc = await db.hosts.find_one({"id": task_obj.host_id}, {"_id": 0})
-                if not host_doc:
-                    yield f"data: {json.dumps({'type': 'error', 'message': f'Хост не найден: {task_obj.host_id}'})}\n\n"
-                    failed_tasks += 1
-                    continue
-                
-                host = Host(**parse_from_mongo(host_doc))
-                
-                # Get system
-                system_doc = await db.systems.find_one({"id": task_obj.system_id}, {"_id": 0})
-                if not system_doc:
-                    yield f"data: {json.dumps({'type': 'error', 'message': f'Система не найдена: {task_obj.system_id}'})}\n\n"
-                    failed_tasks += 1
-                    continue
-                
-                system = System(**parse_from_mongo(system_doc))
-                
-                # Get scripts
-                scripts_cursor = db.scripts.find({"id": {"$in": task_obj.script_ids}}, {"_id": 0})
-                scripts_data = [parse_from_mongo(s) for s in await scripts_cursor.to_list(1000)]
-                # Decode script content and processor_script from Base64
-                scripts_data = [decode_script_from_storage(s) for s in scripts_data]
-                scripts = [Script(**s) for s in scripts_data]
-                
-                if not scripts:
-                    yield f"data: {json.dumps({'type': 'error', 'message': 'Скрипты не найдены для задания'})}\n\n"
-                    failed_tasks += 1
-                    continue
-                
-                # Update task status
-                await db.project_tasks.update_one(
-                    {"id": task_obj.id},
-                    {"$set": {"status": "running"}}
-                )
-                
-                yield f"data: {json.dumps({'type': 'task_start', 'host_name': host.name, 'host_address': host.hostname, 'system_name': system.name, 'scripts_count': len(scripts)})}\n\n"
-                
-                # Perform preliminary checks
-                loop = asyncio.get_event_loop()
-                
-                # 1. Check network access
-                logger.info(f"Checking network access for host: {host.name} ({host.hostname}:{host.port})")
-                network_ok, network_msg = await loop.run_in_executor(None, _check_network_access, host)
-                logger.info(f"Network check result for {host.name}: {network_ok}, message: {network_msg}")
-                
-                # Get error code for network check
-                network_error_code = None
-                network_error_info = None
-                if not network_ok:
-                    network_error_code = get_error_code_for_check_type('network')
-                    if network_error_code:
-                        network_error_info = get_error_description(network_error_code)
-                
-                yield f"data: {json.dumps({'type': 'check_network', 'host_name': host.name, 'success': network_ok, 'message': network_msg, 'error_code': network_error_code, 'error_info': network_error_info})}\n\n"
-                
-                if not network_ok:
-                    await save_failed_executions(
-                        scripts=scripts,
-                        project_id=project_id,
-                        task_id=task_obj.id,
-                        session_id=session_id,
-                        host=host,
-                        system=system,
-                        error_msg=network_msg,
-                        check_type='network',
-                        user_id=user_id
-                    )
-                    
-                    await db.project_tasks.update_one(
-                        {"id": task_obj.id},
-                        {"$set": {"status": "failed"}}
-                    )
-                    failed_tasks += 1
-                    yield f"data: {json.dumps({'type': 'task_error', 'host_name': host.name, 'error': network_msg, 'error_code': network_error_code, 'error_info': network_error_info})}\n\n"
-                    continue
-                
-                # 2. Check login and sudo (combined for SSH to avoid multiple connections)
-                if host.connection_type == "winrm":
-                    # For WinRM, check login first
-                    logger.info(f"Starting WinRM login check for host: {host.name} ({host.hostname}:{host.port})")
-                    try:
-                        login_ok, login_msg = await loop.run_in_executor(None, _check_winrm_login, host)
-                    except Exception as e:
-                        logger.exception(f"WinRM login check failed with exception for {host.name}: {e}")
-                        login_ok, login_msg = False, f"Ошибка проверки входа: {getattr(e, 'message', str(e))}"
-                    logger.info(f"WinRM login check result for {host.name}: ok={login_ok}, msg={str(login_msg)[:80] if login_msg else ''}")
-                    
-                    # Get error code for login check
-                    login_error_code = None
-                    login_error_info = None
-                    if not login_ok:
-                        login_error_code = get_error_code_for_check_type('login')
-                        if login_error_code:
-                            login_error_info = get_error_description(login_error_code)
-                    
-                    yield f"data: {json.dumps({'type': 'check_login', 'host_name': host.name, 'success': login_ok, 'message': login_msg, 'error_code': login_error_code, 'error_info': login_error_info})}\n\n"
-                    
-                    if not login_ok:
-                        await save_failed_executions(
-                            scripts=scripts,
-                            project_id=project_id,
-                            task_id=task_obj.id,
-                            session_id=session_id,
-                            host=host,
-                            system=system,
-                            error_msg=login_msg,
-                            check_type='login',
-                            user_id=user_id
-                        )
-                        
-                        await db.project_tasks.update_one(
-                            {"id": task_obj.id},
-                            {"$set": {"status": "failed"}}
-                        )
-                        failed_tasks += 1
-                        yield f"data: {json.dumps({'type': 'task_error', 'host_name': host.name, 'error': login_msg, 'error_code': login_error_code, 'error_info': login_error_info})}\n\n"
-                        continue
-                    
-                    # Then check admin access
-                    sudo_ok, sudo_msg = await loop.run_in_executor(None, _check_admin_access, host)
-                    
-                    # Get error code for admin check
-                    sudo_error_code = None
-                    sudo_error_info = None
-                    if not sudo_ok:
-                        sudo_error_code = get_error_code_for_check_type('admin')
-                        if sudo_error_code:
-                            sudo_error_info = get_error_description(sudo_error_code)
-                    
-                    yield f"data: {json.dumps({'type': 'check_sudo', 'host_name': host.name, 'success': sudo_ok, 'message': sudo_msg, 'error_code': sudo_error_code, 'error_info': sudo_error_info})}\n\n"
-                else:
-                    # For SSH, check both login and sudo in one connection
-                    login_ok, login_msg, sudo_ok, sudo_msg = await loop.run_in_executor(None, _check_ssh_login_and_sudo, host)
-                    
-                    # Get error code for login check
-                    login_error_code = None
-                    login_error_info = None
-                    if not login_ok:
-                        login_error_code = get_error_code_for_check_type('login')
-                        if login_error_code:
-                            login_error_info = get_error_description(login_error_code)
-                    
-                    yield f"data: {json.dumps({'type': 'check_login', 'host_name': host.name, 'success': login_ok, 'message': login_msg, 'error_code': login_error_code, 'error_info': login_error_info})}\n\n"
-                    
-                    if not login_ok:
-                        await save_failed_executions(
-                            scripts=scripts,
-                            project_id=project_id,
-                            task_id=task_obj.id,
-                            session_id=session_id,
-                            host=host,
-                            system=system,
-                            error_msg=login_msg,
-                            check_type='login',
-                            user_id=user_id
-                        )
-                        
-                        await db.project_tasks.update_one(
-                            {"id": task_obj.id},
-                            {"$set": {"status": "failed"}}
-                        )
-                        failed_tasks += 1
-                        yield f"data: {json.dumps({'type': 'task_error', 'host_name': host.name, 'error': login_msg, 'error_code': login_error_code, 'error_info': login_error_info})}\n\n"
-                        continue
-                    
-                    # Send sudo check result with error code
-                    sudo_error_code = None
-                    sudo_error_info = None
-                    if not sudo_ok:
-                        sudo_error_code = get_error_code_for_check_type('sudo')
-                        if sudo_error_code:
-                            sudo_error_info = get_error_description(sudo_error_code)
-                    
-                    yield f"data: {json.dumps({'type': 'check_sudo', 'host_name': host.name, 'success': sudo_ok, 'message': sudo_msg, 'error_code': sudo_error_code, 'error_info': sudo_error_info})}\n\n"
-                
-                if not sudo_ok:
-                    check_type = 'admin' if host.connection_type == 'winrm' else 'sudo'
-                    await save_failed_executions(
-                        scripts=scripts,
-                        project_id=project_id,
-                        task_id=task_obj.id,
-                        session_id=session_id,
-                        host=host,
-                        system=system,
-                        error_msg=sudo_msg,
-                        check_type=check_type,
-                        user_id=user_id
-                    )
-                    
-                    await db.project_tasks.update_one(
-                        {"id": task_obj.id},
-                        {"$set": {"status": "failed"}}
-                    )
-                    failed_tasks += 1
-                    yield f"data: {json.dumps({'type': 'task_error', 'host_name': host.name, 'error': sudo_msg, 'error_code': sudo_error_code, 'error_info': sudo_error_info})}\n\n"
-                    continue
-                
-                # All checks passed, proceed with script execution
-                task_success = True
-                task_results = []
-                scripts_completed = 0
-                
-                try:
-                    # Execute scripts sequentially on the same host with one connection
-                    for idx, script in enumerate(scripts, 1):
-                        # Get reference data for this script
-                        reference_data = task_obj.reference_data.get(script.id, '') if task_obj.reference_data else ''
-                        
-                        # Use processor if available
-                        result = await execute_check_with_processor(
-                            host, script.content, script.processor_script, reference_data,
-                            script_id=script.id, script_name=script.name
-                        )
-                        
-                        scripts_completed += 1
-                        yield f"data: {json.dumps({'type': 'script_progress', 'host_name': host.name, 'completed': scripts_completed, 'total': len(scripts)})}\n\n"
-                        
-                        # Save execution result with session_id
-                        execution = Execution(
-                            project_id=project_id,
-                            project_task_id=task_obj.id,
-                            execution_session_id=session_id,
-                            host_id=host.id,
-                            system_id=system.id,
-                            script_id=script.id,
-                            script_name=script.name,
-                            success=result.success,
-                            output=result.output,
-                            error=result.error,
-                            check_status=result.check_status,
-                            error_code=result.error_code,
-                            error_description=result.error_description,
-                            reference_data=reference_data if reference_data and reference_data.strip() else None,
-                            actual_data=result.actual_data,
-                            executed_by=user_id
-                        )
-                        
-                        exec_doc = prepare_for_mongo(execution.model_dump())
-                        await db.executions.insert_one(exec_doc)
-                        
-                        task_results.append(execution)
-                        
-                        if not result.success:
-                            task_success = False
-                    
-                    # Update task status - host is successful if all preliminary checks passed
-                    await db.project_tasks.update_one(
-                        {"id": task_obj.id},
-                        {"$set": {"status": "completed"}}
-                    )
-                    
-                    # Host completed successfully (passed preliminary checks)
-                    completed_tasks += 1
-                    yield f"data: {json.dumps({'type': 'task_complete', 'host_name': host.name, 'success': True})}\n\n"
-                
-                except Exception as e:
-                    failed_tasks += 1
-                    await db.project_tasks.update_one(
-                        {"id": task_obj.id},
-                        {"$set": {"status": "failed"}}
-                    )
-                    # Log detailed error server-side, send generic error to client
-                    logger.error(f"Error during task execution on host '{host.name}' for task '{task_obj.id}': {e}")
-                    yield f"data: {json.dumps({'type': 'task_error', 'host_name': host.name, 'error': 'Internal error during task execution'})}\n\n"
-            
-            # Send completion event (don't update project status - project is reusable)
-            successful_hosts = completed_tasks
-            final_status = "completed" if failed_tasks == 0 else "failed"
-            yield f"data: {json.dumps({'type': 'complete', 'status': final_status, 'completed': completed_tasks, 'failed': failed_tasks, 'total': total_tasks, 'successful_hosts': successful_hosts, 'session_id': session_id})}\n\n"
-        
-        except Exception as e:
-            logger.error(f"Error during project execution: {e}")
-            # Send a generic error message without exposing internal exception details
-            yield f"data: {json.dumps({'type': 'error', 'message': 'Произошла внутренняя ошибка при выполнении проекта. Обратитесь к администратору.'})}\n\n"
-    
-    return StreamingResponse(
-        event_generator(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"
-        }
-    )
+
+    run = await start_project_run(project_id, current_user.id, parallel_hosts=parallel_hosts)
+    return _sse_response(run.session_id, 0)
+
+
+@router.get("/projects/{project_id}/sessions/{session_id}/events")
+async def watch_session_events(
+    project_id: str,
+    session_id: str,
+    token: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None),
+):
+    """Follow a run (live or finished) via Server-Sent Events (requires results_view_all or project access)
+
+    Token is passed as a query parameter (EventSource doesn't support headers);
+    events after Last-Event-ID are sent.
+    """
+    if not token:
+        raise HTTPException(status_code=401, detail="Token required for SSE connection")
+    current_user = await get_current_user_from_token(token)
+    if not await has_permission(current_user, 'results_view_all'):
+        if not await can_access_project(current_user, project_id):
+            raise HTTPException(status_code=403, detail="У вас нет доступа к этому проекту")
+
+    _, after_seq = await _resolve_session(project_id, session_id, last_event_id)
+    return _sse_response(session_id, after_seq)
 
 
 @router.get("/projects/{project_id}/execution-failed")
@@ -516,6 +270,27 @@ async def get_session_executions(project_id: str, session_id: str, current_user:
     return [Execution(**parse_from_mongo(execution)) for execution in executions]
 
 
+@router.get("/projects/{project_id}/sessions/{session_id}/ssh-log", response_class=PlainTextResponse)
+async def get_session_ssh_log(
+    project_id: str,
+    session_id: str,
+    max_bytes: int = 1024 * 1024,
+    current_user: User = Depends(get_current_user),
+):
+    """SSH operations log of one execution session, last max_bytes bytes (requires results_view_all or project access)"""
+    if not await has_permission(current_user, 'results_view_all'):
+        if not await can_access_project(current_user, project_id):
+            raise HTTPException(status_code=403, detail="У вас нет доступа к этому проекту")
+
+    if not await db.executions.find_one({"project_id": project_id, "execution_session_id": session_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Сессия не найдена")
+
+    text = await asyncio.to_thread(read_session_log, session_id, max(1024, min(max_bytes, 16 * 1024 * 1024)))
+    if text is None:
+        raise HTTPException(status_code=404, detail="Лог сессии не найден")
+    return PlainTextResponse(text)
+
+
 @router.post("/execute")
 async def execute_script(execute_req: ExecuteRequest, current_user: User = Depends(get_current_user)):
     """Execute script on selected hosts (legacy endpoint)"""
@@ -544,7 +319,14 @@ async def execute_script(execute_req: ExecuteRequest, current_user: User = Depen
         raise HTTPException(status_code=404, detail="Хосты не найдены")
     
     # Execute on all hosts concurrently
-    tasks = [execute_check_with_processor(host, script.content, script.processor_script, None, script.id, script.name) for host in hosts]
+    processor_rules = script.processor_rules if script.processor_type == "rules" else None
+    tasks = [
+        execute_check_with_processor(
+            host, script.content, script.processor_script, None, script.id, script.name,
+            processor_rules=processor_rules,
+        )
+        for host in hosts
+    ]
     results = await asyncio.gather(*tasks)
     
     # Save execution records (one per host)
@@ -9,6 +9,8 @@ from models.content_models import Host, HostCreate, HostUpdate
 from models.auth_models import User
 from services.services_auth import get_current_user, has_permission, require_permission
 from services.services_execution import execute_command
+from services.services_host_health import host_health, host_key, NETWORK, LOGIN
+from services.services_credentials import invalidate_host_credentials
 from utils.db_utils import prepare_for_mongo, parse_from_mongo
 from utils.audit_utils import log_audit
 
@@ -91,8 +93,13 @@ async def test_host_connection(host_id: str):
     
     host = Host(**parse_from_mongo(host_doc))
     
-    # Try simple command
+    # Try simple command (always contacts the host: a manual test is how an open circuit gets closed)
     result = await execute_command(host, "echo 'Connection test successful'")
+    if result.success:
+        host_health.record_success(host.hostname, host.port, LOGIN, host.username)
+    else:
+        kind = LOGIN if (result.error or "").startswith("Authentication failed") else NETWORK
+        host_health.record_failure(host.hostname, host.port, kind, result.error or "Ошибка подключения", host.username)
     
     return {
         "success": result.success,
@@ -102,6 +109,43 @@ async def test_host_connection(host_id: str):
     }
 
 
+@router.get("/host-health")
+async def get_hosts_health(current_user: User = Depends(get_current_user)):
+    """Circuit breaker state of all hosts contacted since startup (requires hosts_edit_all permission)"""
+    await require_permission(current_user, 'hosts_edit_all')
+    return host_health.snapshot()
+
+
+async def _host_for_health(host_id: str, current_user: User, own_permission: str) -> Host:
+    host_doc = await db.hosts.find_one({"id": host_id}, {"_id": 0})
+    if not host_doc:
+        raise HTTPException(status_code=404, detail="Хост не найден")
+    host = Host(**parse_from_mongo(host_doc))
+    if host.created_by == current_user.id:
+        await require_permission(current_user, own_permission)
+    else:
+        await require_permission(current_user, 'hosts_edit_all')
+    return host
+
+
+@router.get("/hosts/{host_id}/health")
+async def get_host_health(host_id: str, current_user: User = Depends(get_current_user)):
+    """Circuit breaker state of a host"""
+    host = await _host_for_health(host_id, current_user, 'hosts_edit_own')
+    # Network circuit of the address and login circuit of the host's account; an open one wins
+    entries = host_health.snapshot([host_key(host.hostname, host.port), host_key(host.hostname, host.port, host.username)])
+    entries.sort(key=lambda entry: entry["state"] == "closed")
+    return entries[0] if entries else {"key": host_key(host.hostname, host.port), "state": "closed"}
+
+
+@router.post("/hosts/{host_id}/health/reset")
+async def reset_host_health(host_id: str, current_user: User = Depends(get_current_user)):
+    """Close a host's circuit and forget its recorded failures"""
+    host = await _host_for_health(host_id, current_user, 'hosts_edit_own')
+    host_health.reset(host.hostname, host.port)
+    return {"message": "Состояние хоста сброшено"}
+
+
 @router.put("/hosts/{host_id}", response_model=Host)
 async def update_host(host_id: str, host_update: HostUpdate, current_user: User = Depends(get_current_user)):
     """Update host (requires hosts_edit_own or hosts_edit_all permission)"""
@@ -145,6 +189,11 @@ async def update_host(host_id: str, host_update: HostUpdate, current_user: User
     )
     
     updated_host = await db.hosts.find_one({"id": host_id}, {"_id": 0})
+    # New address or credentials: earlier failures and cached credentials no longer apply
+    host_health.reset(host.hostname, host.port)
+    if updated_host and (updated_host.get("hostname"), updated_host.get("port")) != (host.hostname, host.port):
+        host_health.reset(updated_host.get("hostname"), updated_host.get("port", host.port))
+    invalidate_host_credentials(host_id)
     
     # Логирование редактирования хоста
     # log_audit(
@@ -177,6 +226,7 @@ async def delete_host(host_id: str, current_user: User = Depends(get_current_use
         await require_permission(current_user, 'hosts_delete_all')
     
     result = await db.hosts.delete_one({"id": host_id})
+    invalidate_host_credentials(host_id)
     
     # Логирование удаления хоста
     # log_audit(
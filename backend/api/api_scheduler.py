@@ -8,7 +8,8 @@ from config.config_init import db
 from models.execution_models import SchedulerJob, SchedulerJobCreate, SchedulerJobUpdate, SchedulerRun
 from models.auth_models import User
 from services.services_auth import get_current_user, require_permission, can_access_project
-from scheduler.scheduler_utils import normalize_run_times, next_recurring_occurrence, calculate_next_run
+from scheduler.scheduler_utils import normalize_run_times, calculate_next_run
+from scheduler.scheduler_timer import notify_job_changed, notify_job_removed
 from utils.db_utils import prepare_for_mongo, parse_from_mongo
 from utils.audit_utils import log_audit
 
@@ -123,11 +124,17 @@ async def create_scheduler_job(job_input: SchedulerJobCreate, current_user: User
         if job_input.recurrence_start_date:
             job.schedule_config["recurrence_start_date"] = job_input.recurrence_start_date.isoformat()
         
-        job.next_run_at = next_recurring_occurrence(job.schedule_config, reference=now, initial=True)
+        if job_input.jitter_seconds is not None:
+            job.schedule_config["jitter_seconds"] = job_input.jitter_seconds
+        if job_input.jitter_mode:
+            job.schedule_config["jitter_mode"] = job_input.jitter_mode
+        
+        job.next_run_at = calculate_next_run(job, reference=now, initial=True)
     else:
         raise HTTPException(status_code=400, detail="Неверный тип задания")
     doc = prepare_for_mongo(job.model_dump())
     await db.scheduler_jobs.insert_one(doc)
+    notify_job_changed(job.id, job.next_run_at, job.status)
     
     # Логирование создания задания планировщика
     log_audit(
@@ -227,15 +234,25 @@ async def update_scheduler_job(job_id: str, job_update: SchedulerJobUpdate, curr
             recurrence_changed = True
             updated_fields.append("дата начала")
         
+        # Update jitter
+        if job_update.jitter_seconds is not None:
+            job.schedule_config["jitter_seconds"] = job_update.jitter_seconds
+            recurrence_changed = True
+            updated_fields.append("разброс запуска")
+        if job_update.jitter_mode is not None:
+            job.schedule_config["jitter_mode"] = job_update.jitter_mode
+            recurrence_changed = True
+            updated_fields.append("режим разброса")
+        
         if recurrence_changed:
-            job.next_run_at = next_recurring_occurrence(job.schedule_config, reference=now, initial=True)
+            job.next_run_at = calculate_next_run(job, reference=now, initial=True)
             changed = True
     
     if job_update.status in {"active", "paused"}:
         job.status = job_update.status
         status_label = "активен" if job_update.status == "active" else "приостановлен"
         if job.status == "active" and job.job_type == "recurring":
-            job.next_run_at = job.next_run_at or next_recurring_occurrence(job.schedule_config, reference=now, initial=True)
+            job.next_run_at = job.next_run_at or calculate_next_run(job, reference=now, initial=True)
         changed = True
         updated_fields.append(f"статус ({status_label})")
     
@@ -248,6 +265,7 @@ async def update_scheduler_job(job_id: str, job_update: SchedulerJobUpdate, curr
         {"id": job.id},
         {"$set": prepare_for_mongo(job.model_dump())}
     )
+    notify_job_changed(job.id, job.next_run_at, job.status)
     
     # Логирование обновления задания планировщика
     log_audit(
@@ -274,6 +292,7 @@ async def pause_scheduler_job(job_id: str, current_user: User = Depends(get_curr
     project_name = project.get('name') if project else "Неизвестный проект"
     
     await db.scheduler_jobs.update_one({"id": job.id}, {"$set": {"status": "paused", "updated_at": datetime.now(timezone.utc).isoformat()}})
+    notify_job_changed(job.id, None, "paused")
     
     # Логирование приостановки задания планировщика
     log_audit(
@@ -304,6 +323,7 @@ async def resume_scheduler_job(job_id: str, current_user: User = Depends(get_cur
         {"id": job.id},
         {"$set": {"status": "active", "next_run_at": next_run.isoformat() if next_run else None, "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
+    notify_job_changed(job.id, next_run, "active")
     
     # Логирование возобновления задания планировщика
     log_audit(
@@ -330,6 +350,7 @@ async def delete_scheduler_job(job_id: str, current_user: User = Depends(get_cur
     project_name = project.get('name') if project else "Неизвестный проект"
     
     await db.scheduler_jobs.delete_one({"id": job.id})
+    notify_job_removed(job.id)
     await db.scheduler_runs.delete_many({"job_id": job.id})
     
     # Логирование удаления задания планировщика
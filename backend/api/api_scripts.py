@@ -13,6 +13,9 @@ from config.config_init import db, logger
 from models.content_models import Script, ScriptCreate, ScriptUpdate, Category, System, CheckGroup
 from models.auth_models import User
 from services.services_auth import get_current_user, has_permission, require_permission
+from services.services_execution import check_processor_syntax, warm_processor_syntax_cache
+from services.services_processor_cache import processor_cache_stats
+from services.services_check_rules import compile_rules, RuleError
 from utils.db_utils import (
     prepare_for_mongo, 
     parse_from_mongo, 
@@ -52,6 +55,8 @@ class ScriptImportPayload(BaseModel):
     processor_script: Optional[str] = None
     processor_script_encoding: Optional[str] = None
     processor_script_comment: Optional[str] = None
+    processor_type: str = "bash"
+    processor_rules: List[dict] = Field(default_factory=list)
     has_reference_files: bool = False
     test_methodology: Optional[str] = None
     success_criteria: Optional[str] = None
@@ -113,6 +118,18 @@ def _decode_transport_field(
         raise HTTPException(status_code=400, detail=f"Некорректные данные в поле '{field_name}' для кодировки gzip+base64")
 
 
+def _validate_processor_rules(processor_type: Optional[str], processor_rules) -> None:
+    """Reject rules that cannot be compiled (bad regex, non-numeric threshold)"""
+    if processor_type != "rules":
+        return
+    if not processor_rules:
+        raise HTTPException(status_code=400, detail="Для обработчика типа 'rules' не заданы правила")
+    try:
+        compile_rules(processor_rules)
+    except RuleError as e:
+        raise HTTPException(status_code=400, detail=f"Некорректные правила обработчика: {e}")
+
+
 def _build_export_script_item(decoded: dict, system: Optional[dict], category: Optional[dict], group_names: List[str], encoded: bool) -> dict:
     processor_version = decoded.get("processor_script_version") or {}
     processor_comment = processor_version.get("comment") if isinstance(processor_version, dict) else None
@@ -125,6 +142,8 @@ def _build_export_script_item(decoded: dict, system: Optional[dict], category: O
         "content": content_value,
         "processor_script": processor_value,
         "processor_script_comment": processor_comment,
+        "processor_type": decoded.get("processor_type", "bash"),
+        "processor_rules": decoded.get("processor_rules") or [],
         "has_reference_files": decoded.get("has_reference_files", False),
         "test_methodology": decoded.get("test_methodology"),
         "success_criteria": decoded.get("success_criteria"),
@@ -157,12 +176,14 @@ async def create_script(system_id: str, script_input: ScriptCreate, current_user
     if not system:
         raise HTTPException(status_code=404, detail="Система не найдена")
     
+    _validate_processor_rules(script_input.processor_type, script_input.processor_rules)
     script_obj = Script(**script_input.model_dump(), created_by=current_user.id)
     script_dict = script_obj.model_dump()
     
     # Если есть processor_script, создаем первую версию
     if script_dict.get('processor_script'):
         processor_script = script_dict.pop('processor_script')
+        await warm_processor_syntax_cache(processor_script)
         processor_comment = script_dict.pop('processor_script_comment', None) or 'Первая версия'
         script_dict['processor_script_version'] = {
             'content': processor_script,
@@ -346,12 +367,14 @@ async def create_script_alt(script_input: ScriptCreate, current_user: User = Dep
         if category:
             category_name = category.get('name', '')
     
+    _validate_processor_rules(script_input.processor_type, script_input.processor_rules)
     script_obj = Script(**script_input.model_dump(), created_by=current_user.id)
     script_dict = script_obj.model_dump()
     
     # Если есть processor_script, создаем первую версию
     if script_dict.get('processor_script'):
         processor_script = script_dict.pop('processor_script')
+        await warm_processor_syntax_cache(processor_script)
         processor_comment = script_dict.pop('processor_script_comment', None) or 'Первая версия'
         script_dict['processor_script_version'] = {
             'content': processor_script,
@@ -400,6 +423,12 @@ async def update_script(script_id: str, script_update: ScriptUpdate, current_use
     
     if not update_data:
         raise HTTPException(status_code=400, detail="Нет данных для обновления")
+
+    if 'processor_type' in update_data or 'processor_rules' in update_data:
+        _validate_processor_rules(
+            update_data.get('processor_type', script.get('processor_type', 'bash')),
+            update_data.get('processor_rules', script.get('processor_rules')),
+        )
     
     # Обработка версионирования processor_script
     processor_script_update = {}
@@ -408,6 +437,7 @@ async def update_script(script_id: str, script_update: ScriptUpdate, current_use
     create_new_version = update_data.pop('create_new_version', False)
     
     if new_processor_script is not None:
+        await warm_processor_syntax_cache(new_processor_script)
         # Подготавливаем обновление версии
         processor_script_update = prepare_processor_script_version_update(
             script_data=script,
@@ -1009,6 +1039,7 @@ async def import_scripts(
                     detail=f"Проверка '{script.name}' в системе '{script.system_name}' уже существует. Импорт отменен."
                 )
             
+            _validate_processor_rules(script.processor_type, script.processor_rules)
             # Prepare script data similar to creation flow
             script_input = ScriptCreate(
                 system_id=system.get("id"),
@@ -1017,6 +1048,8 @@ async def import_scripts(
                 content=decoded_content or "",
                 processor_script=decoded_processor_script,
                 processor_script_comment=script.processor_script_comment or "Импортированная версия",
+                processor_type=script.processor_type,
+                processor_rules=script.processor_rules,
                 has_reference_files=script.has_reference_files,
                 test_methodology=script.test_methodology,
                 success_criteria=script.success_criteria,
@@ -1085,10 +1118,8 @@ async def validate_bash_syntax(
     request: Request,
     current_user: User = Depends(get_current_user)
 ):
-    """Validate bash syntax of a processor script"""
+    """Validate bash syntax of a processor script (result is cached for execution)"""
     import subprocess
-    import tempfile
-    import os
     
     # Получаем содержимое скрипта из body запроса
     script_content = await request.body()
@@ -1100,28 +1131,16 @@ async def validate_bash_syntax(
             "error": "Скрипт пуст"
         }
     
-    # Создаем временный файл для проверки
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.sh', delete=False) as f:
-        f.write(script_content)
-        temp_file = f.name
-    
     try:
-        # Запускаем bash -n для проверки синтаксиса
-        result = subprocess.run(
-            ['bash', '-n', temp_file],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
+        # bash -n по нормализованному тексту; результат кешируется по хешу скрипта
+        valid, error_output = await check_processor_syntax(script_content)
         
-        if result.returncode == 0:
+        if valid:
             return {
                 "valid": True,
                 "message": "Синтаксис скрипта корректен"
             }
         else:
-            # Извлекаем сообщение об ошибке
-            error_output = result.stderr.strip() or result.stdout.strip()
             return {
                 "valid": False,
                 "error": error_output or "Обнаружены синтаксические ошибки"
@@ -1141,12 +1160,10 @@ async def validate_bash_syntax(
             "valid": False,
             "error": f"Ошибка при проверке синтаксиса: {str(e)}"
         }
-    finally:
-        # Удаляем временный файл
-        try:
-            os.unlink(temp_file)
-        except:
-            pass
-
 
 
+@router.get("/scripts/processor-cache/stats")
+async def get_processor_cache_stats(current_user: User = Depends(get_current_user)):
+    """Hit rate and size of the processor result and syntax caches"""
+    await require_permission(current_user, 'logs_access')
+    return processor_cache_stats()
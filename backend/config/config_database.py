@@ -82,6 +82,17 @@ async def ensure_indexes():
         await db.executions.create_index("execution_session_id")
         await db.executions.create_index([("executed_at", -1)])
         await db.executions.create_index("executed_by")
+
+        # Background project runs and their replayable event logs
+        await db.execution_runs.create_index("session_id", unique=True)
+        await db.execution_runs.create_index([("project_id", 1), ("started_at", -1)])
+        await db.execution_runs.create_index([("status", 1), ("heartbeat_at", 1)])
+        await db.execution_events.create_index([("session_id", 1), ("seq", 1)], unique=True)
+
+        # Host tasks leased by execution workers (EXECUTION_QUEUE_ENABLED)
+        await db.execution_queue.create_index("id", unique=True)
+        await db.execution_queue.create_index([("status", 1), ("enqueued_at", 1)])
+        await db.execution_queue.create_index("session_id")
         
         # Audit logs collection
         await db.audit_logs.create_index([("created_at", -1)])
@@ -91,6 +102,11 @@ async def ensure_indexes():
         # Scheduler jobs collection
         await db.scheduler_jobs.create_index("is_active")
         await db.scheduler_jobs.create_index("next_run")
+        await db.scheduler_jobs.create_index([("status", 1), ("next_run_at", 1)])
+        await db.scheduler_jobs.create_index("lease_expires_at", sparse=True)
+        await db.scheduler_runs.create_index([("job_id", 1), ("status", 1)])
+        await db.scheduler_host_budget.create_index("window", unique=True)
+        await db.scheduler_host_budget.create_index("expires_at", expireAfterSeconds=0)  # TTL index - auto-delete expired
         
         # Roles and user_roles collections
         await db.roles.create_index("name", unique=True)
@@ -106,6 +122,9 @@ async def ensure_indexes():
         await db.systems.create_index("category_id")
         await db.scripts.create_index("system_id")
 
+        # Shared processor result cache (PROCESSOR_RESULT_CACHE_MONGO)
+        await db.processor_result_cache.create_index("expires_at", expireAfterSeconds=0)  # TTL index - auto-delete expired
+
         # IS catalog
         await db.is_catalog.create_index("created_at")
         await db.is_catalog.create_index("id", unique=True)
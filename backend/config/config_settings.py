@@ -37,6 +37,7 @@ JWT_REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get('JWT_REFRESH_TOKEN_EXPIRE_DAY
 JWT_ACCESS_TOKEN_EXPIRE_HOURS = 24
 
 # Scheduler Configuration
+# Retry interval of due jobs that could not start yet (the worker sleeps until the next due time)
 SCHEDULER_POLL_SECONDS = int(os.environ.get("SCHEDULER_POLL_SECONDS", "30"))
 
 # ============================================================================
@@ -57,6 +58,8 @@ IS_CATALOG_GRIDFS_BUCKET = os.environ.get("IS_CATALOG_GRIDFS_BUCKET", "is_catalo
 CONFIG_INTEGRITY_SCHEDULE_TZ = os.environ.get("CONFIG_INTEGRITY_SCHEDULE_TZ", "Europe/Moscow")
 CONFIG_INTEGRITY_SCHEDULE_HOUR = int(os.environ.get("CONFIG_INTEGRITY_SCHEDULE_HOUR", "9"))
 CONFIG_INTEGRITY_SCHEDULE_MINUTE = int(os.environ.get("CONFIG_INTEGRITY_SCHEDULE_MINUTE", "0"))
+# Config integrity: окно разброса (сек) после HOUR:MINUTE — постоянное смещение для проверки и отчёта; 0 — без разброса
+CONFIG_INTEGRITY_SCHEDULE_JITTER_SECONDS = int(os.environ.get("CONFIG_INTEGRITY_SCHEDULE_JITTER_SECONDS", "0"))
 
 # ============================================================================
 # LOGGING CONFIGURATION
@@ -0,0 +1,47 @@
+"""
+Execution worker
+Leases host tasks of project runs from db.execution_queue and executes them over SSH/WinRM
+(the API queues them when EXECUTION_QUEUE_ENABLED=true). Any number of workers can run,
+on this node or others, with the same MONGO_URL, DB_NAME and encryption key as the API.
+
+Run from the backend directory:
+
+  python -m execution_worker [--slots N]
+
+SIGINT/SIGTERM stop leasing; hosts already running are finished first.
+"""
+
+import argparse
+import asyncio
+import signal
+
+from config.config_init import logger
+from services.services_execution_worker import EXECUTION_WORKER_SLOTS, ExecutionWorker
+from services.services_processor_pool import start_processor_pool, stop_processor_pool
+from services.services_ssh_async import warn_unavailable_ssh_backend
+from utils.ssh_logger import stop_ssh_logger
+
+
+async def main(slots: int) -> None:
+    worker = ExecutionWorker(slots)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+
+    warn_unavailable_ssh_backend()
+
+    # Warm processor script workers
+    await start_processor_pool()
+    try:
+        await worker.run()
+    finally:
+        await stop_processor_pool()
+        stop_ssh_logger()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Execution worker for queued project runs")
+    parser.add_argument("--slots", type=int, default=EXECUTION_WORKER_SLOTS, help="hosts executed at once")
+    args = parser.parse_args()
+    logger.info(f"Starting execution worker ({args.slots} slots)")
+    asyncio.run(main(args.slots))
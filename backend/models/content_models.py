@@ -58,6 +58,10 @@ class SystemUpdate(BaseModel):
     os_type: Optional[str] = None
 
 
+# How the checks of a host are sent: one channel per check or one bundled script
+ExecutionMode = Literal["channels", "bundle"]
+
+
 class Host(BaseModel):
     model_config = ConfigDict(extra="ignore")
     
@@ -70,6 +74,7 @@ class Host(BaseModel):
     password: Optional[str] = None
     ssh_key: Optional[str] = None
     connection_type: str = "ssh"  # "ssh" for Linux, "winrm" for Windows, "k8s" for Kubernetes
+    execution_mode: Optional[ExecutionMode] = None  # None = EXECUTION_MODE default
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     created_by: Optional[str] = None
 
@@ -83,6 +88,7 @@ class HostCreate(BaseModel):
     password: Optional[str] = None
     ssh_key: Optional[str] = None
     connection_type: str = "ssh"
+    execution_mode: Optional[ExecutionMode] = None
 
 
 class HostUpdate(BaseModel):
@@ -94,6 +100,7 @@ class HostUpdate(BaseModel):
     password: Optional[str] = None
     ssh_key: Optional[str] = None
     connection_type: Optional[str] = None
+    execution_mode: Optional[ExecutionMode] = None
 
 
 class CheckGroup(BaseModel):
@@ -124,6 +131,31 @@ class ProcessorScriptVersion(BaseModel):
     created_by: Optional[str] = None
 
 
+ProcessorType = Literal["bash", "rules"]
+
+ProcessorRuleType = Literal[
+    "contains",          # вывод содержит значение
+    "not_contains",      # вывод не содержит значение
+    "regex",             # вывод соответствует регулярному выражению
+    "key_equals",        # key<separator>value равно значению
+    "subset_of_etalon",  # множество значений ⊆ значений эталона
+    "numeric_le",        # число ≤ значения
+    "numeric_ge",        # число ≥ значения
+]
+
+
+class ProcessorRule(BaseModel):
+    """Правило декларативного обработчика (processor_type="rules"), вычисляется без bash"""
+    model_config = ConfigDict(extra="ignore")
+
+    type: ProcessorRuleType
+    value: Optional[str] = None  # Ожидаемое значение; если не задано - эталонные данные (ETALON_INPUT)
+    key: Optional[str] = None  # Параметр для key_equals/subset_of_etalon/numeric_*; без ключа - весь вывод
+    separator: str = "="  # Разделитель ключа и значения
+    ignore_case: bool = False
+    error_code: Optional[int] = None  # Код ошибки при невыполнении; по умолчанию определяется типом правила
+
+
 ScriptNonComplianceCriticality = Literal[
     "Нет",
     "Низкая",
@@ -145,6 +177,8 @@ class Script(BaseModel):
     # Версионирование processor_script
     processor_script_version: Optional[ProcessorScriptVersion] = None  # Текущая версия
     processor_script_versions: List[ProcessorScriptVersion] = Field(default_factory=list)  # История версий
+    processor_type: ProcessorType = "bash"  # bash - processor_script, rules - processor_rules
+    processor_rules: List[ProcessorRule] = Field(default_factory=list)  # Правила декларативного обработчика
     has_reference_files: bool = False  # Есть ли эталонные файлы
     test_methodology: Optional[str] = None  # Описание методики испытания
     success_criteria: Optional[str] = None  # Критерий успешного прохождения испытания
@@ -163,6 +197,8 @@ class ScriptCreate(BaseModel):
     content: str
     processor_script: Optional[str] = None
     processor_script_comment: Optional[str] = None  # Комментарий к первой версии
+    processor_type: ProcessorType = "bash"
+    processor_rules: List[ProcessorRule] = Field(default_factory=list)
     has_reference_files: bool = False
     test_methodology: Optional[str] = None
     success_criteria: Optional[str] = None
@@ -180,6 +216,8 @@ class ScriptUpdate(BaseModel):
     processor_script: Optional[str] = None  # Для обратной совместимости
     processor_script_comment: Optional[str] = None  # Комментарий к новой версии
     create_new_version: Optional[bool] = False  # Создать новую версию или обновить текущую
+    processor_type: Optional[ProcessorType] = None
+    processor_rules: Optional[List[ProcessorRule]] = None
     has_reference_files: Optional[bool] = None
     test_methodology: Optional[str] = None
     success_criteria: Optional[str] = None
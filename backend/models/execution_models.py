@@ -20,6 +20,7 @@ class ExecutionResult(BaseModel):
     error_description: Optional[str] = None  # Human-readable error description
     actual_data: Optional[str] = None  # Фактические данные из вывода команды (для сравнения с эталоном)
     timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    output_file: Optional[str] = Field(default=None, exclude=True)  # Полный вывод, не поместившийся в память (временный файл)
 
 
 class Execution(BaseModel):
@@ -79,6 +80,9 @@ class SchedulerJobCreate(BaseModel):
     recurrence_day_of_month: Optional[int] = None  # For monthly: 1-31 or -1 for last day
     recurrence_start_date: Optional[date] = None  # yyyy-mm-dd
     cron_expression: Optional[str] = None  # For advanced mode
+    # Load spreading: run up to jitter_seconds after the scheduled time (SCHEDULER_JITTER_SECONDS by default)
+    jitter_seconds: Optional[int] = Field(None, ge=0, le=86400)
+    jitter_mode: Optional[Literal["hash", "random"]] = None  # hash: fixed offset per job; random: new every run
 
 
 class SchedulerJobUpdate(BaseModel):
@@ -94,6 +98,8 @@ class SchedulerJobUpdate(BaseModel):
     recurrence_day_of_month: Optional[int] = None
     recurrence_start_date: Optional[date] = None
     cron_expression: Optional[str] = None
+    jitter_seconds: Optional[int] = Field(None, ge=0, le=86400)
+    jitter_mode: Optional[Literal["hash", "random"]] = None
     status: Optional[Literal["active", "paused"]] = None
 
 
@@ -104,11 +110,47 @@ class SchedulerRun(BaseModel):
     job_id: str
     project_id: str
     session_id: Optional[str] = None
-    status: Literal["running", "success", "failed"] = "running"
+    status: Literal["running", "success", "failed", "skipped"] = "running"
     started_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     finished_at: Optional[datetime] = None
     error: Optional[str] = None
     launched_by_user: Optional[str] = None
+    scheduled_for: Optional[datetime] = None  # next_run_at the run was due at
+    dispatch_delay_seconds: Optional[float] = None  # started_at - scheduled_for
+    lease_owner: Optional[str] = None  # scheduler instance running it
+    summary: Optional[Dict[str, Any]] = None  # host counts and duration of the project run
+
+
+class ProjectRunOptions(BaseModel):
+    """Options of a project run started in-process (run_project)"""
+    parallel_hosts: Optional[int] = None  # hosts processed concurrently (EXECUTION_PARALLEL_HOSTS by default)
+
+
+class HostRunSummary(BaseModel):
+    """Outcome of one host (project task) in a project run"""
+    host_name: str
+    status: Literal["running", "completed", "failed"] = "running"
+    scripts_total: int = 0
+    scripts_completed: int = 0
+    error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    duration_seconds: Optional[float] = None
+
+
+class ProjectRunSummary(BaseModel):
+    """Structured result of a project run (instead of its event stream)"""
+    session_id: str
+    project_id: str
+    status: Literal["running", "completed", "failed", "interrupted"]
+    total: int = 0  # hosts (project tasks)
+    completed: int = 0
+    failed: int = 0
+    error: Optional[str] = None  # run-level error (project not found, no tasks, ...)
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    duration_seconds: Optional[float] = None
+    hosts: List[HostRunSummary] = Field(default_factory=list)
 
 
 class ExecuteProjectRequest(BaseModel):
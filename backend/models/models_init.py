@@ -31,7 +31,8 @@ from models.content_models import (
     HostUpdate,
     Script,
     ScriptCreate,
-    ScriptUpdate
+    ScriptUpdate,
+    ProcessorRule
 )
 
 # Project models
@@ -53,6 +54,9 @@ from models.execution_models import (
     SchedulerJobCreate,
     SchedulerJobUpdate,
     SchedulerRun,
+    ProjectRunOptions,
+    HostRunSummary,
+    ProjectRunSummary,
     ExecuteProjectRequest,
     ExecuteRequest,
     OfflineSession,
@@ -97,6 +101,7 @@ __all__ = [
     "Script",
     "ScriptCreate",
     "ScriptUpdate",
+    "ProcessorRule",
     
     # Project models
     "Project",
@@ -114,6 +119,9 @@ __all__ = [
     "SchedulerJobCreate",
     "SchedulerJobUpdate",
     "SchedulerRun",
+    "ProjectRunOptions",
+    "HostRunSummary",
+    "ProjectRunSummary",
     "ExecuteProjectRequest",
     "ExecuteRequest",
     "OfflineSession",
@@ -9,10 +9,20 @@ from .scheduler_utils import (
 )
 
 from .scheduler_execution import (
-    consume_streaming_response,
     update_job_after_run,
     execute_scheduler_job,
-    handle_due_scheduler_job
+    handle_due_scheduler_job,
+    skip_due_scheduler_job,
+    claim_due_scheduler_job,
+    release_scheduler_job_claim,
+    reclaim_orphaned_scheduler_jobs
+)
+
+from .scheduler_timer import (
+    due_timer,
+    notify_job_changed,
+    notify_job_removed,
+    notify_config_integrity_schedule
 )
 
 from .scheduler_worker import scheduler_worker
@@ -25,10 +35,18 @@ __all__ = [
     'normalize_run_times',
     'calculate_next_run',
     # Execution
-    'consume_streaming_response',
     'update_job_after_run',
     'execute_scheduler_job',
     'handle_due_scheduler_job',
+    'skip_due_scheduler_job',
+    'claim_due_scheduler_job',
+    'release_scheduler_job_claim',
+    'reclaim_orphaned_scheduler_jobs',
+    # Timer
+    'due_timer',
+    'notify_job_changed',
+    'notify_job_removed',
+    'notify_config_integrity_schedule',
     # Worker
     'scheduler_worker'
 ]
@@ -1,53 +1,82 @@
 """Scheduler execution functions for running scheduled jobs"""
 
-import json
-from datetime import datetime, timezone
-from typing import Tuple, Optional, Dict, Any
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any
+
+from pymongo import ReturnDocument
 
 from config.config_init import db, logger
-from models.execution_models import SchedulerJob, SchedulerRun
+from models.execution_models import SchedulerJob, SchedulerRun, ProjectRunSummary
 from models.auth_models import User
 from utils.db_utils import prepare_for_mongo, parse_from_mongo
 from utils.audit_utils import log_audit
 from .scheduler_utils import calculate_next_run
+from .scheduler_timer import notify_job_changed
 
+# Seconds a claimed job belongs to its instance without a renewal
+SCHEDULER_LEASE_SECONDS = int(os.environ.get("SCHEDULER_LEASE_SECONDS", "120"))
+
+# Owner of the job leases taken by this process (several API workers/replicas run the scheduler)
+SCHEDULER_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _lease_deadline() -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=SCHEDULER_LEASE_SECONDS)).isoformat()
+
+
+async def claim_due_scheduler_job(job_doc: dict) -> bool:
+    """Atomically take a due job for this instance
+
+    Matches the next_run_at the job was found with, so of several instances that saw the
+    same due occurrence exactly one wins; the winner clears next_run_at and holds a lease.
 
-async def consume_streaming_response(streaming_response) -> Tuple[Optional[str], Optional[str]]:
-    """Consume SSE streaming response and extract session_id and status
-    
-    Args:
-        streaming_response: FastAPI StreamingResponse object
-        
     Returns:
-        Tuple of (session_id, final_status)
+        True if this instance owns the occurrence
     """
-    session_id = None
-    final_status = None
-    buffer = ""
-    body_iterator = getattr(streaming_response, "body_iterator", None)
-    if body_iterator is None:
-        return session_id, final_status
-    async for chunk in body_iterator:
-        text = chunk.decode() if isinstance(chunk, (bytes, bytearray)) else str(chunk)
-        buffer += text
-        while "\n\n" in buffer:
-            block, buffer = buffer.split("\n\n", 1)
-            line = block.strip()
-            if line.startswith("data: "):
-                try:
-                    payload = json.loads(line[len("data: "):])
-                except json.JSONDecodeError:
-                    continue
-                if payload.get("type") == "complete":
-                    session_id = payload.get("session_id")
-                    final_status = payload.get("status")
-                    print(f"🔍 DEBUG: received status from streaming = '{final_status}'")
-    if hasattr(body_iterator, "aclose"):
-        await body_iterator.aclose()
-    return session_id, final_status
-
-
-async def update_job_after_run(job: SchedulerJob, *, run_success: bool) -> None:
+    now_iso = datetime.now(timezone.utc).isoformat()
+    claimed = await db.scheduler_jobs.find_one_and_update(
+        {"id": job_doc["id"], "status": "active", "next_run_at": job_doc["next_run_at"]},
+        {"$set": {
+            "next_run_at": None,
+            "lease_owner": SCHEDULER_OWNER,
+            "lease_expires_at": _lease_deadline(),
+            "updated_at": now_iso,
+        }},
+        projection={"_id": 0, "id": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    return claimed is not None
+
+
+async def release_scheduler_job_claim(job_doc: dict) -> None:
+    """Give back a claimed occurrence that was not started; it is due again for the next dispatch."""
+    await db.scheduler_jobs.update_one(
+        {"id": job_doc["id"], "lease_owner": SCHEDULER_OWNER, "next_run_at": None},
+        {"$set": {"next_run_at": job_doc["next_run_at"], "lease_owner": None, "lease_expires_at": None}},
+    )
+
+
+async def _renew_job_lease(job_id: str) -> None:
+    """Keep the lease of a running job alive (cancelled when the run ends)."""
+    while True:
+        await asyncio.sleep(SCHEDULER_LEASE_SECONDS / 3)
+        try:
+            result = await db.scheduler_jobs.update_one(
+                {"id": job_id, "lease_owner": SCHEDULER_OWNER},
+                {"$set": {"lease_expires_at": _lease_deadline()}},
+            )
+            if not result.matched_count:
+                logger.warning(f"Scheduler job {job_id}: lease lost")
+                return
+        except Exception as exc:
+            logger.error(f"Scheduler job {job_id}: failed to renew lease: {str(exc)}")
+
+
+async def update_job_after_run(job: SchedulerJob, *, run_success: bool, run_status: Optional[str] = None) -> None:
     """Update scheduler job after execution
     
     Updates last_run_at, last_run_status, and calculates next_run_at.
@@ -58,12 +87,15 @@ async def update_job_after_run(job: SchedulerJob, *, run_success: bool) -> None:
     Args:
         job: Scheduler job that was executed
         run_success: Whether the execution was successful
+        run_status: last_run_status to record instead (e.g. "skipped")
     """
     now = datetime.now(timezone.utc)
     update_fields: Dict[str, Any] = {
         "last_run_at": now.isoformat(),
-        "last_run_status": "success" if run_success else "failed",
+        "last_run_status": run_status or ("success" if run_success else "failed"),
         "updated_at": now.isoformat(),
+        "lease_owner": None,
+        "lease_expires_at": None,
     }
     if job.job_type == "one_time":
         update_fields["status"] = "completed"
@@ -81,23 +113,26 @@ async def update_job_after_run(job: SchedulerJob, *, run_success: bool) -> None:
         next_run = calculate_next_run(job, reference=now)
         update_fields["next_run_at"] = next_run.isoformat() if next_run else None
     await db.scheduler_jobs.update_one({"id": job.id}, {"$set": update_fields})
+    notify_job_changed(job.id, update_fields.get("next_run_at"), update_fields.get("status", job.status))
 
 
-async def execute_scheduler_job(job: SchedulerJob) -> Tuple[Optional[str], Optional[str]]:
+async def execute_scheduler_job(job: SchedulerJob) -> ProjectRunSummary:
     """Execute a scheduler job by running its associated project
     
+    The project runs in-process through run_project (no token, no SSE stream).
+    
     Args:
         job: Scheduler job to execute
         
     Returns:
-        Tuple of (session_id, final_status)
+        Summary of the project run
         
     Raises:
         RuntimeError: If job creator user not found
+        PermissionError: If the creator may no longer run the project
     """
     # Import here to avoid circular dependency
-    from api.api_executions import execute_project
-    from config.config_security import create_access_token  # Импортируем функцию создания токена
+    from services.services_execution_runs import run_project
     
     user_doc = await db.users.find_one({"id": job.created_by}, {"_id": 0})
     if not user_doc:
@@ -117,48 +152,51 @@ async def execute_scheduler_job(job: SchedulerJob) -> Tuple[Optional[str], Optio
             "scheduler_job_name": job.name}
     )
     
-    # Создаем JWT токен для пользователя
-    token = create_access_token(data={"sub": scheduler_user.id})
-    
-    # Передаем токен вместо current_user
-    response = await execute_project(
-        project_id=job.project_id, 
-        token=token, 
-        skip_audit_log=True
-    )  
-    session_id, final_status = await consume_streaming_response(response)
-    return session_id, final_status
+    return await run_project(job.project_id, scheduler_user)
 
 
-async def handle_due_scheduler_job(job_doc: dict) -> None:
+async def handle_due_scheduler_job(job_doc: dict, *, claimed: bool = False) -> None:
     """Handle a scheduler job that is due for execution
     
-    Creates a scheduler run record, executes the job, and updates status.
+    Claims the job (another instance may have taken this occurrence already), creates a
+    scheduler run record, executes the job while renewing the lease, and updates status.
     
     Args:
         job_doc: Scheduler job document from database
+        claimed: The caller has already claimed the occurrence (claim_due_scheduler_job)
     """
+    if not claimed and not await claim_due_scheduler_job(job_doc):
+        logger.info(f"Scheduler job {job_doc.get('id')} was claimed by another instance")
+        return
     job = SchedulerJob(**parse_from_mongo(job_doc))
-    now_iso = datetime.now(timezone.utc).isoformat()
-    await db.scheduler_jobs.update_one({"id": job.id}, {"$set": {"next_run_at": None, "updated_at": now_iso}})
-    run = SchedulerRun(job_id=job.id, project_id=job.project_id, launched_by_user=job.created_by)
+    run = SchedulerRun(
+        job_id=job.id, project_id=job.project_id, launched_by_user=job.created_by,
+        scheduled_for=job.next_run_at, lease_owner=SCHEDULER_OWNER,
+    )
+    if job.next_run_at:
+        run.dispatch_delay_seconds = round((run.started_at - job.next_run_at).total_seconds(), 3)
+        logger.info(f"Scheduler job {job.id} started {run.dispatch_delay_seconds}s after its due time")
     await db.scheduler_runs.insert_one(prepare_for_mongo(run.model_dump()))
     error_message = None
+    renewer = asyncio.create_task(_renew_job_lease(job.id))
+    summary = None
     try:
-        session_id, final_status = await execute_scheduler_job(job)
-        print(f"🔍 DEBUG: final_status from execute_project = '{final_status}'")
-        run_status = "success" if final_status == "completed" else "failed"
-        print(f"🔍 DEBUG: setting run_status = '{run_status}'")
+        summary = await execute_scheduler_job(job)
+        run_status = "success" if summary.status == "completed" else "failed"
+        error_message = summary.error
     except Exception as exc:
         logger.error(f"Scheduler job {job.id} failed: {str(exc)}")
-        session_id = None
         run_status = "failed"
         error_message = str(exc)
+    finally:
+        renewer.cancel()
     update_run = {
         "status": run_status,
         "finished_at": datetime.now(timezone.utc).isoformat(),
-        "session_id": session_id
+        "session_id": summary.session_id if summary else None
     }
+    if summary:
+        update_run["summary"] = summary.model_dump(include={"total", "completed", "failed", "duration_seconds"})
     if error_message:
         update_run["error"] = error_message
     await db.scheduler_runs.update_one({"id": run.id}, {"$set": update_run})
@@ -166,3 +204,63 @@ async def handle_due_scheduler_job(job_doc: dict) -> None:
         now = datetime.now(timezone.utc)
         job.run_times = [rt for rt in job.run_times if rt > now]
     await update_job_after_run(job, run_success=run_status == "success")
+
+
+async def skip_due_scheduler_job(job_doc: dict, reason: str) -> None:
+    """Drop a due occurrence of a job (its project is already running) and schedule the next one
+
+    Args:
+        job_doc: Scheduler job document from database
+        reason: Why the occurrence was skipped (stored as the run error)
+    """
+    if not await claim_due_scheduler_job(job_doc):
+        return
+    job = SchedulerJob(**parse_from_mongo(job_doc))
+    now = datetime.now(timezone.utc)
+    run = SchedulerRun(
+        job_id=job.id, project_id=job.project_id, launched_by_user=job.created_by,
+        status="skipped", finished_at=now, error=reason, scheduled_for=job.next_run_at,
+    )
+    await db.scheduler_runs.insert_one(prepare_for_mongo(run.model_dump()))
+    logger.info(f"Scheduler job {job.id} skipped: {reason}")
+    if job.job_type == "multi_run":
+        job.run_times = [rt for rt in job.run_times if rt > now]
+    await update_job_after_run(job, run_success=False, run_status="skipped")
+
+
+async def reclaim_orphaned_scheduler_jobs() -> int:
+    """Reschedule jobs whose instance died during a run
+
+    Such a job keeps next_run_at None and an expired lease forever. Each one is taken over
+    atomically (so only one instance reclaims it), its running SchedulerRun is marked failed
+    and the next occurrence is calculated as after a failed run.
+
+    Returns:
+        Number of reclaimed jobs
+    """
+    reclaimed = 0
+    while True:
+        now_iso = datetime.now(timezone.utc).isoformat()
+        job_doc = await db.scheduler_jobs.find_one_and_update(
+            {"lease_owner": {"$ne": None}, "lease_expires_at": {"$lt": now_iso}},
+            {"$set": {"lease_owner": SCHEDULER_OWNER, "lease_expires_at": _lease_deadline()}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if job_doc is None:
+            return reclaimed
+        await db.scheduler_runs.update_many(
+            {"job_id": job_doc["id"], "status": "running", "lease_owner": job_doc["lease_owner"]},
+            {"$set": {
+                "status": "failed",
+                "finished_at": now_iso,
+                "error": "Выполнение прервано: экземпляр планировщика остановлен",
+            }},
+        )
+        job = SchedulerJob(**parse_from_mongo(job_doc))
+        if job.job_type == "multi_run":
+            now = datetime.now(timezone.utc)
+            job.run_times = [rt for rt in job.run_times if rt > now]
+        await update_job_after_run(job, run_success=False)
+        logger.warning(f"Scheduler job {job.id}: reclaimed from {job_doc['lease_owner']} after its lease expired")
+        reclaimed += 1
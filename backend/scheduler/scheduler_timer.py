@@ -0,0 +1,131 @@
+"""In-memory timer heap of upcoming scheduler due times
+
+The scheduler worker sleeps until the earliest next_run_at instead of querying Mongo every
+SCHEDULER_POLL_SECONDS. Entries come from a resync (active scheduler jobs and the config
+integrity schedules) and from notify calls made when a job is created, updated, paused,
+resumed or has run; a change that moves the earliest entry wakes the worker at once.
+A slow periodic resync (SCHEDULER_RESYNC_SECONDS) picks up changes made by other instances.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.config_init import db
+from models.config_integrity_models import SCHEDULE_DOC_ID, REPORT_SCHEDULE_DOC_ID
+
+# Full reload of due times from Mongo (changes made by other instances)
+SCHEDULER_RESYNC_SECONDS = int(os.environ.get("SCHEDULER_RESYNC_SECONDS", "300"))
+
+# Entry kinds
+JOB = "job"
+CONFIG_INTEGRITY = "config_integrity"
+CONFIG_INTEGRITY_REPORT = "config_integrity_report"
+
+TimerKey = Tuple[str, str]
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    """next_run_at as an aware datetime (stored as ISO string); None if unset."""
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class SchedulerTimer:
+    """Min-heap of (due time, key); a key has at most one live entry, stale ones are dropped lazily."""
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int, TimerKey]] = []
+        self._due: Dict[TimerKey, datetime] = {}
+        self._order = itertools.count()
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def set(self, key: TimerKey, due: Any) -> None:
+        """Set (or with None remove) the due time of a key; wakes the worker if it becomes the earliest."""
+        due = _as_datetime(due)
+        if due is None:
+            self._due.pop(key, None)
+            return
+        earliest = self.next_due()
+        self._due[key] = due
+        heapq.heappush(self._heap, (due, next(self._order), key))
+        if earliest is None or due < earliest:
+            self._wakeup.set()
+
+    def next_due(self) -> Optional[datetime]:
+        while self._heap and self._due.get(self._heap[0][2]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> List[TimerKey]:
+        """Remove and return the keys due at `now`, earliest first."""
+        keys = []
+        while (due := self.next_due()) is not None and due <= now:
+            _, _, key = heapq.heappop(self._heap)
+            del self._due[key]
+            keys.append(key)
+        return keys
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    async def wait(self, timeout: float) -> None:
+        """Sleep until the earliest entry is due, wake() is called or timeout seconds pass."""
+        delay = timeout
+        due = self.next_due()
+        if due is not None:
+            delay = min(delay, (due - datetime.now(timezone.utc)).total_seconds())
+        if delay > 0:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+        self._wakeup.clear()
+
+    async def refresh_config_integrity(self) -> None:
+        """Reload the due times of the config integrity check and report schedules."""
+        for key, collection, doc_id in (
+            ((CONFIG_INTEGRITY, SCHEDULE_DOC_ID), db.config_integrity_schedule, SCHEDULE_DOC_ID),
+            ((CONFIG_INTEGRITY_REPORT, REPORT_SCHEDULE_DOC_ID), db.config_integrity_report_schedule, REPORT_SCHEDULE_DOC_ID),
+        ):
+            doc = await collection.find_one({"id": doc_id}, {"_id": 0, "enabled": 1, "next_run_at": 1})
+            self.set(key, doc.get("next_run_at") if doc and doc.get("enabled") else None)
+
+    async def resync(self) -> None:
+        """Rebuild the heap from Mongo."""
+        jobs = await db.scheduler_jobs.find(
+            {"status": "active", "next_run_at": {"$ne": None}}, {"_id": 0, "id": 1, "next_run_at": 1}
+        ).to_list(None)
+        self._heap = []
+        self._due = {}
+        for job in jobs:
+            self.set((JOB, job["id"]), job["next_run_at"])
+        await self.refresh_config_integrity()
+        self._wakeup.set()
+
+
+due_timer = SchedulerTimer()
+
+
+def notify_job_changed(job_id: str, next_run_at: Any, status: str = "active") -> None:
+    """A scheduler job was created, updated, paused, resumed or has run."""
+    due_timer.set((JOB, job_id), next_run_at if status == "active" else None)
+
+
+def notify_job_removed(job_id: str) -> None:
+    due_timer.set((JOB, job_id), None)
+
+
+def notify_config_integrity_schedule(next_run_at: Any, enabled: bool, report: bool = False) -> None:
+    """The config integrity check (or report) schedule was changed."""
+    key = (CONFIG_INTEGRITY_REPORT, REPORT_SCHEDULE_DOC_ID) if report else (CONFIG_INTEGRITY, SCHEDULE_DOC_ID)
+    due_timer.set(key, next_run_at if enabled else None)
@@ -1,11 +1,19 @@
 """Scheduler utility functions for time calculations and parsing"""
 
+import hashlib
+import os
+import random
 from datetime import datetime, timezone, timedelta, time
 from typing import Optional, List, Dict, Any
 from fastapi import HTTPException  # pyright: ignore[reportMissingImports]
 
 from models.execution_models import SchedulerJob
 
+# Default jitter window (seconds) of recurring jobs without their own jitter_seconds; 0 disables
+SCHEDULER_JITTER_SECONDS = int(os.environ.get("SCHEDULER_JITTER_SECONDS", "0"))
+# Default jitter: "hash" (fixed offset per job, derived from its id) or "random" (new offset every run)
+SCHEDULER_JITTER_MODE = os.environ.get("SCHEDULER_JITTER_MODE", "hash").lower()
+
 # Optional: croniter for cron expression support
 try:
     from croniter import croniter
@@ -298,6 +306,45 @@ def parse_simple_cron(cron_expression: str, reference: datetime) -> Optional[dat
     return next_hour
 
 
+def jitter_offset(window_seconds: int, *, key: str, mode: str = "hash") -> timedelta:
+    """Offset in [0, window_seconds) that spreads runs scheduled for the same instant
+
+    Args:
+        window_seconds: Jitter window; 0 or less gives no offset
+        key: Identity of the schedule (job id); the "hash" offset depends only on it
+        mode: "hash" (same offset every time) or "random" (new offset every call)
+
+    Returns:
+        Offset to add to the nominal run time
+    """
+    if window_seconds <= 0:
+        return timedelta(0)
+    if mode == "random":
+        fraction = random.random()
+    else:
+        digest = hashlib.sha256(key.encode()).digest()
+        fraction = int.from_bytes(digest[:8], "big") / 2 ** 64
+    return timedelta(seconds=int(fraction * window_seconds))
+
+
+def apply_job_jitter(job: SchedulerJob, nominal: Optional[datetime]) -> Optional[datetime]:
+    """Shift a recurring job's nominal run time by its jitter (schedule_config jitter_seconds/jitter_mode)
+
+    Interval schedules (every X minutes/hours) are not shifted: their next run counts from
+    the previous one, so an offset would accumulate.
+    """
+    config = job.schedule_config or {}
+    if nominal is None or (
+        config.get("schedule_mode", "simple") == "simple"
+        and config.get("recurrence_frequency") in ("minutes", "hours")
+    ):
+        return nominal
+    window = config.get("jitter_seconds")
+    if window is None:
+        window = SCHEDULER_JITTER_SECONDS
+    return nominal + jitter_offset(window, key=job.id, mode=config.get("jitter_mode") or SCHEDULER_JITTER_MODE)
+
+
 def normalize_run_times(run_times: List[datetime]) -> List[datetime]:
     """Normalize and sort run times to UTC
     
@@ -323,7 +370,7 @@ def calculate_next_run(job: SchedulerJob, *, reference: Optional[datetime] = Non
     Handles three job types:
     - one_time: Returns existing next_run_at
     - multi_run: Returns first future run from run_times list
-    - recurring: Calculates next occurrence based on schedule_config
+    - recurring: Calculates next occurrence based on schedule_config, shifted by its jitter
     
     Args:
         job: Scheduler job to calculate next run for
@@ -340,5 +387,7 @@ def calculate_next_run(job: SchedulerJob, *, reference: Optional[datetime] = Non
         future_runs = [rt for rt in job.run_times if rt >= reference_dt]
         return future_runs[0] if future_runs else None
     if job.job_type == "recurring":
-        return next_recurring_occurrence(job.schedule_config, reference=reference_dt, initial=initial)
+        return apply_job_jitter(
+            job, next_recurring_occurrence(job.schedule_config, reference=reference_dt, initial=initial)
+        )
     return None
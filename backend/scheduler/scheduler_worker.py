@@ -1,39 +1,225 @@
 """Background scheduler worker for executing scheduled jobs"""
 
 import asyncio
-from datetime import datetime, timezone
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set
+
+from pymongo.errors import DuplicateKeyError
 
 from config.config_init import db, logger, SCHEDULER_POLL_SECONDS
-from .scheduler_execution import handle_due_scheduler_job
+from .scheduler_execution import (
+    claim_due_scheduler_job,
+    handle_due_scheduler_job,
+    reclaim_orphaned_scheduler_jobs,
+    release_scheduler_job_claim,
+    skip_due_scheduler_job,
+)
+from .scheduler_timer import (
+    CONFIG_INTEGRITY,
+    CONFIG_INTEGRITY_REPORT,
+    JOB,
+    SCHEDULER_RESYNC_SECONDS,
+    due_timer,
+)
 from services.services_config_integrity import (
     process_config_integrity_schedule_due,
     process_config_integrity_report_schedule_due,
 )
 
+# Scheduler jobs executed at the same time
+SCHEDULER_MAX_CONCURRENT_JOBS = int(os.environ.get("SCHEDULER_MAX_CONCURRENT_JOBS", "4"))
+# Due job whose project is already running: "queue" (wait for the run to finish) or "skip" (drop this occurrence)
+SCHEDULER_OVERLAP_POLICY = os.environ.get("SCHEDULER_OVERLAP_POLICY", "queue").lower()
+# Hosts that scheduled runs of all instances may start contacting per minute; 0 = unlimited
+SCHEDULER_MAX_HOSTS_PER_MINUTE = int(os.environ.get("SCHEDULER_MAX_HOSTS_PER_MINUTE", "0"))
+
+# Jobs dispatched by this worker (job id -> task) and the projects they run
+_running_jobs: Dict[str, asyncio.Task] = {}
+_running_projects: Set[str] = set()
+# Due jobs the last dispatch could not start (no free slot, project busy)
+_deferred_jobs: Set[str] = set()
+# End of the minute whose host budget the last dispatch found spent (None: not spent)
+_budget_window_end: Optional[datetime] = None
+# Config integrity hooks in progress (name -> task)
+_running_hooks: Dict[str, asyncio.Task] = {}
+
+
+async def _project_busy(project_id: str) -> bool:
+    """A run of the project is in progress: scheduled here, or started elsewhere (UI, another instance)."""
+    if project_id in _running_projects:
+        return True
+    return await db.execution_runs.find_one({"project_id": project_id, "status": "running"}, {"_id": 1}) is not None
+
+
+async def _take_host_budget(project_id: str) -> bool:
+    """
+    Reserve the project's hosts in the fleet-wide budget of the current minute
+    (db.scheduler_host_budget, one counter per minute shared by all instances). A project
+    larger than the whole budget is only admitted as the first run of a minute. Only the
+    instance that won the job's claim reserves, so a run is charged once across the fleet.
+    """
+    if SCHEDULER_MAX_HOSTS_PER_MINUTE <= 0:
+        return True
+    hosts = await db.project_tasks.count_documents({"project_id": project_id})
+    if hosts <= 0:
+        return True
+    now = datetime.now(timezone.utc)
+    # Two instances creating the counter of a new minute at once: the loser's upsert also hits
+    # the unique window, so a duplicate key is final only on the second attempt
+    for attempt in range(2):
+        try:
+            # No counter of this minute with room for the hosts: the upsert hits the unique window
+            await db.scheduler_host_budget.update_one(
+                {"window": now.strftime("%Y-%m-%dT%H:%M"), "hosts": {"$lte": max(0, SCHEDULER_MAX_HOSTS_PER_MINUTE - hosts)}},
+                {"$inc": {"hosts": hosts}, "$setOnInsert": {"expires_at": now + timedelta(hours=1)}},
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            continue
+    return False
+
+
+async def _run_job(job_doc: dict) -> None:
+    try:
+        await handle_due_scheduler_job(job_doc, claimed=True)
+    except Exception as exc:
+        logger.error(f"Scheduler job {job_doc.get('id')} failed: {str(exc)}")
+    finally:
+        _running_jobs.pop(job_doc.get("id"), None)
+        _running_projects.discard(job_doc.get("project_id"))
+        # A slot and the project are free again: deferred jobs are retried now
+        now = datetime.now(timezone.utc)
+        for job_id in _deferred_jobs:
+            due_timer.set((JOB, job_id), now)
+
+
+async def dispatch_due_jobs(due_job_ids: Iterable[str] = ()) -> int:
+    """
+    Start due jobs concurrently, up to SCHEDULER_MAX_CONCURRENT_JOBS in flight and within
+    SCHEDULER_MAX_HOSTS_PER_MINUTE. Returns the number started; due jobs left waiting are in
+    _deferred_jobs. due_job_ids are the timer keys that woke the worker: those beyond the
+    fetch limit are deferred too, so they are not lost from the timer.
+    """
+    global _budget_window_end
+    capacity = max(1, SCHEDULER_MAX_CONCURRENT_JOBS) - len(_running_jobs)
+    now_iso = datetime.now(timezone.utc).isoformat()
+    # More than capacity: jobs of busy projects must not hide the others
+    limit = max(capacity, 0) + 20
+    jobs = await db.scheduler_jobs.find(
+        {
+            "status": "active",
+            "next_run_at": {"$ne": None, "$lte": now_iso}
+        },
+        {"_id": 0}
+    ).sort("next_run_at", 1).to_list(limit)
+    started = 0
+    _deferred_jobs.clear()
+    _budget_window_end = None
+    if len(jobs) >= limit:
+        # More jobs are due than were fetched: the rest are retried with the deferred ones
+        fetched = {job_doc["id"] for job_doc in jobs}
+        _deferred_jobs.update(job_id for job_id in due_job_ids if job_id not in fetched)
+    for job_doc in jobs:
+        if job_doc["id"] in _running_jobs:
+            continue
+        if started >= capacity or _budget_window_end is not None:
+            _deferred_jobs.add(job_doc["id"])
+            continue
+        if await _project_busy(job_doc["project_id"]):
+            if SCHEDULER_OVERLAP_POLICY == "skip":
+                await skip_due_scheduler_job(job_doc, "Проект уже выполняется")
+            else:
+                _deferred_jobs.add(job_doc["id"])
+            continue
+        if not await claim_due_scheduler_job(job_doc):
+            # Another instance runs this occurrence
+            continue
+        if not await _take_host_budget(job_doc["project_id"]):
+            # Budget of this minute is spent: this job and the later ones wait for the next minute
+            await release_scheduler_job_claim(job_doc)
+            _budget_window_end = datetime.now(timezone.utc).replace(second=0, microsecond=0) + timedelta(minutes=1)
+            _deferred_jobs.add(job_doc["id"])
+            continue
+        _running_projects.add(job_doc["project_id"])
+        _running_jobs[job_doc["id"]] = asyncio.create_task(_run_job(job_doc))
+        started += 1
+    return started
+
+
+def _start_hook(name: str, hook: Callable[[], Awaitable[None]]) -> None:
+    """Run a config integrity hook in the background unless its previous call is still running."""
+    task = _running_hooks.get(name)
+    if task is not None and not task.done():
+        return
+
+    async def _run() -> None:
+        try:
+            await hook()
+        except Exception as exc:
+            logger.error(f"Scheduler hook {name} failed: {str(exc)}")
+        finally:
+            # The hook has moved its next_run_at
+            try:
+                await due_timer.refresh_config_integrity()
+            except Exception as exc:
+                logger.error(f"Scheduler hook {name}: failed to reload schedule: {str(exc)}")
+
+    _running_hooks[name] = asyncio.create_task(_run())
+
 
 async def scheduler_worker():
-    """Background worker that polls for and executes due scheduler jobs
-    
-    Runs continuously, checking every SCHEDULER_POLL_SECONDS for jobs that
-    are active and have a next_run_at time in the past.
-    
+    """Background worker that executes due scheduler jobs
+
+    Sleeps until the earliest next_run_at of the timer heap (see scheduler_timer) or until
+    the API wakes it after a job change, instead of polling Mongo. Due jobs run
+    concurrently (SCHEDULER_MAX_CONCURRENT_JOBS); a long run delays neither other jobs nor
+    the config integrity schedules. A due job that cannot start yet (no free slot, project
+    busy) is retried after SCHEDULER_POLL_SECONDS; one held back by the hosts-per-minute
+    budget is retried when the next minute starts. Due times are reloaded from Mongo every
+    SCHEDULER_RESYNC_SECONDS.
+
+    Every API worker and replica may run this loop: a due job is claimed atomically with a
+    lease (see claim_due_scheduler_job), and jobs whose instance died mid-run are reclaimed
+    on resync once their lease expires.
+
     Initial delay of 5 seconds allows server to fully start up.
     """
     await asyncio.sleep(5)
-    while True:
-        try:
-            now_iso = datetime.now(timezone.utc).isoformat()
-            jobs = await db.scheduler_jobs.find(
-                {
-                    "status": "active",
-                    "next_run_at": {"$ne": None, "$lte": now_iso}
-                },
-                {"_id": 0}
-            ).to_list(20)
-            for job_doc in jobs:
-                await handle_due_scheduler_job(job_doc)
-            await process_config_integrity_schedule_due()
-            await process_config_integrity_report_schedule_due()
-        except Exception as exc:
-            logger.error(f"Scheduler worker error: {str(exc)}")
-        await asyncio.sleep(SCHEDULER_POLL_SECONDS)
+    loop = asyncio.get_running_loop()
+    last_resync = None
+    try:
+        while True:
+            try:
+                if last_resync is None or loop.time() - last_resync >= SCHEDULER_RESYNC_SECONDS:
+                    # Jobs left by a dead instance get their next occurrence before the reload
+                    await reclaim_orphaned_scheduler_jobs()
+                    await due_timer.resync()
+                    last_resync = loop.time()
+                now = datetime.now(timezone.utc)
+                due = due_timer.pop_due(now)
+                due_job_ids = [key_id for kind, key_id in due if kind == JOB]
+                if due_job_ids:
+                    await dispatch_due_jobs(due_job_ids)
+                    retry_at = now + timedelta(seconds=SCHEDULER_POLL_SECONDS)
+                    if _budget_window_end is not None:
+                        retry_at = min(retry_at, _budget_window_end)
+                    for job_id in _deferred_jobs:
+                        due_timer.set((JOB, job_id), retry_at)
+                if any(kind == CONFIG_INTEGRITY for kind, _ in due):
+                    _start_hook("config_integrity_schedule", process_config_integrity_schedule_due)
+                if any(kind == CONFIG_INTEGRITY_REPORT for kind, _ in due):
+                    _start_hook("config_integrity_report_schedule", process_config_integrity_report_schedule_due)
+            except Exception as exc:
+                logger.error(f"Scheduler worker error: {str(exc)}")
+                # Mongo unavailable: retry from a fresh resync
+                last_resync = None
+                await asyncio.sleep(SCHEDULER_POLL_SECONDS)
+                continue
+            await due_timer.wait(SCHEDULER_RESYNC_SECONDS - (loop.time() - last_resync))
+    finally:
+        tasks = list(_running_jobs.values()) + list(_running_hooks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
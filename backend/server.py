@@ -196,6 +196,20 @@ async def startup_db_init():
         else:
             logger.info("✅ Database already initialized")
         
+        # Runs of a process that died will never finish
+        from services.services_execution_runs import mark_interrupted_runs
+        interrupted = await mark_interrupted_runs()
+        if interrupted:
+            logger.warning(f"Marked {interrupted} orphaned project runs as interrupted")
+
+        # SSH_BACKEND=asyncssh without asyncssh installed runs on paramiko
+        from services.services_ssh_async import warn_unavailable_ssh_backend
+        warn_unavailable_ssh_backend()
+
+        # Warm processor script workers
+        from services.services_processor_pool import start_processor_pool
+        await start_processor_pool()
+
         # Start scheduler worker
         global scheduler_task
         if scheduler_task is None:
@@ -209,8 +223,20 @@ async def startup_db_init():
 async def shutdown_db_client():
     """Cleanup on shutdown"""
     from config.config_init import client
-    
+    from services.services_write_buffer import flush_write_buffers
+
+    # Results of runs still in progress must reach Mongo before the client closes
+    from services.services_execution_runs import stop_project_runs
+    await stop_project_runs()
+    await flush_write_buffers()
     client.close()
+
+    from services.services_processor_pool import stop_processor_pool
+    await stop_processor_pool()
+
+    # Pending SSH log records are written out before exit
+    from utils.ssh_logger import stop_ssh_logger
+    stop_ssh_logger()
     
     global scheduler_task
     if scheduler_task:
@@ -0,0 +1,368 @@
+"""
+services/services_bundle.py
+Bundle execution mode: all checks of a host in one remote shell invocation.
+
+The check bodies are assembled into one bash script (like the offline script), sent
+over a single channel and the framed per-check stdout/stderr/exit code is split back
+into one ExecutionResult per script. One round-trip per host instead of one per check.
+Windows hosts get the same framing from one PowerShell script run in the host's WinRM
+shell; each check still runs through cmd.exe, as in channels mode.
+"""
+
+import asyncio
+import base64
+import os
+import re
+import time
+import uuid
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Sequence, Tuple, get_args
+
+import paramiko
+
+from config.config_init import logger
+from models.content_models import ExecutionMode
+from models.models_init import Host, Script, ExecutionResult
+from services.services_execution import (
+    SSH_COMMAND_TIMEOUT,
+    SSHConnectionManager,
+    create_winrm_manager,
+    ssh_connection,
+)
+from services.services_output_capture import BoundedOutput, drain_channel
+from services.services_ssh_async import async_ssh_enabled, ssh_stream_command
+from services.services_winrm import WinRMShellManager
+from utils.ssh_logger import log_ssh_command
+
+# Default execution mode for hosts without their own setting: "channels" or "bundle"
+EXECUTION_MODE = os.environ.get('EXECUTION_MODE', 'channels')
+
+EXECUTION_MODES = get_args(ExecutionMode)
+
+# Seconds a bundle may run per check it contains (a bundle of N checks gets N times this)
+BUNDLE_TIMEOUT_PER_CHECK = int(os.environ.get('BUNDLE_TIMEOUT_PER_CHECK', str(SSH_COMMAND_TIMEOUT)))
+
+_MARKER_PREFIX = "@@KAPPI"
+
+
+def resolve_execution_mode(host: Host) -> str:
+    """Execution mode for host: its own setting, else EXECUTION_MODE. Bundle needs SSH or WinRM."""
+    mode = host.execution_mode or EXECUTION_MODE
+    if mode not in EXECUTION_MODES:
+        # Host values are validated by the model; only a mistyped EXECUTION_MODE gets here
+        mode = "channels"
+    if mode == "bundle" and host.connection_type not in ("ssh", "winrm"):
+        return "channels"
+    return mode
+
+
+def build_bundle_script(scripts: Sequence[Tuple[str, str]], nonce: str) -> str:
+    """
+    Assemble (script_id, content) pairs into one bash script.
+
+    Each check runs in its own subshell with stdin from /dev/null; its stdout, stderr
+    and exit code are printed between markers carrying `nonce` and the check index.
+    Check bodies are embedded through quoted here-documents, so no escaping is needed.
+    """
+    marker = f"{_MARKER_PREFIX}:{nonce}"
+    lines = [
+        "__kappi_dir=$(mktemp -d) || exit 70",
+        "trap 'rm -rf \"$__kappi_dir\"' EXIT",
+    ]
+    for idx, (_, content) in enumerate(scripts):
+        body = content if content.strip() else "true"
+        lines.append(f"IFS= read -r -d '' __kappi_check <<'__KAPPI_{nonce}_{idx}'")
+        lines.extend(body.splitlines())
+        lines.append(f"__KAPPI_{nonce}_{idx}")
+        lines.append('( eval "$__kappi_check" ) >"$__kappi_dir/out" 2>"$__kappi_dir/err" </dev/null')
+        lines.append("__kappi_rc=$?")
+        lines.append(f"printf '\\n{marker}:OUT:{idx}\\n'")
+        lines.append('cat "$__kappi_dir/out"')
+        lines.append(f"printf '\\n{marker}:ERR:{idx}\\n'")
+        lines.append('cat "$__kappi_dir/err"')
+        lines.append(f"printf '\\n{marker}:END:{idx}:%d\\n' \"$__kappi_rc\"")
+    return "\n".join(lines) + "\n"
+
+
+def build_powershell_bundle(scripts: Sequence[Tuple[str, str]], nonce: str) -> str:
+    """
+    PowerShell counterpart of build_bundle_script.
+
+    Each check body runs as `cmd.exe /d /c <body>` (what WinRM run_cmd does in channels
+    mode) with stdout/stderr redirected to temp files; the same markers as the bash bundle
+    frame the output, so parse_bundle_output splits both. Bodies are embedded as base64.
+    """
+    marker = f"{_MARKER_PREFIX}:{nonce}"
+    lines = [
+        "[Console]::OutputEncoding = New-Object System.Text.UTF8Encoding $false",
+        f"$__kappiDir = Join-Path $env:TEMP 'kappi_{nonce}'",
+        "New-Item -ItemType Directory -Force -Path $__kappiDir | Out-Null",
+        "$__kappiOut = Join-Path $__kappiDir 'out'",
+        "$__kappiErr = Join-Path $__kappiDir 'err'",
+        "function __KappiRead([string]$path) {",
+        "    if (Test-Path -LiteralPath $path) { [IO.File]::ReadAllText($path) } else { '' }",
+        "}",
+        "function __KappiRun([int]$idx, [string]$b64) {",
+        "    $body = [Text.Encoding]::UTF8.GetString([Convert]::FromBase64String($b64))",
+        "    try {",
+        "        $p = Start-Process -FilePath $env:ComSpec -ArgumentList ('/d /c ' + $body) -NoNewWindow -Wait -PassThru "
+        "-RedirectStandardOutput $__kappiOut -RedirectStandardError $__kappiErr",
+        "        $rc = $p.ExitCode",
+        "        $out = __KappiRead $__kappiOut",
+        "        $err = __KappiRead $__kappiErr",
+        "    } catch {",
+        "        $rc = 1; $out = ''; $err = $_.ToString()",
+        "    }",
+        f'    [Console]::Out.Write("`n{marker}:OUT:$idx`n")',
+        "    [Console]::Out.Write($out)",
+        f'    [Console]::Out.Write("`n{marker}:ERR:$idx`n")',
+        "    [Console]::Out.Write($err)",
+        f'    [Console]::Out.Write("`n{marker}:END:${{idx}}:$rc`n")',
+        "}",
+        "try {",
+    ]
+    for idx, (_, content) in enumerate(scripts):
+        body = content if content.strip() else "rem"
+        encoded = base64.b64encode(body.encode("utf-8")).decode("ascii")
+        lines.append(f"    __KappiRun {idx} '{encoded}'")
+    lines.extend([
+        "} finally {",
+        "    Remove-Item -LiteralPath $__kappiDir -Recurse -Force -ErrorAction SilentlyContinue",
+        "}",
+    ])
+    return "\n".join(lines) + "\n"
+
+
+class BundleOutput:
+    """
+    Byte sink splitting bundle stdout into per-check streams as it arrives.
+
+    Lines are matched against the OUT/ERR/END markers of `nonce`; the text between markers
+    goes into a BoundedOutput of its check, so a check keeps at most OUTPUT_MEMORY_LIMIT in
+    memory however large the bundle output is. `raw` (optional) also receives the whole
+    stream, e.g. for the SSH log.
+    """
+
+    # Longest marker line: prefix, nonce, kind, check index and exit code
+    _MAX_MARKER = 160
+
+    def __init__(self, nonce: str, raw: Optional[BoundedOutput] = None):
+        self._marker = re.compile(
+            re.escape(f"{_MARKER_PREFIX}:{nonce}:".encode()) + rb"(OUT|ERR|END):(\d+)(?::(-?\d+))?"
+        )
+        self.raw = raw
+        self._sections: Dict[int, Dict[str, BoundedOutput]] = {}
+        self._results: Dict[int, Tuple[str, str, int]] = {}
+        self._section: Optional[BoundedOutput] = None
+        self._line = bytearray()
+        # The pending line was partly written out already, so it cannot be a marker
+        self._midline = False
+        # Newline ending the previous content line; dropped if a marker follows it
+        self._newline_pending = False
+
+    def write(self, data: bytes) -> None:
+        if not data:
+            return
+        if self.raw is not None:
+            self.raw.write(data)
+        *lines, rest = data.split(b"\n")
+        for line in lines:
+            self._line += line
+            self._end_line()
+        self._line += rest
+        if len(self._line) > self._MAX_MARKER:
+            self._content(bytes(self._line), ends_line=False)
+            self._line.clear()
+            self._midline = True
+
+    def _end_line(self) -> None:
+        line = bytes(self._line)
+        self._line.clear()
+        match = None if self._midline else self._marker.fullmatch(line)
+        self._midline = False
+        if match is None:
+            self._content(line, ends_line=True)
+            return
+        self._newline_pending = False
+        kind, idx = match.group(1).decode(), int(match.group(2))
+        if kind == "END":
+            section = self._sections.pop(idx, {})
+            out, err = section.get("OUT"), section.get("ERR")
+            self._results[idx] = (
+                out.text() if out is not None else "",
+                err.text() if err is not None else "",
+                int(match.group(3) or 1),
+            )
+            self._section = None
+            return
+        previous = self._sections.setdefault(idx, {}).get(kind)
+        if previous is not None:
+            previous.discard()
+        self._section = self._sections[idx][kind] = BoundedOutput()
+
+    def _content(self, data: bytes, ends_line: bool) -> None:
+        # Output before the first marker and between END and the next check is not a check's
+        if self._section is not None:
+            if self._newline_pending:
+                self._section.write(b"\n")
+            self._section.write(data)
+        self._newline_pending = ends_line
+
+    def close(self) -> None:
+        """End of stream: a last line without newline belongs to the open section."""
+        if self._line or self._newline_pending:
+            self._content(bytes(self._line), ends_line=False)
+            self._line.clear()
+        self._section = None
+        for section in self._sections.values():
+            for sink in section.values():
+                sink.discard()
+        self._sections.clear()
+        if self.raw is not None:
+            self.raw.close()
+
+    def results(self) -> Dict[int, Tuple[str, str, int]]:
+        """{check index: (stdout, stderr, exit_code)}; checks without an END marker are absent."""
+        return dict(self._results)
+
+
+def parse_bundle_output(output: str, nonce: str) -> Dict[int, Tuple[str, str, int]]:
+    """
+    Split bundle stdout into {check index: (stdout, stderr, exit_code)}.
+    Checks without an END marker (bundle interrupted) are absent from the result.
+    """
+    splitter = BundleOutput(nonce)
+    splitter.write(output.encode("utf-8"))
+    splitter.close()
+    return splitter.results()
+
+
+def bundle_timeout(checks: int) -> int:
+    """Overall time limit of a bundle of `checks` checks."""
+    return BUNDLE_TIMEOUT_PER_CHECK * max(1, checks)
+
+
+def _ssh_execute_bundle(
+    host: Host,
+    bundle_script: str,
+    stdout_sink: "BundleOutput",
+    manager: Optional[SSHConnectionManager] = None,
+    timeout: int = SSH_COMMAND_TIMEOUT,
+) -> Tuple[str, int]:
+    """
+    Send the bundle to `bash -s` over one channel, feeding its stdout into stdout_sink as it
+    arrives. Returns (stderr, exit_code). Output is drained as it comes, so quiet checks do
+    not hit the channel timeout; after `timeout` seconds the bundle is stopped and the checks
+    finished so far keep their results.
+    """
+    limiter = manager.channel_limiter(host) if manager is not None else None
+    with limiter.slot() if limiter is not None else nullcontext():
+        with ssh_connection(host, manager) as ssh:
+            stdin, stdout, stderr = ssh.exec_command("bash -s", timeout=SSH_COMMAND_TIMEOUT)
+            stdin.write(bundle_script)
+            stdin.flush()
+            stdin.channel.shutdown_write()
+            err_buf = BoundedOutput()
+            try:
+                exit_code = drain_channel(stdout.channel, stdout_sink, err_buf, deadline=time.monotonic() + timeout)
+            except TimeoutError:
+                stdout.channel.close()
+                err_buf.discard()
+                return f"Пакетное выполнение превысило лимит времени ({timeout} с)", -1
+            except BaseException:
+                err_buf.discard()
+                raise
+            return err_buf.text(), exit_code
+
+
+def _winrm_execute_bundle(
+    host: Host,
+    bundle_script: str,
+    nonce: str,
+    manager: Optional[WinRMShellManager] = None,
+) -> Tuple[str, str, int]:
+    """Run the PowerShell bundle in the host's WinRM shell. Returns (stdout, stderr, exit_code)."""
+    own_manager = manager is None
+    if own_manager:
+        manager = create_winrm_manager()
+    try:
+        output, error, exit_code = manager.run_ps_file(host, bundle_script, f"kappi_bundle_{nonce}")
+    finally:
+        if own_manager:
+            manager.close_all()
+    return output.decode('utf-8', errors='ignore'), error.decode('utf-8', errors='ignore'), exit_code
+
+
+async def execute_bundle(
+    host: Host,
+    scripts: List[Script],
+    ssh_manager=None,
+    winrm_manager: Optional[WinRMShellManager] = None,
+) -> Dict[str, ExecutionResult]:
+    """
+    Run all scripts of a host in one remote invocation (bash over SSH, PowerShell over WinRM).
+    Returns {script_id: ExecutionResult} with the raw command result of every script
+    (same shape as execute_command), to be passed on to the processor stage.
+    """
+    nonce = uuid.uuid4().hex
+    pairs = [(s.id, s.content or "") for s in scripts]
+    timeout = bundle_timeout(len(scripts))
+
+    # Split per check as the output arrives; only the head of the raw stream is kept for the log
+    splitter = BundleOutput(nonce, raw=BoundedOutput(spill_max_bytes=0))
+    try:
+        if host.connection_type == "winrm":
+            output, error, exit_code = await asyncio.to_thread(
+                _winrm_execute_bundle, host, build_powershell_bundle(pairs, nonce), nonce, winrm_manager
+            )
+            splitter.write(output.encode("utf-8"))
+        elif async_ssh_enabled():
+            error, exit_code = await ssh_stream_command(
+                host, "bash -s", ssh_manager, splitter, input=build_bundle_script(pairs, nonce), timeout=timeout
+            )
+        else:
+            error, exit_code = await asyncio.to_thread(
+                _ssh_execute_bundle, host, build_bundle_script(pairs, nonce), splitter, ssh_manager, timeout
+            )
+    except paramiko.AuthenticationException as e:
+        error, exit_code = f"Authentication failed: {str(e)}", 1
+    except Exception as e:
+        error, exit_code = str(e), 1
+    finally:
+        splitter.close()
+
+    log_ssh_command(
+        host=host,
+        command=f"<bundle: {len(scripts)} checks>",
+        stdout=splitter.raw.text(),
+        stderr=error,
+        exit_code=exit_code,
+        success=(exit_code == 0),
+    )
+
+    parsed = splitter.results()
+    if len(parsed) < len(scripts):
+        logger.warning(
+            f"Bundle on {host.name}: {len(parsed)} of {len(scripts)} checks completed (exit {exit_code})"
+        )
+
+    results: Dict[str, ExecutionResult] = {}
+    for idx, script in enumerate(scripts):
+        if idx in parsed:
+            out, err, rc = parsed[idx]
+            results[script.id] = ExecutionResult(
+                host_id=host.id,
+                host_name=host.name,
+                success=rc == 0,
+                output=out,
+                error=err if rc != 0 else None,
+            )
+        else:
+            results[script.id] = ExecutionResult(
+                host_id=host.id,
+                host_name=host.name,
+                success=False,
+                output="",
+                error=error or "Пакетное выполнение прервано до завершения проверки",
+            )
+    return results
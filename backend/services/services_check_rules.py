@@ -0,0 +1,237 @@
+"""
+services/services_check_rules.py
+Declarative processor: checks described as rules (Script.processor_rules) are evaluated
+in-process instead of running a bash processor script.
+
+A check passes when every rule holds; the first failing rule gives the "Не пройдена"
+status and its error code (41-44), the same fields the bash processor path produces.
+Rules are compiled once (regexes, key lookups) and cached by their content hash.
+"""
+
+import json
+import re
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Pattern, Sequence, Tuple, Union
+
+from models.models_init import ExecutionResult, ProcessorRule
+from services.services_processor_cache import LRUCache, content_hash
+from utils.error_codes import get_error_description, is_check_failure_code
+
+# Error code of a failed rule when the rule does not set its own
+DEFAULT_RULE_ERROR_CODES = {
+    "contains": 41,
+    "not_contains": 44,
+    "regex": 41,
+    "key_equals": 44,
+    "subset_of_etalon": 44,
+    "numeric_le": 44,
+    "numeric_ge": 44,
+}
+
+# Separators of value lists (etalon "a, b c" -> {"a", "b", "c"})
+_LIST_SPLIT = re.compile(r"[,\s]+")
+
+
+class RuleError(ValueError):
+    """Rule cannot be compiled or evaluated (bad regex, non-numeric threshold, no value)."""
+
+
+@dataclass(frozen=True)
+class _CompiledRule:
+    rule: ProcessorRule
+    pattern: Optional[Pattern] = None  # regex rule
+    key_line: Optional[Pattern] = None  # "[#] key <sep> value" lines
+
+
+@dataclass
+class _RuleOutcome:
+    passed: bool
+    error_code: Optional[int] = None
+    actual: Optional[str] = None
+
+
+RuleInput = Union[ProcessorRule, dict]
+
+_compiled_cache: LRUCache[Tuple[_CompiledRule, ...]] = LRUCache(1024)
+
+
+def _as_rules(rules: Iterable[RuleInput]) -> List[ProcessorRule]:
+    return [r if isinstance(r, ProcessorRule) else ProcessorRule.model_validate(r) for r in rules]
+
+
+def _compile_rule(rule: ProcessorRule) -> _CompiledRule:
+    flags = re.IGNORECASE if rule.ignore_case else 0
+    pattern = None
+    key_line = None
+    if rule.type == "regex":
+        if not rule.value:
+            raise RuleError("Правило regex: не задано регулярное выражение")
+        try:
+            pattern = re.compile(rule.value, flags | re.MULTILINE)
+        except re.error as e:
+            raise RuleError(f"Правило regex: некорректное регулярное выражение: {e}")
+    if rule.key:
+        key_line = re.compile(
+            r"^[ \t]*(#*)[ \t]*" + re.escape(rule.key) + r"[ \t]*" + re.escape(rule.separator) + r"[ \t]*(.*?)[ \t]*$",
+            flags | re.MULTILINE,
+        )
+    elif rule.type == "key_equals":
+        raise RuleError("Правило key_equals: не задан параметр (key)")
+    if rule.type in ("numeric_le", "numeric_ge") and rule.value is not None:
+        _to_number(rule.value, "порог")
+    return _CompiledRule(rule=rule, pattern=pattern, key_line=key_line)
+
+
+def compile_rules(rules: Sequence[RuleInput]) -> Tuple[_CompiledRule, ...]:
+    """Validate and compile rules; cached by content. Raises RuleError on invalid rules."""
+    parsed = _as_rules(rules)
+    key = content_hash(json.dumps([r.model_dump() for r in parsed], sort_keys=True, ensure_ascii=False))
+    compiled = _compiled_cache.get(key)
+    if compiled is None:
+        compiled = tuple(_compile_rule(r) for r in parsed)
+        _compiled_cache.put(key, compiled)
+    return compiled
+
+
+def _to_number(text: str, what: str) -> float:
+    try:
+        return float(text.strip().replace(",", "."))
+    except (ValueError, AttributeError):
+        raise RuleError(f"Значение '{text}' ({what}) не является числом")
+
+
+def _split_items(text: str) -> set:
+    return {item for item in _LIST_SPLIT.split(text.strip()) if item}
+
+
+def _expected(rule: ProcessorRule, reference: str) -> str:
+    value = rule.value if rule.value is not None else reference
+    if not value:
+        raise RuleError(f"Правило {rule.type}: не задано значение и нет эталонных данных")
+    return value
+
+
+def _lookup_key(compiled: _CompiledRule, output: str) -> Tuple[Optional[str], bool]:
+    """Value of the last active "key=value" line; (None, True) if only commented lines exist."""
+    value = None
+    commented = False
+    for match in compiled.key_line.finditer(output):
+        if match.group(1):
+            commented = True
+        else:
+            value = match.group(2)
+    return value, commented and value is None
+
+
+def _subject(compiled: _CompiledRule, output: str) -> Tuple[Optional[str], Optional[int]]:
+    """Text a value rule looks at: the key's value or the whole output; error code if the key is missing."""
+    if compiled.key_line is None:
+        return output.strip(), None
+    value, only_commented = _lookup_key(compiled, output)
+    if value is None:
+        return None, 42 if only_commented else 41
+    return value, None
+
+
+def _evaluate_rule(compiled: _CompiledRule, output: str, reference: str) -> _RuleOutcome:
+    rule = compiled.rule
+    fail_code = rule.error_code or DEFAULT_RULE_ERROR_CODES[rule.type]
+
+    if rule.type in ("contains", "not_contains"):
+        expected = _expected(rule, reference)
+        haystack, needle = (output.lower(), expected.lower()) if rule.ignore_case else (output, expected)
+        found = needle in haystack
+        passed = found if rule.type == "contains" else not found
+        return _RuleOutcome(passed, None if passed else fail_code)
+
+    if rule.type == "regex":
+        passed = compiled.pattern.search(output) is not None
+        return _RuleOutcome(passed, None if passed else fail_code)
+
+    actual, missing_code = _subject(compiled, output)
+    if actual is None:
+        return _RuleOutcome(False, rule.error_code or missing_code)
+
+    if rule.type == "key_equals":
+        expected = _expected(rule, reference).strip()
+        if rule.ignore_case:
+            passed = actual.lower() == expected.lower()
+        else:
+            passed = actual == expected
+    elif rule.type == "subset_of_etalon":
+        expected = _expected(rule, reference)
+        if rule.ignore_case:
+            passed = _split_items(actual.lower()) <= _split_items(expected.lower())
+        else:
+            passed = _split_items(actual) <= _split_items(expected)
+    else:  # numeric_le / numeric_ge
+        threshold = _to_number(_expected(rule, reference), "порог")
+        try:
+            number = _to_number(actual, "значение")
+        except RuleError:
+            return _RuleOutcome(False, rule.error_code or 43, actual)
+        passed = number <= threshold if rule.type == "numeric_le" else number >= threshold
+    return _RuleOutcome(passed, None if passed else fail_code, actual)
+
+
+def _describe(error_code: int) -> str:
+    error_info = get_error_description(error_code)
+    return f"{error_info['category']}: {error_info['error']} - {error_info['description']}"
+
+
+def evaluate_rules(
+    host_id: str,
+    host_name: str,
+    raw_output: str,
+    rules: Sequence[RuleInput],
+    reference_data: Optional[str] = None,
+) -> ExecutionResult:
+    """Evaluate declarative rules on captured command output (counterpart of run_processor_on_output)."""
+    output = (raw_output or "").replace('\r\n', '\n').replace('\r', '\n')
+    reference = (reference_data or "").replace('\r\n', '\n').replace('\r', '\n').strip()
+    try:
+        compiled = compile_rules(rules)
+        failed = None
+        actual_data = None
+        for item in compiled:
+            outcome = _evaluate_rule(item, output, reference)
+            if outcome.actual is not None and actual_data is None:
+                actual_data = outcome.actual
+            if not outcome.passed:
+                failed = outcome
+                actual_data = outcome.actual
+                break
+    except RuleError as e:
+        error_code = 52
+        return ExecutionResult(
+            host_id=host_id,
+            host_name=host_name,
+            success=False,
+            output=f"{raw_output or ''}\n\n=== Ошибка правил обработчика ===\n{e}",
+            error=str(e),
+            check_status="Ошибка",
+            error_code=error_code,
+            error_description=_describe(error_code),
+        )
+
+    if failed is None:
+        return ExecutionResult(
+            host_id=host_id,
+            host_name=host_name,
+            success=True,
+            output=raw_output or "",
+            check_status="Пройдена",
+            actual_data=actual_data if reference else None,
+        )
+
+    error_code = failed.error_code
+    return ExecutionResult(
+        host_id=host_id,
+        host_name=host_name,
+        success=False,
+        output=raw_output or "",
+        check_status="Не пройдена" if is_check_failure_code(error_code) else "Ошибка",
+        error_code=error_code,
+        error_description=_describe(error_code),
+        actual_data=actual_data if reference and error_code not in (41, 42) else None,
+    )
@@ -5,6 +5,7 @@ SSH operations for afick-based configuration integrity checking.
 
 import asyncio
 import re
+import socket
 import paramiko
 from typing import Tuple, Optional
 from datetime import datetime, time, date, timezone, timedelta
@@ -15,8 +16,11 @@ from config.config_settings import (
     CONFIG_INTEGRITY_SCHEDULE_TZ,
     CONFIG_INTEGRITY_SCHEDULE_HOUR,
     CONFIG_INTEGRITY_SCHEDULE_MINUTE,
+    CONFIG_INTEGRITY_SCHEDULE_JITTER_SECONDS,
 )
 from models.config_integrity_models import SCHEDULE_DOC_ID, REPORT_SCHEDULE_DOC_ID
+from services.services_credentials import cached_credential, load_private_key
+from services.services_host_health import host_health, failure_kind, NETWORK, LOGIN
 from utils.db_utils import prepare_for_mongo
 
 SSH_CONNECT_TIMEOUT = 10
@@ -24,11 +28,12 @@ SSH_COMMAND_TIMEOUT = 120
 
 
 def _connect_ssh(ip: str, port: int, username: str, auth_type: str,
-                 password: Optional[str], ssh_key: Optional[str]) -> paramiko.SSHClient:
+                 password: Optional[str], ssh_key: Optional[str],
+                 host_id: Optional[str] = None) -> paramiko.SSHClient:
     ssh = paramiko.SSHClient()
     ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
     if auth_type == "password":
-        decrypted = decrypt_password(password) if password else ""
+        decrypted = cached_credential(host_id, "password", password, lambda: decrypt_password(password)) if password else ""
         ssh.connect(
             hostname=ip, port=port, username=username,
             password=decrypted,
@@ -37,16 +42,9 @@ def _connect_ssh(ip: str, port: int, username: str, auth_type: str,
             auth_timeout=SSH_CONNECT_TIMEOUT,
         )
     else:
-        from io import StringIO
-        decrypted_key = decrypt_password(ssh_key)
-        key_file = StringIO(decrypted_key)
-        for loader in (paramiko.RSAKey, paramiko.DSSKey, paramiko.ECDSAKey, paramiko.Ed25519Key):
-            try:
-                pkey = loader.from_private_key(key_file)
-                break
-            except Exception:
-                key_file = StringIO(decrypted_key)
-        else:
+        try:
+            pkey = load_private_key(ssh_key, host_id)
+        except paramiko.SSHException:
             raise ValueError("Не удалось загрузить SSH-ключ")
         ssh.connect(
             hostname=ip, port=port, username=username,
@@ -58,6 +56,25 @@ def _connect_ssh(ip: str, port: int, username: str, auth_type: str,
     return ssh
 
 
+def _connect_tracked(ip: str, port: int, username: str, auth_type: str,
+                     password: Optional[str], ssh_key: Optional[str],
+                     host_id: Optional[str] = None) -> paramiko.SSHClient:
+    """_connect_ssh recording the outcome in the host health registry."""
+    try:
+        ssh = _connect_ssh(ip, port, username, auth_type, password, ssh_key, host_id)
+    except paramiko.AuthenticationException as e:
+        host_health.record_failure(ip, port, LOGIN, f"Неверные учётные данные: {e}", username)
+        raise
+    except (socket.error, paramiko.SSHException, EOFError) as e:
+        if failure_kind(e) == NETWORK:
+            host_health.record_failure(ip, port, NETWORK, f"Нет сетевого доступа: {e}")
+        else:
+            host_health.record_failure(ip, port, LOGIN, f"Ошибка SSH: {e}", username)
+        raise
+    host_health.record_success(ip, port, LOGIN, username)
+    return ssh
+
+
 def _exec(ssh: paramiko.SSHClient, command: str, timeout: int = SSH_COMMAND_TIMEOUT) -> Tuple[int, str, str]:
     _, stdout, stderr = ssh.exec_command(command, timeout=timeout)
     exit_code = stdout.channel.recv_exit_status()
@@ -107,7 +124,7 @@ async def initialize_host(host_doc: dict) -> dict:
     ssh_key = host_doc.get("ssh_key")
 
     def _do():
-        ssh = _connect_ssh(ip, port, username, auth_type, password, ssh_key)
+        ssh = _connect_tracked(ip, port, username, auth_type, password, ssh_key, host_doc["id"])
         try:
             exit_code, out, err = _exec(ssh, "which afick || command -v afick")
             if exit_code != 0:
@@ -137,8 +154,9 @@ async def initialize_host(host_doc: dict) -> dict:
             ssh.close()
 
     loop = asyncio.get_event_loop()
+    blocked = host_health.check(ip, port, username=username)
     try:
-        result = await loop.run_in_executor(None, _do)
+        result = {"success": False, "error": blocked[1]} if blocked else await loop.run_in_executor(None, _do)
     except Exception as e:
         logger.exception("Config integrity init failed for %s: %s", ip, e)
         result = {"success": False, "error": str(e)}
@@ -172,7 +190,7 @@ async def check_host(host_doc: dict) -> dict:
     ssh_key = host_doc.get("ssh_key")
 
     def _do():
-        ssh = _connect_ssh(ip, port, username, auth_type, password, ssh_key)
+        ssh = _connect_tracked(ip, port, username, auth_type, password, ssh_key, host_doc["id"])
         try:
             exit_code, out, err = _exec(ssh, "sudo afick -k", timeout=300)
             combined = out + "\n" + err
@@ -190,8 +208,9 @@ async def check_host(host_doc: dict) -> dict:
             ssh.close()
 
     loop = asyncio.get_event_loop()
+    blocked = host_health.check(ip, port, username=username)
     try:
-        result = await loop.run_in_executor(None, _do)
+        result = {"success": False, "error": blocked[1]} if blocked else await loop.run_in_executor(None, _do)
     except Exception as e:
         logger.exception("Config integrity check failed for %s: %s", ip, e)
         result = {"success": False, "error": str(e)}
@@ -272,6 +291,7 @@ async def process_config_integrity_report_schedule_due() -> None:
             nxt = compute_next_config_integrity_run_at_iso(
                 "monthly" if effective_interval == "monthly" else "weekly",
                 datetime.now(timezone.utc),
+                report=True,
             )
             await db.config_integrity_report_schedule.update_one(
                 {"id": REPORT_SCHEDULE_DOC_ID},
@@ -298,11 +318,22 @@ def _wallclock_run_local(d: date, tz: ZoneInfo) -> datetime:
     )
 
 
-def compute_next_config_integrity_run_at_iso(interval: str, anchor_utc: datetime) -> str:
+def _run_at_iso(cand: datetime, report: bool) -> str:
+    # Import here to avoid circular dependency (the scheduler package imports this module)
+    from scheduler.scheduler_utils import jitter_offset
+
+    # Постоянное смещение в окне CONFIG_INTEGRITY_SCHEDULE_JITTER_SECONDS: проверка и отчёт не стартуют в одну минуту
+    key = "config_integrity_report" if report else "config_integrity"
+    cand += jitter_offset(CONFIG_INTEGRITY_SCHEDULE_JITTER_SECONDS, key=key)
+    return cand.astimezone(timezone.utc).isoformat()
+
+
+def compute_next_config_integrity_run_at_iso(interval: str, anchor_utc: datetime, report: bool = False) -> str:
     """
     Следующий запуск автопроверки в локальном времени CONFIG_INTEGRITY_SCHEDULE_TZ
     (по умолчанию 9:00). Интервалы: ежедневно — ближайшее такое время;
     раз в 7 дней / месяц — через 7 / 30 календарных дней в ту же локальную отметку.
+    report — расписание отчёта (иначе проверки): у них разные смещения разброса.
     Возвращает ISO-UTC для хранения в БД.
     """
     if anchor_utc.tzinfo is None:
@@ -315,14 +346,14 @@ def compute_next_config_integrity_run_at_iso(interval: str, anchor_utc: datetime
         cand = _wallclock_run_local(d, tz)
         if cand <= local:
             cand = _wallclock_run_local(d + timedelta(days=1), tz)
-        return cand.astimezone(timezone.utc).isoformat()
+        return _run_at_iso(cand, report)
 
     if interval == "weekly":
         d = local.date()
         cand = _wallclock_run_local(d + timedelta(days=7), tz)
         while cand <= local:
             cand += timedelta(days=7)
-        return cand.astimezone(timezone.utc).isoformat()
+        return _run_at_iso(cand, report)
 
     # monthly: шаг 30 календарных дней (как в продукте ранее)
     d = local.date()
@@ -330,7 +361,7 @@ def compute_next_config_integrity_run_at_iso(interval: str, anchor_utc: datetime
     while cand <= local:
         next_d = cand.date() + timedelta(days=30)
         cand = _wallclock_run_local(next_d, tz)
-    return cand.astimezone(timezone.utc).isoformat()
+    return _run_at_iso(cand, report)
 
 
 async def process_config_integrity_schedule_due() -> None:
@@ -0,0 +1,123 @@
+"""
+services/services_credentials.py
+Cache of decrypted host credentials and parsed private keys.
+
+Every connect used to Fernet-decrypt the stored password or key and parse the key by
+trying each paramiko key class in turn. Decrypted passwords and parsed keys are kept in
+memory per (host id, sha256 of the stored ciphertext): a changed credential never hits a
+stale entry, entries expire after CREDENTIAL_CACHE_TTL seconds, and updating or deleting
+a host drops its entries (invalidate_host_credentials). The key type is detected from
+the key text, so the matching class is tried first.
+"""
+
+import base64
+import binascii
+import os
+import re
+import threading
+from io import StringIO
+from typing import Callable, List, Optional, Tuple, TypeVar
+
+import paramiko
+
+from config.config_init import decrypt_password
+from services.services_processor_cache import LRUCache, content_hash
+
+# Max cached credentials (0 disables the cache)
+CREDENTIAL_CACHE_SIZE = int(os.environ.get('CREDENTIAL_CACHE_SIZE', '4096'))
+# Seconds a decrypted credential stays in memory
+CREDENTIAL_CACHE_TTL = int(os.environ.get('CREDENTIAL_CACHE_TTL', '900'))
+
+T = TypeVar("T")
+
+# Key classes in fallback order; DSSKey is gone from paramiko 4
+_KEY_CLASSES: List[Tuple[str, type]] = [
+    (name, getattr(paramiko, attr))
+    for name, attr in (("rsa", "RSAKey"), ("dss", "DSSKey"), ("ecdsa", "ECDSAKey"), ("ed25519", "Ed25519Key"))
+    if hasattr(paramiko, attr)
+]
+
+# PEM headers of the traditional formats
+_PEM_TYPES = {"RSA": "rsa", "DSA": "dss", "EC": "ecdsa"}
+# Key type names inside the (unencrypted) public part of an OpenSSH-format key
+_OPENSSH_TYPES = ((b"ssh-ed25519", "ed25519"), (b"ecdsa-sha2-", "ecdsa"), (b"ssh-rsa", "rsa"), (b"ssh-dss", "dss"))
+
+_PEM_HEADER = re.compile(r"-----BEGIN (?:(RSA|DSA|EC|OPENSSH) )?PRIVATE KEY-----(.*?)-----END", re.DOTALL)
+
+_cache: LRUCache = LRUCache(CREDENTIAL_CACHE_SIZE, ttl=CREDENTIAL_CACHE_TTL)
+# Connects run in executor threads
+_lock = threading.Lock()
+
+
+def cached_credential(host_id: Optional[str], kind: str, ciphertext: str, build: Callable[[], T]) -> T:
+    """Value built from a stored credential, cached per (host_id, kind, ciphertext hash)."""
+    if CREDENTIAL_CACHE_SIZE <= 0 or not host_id:
+        return build()
+    key = (host_id, kind, content_hash(ciphertext))
+    with _lock:
+        value = _cache.get(key)
+    if value is None:
+        value = build()
+        with _lock:
+            _cache.put(key, value)
+    return value
+
+
+def host_password(host) -> str:
+    """Decrypted password of a host ("" if none)."""
+    if not host.password:
+        return ""
+    return cached_credential(host.id, "password", host.password, lambda: decrypt_password(host.password))
+
+
+def detect_key_type(key_text: str) -> Optional[str]:
+    """Key type ("rsa", "dss", "ecdsa", "ed25519") from the key text, None if unknown."""
+    match = _PEM_HEADER.search(key_text)
+    if not match:
+        return None
+    label = match.group(1)
+    if label in _PEM_TYPES:
+        return _PEM_TYPES[label]
+    if label == "OPENSSH":
+        body = "".join(match.group(2).split())
+        try:
+            # The key type name is in the first bytes of the blob
+            blob = base64.b64decode(body[:(min(len(body), 400) // 4) * 4])
+        except (binascii.Error, ValueError):
+            return None
+        for marker, key_type in _OPENSSH_TYPES:
+            if marker in blob:
+                return key_type
+    return None
+
+
+def parse_private_key(key_text: str) -> Tuple[paramiko.PKey, str]:
+    """Parse a decrypted private key; the detected type is tried first. Returns (key, type)."""
+    detected = detect_key_type(key_text)
+    candidates = sorted(_KEY_CLASSES, key=lambda item: item[0] != detected)
+    error: Optional[Exception] = None
+    for key_type, key_class in candidates:
+        try:
+            return key_class.from_private_key(StringIO(key_text)), key_type
+        except Exception as e:
+            error = error or e
+    raise paramiko.SSHException(f"Unsupported or invalid private key: {error}")
+
+
+def load_private_key(key_data: str, host_id: Optional[str] = None) -> paramiko.PKey:
+    """Decrypt and parse a stored (encrypted) private key, cached per host."""
+    key, _ = cached_credential(
+        host_id, "private_key", key_data, lambda: parse_private_key(decrypt_password(key_data))
+    )
+    return key
+
+
+def invalidate_host_credentials(host_id: str) -> int:
+    """Drop cached credentials of a host (after update/delete). Returns the number removed."""
+    with _lock:
+        return _cache.drop(lambda key: key[0] == host_id)
+
+
+def clear_credential_cache() -> None:
+    with _lock:
+        _cache.clear()
@@ -4,13 +4,17 @@ Command execution services for SSH and WinRM
 """
 
 import asyncio
+import signal
 import socket
+import subprocess
+import threading
+import time
 import paramiko
 import winrm  # pyright: ignore[reportMissingImports]
-from typing import Tuple, Optional, List
+from typing import Tuple, Optional, List, Dict
 import logging
 import re
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 import os
 
@@ -18,62 +22,66 @@ from config.config_init import logger, decrypt_password, db
 from models.models_init import Host, ExecutionResult, Execution, Script, System
 from utils.error_codes import get_error_description, extract_error_code_from_output, get_error_code_for_check_type, detect_command_error, is_check_failure_code
 from utils.db_utils import prepare_for_mongo
+from services.services_processor_pool import processor_pool, ProcessorWorkerError
+from services.services_check_rules import evaluate_rules
+from services.services_output_capture import OUTPUT_MEMORY_LIMIT, BoundedOutput, discard_spill, drain_channel, read_spill
+from services.services_host_health import host_health, NETWORK, LOGIN
+from services.services_winrm import WinRMShellManager
+from services.services_credentials import host_password, load_private_key
+from services.services_processor_cache import (
+    get_cached_syntax,
+    store_syntax,
+    normalize_script_text,
+    result_cache_key,
+    get_cached_result,
+    store_result,
+)
 from utils.ssh_logger import log_ssh_connection, log_ssh_command, log_ssh_check, log_processor_script
 
 # SSH connection settings from environment
 SSH_CONNECT_TIMEOUT = int(os.environ.get('SSH_CONNECT_TIMEOUT', '10'))
+# Seconds a command may go without output before it is stopped (both SSH backends)
 SSH_COMMAND_TIMEOUT = int(os.environ.get('SSH_COMMAND_TIMEOUT', '60'))
 SSH_RETRY_ATTEMPTS = int(os.environ.get('SSH_RETRY_ATTEMPTS', '3'))
 WINRM_TIMEOUT = int(os.environ.get('WINRM_TIMEOUT', '30'))
 # pywinrm requires read_timeout_sec > operation_timeout_sec (both non-zero)
 WINRM_READ_TIMEOUT = int(os.environ.get('WINRM_READ_TIMEOUT', str(WINRM_TIMEOUT + 15)))
+# Pooled SSH connections: idle eviction and transport keepalive
+SSH_POOL_IDLE_SECONDS = int(os.environ.get('SSH_POOL_IDLE_SECONDS', '300'))
+SSH_KEEPALIVE_SECONDS = int(os.environ.get('SSH_KEEPALIVE_SECONDS', '30'))
+# Concurrent channels per pooled connection; keep below sshd MaxSessions (default 10)
+SSH_MAX_SESSIONS_PER_HOST = int(os.environ.get('SSH_MAX_SESSIONS_PER_HOST', '8'))
+# Retries when sshd refuses to open another channel (MaxSessions reached)
+SSH_CHANNEL_OPEN_RETRIES = int(os.environ.get('SSH_CHANNEL_OPEN_RETRIES', '3'))
+# Local processor scripts: timeout and max processes running at once in this process
+PROCESSOR_TIMEOUT = int(os.environ.get('PROCESSOR_TIMEOUT', '30'))
+PROCESSOR_MAX_CONCURRENCY = int(os.environ.get('PROCESSOR_MAX_CONCURRENCY', str(os.cpu_count() or 4)))
+# Pre-run TCP reachability sweep: connect timeout, attempts per host, probes in flight
+NETWORK_PROBE_TIMEOUT = float(os.environ.get('NETWORK_PROBE_TIMEOUT', '3'))
+NETWORK_PROBE_ATTEMPTS = int(os.environ.get('NETWORK_PROBE_ATTEMPTS', '2'))
+NETWORK_SWEEP_CONCURRENCY = int(os.environ.get('NETWORK_SWEEP_CONCURRENCY', '256'))
+
+# Errors meaning the pooled transport is gone and a fresh connection may succeed
+_SSH_TRANSPORT_ERRORS = (paramiko.SSHException, EOFError, socket.error)
 
+_processor_slots = asyncio.Semaphore(max(1, PROCESSOR_MAX_CONCURRENCY))
 
-def _load_private_key(key_data: str):
+
+def _load_private_key(key_data: str, host_id: Optional[str] = None):
     """
     Load private key from string, trying different key formats.
-    SSH keys are stored encrypted, so decrypt first.
+    SSH keys are stored encrypted; the decrypted, parsed key is cached per host.
     """
-    from io import StringIO
-    
-    # Decrypt the SSH key
-    decrypted_key = decrypt_password(key_data)
-    
-    # Try different key formats
-    key_file = StringIO(decrypted_key)
-    try:
-        return paramiko.RSAKey.from_private_key(key_file)
-    except:
-        pass
-    
-    key_file = StringIO(decrypted_key)
-    try:
-        return paramiko.DSSKey.from_private_key(key_file)
-    except:
-        pass
-    
-    key_file = StringIO(decrypted_key)
-    try:
-        return paramiko.ECDSAKey.from_private_key(key_file)
-    except:
-        pass
-    
-    key_file = StringIO(decrypted_key)
-    return paramiko.Ed25519Key.from_private_key(key_file)
+    return load_private_key(key_data, host_id)
 
 
-@contextmanager
-def ssh_connection(host: Host):
-    """
-    Context manager for SSH connections with automatic cleanup.
-    Reuses connection for multiple commands when used properly.
-    """
+def _open_ssh_client(host: Host) -> paramiko.SSHClient:
+    """Open and authenticate a new SSH connection to host."""
     ssh = paramiko.SSHClient()
     ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    
     try:
         if host.auth_type == "password":
-            password = decrypt_password(host.password) if host.password else ""
+            password = host_password(host)
             ssh.connect(
                 hostname=host.hostname,
                 port=host.port,
@@ -86,7 +94,7 @@ def ssh_connection(host: Host):
         else:  # key-based
             if not host.ssh_key:
                 raise ValueError("SSH key not provided for key-based authentication")
-            pkey = _load_private_key(host.ssh_key)
+            pkey = _load_private_key(host.ssh_key, host.id)
             ssh.connect(
                 hostname=host.hostname,
                 port=host.port,
@@ -96,6 +104,182 @@ def ssh_connection(host: Host):
                 banner_timeout=SSH_CONNECT_TIMEOUT,
                 auth_timeout=SSH_CONNECT_TIMEOUT
             )
+    except Exception:
+        try:
+            ssh.close()
+        except Exception:
+            pass
+        raise
+    return ssh
+
+
+def _is_ssh_client_alive(ssh: paramiko.SSHClient) -> bool:
+    transport = ssh.get_transport()
+    return transport is not None and transport.is_active()
+
+
+class _ChannelLimiter:
+    """
+    Bounds concurrent channels on one connection. The limit shrinks when the server
+    refuses a channel, so it settles at the target's actual MaxSessions.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def slot(self):
+        with self._cond:
+            while self._in_use >= self.limit:
+                self._cond.wait()
+            self._in_use += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+
+    def refused(self) -> int:
+        """Called inside slot() when the server refused a channel; returns the new limit."""
+        with self._cond:
+            # The refused channel was one too many: everything else in flight is the maximum
+            self.limit = max(1, min(self.limit, self._in_use - 1))
+            return self.limit
+
+
+class SSHConnectionManager:
+    """
+    Pool of authenticated SSH connections, one per host, shared by all operations of a run.
+
+    Preflight checks and every check command open channels on the same Transport instead
+    of doing a full TCP+KEX+auth handshake each time. Dead transports are reconnected on
+    next use, connections unused for `idle_timeout` seconds are closed. At most
+    `max_sessions` channels run concurrently on one connection. Thread-safe: the
+    blocking paramiko calls run in executor threads.
+    """
+
+    def __init__(
+        self,
+        idle_timeout: int = SSH_POOL_IDLE_SECONDS,
+        max_sessions: int = SSH_MAX_SESSIONS_PER_HOST,
+    ):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max(1, max_sessions)
+        self._lock = threading.Lock()
+        self._clients: Dict[str, paramiko.SSHClient] = {}
+        self._last_used: Dict[str, float] = {}
+        self._host_locks: Dict[str, threading.Lock] = {}
+        self._channel_limiters: Dict[str, _ChannelLimiter] = {}
+
+    def _host_lock(self, host_id: str) -> threading.Lock:
+        with self._lock:
+            return self._host_locks.setdefault(host_id, threading.Lock())
+
+    def get(self, host: Host) -> paramiko.SSHClient:
+        """Return a live connection to host, authenticating only if there is none yet."""
+        self.evict_idle()
+        with self._host_lock(host.id):
+            with self._lock:
+                ssh = self._clients.get(host.id)
+            if ssh is not None and not _is_ssh_client_alive(ssh):
+                logger.info(f"Pooled SSH connection to {host.hostname}:{host.port} dropped, reconnecting")
+                self._close_client(ssh)
+                ssh = None
+            if ssh is None:
+                ssh = _open_ssh_client(host)
+                transport = ssh.get_transport()
+                if transport is not None and SSH_KEEPALIVE_SECONDS > 0:
+                    transport.set_keepalive(SSH_KEEPALIVE_SECONDS)
+            with self._lock:
+                self._clients[host.id] = ssh
+                self._last_used[host.id] = time.monotonic()
+            return ssh
+
+    def channel_limiter(self, host: Host) -> _ChannelLimiter:
+        """Limiter of concurrent channels on the connection to host."""
+        with self._lock:
+            limiter = self._channel_limiters.get(host.id)
+            if limiter is None:
+                limiter = self._channel_limiters[host.id] = _ChannelLimiter(self.max_sessions)
+            return limiter
+
+    def is_connected(self, host: Host) -> bool:
+        """True if the pool holds a live connection to host."""
+        with self._lock:
+            ssh = self._clients.get(host.id)
+        return ssh is not None and _is_ssh_client_alive(ssh)
+
+    def invalidate(self, host: Host) -> None:
+        """Drop the pooled connection to host (e.g. after a transport error)."""
+        self.release(host.id)
+
+    def release(self, host_id: str) -> None:
+        """Close the connection to a host once the run is done with it."""
+        with self._lock:
+            ssh = self._clients.pop(host_id, None)
+            self._last_used.pop(host_id, None)
+        if ssh is not None:
+            self._close_client(ssh)
+
+    def evict_idle(self) -> None:
+        """Close connections that have not been used for idle_timeout seconds."""
+        if self.idle_timeout <= 0:
+            return
+        deadline = time.monotonic() - self.idle_timeout
+        with self._lock:
+            stale = [host_id for host_id, used in self._last_used.items() if used < deadline]
+            clients = [self._clients.pop(host_id) for host_id in stale if host_id in self._clients]
+            for host_id in stale:
+                self._last_used.pop(host_id, None)
+        for ssh in clients:
+            self._close_client(ssh)
+
+    async def arelease(self, host_id: str) -> None:
+        """release() without blocking the event loop."""
+        await asyncio.get_running_loop().run_in_executor(None, self.release, host_id)
+
+    async def aclose_all(self) -> None:
+        """close_all() without blocking the event loop."""
+        await asyncio.get_running_loop().run_in_executor(None, self.close_all)
+
+    def close_all(self) -> None:
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            self._last_used.clear()
+        for ssh in clients:
+            self._close_client(ssh)
+
+    @staticmethod
+    def _close_client(ssh: paramiko.SSHClient) -> None:
+        try:
+            ssh.close()
+        except Exception:
+            pass
+
+
+@contextmanager
+def ssh_connection(host: Host, manager: Optional[SSHConnectionManager] = None):
+    """
+    Context manager for SSH connections with automatic cleanup.
+    With a manager the pooled connection is reused and left open for later commands;
+    it is dropped from the pool if the transport fails inside the block.
+    """
+    if manager is not None:
+        ssh = manager.get(host)
+        try:
+            yield ssh
+        except _SSH_TRANSPORT_ERRORS:
+            if not _is_ssh_client_alive(ssh):
+                manager.invalidate(host)
+            raise
+        return
+
+    ssh = _open_ssh_client(host)
+    try:
         yield ssh
     finally:
         try:
@@ -126,22 +310,75 @@ def _check_network_access(host: Host) -> Tuple[bool, str]:
         return False, f"Нет сетевого доступа: {str(e)}"
 
 
+async def probe_network_access(host: Host) -> Tuple[bool, str]:
+    """
+    Non-blocking counterpart of _check_network_access: asyncio TCP connect with
+    NETWORK_PROBE_TIMEOUT, retried NETWORK_PROBE_ATTEMPTS times without backoff sleeps.
+    Goes through the host health registry: hosts with an open circuit fail fast, hosts
+    reached within HOST_REACHABILITY_TTL_SECONDS are not probed again.
+    """
+    blocked = host_health.check(host.hostname, host.port, NETWORK)
+    if blocked:
+        return False, blocked[1]
+    if host_health.recently_reachable(host.hostname, host.port):
+        return True, "Сетевой доступ получен"
+    message = "Нет сетевого доступа: Недоступен сервер или порт"
+    for attempt in range(max(1, NETWORK_PROBE_ATTEMPTS)):
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(host.hostname, host.port), NETWORK_PROBE_TIMEOUT
+            )
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+            logger.info(f"Network connection successful to {host.hostname}:{host.port}")
+            host_health.record_success(host.hostname, host.port, NETWORK)
+            return True, "Сетевой доступ получен"
+        except asyncio.TimeoutError:
+            message = "Нет сетевого доступа: Недоступен сервер или порт"
+        except OSError as e:
+            message = f"Нет сетевого доступа: {str(e)}"
+    logger.warning(f"Network connection to {host.hostname}:{host.port} failed: {message}")
+    host_health.record_failure(host.hostname, host.port, NETWORK, message)
+    return False, message
+
+
+async def sweep_network_access(hosts) -> Dict[str, Tuple[bool, str]]:
+    """Probe all hosts at once (at most NETWORK_SWEEP_CONCURRENCY connects in flight). Returns host_id -> (ok, message)."""
+    slots = asyncio.Semaphore(max(1, NETWORK_SWEEP_CONCURRENCY))
+
+    async def _probe(host: Host) -> Tuple[bool, str]:
+        async with slots:
+            return await probe_network_access(host)
+
+    hosts = list(hosts)
+    results = await asyncio.gather(*(_probe(host) for host in hosts))
+    return {host.id: result for host, result in zip(hosts, results)}
+
+
 @retry(
     stop=stop_after_attempt(SSH_RETRY_ATTEMPTS),
     wait=wait_exponential(multiplier=1, min=2, max=10),
     retry=retry_if_exception_type((socket.error, socket.timeout)),
     reraise=True
 )
-def _check_ssh_login(host: Host) -> Tuple[bool, str]:
+def _check_ssh_login(host: Host, manager: Optional[SSHConnectionManager] = None) -> Tuple[bool, str]:
     """Check SSH login credentials with retry logic"""
     try:
-        with ssh_connection(host):
+        with ssh_connection(host, manager):
             log_ssh_connection(host, "login", success=True)
             return True, "SSH login OK"
     except paramiko.AuthenticationException as e:
         error_msg = "Неверные учётные данные"
         log_ssh_connection(host, "login", success=False, error=str(e))
         return False, error_msg
+    except (socket.error, EOFError) as e:
+        # Includes timeouts and NoValidConnectionsError: the host was not reached
+        error_msg = f"Нет сетевого доступа: {str(e)}"
+        log_ssh_connection(host, "login", success=False, error=str(e))
+        return False, error_msg
     except paramiko.SSHException as e:
         error_msg = f"Ошибка SSH: {str(e)}"
         log_ssh_connection(host, "login", success=False, error=str(e))
@@ -152,17 +389,18 @@ def _check_ssh_login(host: Host) -> Tuple[bool, str]:
         return False, error_msg
 
 
-def _check_ssh_login_and_sudo(host: Host) -> Tuple[bool, str, bool, str]:
+def _check_ssh_login_and_sudo(host: Host, manager: Optional[SSHConnectionManager] = None) -> Tuple[bool, str, bool, str]:
     """
-    Check SSH login and sudo access
+    Check SSH login and sudo access.
+    With a manager both checks (and later commands) share one authenticated connection.
     
     Returns: (login_success, login_message, sudo_success, sudo_message)
     """
-    login_ok, login_msg = _check_ssh_login(host)
+    login_ok, login_msg = _check_ssh_login(host, manager)
     if not login_ok:
         return False, login_msg, False, "Login failed"
     
-    sudo_ok, sudo_msg = _check_sudo_access_linux(host)
+    sudo_ok, sudo_msg = _check_sudo_access_linux(host, manager)
     return login_ok, login_msg, sudo_ok, sudo_msg
 
 
@@ -172,11 +410,11 @@ def _check_ssh_login_and_sudo(host: Host) -> Tuple[bool, str, bool, str]:
     retry=retry_if_exception_type((socket.error, socket.timeout)),
     reraise=True
 )
-def _check_sudo_access_linux(host: Host) -> Tuple[bool, str]:
+def _check_sudo_access_linux(host: Host, manager: Optional[SSHConnectionManager] = None) -> Tuple[bool, str]:
     """Check sudo access on Linux host with retry logic"""
     command = "sudo -n id"
     try:
-        with ssh_connection(host) as ssh:
+        with ssh_connection(host, manager) as ssh:
             # Check sudo without password
             stdin, stdout, stderr = ssh.exec_command(command, timeout=SSH_COMMAND_TIMEOUT)
             exit_code = stdout.channel.recv_exit_status()
@@ -228,7 +466,7 @@ def _create_winrm_session(host: Host) -> winrm.Session:
     if not endpoint.rstrip("/").endswith("/wsman"):
         endpoint = endpoint.rstrip("/") + "/wsman"
     logger.info(f"WinRM session: endpoint={endpoint}, user={((host.username or '').strip())[:20]}...")
-    password = decrypt_password(host.password) if host.password else ""
+    password = host_password(host)
     # Ensure username is passed as-is (DOMAIN\user); avoid stripping backslash
     username = (host.username or "").strip()
     # read_timeout_sec must exceed operation_timeout_sec (pywinrm requirement)
@@ -248,13 +486,15 @@ def _create_winrm_session(host: Host) -> winrm.Session:
     wait=wait_exponential(multiplier=1, min=2, max=10),
     reraise=True
 )
-def _check_admin_access(host: Host) -> Tuple[bool, str]:
-    """Check admin access on Windows host with retry logic"""
+def _check_admin_access(host: Host, manager: Optional[WinRMShellManager] = None) -> Tuple[bool, str]:
+    """Check admin access on Windows host with retry logic (in the host's shared shell with a manager)"""
     try:
-        session = _create_winrm_session(host)
         # Run simple command to verify access
-        r = session.run_cmd("whoami")
-        if r.status_code == 0:
+        if manager is not None:
+            _, _, status_code = manager.run_cmd(host, "whoami")
+        else:
+            status_code = _create_winrm_session(host).run_cmd("whoami").status_code
+        if status_code == 0:
             return True, "Admin access OK"
         else:
             return False, "Недостаточно прав (sudo): Нет полномочий на выполнение команды"
@@ -267,18 +507,23 @@ def _check_admin_access(host: Host) -> Tuple[bool, str]:
     wait=wait_exponential(multiplier=1, min=2, max=10),
     reraise=True
 )
-def _check_winrm_login(host: Host) -> Tuple[bool, str]:
-    """Check WinRM login credentials with retry logic"""
+def _check_winrm_login(host: Host, manager: Optional[WinRMShellManager] = None) -> Tuple[bool, str]:
+    """
+    Check WinRM login credentials with retry logic.
+    With a manager the shell opened here is kept for the admin check and all commands.
+    """
     try:
-        logger.info(f"WinRM login: creating session for {host.hostname}")
-        session = _create_winrm_session(host)
         logger.info(f"WinRM login: running echo test on {host.hostname}")
-        r = session.run_cmd("echo test")
-        logger.info(f"WinRM login: run_cmd status_code={r.status_code} for {host.hostname}")
-        if r.status_code == 0:
+        if manager is not None:
+            _, std_err, status_code = manager.run_cmd(host, "echo test")
+        else:
+            r = _create_winrm_session(host).run_cmd("echo test")
+            std_err, status_code = r.std_err, r.status_code
+        logger.info(f"WinRM login: run_cmd status_code={status_code} for {host.hostname}")
+        if status_code == 0:
             return True, "WinRM login OK"
         else:
-            err = (r.std_err or b"").decode("utf-8", errors="ignore") or str(r.status_code)
+            err = (std_err or b"").decode("utf-8", errors="ignore") or str(status_code)
             return False, f"Неверные учётные данные: {err}"
     except Exception as e:
         logger.warning(f"WinRM login exception for {host.hostname}: {e}")
@@ -291,33 +536,81 @@ def _check_winrm_login(host: Host) -> Tuple[bool, str]:
     retry=retry_if_exception_type((socket.error, socket.timeout)),
     reraise=True
 )
-def _ssh_connect_and_execute(host: Host, command: str) -> Tuple[bool, str, str, int]:
+def _ssh_connect_and_execute(
+    host: Host,
+    command: str,
+    manager: Optional[SSHConnectionManager] = None,
+    keep_spill: bool = False,
+) -> Tuple[bool, str, str, int]:
     """
     Connect to host via SSH and execute command with retry logic.
-    Uses ssh_connection context manager for automatic cleanup.
+    Uses ssh_connection context manager for automatic cleanup; with a manager the command
+    runs as a new channel on the pooled connection, reconnecting once if it has dropped.
+    Output is read incrementally and bounded by OUTPUT_MEMORY_LIMIT; with keep_spill an
+    oversized stdout is returned as SpilledText whose file the caller must discard. The
+    command is stopped once it produces no output for SSH_COMMAND_TIMEOUT seconds.
 
     Returns: (success, output, error, exit_code)
     On connection/execution exception, exit_code is 1 (generic failure).
     """
     try:
-        with ssh_connection(host) as ssh:
-            stdin, stdout, stderr = ssh.exec_command(command, timeout=SSH_COMMAND_TIMEOUT)
-            exit_code = stdout.channel.recv_exit_status()
+        attempts = 2 if manager is not None else 1
+        limiter = manager.channel_limiter(host) if manager is not None else None
+        attempt = 0
+        refusals = 0
+        while True:
+            attempt += 1
+            try:
+                with limiter.slot() if limiter else nullcontext():
+                    try:
+                        with ssh_connection(host, manager) as ssh:
+                            stdin, stdout, stderr = ssh.exec_command(command, timeout=SSH_COMMAND_TIMEOUT)
+                            out_buf, err_buf = BoundedOutput(), BoundedOutput()
+                            try:
+                                exit_code = drain_channel(
+                                    stdout.channel, out_buf, err_buf, idle_timeout=SSH_COMMAND_TIMEOUT
+                                )
+                            except BaseException:
+                                stdout.channel.close()
+                                out_buf.discard()
+                                err_buf.discard()
+                                raise
 
-            output = stdout.read().decode('utf-8', errors='ignore')
-            error = stderr.read().decode('utf-8', errors='ignore') if exit_code != 0 else ""
+                            output = out_buf.text(keep_spill=keep_spill)
+                            error = err_buf.text() if exit_code != 0 else ""
+                            err_buf.discard()
+                    except paramiko.ChannelException:
+                        if limiter:
+                            limit = limiter.refused()
+                            logger.info(f"{host.hostname}: channel refused, limiting to {limit} concurrent sessions")
+                        raise
+                break
+            except paramiko.AuthenticationException:
+                raise
+            except paramiko.ChannelException:
+                # Server-side MaxSessions reached: wait for a channel to free up and try again
+                refusals += 1
+                if limiter is None or refusals > SSH_CHANNEL_OPEN_RETRIES:
+                    raise
+                attempt -= 1
+                time.sleep(min(0.5 * 2 ** (refusals - 1), 5))
+            except _SSH_TRANSPORT_ERRORS as e:
+                # Retry only when the pooled transport itself dropped (it was invalidated)
+                if attempt >= attempts or manager.is_connected(host):
+                    raise
+                logger.warning(f"SSH transport to {host.hostname}:{host.port} lost ({e}), retrying on a new connection")
 
-            # Логируем команду и результат
-            log_ssh_command(
-                host=host,
-                command=command,
-                stdout=output,
-                stderr=error,
-                exit_code=exit_code,
-                success=(exit_code == 0)
-            )
+        # Логируем команду и результат
+        log_ssh_command(
+            host=host,
+            command=command,
+            stdout=output,
+            stderr=error,
+            exit_code=exit_code,
+            success=(exit_code == 0)
+        )
 
-            return exit_code == 0, output, error, exit_code
+        return exit_code == 0, output, error, exit_code
     except paramiko.AuthenticationException as e:
         error_msg = f"Authentication failed: {str(e)}"
         log_ssh_command(
@@ -327,6 +620,15 @@ def _ssh_connect_and_execute(host: Host, command: str) -> Tuple[bool, str, str,
             success=False
         )
         return False, "", error_msg, 1
+    except TimeoutError as e:
+        error_msg = f"Command timeout: {str(e)}"
+        log_ssh_command(
+            host=host,
+            command=command,
+            stderr=error_msg,
+            success=False
+        )
+        return False, "", error_msg, 1
     except paramiko.SSHException as e:
         error_msg = f"SSH error: {str(e)}"
         log_ssh_command(
@@ -352,45 +654,60 @@ def _ssh_connect_and_execute(host: Host, command: str) -> Tuple[bool, str, str,
     wait=wait_exponential(multiplier=1, min=2, max=10),
     reraise=True
 )
-def _winrm_connect_and_execute(host: Host, command: str) -> Tuple[bool, str, str]:
+def _winrm_connect_and_execute(
+    host: Host,
+    command: str,
+    manager: Optional[WinRMShellManager] = None,
+) -> Tuple[bool, str, str]:
     """
     Connect to host via WinRM and execute command with retry logic.
+    With a manager the command runs in the host's shared shell.
     
     Returns: (success, output, error)
     """
     try:
-        session = _create_winrm_session(host)
-        
-        r = session.run_cmd(command)
+        if manager is not None:
+            output, error, status_code = manager.run_cmd(host, command)
+        else:
+            r = _create_winrm_session(host).run_cmd(command)
+            output, error, status_code = r.std_out, r.std_err, r.status_code
         
-        success = r.status_code == 0
-        output = r.std_out
-        error = r.std_err if not success else ""
+        success = status_code == 0
+        error = error if not success else ""
         
         return success, output, error
     except Exception as e:
         return False, "", str(e)
 
 
-def _execute_profile_linux(host: Host, script_content: str) -> Tuple[bool, str, str, int]:
+def _profile_linux_command(script_content: str) -> str:
+    """Shell command writing the profile to a temp file and running it via sudo bash."""
+    import base64
+    import uuid as _uuid
+    content_b64 = base64.b64encode(script_content.encode("utf-8")).decode("ascii").replace("\n", "")
+    tmp_name = f"/tmp/ib_profile_{_uuid.uuid4().hex[:12]}.sh"
+    # Write via base64 decode, chmod, sudo bash, then rm; capture exit code
+    return (
+        f"echo '{content_b64}' | base64 -d > {tmp_name} && "
+        f"chmod +x {tmp_name} && "
+        f"sudo -n bash {tmp_name}; rc=$?; rm -f {tmp_name}; exit $rc"
+    )
+
+
+def _execute_profile_linux(
+    host: Host,
+    script_content: str,
+    manager: Optional[SSHConnectionManager] = None,
+) -> Tuple[bool, str, str, int]:
     """
     Execute IB profile script on Linux: write content to temp file and run via sudo bash.
     Returns: (success, stdout, stderr, exit_code)
     """
-    import base64
-    import uuid as _uuid
     if not script_content:
         return True, "", "", 0
     try:
-        content_b64 = base64.b64encode(script_content.encode("utf-8")).decode("ascii").replace("\n", "")
-        tmp_name = f"/tmp/ib_profile_{_uuid.uuid4().hex[:12]}.sh"
-        # Write via base64 decode, chmod, sudo bash, then rm; capture exit code
-        cmd = (
-            f"echo '{content_b64}' | base64 -d > {tmp_name} && "
-            f"chmod +x {tmp_name} && "
-            f"sudo -n bash {tmp_name}; rc=$?; rm -f {tmp_name}; exit $rc"
-        )
-        success, output, error, exit_code = _ssh_connect_and_execute(host, cmd)
+        cmd = _profile_linux_command(script_content)
+        success, output, error, exit_code = _ssh_connect_and_execute(host, cmd, manager)
         if not success and not error and output:
             error = output
         return success, output or "", error or "", exit_code
@@ -418,20 +735,96 @@ def _execute_profile_windows(host: Host, script_content: str) -> Tuple[bool, str
         return False, "", str(e), 1
 
 
-async def execute_command(host: Host, command: str) -> ExecutionResult:
+def create_winrm_manager() -> WinRMShellManager:
+    """Shell pool for one run: one authenticated WinRM shell per Windows host."""
+    return WinRMShellManager(_create_winrm_session)
+
+
+def create_ssh_manager():
     """
-    Execute command on host (SSH for Linux, WinRM for Windows)
+    Connection pool for one run, matching the configured SSH backend:
+    SSHConnectionManager (paramiko) or AsyncSSHConnectionManager (asyncssh).
+    Both provide arelease(host_id) and aclose_all().
+    """
+    from services.services_ssh_async import AsyncSSHConnectionManager, async_ssh_enabled
+    if async_ssh_enabled():
+        return AsyncSSHConnectionManager()
+    return SSHConnectionManager()
+
+
+async def run_ssh_command(
+    host: Host,
+    command: str,
+    ssh_manager=None,
+    keep_spill: bool = False,
+) -> Tuple[bool, str, str, int]:
+    """_ssh_connect_and_execute on the configured backend. Returns (success, output, error, exit_code)."""
+    from services.services_ssh_async import async_ssh_enabled, ssh_connect_and_execute
+    if async_ssh_enabled():
+        return await ssh_connect_and_execute(host, command, ssh_manager, keep_spill=keep_spill)
+    return await asyncio.to_thread(_ssh_connect_and_execute, host, command, ssh_manager, keep_spill)
+
+
+def _record_login(host: Host, login_ok: bool, login_msg: str) -> None:
+    if login_ok:
+        host_health.record_success(host.hostname, host.port, LOGIN, host.username)
+    elif login_msg.startswith("Нет сетевого доступа"):
+        host_health.record_failure(host.hostname, host.port, NETWORK, login_msg)
+    else:
+        host_health.record_failure(host.hostname, host.port, LOGIN, login_msg, host.username)
+
+
+async def run_ssh_login_and_sudo(host: Host, ssh_manager=None) -> Tuple[bool, str, bool, str]:
+    """_check_ssh_login_and_sudo on the configured backend; fails fast while the host's login circuit is open."""
+    from services.services_ssh_async import async_ssh_enabled, check_ssh_login_and_sudo
+    blocked = host_health.check(host.hostname, host.port, LOGIN, host.username)
+    if blocked:
+        return False, blocked[1], False, "Login failed"
+    if async_ssh_enabled():
+        result = await check_ssh_login_and_sudo(host, ssh_manager)
+    else:
+        result = await asyncio.to_thread(_check_ssh_login_and_sudo, host, ssh_manager)
+    _record_login(host, result[0], result[1])
+    return result
+
+
+async def run_winrm_login(host: Host, winrm_manager: Optional[WinRMShellManager] = None) -> Tuple[bool, str]:
+    """_check_winrm_login in the executor; fails fast while the host's login circuit is open."""
+    blocked = host_health.check(host.hostname, host.port, LOGIN, host.username)
+    if blocked:
+        return False, blocked[1]
+    login_ok, login_msg = await asyncio.to_thread(_check_winrm_login, host, winrm_manager)
+    _record_login(host, login_ok, login_msg)
+    return login_ok, login_msg
+
+
+async def run_profile_linux(host: Host, script_content: str, ssh_manager=None) -> Tuple[bool, str, str, int]:
+    """_execute_profile_linux on the configured backend."""
+    from services.services_ssh_async import async_ssh_enabled, execute_profile_linux
+    if async_ssh_enabled():
+        return await execute_profile_linux(host, script_content, ssh_manager)
+    return await asyncio.to_thread(_execute_profile_linux, host, script_content, ssh_manager)
+
+
+async def execute_command(
+    host: Host,
+    command: str,
+    ssh_manager: Optional[SSHConnectionManager] = None,
+    keep_spill: bool = False,
+    winrm_manager: Optional[WinRMShellManager] = None,
+) -> ExecutionResult:
+    """
+    Execute command on host (SSH for Linux, WinRM for Windows).
+    ssh_manager: reuse pooled SSH connections of the current run (see create_ssh_manager).
+    keep_spill: oversized SSH output stays on disk as result.output_file (caller discards it).
+    winrm_manager: reuse the host's WinRM shell of the current run (see create_winrm_manager).
     """
-    loop = asyncio.get_event_loop()
-    
     try:
         if host.connection_type == "ssh":
-            success, output, error, _ = await loop.run_in_executor(
-                None, _ssh_connect_and_execute, host, command
-            )
+            success, output, error, _ = await run_ssh_command(host, command, ssh_manager, keep_spill)
         elif host.connection_type == "winrm":
-            success, output, error = await loop.run_in_executor(
-                None, _winrm_connect_and_execute, host, command
+            success, output, error = await asyncio.to_thread(
+                _winrm_connect_and_execute, host, command, winrm_manager
             )
         else:
             return ExecutionResult(
@@ -447,7 +840,8 @@ async def execute_command(host: Host, command: str) -> ExecutionResult:
             host_name=host.name,
             success=success,
             output=output,
-            error=error if not success else None
+            error=error if not success else None,
+            output_file=getattr(output, "path", None),
         )
     except Exception as e:
         return ExecutionResult(
@@ -459,6 +853,109 @@ async def execute_command(host: Host, command: str) -> ExecutionResult:
         )
 
 
+def _kill_process_group(proc: asyncio.subprocess.Process) -> None:
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def _run_local_process(
+    args: List[str],
+    *,
+    input: Optional[str] = None,
+    env: Optional[dict] = None,
+    timeout: float,
+) -> subprocess.CompletedProcess:
+    """
+    asyncio replacement for subprocess.run(..., capture_output=True, text=True, timeout=...).
+    The process runs in its own session; on timeout or cancellation the whole process
+    group is killed. Raises subprocess.TimeoutExpired like subprocess.run.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        env=env,
+        start_new_session=True,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(
+            proc.communicate(input.encode('utf-8') if input is not None else None), timeout
+        )
+    except asyncio.TimeoutError:
+        _kill_process_group(proc)
+        await proc.wait()
+        raise subprocess.TimeoutExpired(args, timeout)
+    except asyncio.CancelledError:
+        _kill_process_group(proc)
+        raise
+    return subprocess.CompletedProcess(
+        args,
+        proc.returncode,
+        stdout.decode('utf-8', errors='replace'),
+        stderr.decode('utf-8', errors='replace'),
+    )
+
+
+async def check_processor_syntax(script: str) -> Tuple[bool, str]:
+    """
+    `bash -n` for a processor script: (valid, error message).
+    Cached by hash of the normalized text, so each script version is checked once.
+    """
+    normalized = normalize_script_text(script)
+    cached = get_cached_syntax(normalized)
+    if cached is not None:
+        return cached
+    result = await _run_local_process(['bash', '-n'], input=normalized, timeout=5)
+    valid = result.returncode == 0
+    error = "" if valid else (result.stderr.strip() or result.stdout.strip())
+    store_syntax(normalized, valid, error)
+    return valid, error
+
+
+async def warm_processor_syntax_cache(script: Optional[str]) -> None:
+    """Validate a saved processor script ahead of its first execution; errors are ignored."""
+    if not script or not script.strip():
+        return
+    try:
+        await check_processor_syntax(script)
+    except Exception as e:
+        logger.debug(f"Processor syntax pre-check skipped: {e}")
+
+
+async def _run_processor_process(
+    script: str,
+    check_output: str,
+    reference: str,
+    output_file: Optional[str] = None,
+) -> subprocess.CompletedProcess:
+    """
+    Run processor script with `bash -x` (CHECK_OUTPUT / ETALON_INPUT in env) without blocking
+    the event loop; at most PROCESSOR_MAX_CONCURRENCY processors run at once.
+    Uses the pre-forked worker pool when enabled, a new bash process otherwise.
+    output_file: path of the full (spilled) output, exported as CHECK_OUTPUT_FILE.
+    """
+    syntax_ok, syntax_error = await check_processor_syntax(script)
+    if not syntax_ok:
+        logger.error(f"Bash syntax error in script: {syntax_error}")
+
+    async with _processor_slots:
+        if processor_pool is not None:
+            try:
+                return await processor_pool.run(script, check_output, reference, PROCESSOR_TIMEOUT, output_file)
+            except ProcessorWorkerError as e:
+                logger.warning(f"Processor worker failed ({e}), running the script in a new process")
+
+        env = os.environ.copy()
+        env['CHECK_OUTPUT'] = check_output
+        env['ETALON_INPUT'] = reference
+        if output_file:
+            env['CHECK_OUTPUT_FILE'] = output_file
+        return await _run_local_process(['bash', '-x', '-c', script], env=env, timeout=PROCESSOR_TIMEOUT)
+
+
 async def run_processor_on_output(
     host_id: str,
     host_name: str,
@@ -467,12 +964,24 @@ async def run_processor_on_output(
     reference_data: Optional[str],
     script_id: str,
     script_name: str,
+    processor_rules: Optional[list] = None,
+    output_file: Optional[str] = None,
 ) -> ExecutionResult:
     """
     Run processor script locally on pre-captured command output.
     Used by online execution (after SSH/WinRM) and by offline result import.
+    processor_rules: declarative rules (processor_type "rules"), evaluated in-process instead of bash.
+    output_file: full output when raw_output is only its head and a truncation note (exported as
+    CHECK_OUTPUT_FILE). The note stays in the stored output only: rules evaluate the whole
+    file, CHECK_OUTPUT is the head as captured.
     """
-    import subprocess
+    if processor_rules:
+        if not output_file:
+            return evaluate_rules(host_id, host_name, raw_output, processor_rules, reference_data)
+        full_output = await asyncio.to_thread(read_spill, output_file)
+        result = evaluate_rules(host_id, host_name, full_output, processor_rules, reference_data)
+        # Stored output keeps the head and its note, whatever the rules appended follows it
+        return result.model_copy(update={"output": raw_output + result.output[len(full_output):]})
     if not processor_script:
         return ExecutionResult(
             host_id=host_id,
@@ -481,36 +990,37 @@ async def run_processor_on_output(
             output=raw_output or "",
             error=None,
         )
+
+    # Same processor, output and reference give the same classification: reuse it
+    # (not for spilled output: raw_output is only its head)
+    cache_key = None if output_file else result_cache_key(processor_script, raw_output, reference_data)
+    cached = await get_cached_result(cache_key) if cache_key else None
+    if cached is not None:
+        logger.info(f"Processor result for {host_name} taken from cache")
+        return ExecutionResult(
+            host_id=host_id,
+            host_name=host_name,
+            success=cached["success"],
+            output=(raw_output or "") + (cached["output_suffix"] or ""),
+            error=cached["error"],
+            check_status=cached["check_status"],
+            error_code=cached["error_code"],
+            error_description=cached["error_description"],
+            actual_data=cached["actual_data"],
+        )
+
     try:
         # Normalize line endings: CRLF -> LF (fixes Windows/Linux compatibility issues)
         normalized_script = processor_script.replace('\r\n', '\n').replace('\r', '\n')
-        normalized_output = (raw_output or '').replace('\r\n', '\n').replace('\r', '\n')
+        check_output = await asyncio.to_thread(read_spill, output_file, OUTPUT_MEMORY_LIMIT) if output_file else raw_output
+        normalized_output = (check_output or '').replace('\r\n', '\n').replace('\r', '\n')
         normalized_reference = (reference_data or '').replace('\r\n', '\n').replace('\r', '\n')
         
         script_lines = normalized_script.split('\n')
         logger.info(f"Processor script total length: {len(normalized_script)} chars, {len(script_lines)} lines")
         logger.info(f"Executing processor script locally for {host_name}, output size: {len(normalized_output)} bytes")
         
-        env = os.environ.copy()
-        env['CHECK_OUTPUT'] = normalized_output
-        env['ETALON_INPUT'] = normalized_reference
-        
-        syntax_check = subprocess.run(
-            ['bash', '-n'],
-            input=normalized_script,
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        if syntax_check.returncode != 0:
-            logger.error(f"Bash syntax error in script: {syntax_check.stderr}")
-        result = subprocess.run(
-            ['bash', '-x', '-c', normalized_script],
-            env=env,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
+        result = await _run_processor_process(normalized_script, normalized_output, normalized_reference, output_file)
         
         logger.info(f"Local processor execution completed for {host_name}, return code: {result.returncode}")
         logger.info(f"STDOUT length: {len(result.stdout)} chars, STDERR length: {len(result.stderr)} chars")
@@ -795,7 +1305,7 @@ async def run_processor_on_output(
                                     actual_data = value
                                     break
         
-        return ExecutionResult(
+        execution_result = ExecutionResult(
             host_id=host_id,
             host_name=host_name,
             success=(check_status == 'Пройдена'),
@@ -806,6 +1316,13 @@ async def run_processor_on_output(
             error_description=error_description,
             actual_data=actual_data
         )
+        # Timeouts and internal errors are not cached (they depend on load, not on input)
+        if cache_key:
+            await store_result(cache_key, {
+                **execution_result.model_dump(include={"success", "error", "check_status", "error_code", "error_description", "actual_data"}),
+                "output_suffix": result_output[len(raw_output or ""):],
+            })
+        return execution_result
         
     except subprocess.TimeoutExpired:
         error_code = 34
@@ -868,45 +1385,67 @@ async def run_processor_on_output(
 
 async def execute_check_with_processor(host: Host, command: str, processor_script: Optional[str] = None, 
                                         reference_data: Optional[str] = None, script_id: Optional[str] = None, 
-                                        script_name: Optional[str] = None) -> ExecutionResult:
+                                        script_name: Optional[str] = None,
+                                        ssh_manager: Optional[SSHConnectionManager] = None,
+                                        processor_rules: Optional[list] = None,
+                                        winrm_manager: Optional[WinRMShellManager] = None) -> ExecutionResult:
     """
     Execute check command and process results with optional reference data.
     Two-stage: (1) execute command on remote host, (2) run processor script locally.
     """
-    main_result = await execute_command(host, command)
-    if not processor_script:
-        return main_result
-    if not main_result.success:
-        exit_code = 1
-        cmd_error_code = detect_command_error(
-            exit_code=exit_code,
-            stdout=main_result.output or "",
-            stderr=main_result.error or ""
-        )
-        if cmd_error_code and cmd_error_code in [11, 12, 13, 21, 22, 31, 32, 33, 34]:
-            error_info = get_error_description(cmd_error_code)
-            error_description = f"{error_info['category']}: {error_info['error']} - {error_info['description']}"
-            return ExecutionResult(
-                host_id=host.id,
-                host_name=host.name,
-                success=False,
-                output=main_result.output or "",
-                error=main_result.error,
-                check_status="Ошибка",
-                error_code=cmd_error_code,
-                error_description=error_description
-            )
-    return await run_processor_on_output(
-        host.id,
-        host.name,
-        main_result.output or "",
-        processor_script,
-        reference_data,
-        script_id or "",
-        script_name or "",
+    main_result = await execute_command(host, command, ssh_manager, keep_spill=True, winrm_manager=winrm_manager)
+    return await process_command_result(
+        host, main_result, processor_script, reference_data, script_id, script_name, processor_rules
     )
 
 
+async def process_command_result(host: Host, main_result: ExecutionResult, processor_script: Optional[str] = None,
+                                 reference_data: Optional[str] = None, script_id: Optional[str] = None,
+                                 script_name: Optional[str] = None,
+                                 processor_rules: Optional[list] = None) -> ExecutionResult:
+    """
+    Second stage of a check: classify command errors and run the processor script
+    (or evaluate processor_rules) on the output already collected from the host.
+    """
+    try:
+        if not processor_script and not processor_rules:
+            return main_result.model_copy(update={"output_file": None})
+        if not main_result.success:
+            exit_code = 1
+            cmd_error_code = detect_command_error(
+                exit_code=exit_code,
+                stdout=main_result.output or "",
+                stderr=main_result.error or ""
+            )
+            if cmd_error_code and cmd_error_code in [11, 12, 13, 21, 22, 31, 32, 33, 34]:
+                error_info = get_error_description(cmd_error_code)
+                error_description = f"{error_info['category']}: {error_info['error']} - {error_info['description']}"
+                return ExecutionResult(
+                    host_id=host.id,
+                    host_name=host.name,
+                    success=False,
+                    output=main_result.output or "",
+                    error=main_result.error,
+                    check_status="Ошибка",
+                    error_code=cmd_error_code,
+                    error_description=error_description
+                )
+        return await run_processor_on_output(
+            host.id,
+            host.name,
+            main_result.output or "",
+            processor_script,
+            reference_data,
+            script_id or "",
+            script_name or "",
+            processor_rules,
+            output_file=main_result.output_file,
+        )
+    finally:
+        # Spilled output is only needed by the processor
+        discard_spill(main_result.output_file)
+
+
 # Keep for backward compatibility
 def _check_ssh_login_original(host: Host) -> tuple[bool, str]:
     """Original SSH login check - kept for reference"""
@@ -986,7 +1525,8 @@ async def save_failed_executions(
     system: System,
     error_msg: str,
     check_type: str,
-    user_id: str
+    user_id: str,
+    writer=None,
 ) -> None:
     """
     Save failed execution records for all scripts when a preliminary check fails.
@@ -1001,6 +1541,7 @@ async def save_failed_executions(
         error_msg: Error message to save
         check_type: Type of check that failed ('network', 'login', 'sudo', 'admin')
         user_id: ID of user who initiated execution
+        writer: ExecutionWriteBuffer of the run; without it records are inserted at once
     """
     # Get error code and description for the check type
     error_code = get_error_code_for_check_type(check_type)
@@ -1011,6 +1552,7 @@ async def save_failed_executions(
         error_description = f"{error_info['category']}: {error_info['error']} - {error_info['description']}"
     
     # Save execution record for each script
+    exec_docs = []
     for script in scripts:
         execution = Execution(
             project_id=project_id,
@@ -1028,5 +1570,10 @@ async def save_failed_executions(
             error_description=error_description,
             executed_by=user_id
         )
-        exec_doc = prepare_for_mongo(execution.model_dump())
-        await db.executions.insert_one(exec_doc)        
\ No newline at end of file
+        exec_docs.append(prepare_for_mongo(execution.model_dump()))
+    if not exec_docs:
+        return
+    if writer is not None:
+        await writer.add_executions(exec_docs)
+    else:
+        await db.executions.insert_many(exec_docs, ordered=False)        
\ No newline at end of file
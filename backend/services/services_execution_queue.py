@@ -0,0 +1,194 @@
+"""
+services/services_execution_queue.py
+Mongo-backed queue of host tasks for standalone execution workers.
+
+With EXECUTION_QUEUE_ENABLED the API process does not connect to hosts itself:
+run_project_events() puts an item into db.execution_queue for every host that gets one of
+its host slots and relays the events the workers publish. Execution workers
+(services_execution_worker, any number of processes on any nodes) lease items with an
+atomic find_one_and_update and renew the lease while the host runs. An item whose worker
+died is leased again once its lease expires, up to EXECUTION_QUEUE_MAX_ATTEMPTS times.
+"""
+
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+from config.config_init import db, logger
+
+# Run host tasks on execution workers instead of the API process
+EXECUTION_QUEUE_ENABLED = os.environ.get('EXECUTION_QUEUE_ENABLED', 'false').lower() == 'true'
+# Seconds a leased item belongs to its worker without a renewal
+EXECUTION_QUEUE_LEASE_SECONDS = int(os.environ.get('EXECUTION_QUEUE_LEASE_SECONDS', '60'))
+# Leases of one item before it is given up
+EXECUTION_QUEUE_MAX_ATTEMPTS = int(os.environ.get('EXECUTION_QUEUE_MAX_ATTEMPTS', '3'))
+# Poll interval of idle workers and of the run relaying events; also the event publish interval
+EXECUTION_QUEUE_POLL_SECONDS = float(os.environ.get('EXECUTION_QUEUE_POLL_SECONDS', '1.0'))
+
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _lease_deadline() -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=EXECUTION_QUEUE_LEASE_SECONDS)).isoformat()
+
+
+async def enqueue_tasks(
+    tasks: List[dict],
+    *,
+    project_id: str,
+    session_id: str,
+    user_id: str,
+    network: Optional[Mapping[str, Tuple[bool, str]]] = None,
+) -> List[str]:
+    """Queue the tasks of a run; returns the item ids. The run's reachability sweep goes along."""
+    now = _now_iso()
+    docs = []
+    for task in tasks:
+        host_id = task.get("host_id")
+        docs.append({
+            "id": str(uuid.uuid4()),
+            "session_id": session_id,
+            "project_id": project_id,
+            "user_id": user_id,
+            "host_id": host_id,
+            "task": task,
+            "network": list(network[host_id]) if network and host_id in network else None,
+            "status": QUEUED,
+            "attempts": 0,
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "enqueued_at": now,
+            "finished_at": None,
+            "ok": None,
+            "events": [],
+            "event_count": 0,
+        })
+    if docs:
+        await db.execution_queue.insert_many(docs)
+    return [doc["id"] for doc in docs]
+
+
+async def lease_task(owner: str) -> Optional[dict]:
+    """Atomically lease the oldest queued item (or one whose lease expired)."""
+    now = _now_iso()
+    return await db.execution_queue.find_one_and_update(
+        {
+            "$or": [{"status": QUEUED}, {"status": LEASED, "lease_expires_at": {"$lt": now}}],
+            "attempts": {"$lt": EXECUTION_QUEUE_MAX_ATTEMPTS},
+        },
+        {
+            "$set": {"status": LEASED, "lease_owner": owner, "lease_expires_at": _lease_deadline(), "leased_at": now},
+            "$inc": {"attempts": 1},
+        },
+        sort=[("enqueued_at", 1)],
+        projection={"_id": 0, "events": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def renew_lease(item_id: str, owner: str) -> bool:
+    """Extend a lease; False if the item is no longer leased by owner."""
+    result = await db.execution_queue.update_one(
+        {"id": item_id, "lease_owner": owner, "status": LEASED},
+        {"$set": {"lease_expires_at": _lease_deadline()}},
+    )
+    return result.matched_count == 1
+
+
+async def publish_events(item_id: str, owner: str, events: List[Dict[str, Any]]) -> None:
+    if events:
+        await db.execution_queue.update_one(
+            {"id": item_id, "lease_owner": owner},
+            {"$push": {"events": {"$each": events}}, "$inc": {"event_count": len(events)}},
+        )
+
+
+async def complete_task(item_id: str, owner: str, ok: bool) -> None:
+    await db.execution_queue.update_one(
+        {"id": item_id, "lease_owner": owner, "status": LEASED},
+        {"$set": {"status": DONE, "ok": ok, "finished_at": _now_iso()}},
+    )
+
+
+async def _item_state(item_id: str) -> Optional[dict]:
+    return await db.execution_queue.find_one(
+        {"id": item_id},
+        {"_id": 0, "id": 1, "host_id": 1, "status": 1, "ok": 1, "event_count": 1, "attempts": 1, "lease_expires_at": 1},
+    )
+
+
+async def _item_events(item_id: str, skip: int, limit: int) -> List[Dict[str, Any]]:
+    doc = await db.execution_queue.find_one({"id": item_id}, {"_id": 0, "events": {"$slice": [skip, limit]}})
+    return (doc or {}).get("events") or []
+
+
+def _abandoned(item: dict, now: str) -> bool:
+    """Lease expired and no attempts left: no worker will pick the item up again."""
+    return (
+        item.get("status") == LEASED
+        and item.get("attempts", 0) >= EXECUTION_QUEUE_MAX_ATTEMPTS
+        and (item.get("lease_expires_at") or "") < now
+    )
+
+
+async def run_task_via_queue(
+    task: dict,
+    *,
+    project_id: str,
+    session_id: str,
+    user_id: str,
+    emit: Callable[[Dict[str, Any]], Awaitable[None]],
+    network: Optional[Mapping[str, Tuple[bool, str]]] = None,
+) -> bool:
+    """
+    Queue one task of a run and relay the events of its item until a worker finishes it.
+    Returns the outcome of the task (True if the host passed the preliminary checks).
+    The caller holds the run's host slot meanwhile, as for a host run in-process.
+    """
+    [item_id] = await enqueue_tasks([task], project_id=project_id, session_id=session_id, user_id=user_id, network=network)
+    relayed = 0
+    outcome: Optional[bool] = None
+    try:
+        while outcome is None:
+            item = await _item_state(item_id)
+            if item is None:
+                logger.error(f"Execution queue item {item_id} disappeared")
+                await emit({'type': 'task_error', 'host_name': task.get("host_id"), 'error': 'Internal error during task execution'})
+                return False
+            count = item.get("event_count", 0)
+            if count > relayed:
+                for event in await _item_events(item_id, relayed, count - relayed):
+                    await emit(event)
+                relayed = count
+            if item.get("status") in (DONE, FAILED):
+                outcome = bool(item.get("ok"))
+            elif _abandoned(item, _now_iso()):
+                await db.execution_queue.update_one(
+                    {"id": item_id, "status": LEASED}, {"$set": {"status": FAILED, "ok": False, "finished_at": _now_iso()}}
+                )
+                logger.error(f"Execution queue item {item_id} abandoned after {item.get('attempts')} attempts")
+                await emit({'type': 'task_error', 'host_name': item.get("host_id"), 'error': 'Internal error during task execution'})
+                outcome = False
+            else:
+                await asyncio.sleep(EXECUTION_QUEUE_POLL_SECONDS)
+    finally:
+        if outcome is None:
+            # The run is gone (cancelled): an item nobody has started is withdrawn
+            await db.execution_queue.update_one(
+                {"id": item_id, "status": QUEUED},
+                {"$set": {"status": FAILED, "ok": False, "finished_at": _now_iso()}},
+            )
+    # Events are in the run's own log by now
+    await db.execution_queue.delete_one({"id": item_id, "status": {"$in": [DONE, FAILED]}})
+    return outcome
@@ -0,0 +1,310 @@
+"""
+services/services_execution_runs.py
+Project runs as background tasks with a replayable event log.
+
+A run used to live inside the SSE response, so the browser reading the stream drove it:
+a slow client stalled the run and a dropped connection cancelled it. start_project_run()
+drives run_project_events() in its own task instead. Every event gets a sequence number
+(1, 2, ...) and is appended to the in-memory log of the run and, in batches, to
+db.execution_events. Any number of clients read the log with stream_run_events() from a
+given sequence number (SSE Last-Event-ID) without affecting the run. Finished runs are
+followed through Mongo; db.execution_runs keeps the status and heartbeat of every run.
+
+run_project() is the in-process entry point (scheduler, internal callers): it starts the
+same run and waits for its ProjectRunSummary, which the run builds from its events as they
+are appended, so no token, SSE text or JSON round-trip is involved.
+"""
+
+import asyncio
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+from config.config_init import db, logger
+from models.models_init import User, ProjectRunOptions, HostRunSummary, ProjectRunSummary
+from services.services_auth import has_permission, can_access_project
+from services.services_project_execution import run_project_events
+
+# Max delay between an event and its write to db.execution_events
+EXECUTION_EVENTS_FLUSH_SECONDS = float(os.environ.get('EXECUTION_EVENTS_FLUSH_SECONDS', '0.5'))
+# Seconds a finished run stays in memory (late viewers are served without Mongo)
+EXECUTION_RUN_LINGER_SECONDS = float(os.environ.get('EXECUTION_RUN_LINGER_SECONDS', '60'))
+# Interval of heartbeat_at updates of a running run; a run silent for 3 intervals is dead
+EXECUTION_RUN_HEARTBEAT_SECONDS = float(os.environ.get('EXECUTION_RUN_HEARTBEAT_SECONDS', '30'))
+
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+INTERRUPTED = "interrupted"
+
+_INTERNAL_ERROR_EVENT = {
+    'type': 'error',
+    'message': 'Произошла внутренняя ошибка при выполнении проекта. Обратитесь к администратору.',
+}
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class ProjectRun:
+    """A project run in progress (or recently finished) with its numbered event log."""
+
+    def __init__(self, session_id: str, project_id: str, user_id: str):
+        self.session_id = session_id
+        self.project_id = project_id
+        self.user_id = user_id
+        self.events: List[Dict[str, Any]] = []
+        self.status = RUNNING
+        self.task: Optional[asyncio.Task] = None
+        self.started_at = datetime.now(timezone.utc)
+        self.finished_at: Optional[datetime] = None
+        # Summary state, updated by append()
+        self.hosts: Dict[str, HostRunSummary] = {}
+        self.complete: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self._unsaved: List[dict] = []
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status != RUNNING
+
+    def append(self, event: Dict[str, Any]) -> int:
+        """Add an event; returns its sequence number."""
+        self.events.append(event)
+        self._track(event)
+        seq = len(self.events)
+        self._unsaved.append({"session_id": self.session_id, "seq": seq, "event": event, "created_at": _now_iso()})
+        self._notify()
+        return seq
+
+    def _track(self, event: Dict[str, Any]) -> None:
+        """Fold an event into the run summary (per-host status, script counts, durations)."""
+        kind = event.get('type')
+        if kind == 'complete':
+            self.complete = event
+            return
+        if kind == 'error':
+            self.error = event.get('message')
+            return
+        if kind not in ('task_start', 'script_progress', 'task_complete', 'task_error'):
+            return
+        name = str(event.get('host_name'))
+        now = datetime.now(timezone.utc)
+        host = self.hosts.get(name)
+        if host is None:
+            host = self.hosts[name] = HostRunSummary(host_name=name, started_at=now)
+        if kind == 'task_start':
+            host.scripts_total = event.get('scripts_count') or 0
+        elif kind == 'script_progress':
+            host.scripts_completed = event.get('completed') or 0
+            host.scripts_total = event.get('total') or host.scripts_total
+        else:
+            host.status = 'completed' if kind == 'task_complete' else 'failed'
+            host.error = event.get('error')
+            host.finished_at = now
+            host.duration_seconds = round((now - host.started_at).total_seconds(), 3)
+
+    def summary(self) -> ProjectRunSummary:
+        complete = self.complete or {}
+        failed_hosts = sum(1 for host in self.hosts.values() if host.status == 'failed')
+        return ProjectRunSummary(
+            session_id=self.session_id,
+            project_id=self.project_id,
+            status=self.status,
+            total=complete.get('total', len(self.hosts)),
+            completed=complete.get('completed', len(self.hosts) - failed_hosts),
+            failed=complete.get('failed', failed_hosts),
+            error=self.error,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            duration_seconds=(
+                round((self.finished_at - self.started_at).total_seconds(), 3) if self.finished_at else None
+            ),
+            hosts=list(self.hosts.values()),
+        )
+
+    def _notify(self) -> None:
+        # Waiters hold the previous Event; a new one is armed for the next change
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait_for(self, after_seq: int) -> None:
+        """Return once there are events after after_seq or the run is finished."""
+        while len(self.events) <= after_seq and not self.finished:
+            await self._changed.wait()
+
+    async def save_events(self) -> None:
+        """Write unsaved events to db.execution_events."""
+        docs, self._unsaved = self._unsaved, []
+        if not docs:
+            return
+        try:
+            await db.execution_events.insert_many(docs, ordered=False)
+        except Exception as e:
+            logger.error(f"Failed to save {len(docs)} events of run {self.session_id}: {e}")
+
+    async def _save_periodically(self) -> None:
+        loop = asyncio.get_running_loop()
+        last_heartbeat = loop.time()
+        while True:
+            await asyncio.sleep(EXECUTION_EVENTS_FLUSH_SECONDS)
+            await self.save_events()
+            if loop.time() - last_heartbeat >= EXECUTION_RUN_HEARTBEAT_SECONDS:
+                last_heartbeat = loop.time()
+                try:
+                    await db.execution_runs.update_one(
+                        {"session_id": self.session_id}, {"$set": {"heartbeat_at": _now_iso()}}
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to update heartbeat of run {self.session_id}: {e}")
+
+
+# Runs of this process by session id (the task keeps a run alive, the dict keeps the task)
+_runs: Dict[str, ProjectRun] = {}
+
+
+async def _drive(run: ProjectRun, parallel_hosts: Optional[int]) -> None:
+    saver = asyncio.create_task(run._save_periodically())
+    status = FAILED
+    try:
+        async for event in run_project_events(
+            run.project_id, run.user_id, parallel_hosts=parallel_hosts, session_id=run.session_id
+        ):
+            run.append(event)
+            if event.get('type') == 'complete':
+                status = COMPLETED if event.get('status') == 'completed' else FAILED
+    except asyncio.CancelledError:
+        status = INTERRUPTED
+        raise
+    except Exception as e:
+        logger.error(f"Error during project execution: {e}")
+        # A generic message: internal exception details are not exposed to clients
+        run.append(dict(_INTERNAL_ERROR_EVENT))
+    finally:
+        saver.cancel()
+        await run.save_events()
+        run.finished_at = datetime.now(timezone.utc)
+        run.status = status
+        run._notify()
+        try:
+            await db.execution_runs.update_one(
+                {"session_id": run.session_id},
+                {"$set": {"status": status, "finished_at": _now_iso(), "event_count": len(run.events)}},
+            )
+        except Exception as e:
+            logger.error(f"Failed to save status of run {run.session_id}: {e}")
+        asyncio.get_running_loop().call_later(EXECUTION_RUN_LINGER_SECONDS, _runs.pop, run.session_id, None)
+
+
+async def start_project_run(project_id: str, user_id: str, parallel_hosts: Optional[int] = None) -> ProjectRun:
+    """Start a project run in the background; the returned run is already executing."""
+    run = ProjectRun(str(uuid.uuid4()), project_id, user_id)
+    await db.execution_runs.insert_one({
+        "session_id": run.session_id,
+        "project_id": project_id,
+        "started_by": user_id,
+        "status": RUNNING,
+        "started_at": _now_iso(),
+        "heartbeat_at": _now_iso(),
+        "finished_at": None,
+    })
+    _runs[run.session_id] = run
+    run.task = asyncio.create_task(_drive(run, parallel_hosts))
+    return run
+
+
+async def run_project(
+    project_id: str, user: User, options: Optional[ProjectRunOptions] = None
+) -> ProjectRunSummary:
+    """
+    Run a project in this process and return its summary once it has finished.
+    The run is the one GET /projects/{id}/execute starts (same events, results and
+    db.execution_runs record; it can be followed over SSE), minus the token and the stream.
+    Cancelling the caller does not cancel the run. Raises PermissionError if the user may
+    not run the project.
+    """
+    if not await has_permission(user, 'projects_execute'):
+        raise PermissionError("Вам запрещено производить запуски проектов")
+    if not await can_access_project(user, project_id):
+        raise PermissionError("У вас нет доступа к текущему проекту")
+    options = options or ProjectRunOptions()
+    run = await start_project_run(project_id, user.id, parallel_hosts=options.parallel_hosts)
+    await asyncio.wait({run.task})
+    return run.summary()
+
+
+async def find_run(session_id: str) -> Optional[Dict[str, Any]]:
+    """db.execution_runs document of a run (project_id, status, ...)."""
+    run = _runs.get(session_id)
+    if run is not None:
+        return {"session_id": run.session_id, "project_id": run.project_id, "status": run.status}
+    return await db.execution_runs.find_one({"session_id": session_id}, {"_id": 0})
+
+
+async def stream_run_events(session_id: str, after_seq: int = 0) -> AsyncGenerator[Tuple[int, Dict[str, Any]], None]:
+    """
+    (seq, event) pairs of a run after after_seq until the run finishes. Runs of this process
+    are followed in memory; runs of another process are followed through db.execution_events.
+    """
+    seq = max(0, after_seq)
+    run = _runs.get(session_id)
+    if run is None:
+        while True:
+            doc = await db.execution_runs.find_one({"session_id": session_id}, {"_id": 0, "status": 1})
+            cursor = db.execution_events.find(
+                {"session_id": session_id, "seq": {"$gt": seq}}, {"_id": 0, "seq": 1, "event": 1}
+            ).sort("seq", 1)
+            async for event_doc in cursor:
+                seq = event_doc["seq"]
+                yield seq, event_doc["event"]
+            # Events are saved before the final status: nothing new can follow it
+            if not doc or doc.get("status") != RUNNING:
+                return
+            await asyncio.sleep(EXECUTION_EVENTS_FLUSH_SECONDS)
+
+    while True:
+        await run.wait_for(seq)
+        while seq < len(run.events):
+            seq += 1
+            yield seq, run.events[seq - 1]
+        if run.finished and seq >= len(run.events):
+            return
+
+
+def format_event_id(session_id: str, seq: int) -> str:
+    """SSE event id: identifies the run too, so a reconnect without a session id can resume it."""
+    return f"{session_id}:{seq}"
+
+
+def parse_event_id(value: Optional[str]) -> Tuple[Optional[str], int]:
+    """(session_id, seq) from a Last-Event-ID value; (None, 0) if absent or malformed."""
+    if not value:
+        return None, 0
+    session_id, _, seq = value.strip().rpartition(":")
+    if not session_id or not seq.isdigit():
+        return None, 0
+    return session_id, int(seq)
+
+
+async def mark_interrupted_runs() -> int:
+    """Runs whose process died (no heartbeat for 3 intervals) can never finish: mark them interrupted."""
+    stale = datetime.fromtimestamp(
+        datetime.now(timezone.utc).timestamp() - 3 * EXECUTION_RUN_HEARTBEAT_SECONDS, timezone.utc
+    ).isoformat()
+    result = await db.execution_runs.update_many(
+        {"status": RUNNING, "heartbeat_at": {"$lt": stale}},
+        {"$set": {"status": INTERRUPTED, "finished_at": _now_iso()}},
+    )
+    return result.modified_count
+
+
+async def stop_project_runs() -> None:
+    """Cancel runs of this process (shutdown); their results and events are flushed first."""
+    tasks = [run.task for run in _runs.values() if run.task is not None and not run.task.done()]
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
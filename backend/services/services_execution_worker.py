@@ -0,0 +1,165 @@
+"""
+services/services_execution_worker.py
+Execution worker: runs the host tasks queued in db.execution_queue.
+
+A worker leases items (services_execution_queue), executes each with the usual
+_execute_task and publishes its events and outcome back to the item. A worker that
+loses the lease of an item (it expired and another worker took the item over) stops
+executing it and drops its unwritten results; a retried item first removes the results
+an earlier attempt wrote, so every check of a task is stored once.
+"""
+
+import asyncio
+import os
+import socket
+import uuid
+from typing import Any, Dict, List, Optional, Set
+
+from config.config_init import db, logger
+from services.services_execution import create_ssh_manager, create_winrm_manager
+from services.services_execution_queue import (
+    EXECUTION_QUEUE_LEASE_SECONDS,
+    EXECUTION_QUEUE_POLL_SECONDS,
+    complete_task,
+    lease_task,
+    publish_events,
+    renew_lease,
+)
+from services.services_project_execution import HostConnectionUsers, _execute_task, load_run_plan
+from services.services_write_buffer import ExecutionWriteBuffer
+from utils.ssh_logger import ssh_log_context
+
+# Hosts one worker process runs at once
+EXECUTION_WORKER_SLOTS = int(os.environ.get('EXECUTION_WORKER_SLOTS', '10'))
+
+
+class ExecutionWorker:
+    """
+    Leases queue items and runs up to `slots` hosts at once. SSH connections and WinRM
+    shells are kept per host while it runs, events are published every
+    EXECUTION_QUEUE_POLL_SECONDS and the lease is renewed during long hosts.
+    """
+
+    def __init__(self, slots: int = EXECUTION_WORKER_SLOTS, owner: Optional[str] = None):
+        self.slots = max(1, slots)
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stopping = asyncio.Event()
+        # Items running at once may target the same host and share its connection
+        self._host_users = HostConnectionUsers()
+
+    def stop(self) -> None:
+        """Stop leasing; hosts already running are finished."""
+        self._stopping.set()
+
+    async def run(self) -> None:
+        slots = asyncio.Semaphore(self.slots)
+        running: Set[asyncio.Task] = set()
+        ssh_manager = create_ssh_manager()
+        winrm_manager = create_winrm_manager()
+        logger.info(f"Execution worker {self.owner} started with {self.slots} slots")
+        try:
+            while not self._stopping.is_set():
+                await slots.acquire()
+                try:
+                    item = await lease_task(self.owner)
+                except Exception as e:
+                    logger.error(f"Execution worker {self.owner} failed to lease a task: {e}")
+                    item = None
+                if item is None:
+                    slots.release()
+                    try:
+                        await asyncio.wait_for(self._stopping.wait(), EXECUTION_QUEUE_POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                task = asyncio.create_task(
+                    self.run_item(item, ssh_manager, winrm_manager), context=ssh_log_context(item["session_id"])
+                )
+                running.add(task)
+                task.add_done_callback(running.discard)
+                task.add_done_callback(lambda _: slots.release())
+        finally:
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+            await ssh_manager.aclose_all()
+            await winrm_manager.aclose_all()
+            logger.info(f"Execution worker {self.owner} stopped")
+
+    async def run_item(self, item: dict, ssh_manager=None, winrm_manager=None) -> bool:
+        """
+        Execute one leased item and publish its events and outcome.
+        Returns False without completing the item if its lease was lost meanwhile.
+        """
+        item_id = item["id"]
+        host_id = item.get("host_id")
+        task = item["task"]
+        pending: List[Dict[str, Any]] = []
+        lease_lost = False
+
+        async def emit(event: Dict[str, Any]) -> None:
+            pending.append(event)
+
+        async def flush() -> None:
+            events = pending[:]
+            del pending[:len(events)]
+            await publish_events(item_id, self.owner, events)
+
+        async def execute() -> bool:
+            try:
+                network = {host_id: tuple(item["network"])} if item.get("network") else None
+                return await _execute_task(
+                    task, project_id=item["project_id"], session_id=item["session_id"], user_id=item["user_id"],
+                    emit=emit, writer=writer, plan=await load_run_plan([task]), ssh_manager=ssh_manager,
+                    network=network, winrm_manager=winrm_manager,
+                )
+            except Exception as e:
+                logger.exception(f"Unexpected error while executing queue item {item_id}: {e}")
+                await emit({'type': 'task_error', 'host_name': host_id, 'error': 'Internal error during task execution'})
+                return False
+
+        async def publish_periodically() -> None:
+            nonlocal lease_lost
+            loop = asyncio.get_running_loop()
+            renewed = loop.time()
+            while True:
+                await asyncio.sleep(EXECUTION_QUEUE_POLL_SECONDS)
+                try:
+                    await flush()
+                    if loop.time() - renewed >= EXECUTION_QUEUE_LEASE_SECONDS / 3:
+                        renewed = loop.time()
+                        if not await renew_lease(item_id, self.owner):
+                            # The item is another worker's now: stop before this attempt writes more results
+                            logger.warning(f"Lease of execution queue item {item_id} was lost, aborting it")
+                            lease_lost = True
+                            execution.cancel()
+                            return
+                except Exception as e:
+                    logger.error(f"Failed to publish progress of execution queue item {item_id}: {e}")
+
+        if item.get("attempts", 1) > 1:
+            # An earlier attempt may have stored part of the results: the retry stores them all again
+            await db.executions.delete_many({"execution_session_id": item["session_id"], "project_task_id": task.get("id")})
+
+        writer = ExecutionWriteBuffer()
+        self._host_users.acquire(host_id)
+        execution = asyncio.create_task(execute())
+        publisher = asyncio.create_task(publish_periodically())
+        ok = False
+        try:
+            ok = await execution
+        except asyncio.CancelledError:
+            if not lease_lost:
+                raise
+        finally:
+            publisher.cancel()
+            if lease_lost:
+                writer.discard()
+            else:
+                # Results are in Mongo before the item is reported done
+                await writer.close()
+            await self._host_users.release(host_id, ssh_manager, winrm_manager)
+        if lease_lost:
+            return False
+        await flush()
+        await complete_task(item_id, self.owner, ok)
+        return ok
@@ -0,0 +1,269 @@
+"""
+services/services_host_health.py
+Host health registry: per-host circuit breaker and reachability cache.
+
+Connect ("network") and authentication ("login") outcomes of every subsystem — project
+runs, IB profile application, host connection tests, config integrity checks — are
+recorded here, so one unreachable machine is learned about once instead of by every run.
+Network state is keyed by "address:port"; login state by "username@address:port", so bad
+credentials of one account do not block runs that log in with another. After
+HOST_BREAKER_FAILURE_THRESHOLD consecutive failures the circuit opens: callers fail fast
+with the cached reason for HOST_BREAKER_OPEN_SECONDS.
+Then the circuit goes half-open: a network circuit is probed in the background (TCP
+connect), a login circuit lets one real attempt through; success closes it, failure
+re-opens it. Failures older than HOST_HEALTH_TTL_SECONDS are forgotten, and a successful
+connect is reused as reachability for HOST_REACHABILITY_TTL_SECONDS.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from config.config_init import logger
+
+# Consecutive failures that open a host's circuit (0 disables the breaker)
+HOST_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('HOST_BREAKER_FAILURE_THRESHOLD', '3'))
+# Seconds an open circuit fails fast before it is probed again
+HOST_BREAKER_OPEN_SECONDS = float(os.environ.get('HOST_BREAKER_OPEN_SECONDS', '120'))
+# Failures older than this no longer count towards the threshold
+HOST_HEALTH_TTL_SECONDS = float(os.environ.get('HOST_HEALTH_TTL_SECONDS', '600'))
+# Seconds a successful connect is trusted without probing the host again (0 disables)
+HOST_REACHABILITY_TTL_SECONDS = float(os.environ.get('HOST_REACHABILITY_TTL_SECONDS', '30'))
+# Timeout of the background half-open probe
+HOST_BREAKER_PROBE_TIMEOUT = float(os.environ.get('HOST_BREAKER_PROBE_TIMEOUT', '5'))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+NETWORK = "network"
+LOGIN = "login"
+
+
+def host_key(address: str, port, username: Optional[str] = None) -> str:
+    """Registry key: "address:port" (network state) or "username@address:port" (login state)."""
+    key = f"{address}:{port}"
+    return key if username is None else f"{username}@{key}"
+
+
+def failure_kind(error: BaseException) -> str:
+    """
+    Circuit a failed SSH connect counts against: NETWORK when the host could not be reached
+    (socket errors and timeouts, paramiko's NoValidConnectionsError, a dropped connection),
+    LOGIN for rejected credentials and other failures past the TCP connect.
+    """
+    return NETWORK if isinstance(error, (OSError, EOFError)) else LOGIN
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+@dataclass
+class _HostHealth:
+    address: str
+    port: int
+    kind: str  # NETWORK or LOGIN
+    username: Optional[str] = None
+    state: str = CLOSED
+    failures: int = 0
+    reason: Optional[str] = None
+    last_failure: Optional[float] = None  # monotonic
+    last_success: Optional[float] = None  # monotonic
+    reachable_at: Optional[float] = None  # monotonic, last successful connect
+    retry_at: Optional[float] = None  # monotonic, end of the open period / trial deadline
+    trips: int = 0
+    last_failure_wall: Optional[float] = None
+    last_success_wall: Optional[float] = None
+
+
+class HostHealthRegistry:
+    """Process-wide host outcomes. Thread-safe: executor threads record outcomes too."""
+
+    def __init__(self):
+        self._hosts: Dict[str, _HostHealth] = {}
+        self._lock = threading.Lock()
+        self._probes: Dict[str, asyncio.Task] = {}
+
+    def _entry(self, address: str, port, kind: str, username: Optional[str] = None) -> _HostHealth:
+        # Login state always has an account part ("@address:port" if it is unknown)
+        username = None if kind == NETWORK else (username or "")
+        key = host_key(address, port, username)
+        entry = self._hosts.get(key)
+        if entry is None:
+            entry = self._hosts[key] = _HostHealth(address=address, port=int(port), kind=kind, username=username)
+        return entry
+
+    def check(self, address: str, port, kind: Optional[str] = None,
+              username: Optional[str] = None) -> Optional[Tuple[str, str]]:
+        """
+        None if the host may be contacted; (kind, message) if a circuit is open and the
+        caller must fail fast. `kind` limits the check to the network circuit or to the login
+        circuit of `username`; without it both are checked. Moves expired open circuits to
+        half-open.
+        """
+        if HOST_BREAKER_FAILURE_THRESHOLD <= 0:
+            return None
+        keys = []
+        if kind in (None, NETWORK):
+            keys.append(host_key(address, port))
+        if kind in (None, LOGIN):
+            keys.append(host_key(address, port, username or ""))
+        now = time.monotonic()
+        probe = False
+        blocked = None
+        with self._lock:
+            for key in keys:
+                entry = self._hosts.get(key)
+                if entry is None or entry.state == CLOSED:
+                    continue
+                if now < entry.retry_at:
+                    blocked = entry.kind, self._blocked_message(entry, now)
+                    break
+                # Open period (or the previous trial) is over: half-open
+                entry.state = HALF_OPEN
+                entry.retry_at = now + HOST_BREAKER_OPEN_SECONDS
+                if entry.kind == LOGIN:
+                    # Credentials can only be verified by a real login: this caller is the trial
+                    continue
+                blocked = entry.kind, self._blocked_message(entry, now)
+                probe = True
+                break
+        if probe:
+            self._probe_in_background(address, port)
+        return blocked
+
+    @staticmethod
+    def _blocked_message(entry: _HostHealth, now: float) -> str:
+        retry_in = max(0, int(entry.retry_at - now))
+        return f"{entry.reason} (хост временно исключён после {entry.failures} неудачных попыток, повтор через {retry_in} с)"
+
+    def recently_reachable(self, address: str, port) -> bool:
+        if HOST_REACHABILITY_TTL_SECONDS <= 0:
+            return False
+        with self._lock:
+            entry = self._hosts.get(host_key(address, port))
+            return (
+                entry is not None
+                and entry.state == CLOSED
+                and entry.reachable_at is not None
+                and time.monotonic() - entry.reachable_at < HOST_REACHABILITY_TTL_SECONDS
+            )
+
+    @staticmethod
+    def _close(entry: _HostHealth, now: float) -> None:
+        if entry.state != CLOSED:
+            logger.info(f"Host {host_key(entry.address, entry.port, entry.username)}: circuit closed")
+        entry.state = CLOSED
+        entry.failures = 0
+        entry.reason = None
+        entry.retry_at = None
+        entry.last_success = now
+        entry.last_success_wall = time.time()
+
+    def record_success(self, address: str, port, kind: str = NETWORK, username: Optional[str] = None) -> None:
+        """A connect (NETWORK) or login (LOGIN) succeeded; a login also proves reachability."""
+        now = time.monotonic()
+        with self._lock:
+            network = self._entry(address, port, NETWORK)
+            network.reachable_at = now
+            self._close(network, now)
+            if kind == LOGIN:
+                self._close(self._entry(address, port, LOGIN, username), now)
+
+    def record_failure(self, address: str, port, kind: str, reason: str, username: Optional[str] = None) -> None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entry(address, port, kind, username)
+            if entry.last_failure is not None and now - entry.last_failure > HOST_HEALTH_TTL_SECONDS:
+                entry.failures = 0
+            entry.failures += 1
+            entry.reason = reason
+            entry.last_failure = now
+            entry.last_failure_wall = time.time()
+            if kind == NETWORK:
+                entry.reachable_at = None
+            threshold = HOST_BREAKER_FAILURE_THRESHOLD
+            if threshold > 0 and (entry.state == HALF_OPEN or entry.failures >= threshold):
+                if entry.state != OPEN:
+                    entry.trips += 1
+                    logger.warning(
+                        f"Host {host_key(address, port, entry.username)}: circuit opened after {entry.failures} failures ({kind}): {reason}"
+                    )
+                entry.state = OPEN
+                entry.retry_at = now + HOST_BREAKER_OPEN_SECONDS
+
+    def _probe_in_background(self, address: str, port) -> None:
+        key = host_key(address, port)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # executor thread: the next check from the event loop schedules the probe
+        running = self._probes.get(key)
+        if running is not None and not running.done():
+            return
+        self._probes[key] = loop.create_task(self._probe(address, port))
+
+    async def _probe(self, address: str, port) -> None:
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(address, port), HOST_BREAKER_PROBE_TIMEOUT)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+        except asyncio.TimeoutError:
+            self.record_failure(address, port, NETWORK, "Нет сетевого доступа: Недоступен сервер или порт")
+        except OSError as e:
+            self.record_failure(address, port, NETWORK, f"Нет сетевого доступа: {str(e)}")
+        else:
+            self.record_success(address, port, NETWORK)
+        finally:
+            self._probes.pop(host_key(address, port), None)
+
+    def snapshot(self, keys: Optional[List[str]] = None) -> List[dict]:
+        """Breaker state of known circuits (all, or the given keys, see host_key)."""
+        now = time.monotonic()
+        with self._lock:
+            items = [(k, self._hosts[k]) for k in (keys if keys is not None else list(self._hosts)) if k in self._hosts]
+            return [
+                {
+                    "key": key,
+                    "address": entry.address,
+                    "port": entry.port,
+                    "username": entry.username,
+                    "state": entry.state,
+                    "consecutive_failures": entry.failures,
+                    "failure_kind": entry.kind if entry.failures else None,
+                    "reason": entry.reason,
+                    "retry_in_seconds": max(0.0, round(entry.retry_at - now, 1)) if entry.retry_at else None,
+                    "trips": entry.trips,
+                    "last_failure_at": _iso(entry.last_failure_wall),
+                    "last_success_at": _iso(entry.last_success_wall),
+                }
+                for key, entry in items
+            ]
+
+    def reset(self, address: Optional[str] = None, port=None) -> int:
+        """Forget one host's network and login circuits (or all hosts). Returns the number of entries removed."""
+        with self._lock:
+            if address is None:
+                count = len(self._hosts)
+                self._hosts.clear()
+                return count
+            keys = [
+                key for key, entry in self._hosts.items()
+                if entry.address == address and entry.port == int(port)
+            ]
+            for key in keys:
+                del self._hosts[key]
+            return len(keys)
+
+
+host_health = HostHealthRegistry()
@@ -14,11 +14,12 @@ from config.config_init import db, logger
 from models.content_models import Host
 from models.ib_profile_models import IBProfileApplySession, IBProfileApplication
 from services.services_execution import (
-    _check_network_access,
-    _check_ssh_login_and_sudo,
-    _check_winrm_login,
+    create_ssh_manager,
+    run_ssh_login_and_sudo,
+    run_profile_linux,
+    probe_network_access,
+    run_winrm_login,
     _check_admin_access,
-    _execute_profile_linux,
     _execute_profile_windows,
 )
 from utils.db_utils import prepare_for_mongo, parse_from_mongo
@@ -68,8 +69,13 @@ async def run_apply_session_events(
     completed = 0
     failed = 0
     loop = asyncio.get_event_loop()
+    # Login/sudo checks and the profile run share one SSH connection per host
+    ssh_manager = create_ssh_manager()
 
     for idx, host_id in enumerate(host_ids):
+        # Hosts run sequentially: drop the previous host's connection
+        await ssh_manager.aclose_all()
+
         host_doc = await db.hosts.find_one({"id": host_id}, {"_id": 0})
         if not host_doc:
             yield {"type": "task_error", "host_name": host_id, "error": "Хост не найден"}
@@ -104,7 +110,7 @@ async def run_apply_session_events(
         }
 
         # 1. Network
-        network_ok, network_msg = await loop.run_in_executor(None, _check_network_access, host)
+        network_ok, network_msg = await probe_network_access(host)
         yield {"type": "check_network", "host_name": host.name, "success": network_ok, "message": network_msg}
 
         if not network_ok:
@@ -126,7 +132,7 @@ async def run_apply_session_events(
 
         # 2. Login + Sudo/Admin
         if host.connection_type == "winrm":
-            login_ok, login_msg = await loop.run_in_executor(None, _check_winrm_login, host)
+            login_ok, login_msg = await run_winrm_login(host)
             yield {"type": "check_login", "host_name": host.name, "success": login_ok, "message": login_msg}
             if not login_ok:
                 await _persist_application(
@@ -141,9 +147,7 @@ async def run_apply_session_events(
             sudo_ok, sudo_msg = await loop.run_in_executor(None, _check_admin_access, host)
             yield {"type": "check_sudo", "host_name": host.name, "success": sudo_ok, "message": sudo_msg}
         else:
-            login_ok, login_msg, sudo_ok, sudo_msg = await loop.run_in_executor(
-                None, _check_ssh_login_and_sudo, host
-            )
+            login_ok, login_msg, sudo_ok, sudo_msg = await run_ssh_login_and_sudo(host, ssh_manager)
             yield {"type": "check_login", "host_name": host.name, "success": login_ok, "message": login_msg}
             if not login_ok:
                 await _persist_application(
@@ -175,9 +179,7 @@ async def run_apply_session_events(
                 None, _execute_profile_windows, host, profile_content
             )
         else:
-            success, stdout, stderr, exit_code = await loop.run_in_executor(
-                None, _execute_profile_linux, host, profile_content
-            )
+            success, stdout, stderr, exit_code = await run_profile_linux(host, profile_content, ssh_manager)
         finished_at = datetime.now(timezone.utc)
 
         stdout_stored = _truncate(stdout, OUTPUT_STORAGE_MAX)
@@ -215,6 +217,8 @@ async def run_apply_session_events(
         else:
             failed += 1
 
+    await ssh_manager.aclose_all()
+
     yield {
         "type": "complete",
         "status": "completed" if failed == 0 else "failed",
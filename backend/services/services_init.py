@@ -24,6 +24,8 @@ from services.services_auth import (
 
 # Execution
 from services.services_execution import (
+    SSHConnectionManager,
+    create_ssh_manager,
     execute_command,
     execute_check_with_processor,
     _check_network_access,
@@ -85,6 +87,8 @@ __all__ = [
     "can_access_project",
     
     # Execution
+    "SSHConnectionManager",
+    "create_ssh_manager",
     "execute_command",
     "execute_check_with_processor",
     "_check_network_access",
@@ -295,6 +295,7 @@ async def process_offline_upload(
         script_decoded = decode_script_from_storage(script_doc)
         script_name = script_decoded.get("name", script_id)
         processor_script = script_decoded.get("processor_script")
+        processor_rules = script_decoded.get("processor_rules") if script_decoded.get("processor_type") == "rules" else None
         ref_data = reference_data_map.get(script_id) or ""
         if isinstance(ref_data, dict):
             ref_data = str(ref_data.get("text", ref_data) or "")
@@ -314,6 +315,7 @@ async def process_offline_upload(
             reference_data=ref_data,
             script_id=script_id,
             script_name=script_name,
+            processor_rules=processor_rules,
         )
 
         execution = Execution(
@@ -0,0 +1,209 @@
+"""
+services/services_output_capture.py
+Bounded capture of remote command output.
+
+Channel output is read incrementally (stdout and stderr together, so neither stream can
+stall the other). Up to OUTPUT_MEMORY_LIMIT bytes per stream are kept in memory; beyond
+that the stream spills to a temporary file which is handed to the processor script as
+CHECK_OUTPUT_FILE, while ExecutionResult, logs and Mongo only get the in-memory head and a
+note on the truncation. Processors see the head without the note, declarative rules the
+whole spilled output.
+"""
+
+import asyncio
+import os
+import select
+import tempfile
+import time
+from typing import Optional
+
+# Bytes of a command's stdout/stderr kept in memory; the rest spills to a temp file
+OUTPUT_MEMORY_LIMIT = int(os.environ.get('OUTPUT_MEMORY_LIMIT', str(1024 * 1024)))
+# Upper bound of a spill file; output beyond it is dropped
+OUTPUT_SPILL_MAX_BYTES = int(os.environ.get('OUTPUT_SPILL_MAX_BYTES', str(512 * 1024 * 1024)))
+# Directory for spill files (system temp dir if empty)
+OUTPUT_SPILL_DIR = os.environ.get('OUTPUT_SPILL_DIR') or None
+
+_CHUNK_SIZE = 64 * 1024
+
+
+class SpilledText(str):
+    """Head of an output that did not fit in memory; `path` is the file with the full output."""
+
+    path: Optional[str] = None
+
+
+def read_spill(path: str, limit: Optional[int] = None) -> str:
+    """Decoded content of a spill file (its first `limit` bytes if given)."""
+    with open(path, "rb") as f:
+        data = f.read() if limit is None else f.read(limit)
+    return data.decode('utf-8', errors='ignore')
+
+
+def discard_spill(path: Optional[str]) -> None:
+    """Remove a spill file (no-op for None)."""
+    if path:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+class BoundedOutput:
+    """Byte sink keeping at most `memory_limit` bytes in memory and spilling the full stream to disk."""
+
+    def __init__(self, memory_limit: int = OUTPUT_MEMORY_LIMIT, spill_max_bytes: int = OUTPUT_SPILL_MAX_BYTES):
+        self.memory_limit = max(0, memory_limit)
+        self.spill_max_bytes = spill_max_bytes
+        self.total_bytes = 0
+        self.truncated = False
+        self.path: Optional[str] = None
+        self._head = bytearray()
+        self._file = None
+
+    def write(self, data: bytes) -> None:
+        if not data:
+            return
+        self.total_bytes += len(data)
+        if self._file is None and len(self._head) + len(data) <= self.memory_limit:
+            self._head += data
+            return
+        if self._file is None:
+            fd, self.path = tempfile.mkstemp(prefix="kappi-output-", dir=OUTPUT_SPILL_DIR)
+            self._file = os.fdopen(fd, "wb")
+            self._file.write(self._head)
+        room = self.spill_max_bytes - self._file.tell()
+        if room < len(data):
+            self.truncated = True
+            data = data[:max(0, room)]
+        if len(self._head) < self.memory_limit:
+            self._head += data[:self.memory_limit - len(self._head)]
+        self._file.write(data)
+
+    @property
+    def spilled(self) -> bool:
+        return self.path is not None
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self) -> None:
+        self.close()
+        if self.path:
+            discard_spill(self.path)
+            self.path = None
+
+    def text(self, keep_spill: bool = False) -> str:
+        """
+        Decoded output. A spilled stream yields its head plus a note; with keep_spill the result
+        is a SpilledText whose path the caller must discard, otherwise the file is removed here.
+        """
+        self.close()
+        text = self._head.decode('utf-8', errors='ignore')
+        if not self.spilled:
+            return text
+        note = f"\n... [вывод усечён: показано {len(self._head)} из {self.total_bytes} байт"
+        note += ", превышен предел сохранения]" if self.truncated else "]"
+        if not keep_spill:
+            self.discard()
+            return text + note
+        spilled = SpilledText(text + note)
+        spilled.path = self.path
+        return spilled
+
+
+def drain_channel(
+    channel,
+    stdout: BoundedOutput,
+    stderr: BoundedOutput,
+    deadline: Optional[float] = None,
+    idle_timeout: Optional[float] = None,
+) -> int:
+    """
+    Read a paramiko channel until the remote side closes its output, feeding both sinks.
+    Returns the command's exit status. TimeoutError, with the sinks keeping what was read,
+    once deadline (time.monotonic()) passes or idle_timeout seconds go by without output
+    while the command is still running.
+    """
+    last_output = time.monotonic()
+    while True:
+        # EOF is looked at before the buffers: data that came with it is read on this pass
+        finished = channel.eof_received or channel.closed
+        progressed = False
+        if channel.recv_ready():
+            stdout.write(channel.recv(_CHUNK_SIZE))
+            progressed = True
+        if channel.recv_stderr_ready():
+            stderr.write(channel.recv_stderr(_CHUNK_SIZE))
+            progressed = True
+        if progressed:
+            last_output = time.monotonic()
+            continue
+        if finished:
+            break
+        expired = _expired(deadline, idle_timeout, last_output)
+        if expired:
+            stdout.close()
+            stderr.close()
+            raise TimeoutError(expired)
+        # Channel.fileno() becomes readable on new stdout/stderr data and on EOF
+        select.select([channel], [], [], 1.0)
+    stdout.close()
+    stderr.close()
+    return channel.recv_exit_status()
+
+
+async def drain_process(
+    process,
+    stdout: BoundedOutput,
+    stderr: BoundedOutput,
+    deadline: Optional[float] = None,
+    idle_timeout: Optional[float] = None,
+) -> Optional[int]:
+    """
+    asyncio counterpart of drain_channel for an asyncssh process opened with encoding=None:
+    both streams are read in chunks into the sinks. Returns the exit status (None if the
+    remote side sent none); deadline and idle_timeout as in drain_channel.
+    """
+    last_output = time.monotonic()
+
+    async def pump(stream, sink: BoundedOutput) -> None:
+        nonlocal last_output
+        while True:
+            data = await stream.read(_CHUNK_SIZE)
+            if not data:
+                return
+            last_output = time.monotonic()
+            sink.write(data)
+
+    pumps = asyncio.ensure_future(asyncio.gather(pump(process.stdout, stdout), pump(process.stderr, stderr)))
+    try:
+        while not pumps.done():
+            now = time.monotonic()
+            idle_limit = None if idle_timeout is None else last_output + idle_timeout
+            limits = [t for t in (deadline, idle_limit) if t is not None]
+            await asyncio.wait({pumps}, timeout=max(0.0, min(limits) - now) if limits else None)
+            expired = None if pumps.done() else _expired(deadline, idle_timeout, last_output)
+            if expired:
+                raise TimeoutError(expired)
+        pumps.result()
+    finally:
+        if not pumps.done():
+            pumps.cancel()
+            await asyncio.gather(pumps, return_exceptions=True)
+        stdout.close()
+        stderr.close()
+    await process.wait_closed()
+    return process.exit_status
+
+
+def _expired(deadline: Optional[float], idle_timeout: Optional[float], last_output: float) -> Optional[str]:
+    """Why a still running command must be stopped now, or None."""
+    now = time.monotonic()
+    if deadline is not None and now >= deadline:
+        return "command did not finish before its deadline"
+    if idle_timeout is not None and now - last_output >= idle_timeout:
+        return f"command produced no output for {idle_timeout:g} s"
+    return None
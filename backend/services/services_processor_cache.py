@@ -0,0 +1,186 @@
+"""
+services/services_processor_cache.py
+Content-addressed caches for processor scripts.
+
+Syntax validation (`bash -n`) depends only on the script text, so its result is kept
+per sha256 of the normalized script: the check runs once per script version instead
+of once per execution.
+
+Processor results are a function of (processor script, CHECK_OUTPUT, ETALON_INPUT);
+hosts returning identical output for a check reuse the cached classification instead
+of running the processor again. In-process LRU with TTL, optionally shared through Mongo.
+"""
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+from config.config_init import db, logger
+
+# Max distinct processor scripts whose syntax check result is kept
+SYNTAX_CACHE_SIZE = int(os.environ.get('SYNTAX_CACHE_SIZE', '4096'))
+# Processor result cache: max entries in memory (0 disables), entry lifetime in seconds
+PROCESSOR_RESULT_CACHE_SIZE = int(os.environ.get('PROCESSOR_RESULT_CACHE_SIZE', '20000'))
+PROCESSOR_RESULT_CACHE_TTL = int(os.environ.get('PROCESSOR_RESULT_CACHE_TTL', '3600'))
+# Share cached results between backend processes through the processor_result_cache collection
+PROCESSOR_RESULT_CACHE_MONGO = os.environ.get('PROCESSOR_RESULT_CACHE_MONGO', 'false').lower() in ('1', 'true', 'yes')
+
+V = TypeVar("V")
+
+
+def normalize_script_text(text: Optional[str]) -> str:
+    """CRLF/CR -> LF, the same normalization run_processor_on_output applies."""
+    return (text or '').replace('\r\n', '\n').replace('\r', '\n')
+
+
+def content_hash(text: Optional[str]) -> str:
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+
+class LRUCache(Generic[V]):
+    """Small bounded LRU mapping with optional TTL (not thread-safe; used from the event loop)."""
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, V]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at and expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: V) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0.0
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def drop(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Remove entries whose key matches predicate. Returns the number removed."""
+        keys = [key for key in self._data if predicate(key)]
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# sha256(normalized script) -> (valid, error message)
+_syntax_cache: LRUCache[Tuple[bool, str]] = LRUCache(SYNTAX_CACHE_SIZE)
+
+
+def get_cached_syntax(script: str) -> Optional[Tuple[bool, str]]:
+    """Cached `bash -n` result for the script, None if unknown."""
+    return _syntax_cache.get(content_hash(normalize_script_text(script)))
+
+
+def store_syntax(script: str, valid: bool, error: str = "") -> None:
+    _syntax_cache.put(content_hash(normalize_script_text(script)), (valid, error))
+
+
+# Result fields reused on a cache hit; "output_suffix" is what the processor appended to the raw output
+_RESULT_FIELDS = ("success", "output_suffix", "error", "check_status", "error_code", "error_description", "actual_data")
+
+_result_cache: LRUCache[Dict[str, Any]] = LRUCache(max(1, PROCESSOR_RESULT_CACHE_SIZE), PROCESSOR_RESULT_CACHE_TTL)
+_result_stats = {"hits": 0, "mongo_hits": 0, "misses": 0, "stores": 0}
+
+
+def result_cache_enabled() -> bool:
+    return PROCESSOR_RESULT_CACHE_SIZE > 0
+
+
+def result_cache_key(processor_script: str, raw_output: Optional[str], reference_data: Optional[str]) -> str:
+    """Key of a processor run: hashes of normalized script, raw output and reference."""
+    parts = (
+        content_hash(normalize_script_text(processor_script)),
+        content_hash(raw_output),
+        content_hash(reference_data),
+    )
+    return content_hash(":".join(parts))
+
+
+async def get_cached_result(key: str) -> Optional[Dict[str, Any]]:
+    """Cached result fields for key (memory, then Mongo if enabled), None on miss."""
+    if not result_cache_enabled():
+        return None
+    fields = _result_cache.get(key)
+    if fields is not None:
+        _result_stats["hits"] += 1
+        return fields
+    if PROCESSOR_RESULT_CACHE_MONGO:
+        try:
+            doc = await db.processor_result_cache.find_one(
+                {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}}, {"fields": 1}
+            )
+        except Exception as e:
+            logger.warning(f"Processor result cache lookup failed: {e}")
+            doc = None
+        if doc and doc.get("fields"):
+            _result_cache.put(key, doc["fields"])
+            _result_stats["mongo_hits"] += 1
+            return doc["fields"]
+    _result_stats["misses"] += 1
+    return None
+
+
+async def store_result(key: str, fields: Dict[str, Any]) -> None:
+    if not result_cache_enabled():
+        return
+    fields = {name: fields.get(name) for name in _RESULT_FIELDS}
+    _result_cache.put(key, fields)
+    _result_stats["stores"] += 1
+    if PROCESSOR_RESULT_CACHE_MONGO:
+        try:
+            await db.processor_result_cache.replace_one(
+                {"_id": key},
+                {
+                    "fields": fields,
+                    "expires_at": datetime.now(timezone.utc) + timedelta(seconds=PROCESSOR_RESULT_CACHE_TTL),
+                },
+                upsert=True,
+            )
+        except Exception as e:
+            logger.warning(f"Processor result cache store failed: {e}")
+
+
+def processor_cache_stats() -> Dict[str, Any]:
+    """Hit-rate and size statistics of the processor caches."""
+    lookups = _result_stats["hits"] + _result_stats["mongo_hits"] + _result_stats["misses"]
+    hits = _result_stats["hits"] + _result_stats["mongo_hits"]
+    return {
+        "result_cache": {
+            "enabled": result_cache_enabled(),
+            "mongo": PROCESSOR_RESULT_CACHE_MONGO,
+            "size": len(_result_cache),
+            "max_size": PROCESSOR_RESULT_CACHE_SIZE,
+            "ttl_seconds": PROCESSOR_RESULT_CACHE_TTL,
+            **_result_stats,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        },
+        "syntax_cache": {
+            "size": len(_syntax_cache),
+            "max_size": SYNTAX_CACHE_SIZE,
+        },
+    }
+
+
+def clear_processor_caches() -> None:
+    _result_cache.clear()
+    _syntax_cache.clear()
+    for name in _result_stats:
+        _result_stats[name] = 0
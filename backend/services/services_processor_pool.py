@@ -0,0 +1,243 @@
+"""
+services/services_processor_pool.py
+Pool of pre-forked bash workers for processor scripts.
+
+Each worker is a long-lived bash loop. A job (script, check output, reference) is
+handed over in files of the worker's private directory (on /dev/shm when available),
+the worker runs the script in a fresh subshell with tracing enabled (like `bash -x -c`)
+and reports the exit code over its stdout pipe. No fork/exec of bash per check, and
+large outputs no longer need to pass through the process environment.
+
+Traces of the script are prefixed with "++" instead of "+" (one eval level deeper);
+the exit-code extraction in run_processor_on_output is not affected.
+"""
+
+import asyncio
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+from typing import List, Optional
+
+from config.config_init import logger
+
+# Number of warm workers; 0 disables the pool (a new bash process per check)
+PROCESSOR_POOL_SIZE = int(os.environ.get('PROCESSOR_POOL_SIZE', '4'))
+# Worker is replaced after this many jobs
+PROCESSOR_WORKER_MAX_JOBS = int(os.environ.get('PROCESSOR_WORKER_MAX_JOBS', '500'))
+# CHECK_OUTPUT / ETALON_INPUT larger than this are not exported to child processes
+# (Linux limits one environment string to 128 KiB); the script still sees them as variables
+PROCESSOR_ENV_MAX_BYTES = int(os.environ.get('PROCESSOR_ENV_MAX_BYTES', str(127 * 1024)))
+
+_WORKER_LOOP = r'''
+__kappi_dir=$KAPPI_WORKER_DIR
+unset KAPPI_WORKER_DIR
+while IFS= read -r __kappi_cmd; do
+    [ "$__kappi_cmd" = run ] || break
+    IFS= read -r -d '' __kappi_script < "$__kappi_dir/script"
+    (
+        IFS= read -r -d '' CHECK_OUTPUT < "$__kappi_dir/output"
+        IFS= read -r -d '' ETALON_INPUT < "$__kappi_dir/reference"
+        if [ -e "$__kappi_dir/export" ]; then export CHECK_OUTPUT ETALON_INPUT; fi
+        if [ -e "$__kappi_dir/output_file" ]; then
+            IFS= read -r -d '' CHECK_OUTPUT_FILE < "$__kappi_dir/output_file"
+            export CHECK_OUTPUT_FILE
+        fi
+        eval "set -x
+$__kappi_script"
+    ) >"$__kappi_dir/stdout" 2>"$__kappi_dir/stderr" </dev/null
+    printf 'done %d\n' $?
+done
+'''
+
+
+class ProcessorWorkerError(RuntimeError):
+    """Worker exited or answered unexpectedly; the job can be retried elsewhere."""
+
+
+def _work_root() -> Optional[str]:
+    return "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+
+
+class _ProcessorWorker:
+    def __init__(self, proc: asyncio.subprocess.Process, workdir: str):
+        self.proc = proc
+        self.workdir = workdir
+        self.jobs = 0
+        self.loop = asyncio.get_running_loop()
+
+    def usable(self) -> bool:
+        """Alive and bound to the current event loop (pipes belong to the loop that spawned it)."""
+        return self.proc.returncode is None and self.loop is asyncio.get_running_loop()
+
+    def abandon(self) -> None:
+        """Kill without awaiting; for workers of another (possibly closed) event loop."""
+        try:
+            os.killpg(self.proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    @classmethod
+    async def spawn(cls) -> "_ProcessorWorker":
+        workdir = tempfile.mkdtemp(prefix="kappi-processor-", dir=_work_root())
+        env = os.environ.copy()
+        env.pop('CHECK_OUTPUT', None)
+        env.pop('ETALON_INPUT', None)
+        env.pop('CHECK_OUTPUT_FILE', None)
+        env['KAPPI_WORKER_DIR'] = workdir
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                'bash', '-c', _WORKER_LOOP,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+                env=env,
+                start_new_session=True,
+            )
+        except Exception:
+            shutil.rmtree(workdir, ignore_errors=True)
+            raise
+        return cls(proc, workdir)
+
+    def _write(self, name: str, data: str) -> None:
+        with open(os.path.join(self.workdir, name), 'w', encoding='utf-8') as f:
+            f.write(data)
+
+    def _read(self, name: str) -> str:
+        with open(os.path.join(self.workdir, name), 'rb') as f:
+            return f.read().decode('utf-8', errors='replace')
+
+    async def run(
+        self,
+        script: str,
+        check_output: str,
+        reference: str,
+        timeout: float,
+        output_file: Optional[str] = None,
+    ) -> subprocess.CompletedProcess:
+        self._write('script', script)
+        self._write('output', check_output)
+        self._write('reference', reference)
+        output_file_ref = os.path.join(self.workdir, 'output_file')
+        if output_file:
+            self._write('output_file', output_file)
+        elif os.path.exists(output_file_ref):
+            os.unlink(output_file_ref)
+        export_flag = os.path.join(self.workdir, 'export')
+        if len(check_output.encode('utf-8')) <= PROCESSOR_ENV_MAX_BYTES and \
+                len(reference.encode('utf-8')) <= PROCESSOR_ENV_MAX_BYTES:
+            open(export_flag, 'w').close()
+        elif os.path.exists(export_flag):
+            os.unlink(export_flag)
+
+        try:
+            self.proc.stdin.write(b"run\n")
+            await self.proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError) as e:
+            raise ProcessorWorkerError(f"worker stdin closed: {e}")
+        try:
+            line = await asyncio.wait_for(self.proc.stdout.readline(), timeout)
+        except asyncio.TimeoutError:
+            raise subprocess.TimeoutExpired(['bash', '-x', '-c', script], timeout)
+        if not line.startswith(b"done "):
+            raise ProcessorWorkerError(f"unexpected worker reply {line[:80]!r}")
+        self.jobs += 1
+        return subprocess.CompletedProcess(
+            ['bash', '-x', '-c', script],
+            int(line.split()[1]),
+            self._read('stdout'),
+            self._read('stderr'),
+        )
+
+    async def close(self, kill: bool = False) -> None:
+        if self.proc.returncode is None:
+            if kill:
+                try:
+                    os.killpg(self.proc.pid, signal.SIGKILL)
+                except (ProcessLookupError, PermissionError):
+                    pass
+            else:
+                try:
+                    self.proc.stdin.close()
+                except Exception:
+                    pass
+            try:
+                await asyncio.wait_for(self.proc.wait(), 5)
+            except asyncio.TimeoutError:
+                self.proc.kill()
+                await self.proc.wait()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class ProcessorPool:
+    """Fixed-size pool of bash workers; at most `size` processor jobs run at once."""
+
+    def __init__(self, size: int = PROCESSOR_POOL_SIZE, max_jobs: int = PROCESSOR_WORKER_MAX_JOBS):
+        self.size = max(1, size)
+        self.max_jobs = max(1, max_jobs)
+        self._idle: List[_ProcessorWorker] = []
+        self._slots = asyncio.Semaphore(self.size)
+
+    async def warm(self) -> None:
+        """Start workers up to the pool size so the first checks do not pay the spawn cost."""
+        while len(self._idle) < self.size:
+            self._idle.append(await _ProcessorWorker.spawn())
+
+    async def run(
+        self,
+        script: str,
+        check_output: str,
+        reference: str,
+        timeout: float,
+        output_file: Optional[str] = None,
+    ) -> subprocess.CompletedProcess:
+        """
+        Run processor script on a worker. Raises subprocess.TimeoutExpired on timeout
+        (the worker is killed and replaced) and ProcessorWorkerError if the worker died.
+        """
+        async with self._slots:
+            worker = None
+            while self._idle and worker is None:
+                candidate = self._idle.pop()
+                if candidate.usable():
+                    worker = candidate
+                else:
+                    candidate.abandon()
+            if worker is None:
+                worker = await _ProcessorWorker.spawn()
+            try:
+                result = await worker.run(script, check_output, reference, timeout, output_file)
+            except BaseException:
+                await asyncio.shield(worker.close(kill=True))
+                raise
+            if worker.jobs >= self.max_jobs:
+                await worker.close()
+            else:
+                self._idle.append(worker)
+            return result
+
+    async def close(self) -> None:
+        workers, self._idle = self._idle, []
+        for worker in workers:
+            if worker.usable():
+                await worker.close()
+            else:
+                worker.abandon()
+
+
+processor_pool: Optional[ProcessorPool] = ProcessorPool() if PROCESSOR_POOL_SIZE > 0 else None
+
+
+async def start_processor_pool() -> None:
+    if processor_pool is not None:
+        try:
+            await processor_pool.warm()
+        except Exception as e:
+            logger.warning(f"Could not start processor workers: {e}")
+
+
+async def stop_processor_pool() -> None:
+    if processor_pool is not None:
+        await processor_pool.close()
@@ -0,0 +1,469 @@
+"""
+services/services_project_execution.py
+Project run: preflight checks + check execution per host, yield SSE event dicts.
+Hosts are processed concurrently within per-run and global concurrency limits;
+checks of one host run concurrently as channels of its SSH connection.
+"""
+
+import asyncio
+import os
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import AsyncGenerator, Awaitable, Callable, Dict, Any, List, Mapping, Optional, Tuple
+
+from config.config_init import db, logger
+from models.models_init import Host, System, Script, ProjectTask, Execution, ExecutionResult
+from services.services_execution import (
+    SSH_MAX_SESSIONS_PER_HOST,
+    create_ssh_manager,
+    create_winrm_manager,
+    execute_check_with_processor,
+    process_command_result,
+    _check_network_access,
+    sweep_network_access,
+    run_ssh_login_and_sudo,
+    run_winrm_login,
+    _check_admin_access,
+    save_failed_executions,
+)
+from services.services_bundle import execute_bundle, resolve_execution_mode
+from services.services_execution_queue import EXECUTION_QUEUE_ENABLED, run_task_via_queue
+from services.services_write_buffer import ExecutionWriteBuffer
+from utils.db_utils import prepare_for_mongo, parse_from_mongo, decode_script_from_storage
+from utils.ssh_logger import end_ssh_log_session, ssh_log_context, start_ssh_log_session
+from utils.error_codes import get_error_code_for_check_type, get_error_description
+
+# Default number of hosts processed in parallel within one project run
+EXECUTION_PARALLEL_HOSTS = int(os.environ.get('EXECUTION_PARALLEL_HOSTS', '10'))
+# Upper bound of hosts in flight across all concurrent project runs of this process
+EXECUTION_GLOBAL_PARALLEL_HOSTS = int(os.environ.get('EXECUTION_GLOBAL_PARALLEL_HOSTS', '50'))
+
+_global_host_slots = asyncio.Semaphore(max(1, EXECUTION_GLOBAL_PARALLEL_HOSTS))
+
+EmitFn = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def resolve_parallel_hosts(requested: Optional[int]) -> int:
+    """Per-run host concurrency: requested value (or default), clamped to [1, global limit]."""
+    value = requested if requested else EXECUTION_PARALLEL_HOSTS
+    return max(1, min(int(value), max(1, EXECUTION_GLOBAL_PARALLEL_HOSTS)))
+
+
+@dataclass(frozen=True)
+class RunPlan:
+    """Hosts, systems and decoded scripts of a project run, resolved once before the first host starts."""
+    hosts: Mapping[str, Host]
+    systems: Mapping[str, System]
+    scripts: Mapping[str, Script]
+
+    def task_scripts(self, task_obj: ProjectTask) -> List[Script]:
+        """Scripts of a task in task order; scripts missing from the database are skipped."""
+        return [self.scripts[script_id] for script_id in task_obj.script_ids if script_id in self.scripts]
+
+
+async def load_run_plan(tasks: List[dict]) -> RunPlan:
+    """Fetch everything the tasks reference with one $in query per collection."""
+    host_ids = list({t["host_id"] for t in tasks if t.get("host_id")})
+    system_ids = list({t["system_id"] for t in tasks if t.get("system_id")})
+    script_ids = list({script_id for t in tasks for script_id in (t.get("script_ids") or [])})
+
+    host_docs, system_docs, script_docs = await asyncio.gather(
+        db.hosts.find({"id": {"$in": host_ids}}, {"_id": 0}).to_list(None),
+        db.systems.find({"id": {"$in": system_ids}}, {"_id": 0}).to_list(None),
+        db.scripts.find({"id": {"$in": script_ids}}, {"_id": 0}).to_list(None),
+    )
+    hosts = {d["id"]: Host(**parse_from_mongo(d)) for d in host_docs}
+    systems = {d["id"]: System(**parse_from_mongo(d)) for d in system_docs}
+    # Decode script content and processor_script from Base64 once per run, not once per host
+    scripts = {d["id"]: Script(**decode_script_from_storage(parse_from_mongo(d))) for d in script_docs}
+    return RunPlan(
+        hosts=MappingProxyType(hosts),
+        systems=MappingProxyType(systems),
+        scripts=MappingProxyType(scripts),
+    )
+
+
+class HostConnectionUsers:
+    """
+    Tasks using the connections of one SSH/WinRM manager, counted per host: the host's
+    connection is released after its last task, not under another task still running on it.
+    """
+
+    def __init__(self):
+        self._counts: Counter = Counter()
+
+    def acquire(self, host_id: Optional[str]) -> None:
+        self._counts[host_id] += 1
+
+    async def release(self, host_id: Optional[str], *managers) -> None:
+        self._counts[host_id] -= 1
+        if self._counts[host_id] > 0:
+            return
+        del self._counts[host_id]
+        for manager in managers:
+            if manager is not None:
+                await manager.arelease(host_id)
+
+
+def _check_error(check_type: str, ok: bool):
+    """Return (error_code, error_info) for a failed preliminary check, (None, None) otherwise."""
+    if ok:
+        return None, None
+    error_code = get_error_code_for_check_type(check_type)
+    error_info = get_error_description(error_code) if error_code else None
+    return error_code, error_info
+
+
+async def _fail_task(
+    emit: EmitFn,
+    *,
+    scripts,
+    project_id: str,
+    task_obj: ProjectTask,
+    session_id: str,
+    host: Host,
+    system: System,
+    error_msg: str,
+    check_type: str,
+    user_id: str,
+    error_code: Optional[int],
+    error_info: Optional[dict],
+    writer: ExecutionWriteBuffer,
+) -> bool:
+    """Persist failed executions for a host that did not pass a preliminary check."""
+    await save_failed_executions(
+        scripts=scripts,
+        project_id=project_id,
+        task_id=task_obj.id,
+        session_id=session_id,
+        host=host,
+        system=system,
+        error_msg=error_msg,
+        check_type=check_type,
+        user_id=user_id,
+        writer=writer,
+    )
+    await writer.set_task_status(task_obj.id, "failed")
+    await emit({'type': 'task_error', 'host_name': host.name, 'error': error_msg, 'error_code': error_code, 'error_info': error_info})
+    return False
+
+
+async def _execute_task(
+    task: dict,
+    *,
+    project_id: str,
+    session_id: str,
+    user_id: str,
+    emit: EmitFn,
+    writer: ExecutionWriteBuffer,
+    plan: RunPlan,
+    ssh_manager=None,
+    network: Optional[Mapping[str, Tuple[bool, str]]] = None,
+    winrm_manager=None,
+) -> bool:
+    """
+    Run one project task (one host with multiple scripts).
+    Publishes events through `emit`; returns True if the host passed all preliminary checks.
+    With ssh_manager the login/sudo checks and all scripts share one SSH connection
+    (with winrm_manager one WinRM shell); up to SSH_MAX_SESSIONS_PER_HOST scripts run at once
+    (one at a time over WinRM). In bundle mode (see services_bundle) all commands are sent in
+    one invocation and only processors run per script.
+    Results and task statuses go through `writer` (flushed by the caller); host, system
+    and scripts come from the run's `plan`. `network` holds the run's reachability sweep;
+    hosts not in it are probed here.
+    """
+    task_obj = ProjectTask(**parse_from_mongo(task))
+
+    # Get host
+    host = plan.hosts.get(task_obj.host_id)
+    if host is None:
+        await emit({'type': 'error', 'message': f'Хост не найден: {task_obj.host_id}'})
+        return False
+
+    # Get system
+    system = plan.systems.get(task_obj.system_id)
+    if system is None:
+        await emit({'type': 'error', 'message': f'Система не найдена: {task_obj.system_id}'})
+        return False
+
+    # Get scripts
+    scripts = plan.task_scripts(task_obj)
+
+    if not scripts:
+        await emit({'type': 'error', 'message': 'Скрипты не найдены для задания'})
+        return False
+
+    # Update task status
+    await writer.set_task_status(task_obj.id, "running")
+
+    await emit({'type': 'task_start', 'host_name': host.name, 'host_address': host.hostname, 'system_name': system.name, 'scripts_count': len(scripts)})
+
+    fail_ctx = dict(
+        scripts=scripts, project_id=project_id, task_obj=task_obj, session_id=session_id,
+        host=host, system=system, user_id=user_id, writer=writer,
+    )
+
+    # 1. Check network access
+    if network is not None and host.id in network:
+        network_ok, network_msg = network[host.id]
+    else:
+        logger.info(f"Checking network access for host: {host.name} ({host.hostname}:{host.port})")
+        network_ok, network_msg = await asyncio.to_thread(_check_network_access, host)
+    logger.info(f"Network check result for {host.name}: {network_ok}, message: {network_msg}")
+
+    network_error_code, network_error_info = _check_error('network', network_ok)
+    await emit({'type': 'check_network', 'host_name': host.name, 'success': network_ok, 'message': network_msg, 'error_code': network_error_code, 'error_info': network_error_info})
+
+    if not network_ok:
+        return await _fail_task(
+            emit, **fail_ctx, error_msg=network_msg, check_type='network',
+            error_code=network_error_code, error_info=network_error_info,
+        )
+
+    # 2. Check login and sudo (combined for SSH to avoid multiple connections)
+    if host.connection_type == "winrm":
+        # For WinRM, check login first
+        logger.info(f"Starting WinRM login check for host: {host.name} ({host.hostname}:{host.port})")
+        try:
+            login_ok, login_msg = await run_winrm_login(host, winrm_manager)
+        except Exception as e:
+            logger.exception(f"WinRM login check failed with exception for {host.name}: {e}")
+            login_ok, login_msg = False, f"Ошибка проверки входа: {getattr(e, 'message', str(e))}"
+        logger.info(f"WinRM login check result for {host.name}: ok={login_ok}, msg={str(login_msg)[:80] if login_msg else ''}")
+
+        login_error_code, login_error_info = _check_error('login', login_ok)
+        await emit({'type': 'check_login', 'host_name': host.name, 'success': login_ok, 'message': login_msg, 'error_code': login_error_code, 'error_info': login_error_info})
+
+        if not login_ok:
+            return await _fail_task(
+                emit, **fail_ctx, error_msg=login_msg, check_type='login',
+                error_code=login_error_code, error_info=login_error_info,
+            )
+
+        # Then check admin access
+        sudo_ok, sudo_msg = await asyncio.to_thread(_check_admin_access, host, winrm_manager)
+        sudo_error_code, sudo_error_info = _check_error('admin', sudo_ok)
+    else:
+        # For SSH, check both login and sudo in one connection
+        login_ok, login_msg, sudo_ok, sudo_msg = await run_ssh_login_and_sudo(host, ssh_manager)
+
+        login_error_code, login_error_info = _check_error('login', login_ok)
+        await emit({'type': 'check_login', 'host_name': host.name, 'success': login_ok, 'message': login_msg, 'error_code': login_error_code, 'error_info': login_error_info})
+
+        if not login_ok:
+            return await _fail_task(
+                emit, **fail_ctx, error_msg=login_msg, check_type='login',
+                error_code=login_error_code, error_info=login_error_info,
+            )
+
+        sudo_error_code, sudo_error_info = _check_error('sudo', sudo_ok)
+
+    await emit({'type': 'check_sudo', 'host_name': host.name, 'success': sudo_ok, 'message': sudo_msg, 'error_code': sudo_error_code, 'error_info': sudo_error_info})
+
+    if not sudo_ok:
+        check_type = 'admin' if host.connection_type == 'winrm' else 'sudo'
+        return await _fail_task(
+            emit, **fail_ctx, error_msg=sudo_msg, check_type=check_type,
+            error_code=sudo_error_code, error_info=sudo_error_info,
+        )
+
+    # All checks passed, proceed with script execution
+    scripts_completed = 0
+    # Checks of one host run as parallel channels; slow ones no longer block the quick ones.
+    # A WinRM shell runs one command at a time: more slots would only hold executor threads
+    script_slots = asyncio.Semaphore(1 if host.connection_type == "winrm" else max(1, SSH_MAX_SESSIONS_PER_HOST))
+    # Bundle mode: all command outputs collected in one remote invocation up front
+    bundle_results: Optional[Dict[str, ExecutionResult]] = None
+
+    async def _run_script(script: Script) -> None:
+        nonlocal scripts_completed
+        # Get reference data for this script
+        reference_data = task_obj.reference_data.get(script.id, '') if task_obj.reference_data else ''
+        processor_rules = script.processor_rules if script.processor_type == "rules" else None
+
+        # Use processor if available
+        async with script_slots:
+            if bundle_results is not None:
+                result = await process_command_result(
+                    host, bundle_results[script.id], script.processor_script, reference_data,
+                    script_id=script.id, script_name=script.name,
+                    processor_rules=processor_rules,
+                )
+            else:
+                result = await execute_check_with_processor(
+                    host, script.content, script.processor_script, reference_data,
+                    script_id=script.id, script_name=script.name,
+                    ssh_manager=ssh_manager,
+                    processor_rules=processor_rules,
+                    winrm_manager=winrm_manager,
+                )
+
+        scripts_completed += 1
+        await emit({'type': 'script_progress', 'host_name': host.name, 'completed': scripts_completed, 'total': len(scripts)})
+
+        # Save execution result with session_id
+        execution = Execution(
+            project_id=project_id,
+            project_task_id=task_obj.id,
+            execution_session_id=session_id,
+            host_id=host.id,
+            system_id=system.id,
+            script_id=script.id,
+            script_name=script.name,
+            success=result.success,
+            output=result.output,
+            error=result.error,
+            check_status=result.check_status,
+            error_code=result.error_code,
+            error_description=result.error_description,
+            reference_data=reference_data if reference_data and reference_data.strip() else None,
+            actual_data=result.actual_data,
+            executed_by=user_id
+        )
+
+        await writer.add_execution(prepare_for_mongo(execution.model_dump()))
+
+    try:
+        if resolve_execution_mode(host) == 'bundle':
+            bundle_results = await execute_bundle(host, scripts, ssh_manager, winrm_manager)
+
+        script_runs = [asyncio.ensure_future(_run_script(script)) for script in scripts]
+        try:
+            await asyncio.gather(*script_runs)
+        except BaseException:
+            for run in script_runs:
+                run.cancel()
+            raise
+
+        # Update task status - host is successful if all preliminary checks passed
+        await writer.set_task_status(task_obj.id, "completed")
+
+        await emit({'type': 'task_complete', 'host_name': host.name, 'success': True})
+        return True
+
+    except Exception as e:
+        await writer.set_task_status(task_obj.id, "failed")
+        # Log detailed error server-side, send generic error to client
+        logger.error(f"Error during task execution on host '{host.name}' for task '{task_obj.id}': {e}")
+        await emit({'type': 'task_error', 'host_name': host.name, 'error': 'Internal error during task execution'})
+        return False
+
+
+async def run_project_events(
+    project_id: str,
+    user_id: str,
+    parallel_hosts: Optional[int] = None,
+    session_id: Optional[str] = None,
+) -> AsyncGenerator[Dict[str, Any], None]:
+    """
+    Execute all tasks of a project and yield SSE event dicts.
+    Up to `parallel_hosts` hosts run at once (bounded by EXECUTION_GLOBAL_PARALLEL_HOSTS
+    across runs); events of in-flight hosts are interleaved, per-host order is preserved.
+    session_id: id of the run chosen by the caller (a new one by default).
+    """
+    # Get project
+    project = await db.projects.find_one({"id": project_id}, {"_id": 0})
+    if not project:
+        yield {'type': 'error', 'message': 'Проект не найден'}
+        return
+
+    # Create unique session ID for this execution
+    session_id = session_id or str(uuid.uuid4())
+
+    # Don't update project status - projects are reusable templates now
+    yield {'type': 'status', 'message': 'Начало выполнения проекта', 'session_id': session_id}
+
+    # Get all tasks for this project
+    tasks = await db.project_tasks.find({"project_id": project_id}, {"_id": 0}).to_list(1000)
+
+    if not tasks:
+        yield {'type': 'error', 'message': 'Нет заданий для выполнения'}
+        return
+
+    total_tasks = len(tasks)
+    yield {'type': 'info', 'message': f'Всего заданий: {total_tasks}'}
+
+    # Hosts, systems and scripts of all tasks in a constant number of queries
+    plan = await load_run_plan(tasks)
+
+    # Probe every host at once: dead hosts fail in one timeout window, not one by one
+    network = await sweep_network_access(plan.hosts.values())
+    reachable = sum(1 for ok, _ in network.values() if ok)
+    yield {'type': 'info', 'message': f'Сетевой доступ: {reachable} из {len(network)} хостов'}
+
+    run_slots = asyncio.Semaphore(resolve_parallel_hosts(parallel_hosts))
+    events: asyncio.Queue = asyncio.Queue()
+    outcomes = []
+    # One authenticated SSH connection (WinRM shell) per host for the whole run
+    ssh_manager = create_ssh_manager()
+    winrm_manager = create_winrm_manager()
+    # Results and task statuses are written in batches
+    writer = ExecutionWriteBuffer()
+    # Several tasks of the run may target the same host and share its connection
+    host_users = HostConnectionUsers()
+    for task in tasks:
+        host_users.acquire(task.get('host_id'))
+
+    async def _run_task(task: dict) -> bool:
+        try:
+            if EXECUTION_QUEUE_ENABLED:
+                # The host runs on an execution worker; its events are relayed from the queue
+                return await run_task_via_queue(
+                    task, project_id=project_id, session_id=session_id, user_id=user_id,
+                    emit=events.put, network=network,
+                )
+            return await _execute_task(
+                task, project_id=project_id, session_id=session_id,
+                user_id=user_id, emit=events.put, writer=writer, plan=plan, ssh_manager=ssh_manager, network=network,
+                winrm_manager=winrm_manager,
+            )
+        except Exception as e:
+            logger.exception(f"Unexpected error while executing task {task.get('id')}: {e}")
+            await events.put({'type': 'task_error', 'host_name': task.get('host_id'), 'error': 'Internal error during task execution'})
+            return False
+        finally:
+            # Last task of the host in this run: free its connection
+            await host_users.release(task.get('host_id'), ssh_manager, winrm_manager)
+
+    async def _worker(task: dict) -> None:
+        if network.get(task.get('host_id'), (True, ''))[0]:
+            async with run_slots, _global_host_slots:
+                ok = await _run_task(task)
+        else:
+            # Unreachable host only records its failure: it does not wait for a host slot
+            ok = await _run_task(task)
+        outcomes.append(ok)
+
+    async def _supervise() -> None:
+        try:
+            await asyncio.gather(*(_worker(task) for task in tasks))
+        finally:
+            await events.put(None)
+
+    # SSH operations of this run also go to its own log file (GET .../ssh-log)
+    start_ssh_log_session(session_id, f"project {project_id}")
+    supervisor = asyncio.create_task(_supervise(), context=ssh_log_context(session_id))
+    try:
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            yield event
+        await supervisor
+    finally:
+        if not supervisor.done():
+            supervisor.cancel()
+        await ssh_manager.aclose_all()
+        await winrm_manager.aclose_all()
+        # Everything of this run is in Mongo before `complete` is sent
+        await writer.close()
+        end_ssh_log_session(session_id)
+
+    completed_tasks = sum(1 for ok in outcomes if ok)
+    failed_tasks = len(outcomes) - completed_tasks
+
+    # Send completion event (don't update project status - project is reusable)
+    final_status = "completed" if failed_tasks == 0 else "failed"
+    yield {'type': 'complete', 'status': final_status, 'completed': completed_tasks, 'failed': failed_tasks, 'total': total_tasks, 'successful_hosts': completed_tasks, 'session_id': session_id}
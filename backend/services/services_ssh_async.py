@@ -0,0 +1,391 @@
+"""
+services/services_ssh_async.py
+asyncio-native SSH backend (asyncssh) with the same contract as the paramiko functions
+in services_execution: login/sudo checks, command execution and Linux profile run.
+
+Selected with SSH_BACKEND=asyncssh. Connections and channels live on the event loop, so
+hosts in flight are not bounded by the default thread pool. Falls back to paramiko when
+asyncssh is not installed.
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from config.config_init import logger, decrypt_password
+from models.models_init import Host
+from services.services_credentials import cached_credential, host_password
+from services.services_execution import (
+    SSH_COMMAND_TIMEOUT,
+    SSH_CONNECT_TIMEOUT,
+    SSH_CHANNEL_OPEN_RETRIES,
+    SSH_KEEPALIVE_SECONDS,
+    SSH_MAX_SESSIONS_PER_HOST,
+    SSH_POOL_IDLE_SECONDS,
+    _profile_linux_command,
+)
+from services.services_output_capture import BoundedOutput, drain_process
+from utils.ssh_logger import log_ssh_connection, log_ssh_command, log_ssh_check
+
+# Optional: asyncssh for the asyncio SSH backend
+try:
+    import asyncssh
+    HAS_ASYNCSSH = True
+except ImportError:
+    asyncssh = None
+    HAS_ASYNCSSH = False
+
+# SSH implementation: "paramiko" (threads) or "asyncssh" (event loop)
+SSH_BACKEND = os.environ.get('SSH_BACKEND', 'paramiko')
+
+_fallback_warned = False
+
+
+def async_ssh_enabled() -> bool:
+    """True if the asyncssh backend is configured and available."""
+    global _fallback_warned
+    if SSH_BACKEND != "asyncssh":
+        return False
+    if not HAS_ASYNCSSH:
+        if not _fallback_warned:
+            logger.warning("SSH_BACKEND=asyncssh but asyncssh is not installed, using paramiko")
+            _fallback_warned = True
+        return False
+    return True
+
+
+def warn_unavailable_ssh_backend() -> None:
+    """Startup check: warn when SSH_BACKEND names a backend that will not be used."""
+    if SSH_BACKEND not in ("paramiko", "asyncssh"):
+        logger.warning(f"Unknown SSH_BACKEND={SSH_BACKEND!r}, using paramiko")
+    else:
+        async_ssh_enabled()
+
+
+def _transport_errors() -> tuple:
+    return (asyncssh.ConnectionLost, asyncssh.DisconnectError, OSError)
+
+
+async def _open_connection(host: Host):
+    """Open and authenticate a new asyncssh connection to host."""
+    options = dict(
+        host=host.hostname,
+        port=host.port,
+        username=host.username,
+        known_hosts=None,
+        connect_timeout=SSH_CONNECT_TIMEOUT,
+        login_timeout=SSH_CONNECT_TIMEOUT,
+        keepalive_interval=SSH_KEEPALIVE_SECONDS or None,
+    )
+    if host.auth_type == "password":
+        options["password"] = host_password(host)
+    else:  # key-based
+        if not host.ssh_key:
+            raise ValueError("SSH key not provided for key-based authentication")
+        options["client_keys"] = [cached_credential(
+            host.id, "asyncssh_key", host.ssh_key,
+            lambda: asyncssh.import_private_key(decrypt_password(host.ssh_key)),
+        )]
+    return await asyncssh.connect(**options)
+
+
+class AsyncSSHConnectionManager:
+    """
+    asyncssh counterpart of SSHConnectionManager: one authenticated connection per host,
+    at most `max_sessions` concurrent channels on it, idle connections closed on next use.
+    Must be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        idle_timeout: int = SSH_POOL_IDLE_SECONDS,
+        max_sessions: int = SSH_MAX_SESSIONS_PER_HOST,
+    ):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max(1, max_sessions)
+        self._conns: Dict[str, object] = {}
+        self._last_used: Dict[str, float] = {}
+        self._host_locks: Dict[str, asyncio.Lock] = {}
+        self._channel_slots: Dict[str, asyncio.Semaphore] = {}
+
+    async def get(self, host: Host):
+        """Return a live connection to host, authenticating only if there is none yet."""
+        await self.evict_idle()
+        lock = self._host_locks.setdefault(host.id, asyncio.Lock())
+        async with lock:
+            conn = self._conns.get(host.id)
+            if conn is not None and conn.is_closed():
+                logger.info(f"Pooled SSH connection to {host.hostname}:{host.port} dropped, reconnecting")
+                conn = None
+            if conn is None:
+                conn = await _open_connection(host)
+            self._conns[host.id] = conn
+            self._last_used[host.id] = time.monotonic()
+            return conn
+
+    def channel_slots(self, host: Host) -> asyncio.Semaphore:
+        """Semaphore bounding concurrent channels on the connection to host."""
+        return self._channel_slots.setdefault(host.id, asyncio.Semaphore(self.max_sessions))
+
+    def is_connected(self, host: Host) -> bool:
+        conn = self._conns.get(host.id)
+        return conn is not None and not conn.is_closed()
+
+    async def arelease(self, host_id: str) -> None:
+        """Close the connection to a host once the run is done with it."""
+        conn = self._conns.pop(host_id, None)
+        self._last_used.pop(host_id, None)
+        if conn is not None:
+            await self._close(conn)
+
+    async def evict_idle(self) -> None:
+        if self.idle_timeout <= 0:
+            return
+        deadline = time.monotonic() - self.idle_timeout
+        for host_id in [h for h, used in self._last_used.items() if used < deadline]:
+            await self.arelease(host_id)
+
+    async def aclose_all(self) -> None:
+        for host_id in list(self._conns):
+            await self.arelease(host_id)
+
+    @staticmethod
+    async def _close(conn) -> None:
+        try:
+            conn.close()
+            await conn.wait_closed()
+        except Exception:
+            pass
+
+
+class _Completed(NamedTuple):
+    exit_status: Optional[int]
+    stdout: str
+    stderr: str
+
+
+async def _execute(
+    conn,
+    command: str,
+    input: Optional[str],
+    keep_spill: bool,
+    stdout_sink=None,
+    timeout: Optional[float] = None,
+) -> _Completed:
+    """
+    Run command on a new channel of conn; output is bounded like on the paramiko path.
+    stdout_sink (a byte sink owned by the caller) receives stdout instead of a BoundedOutput.
+    """
+    process = await conn.create_process(command, encoding=None)
+    out_buf = stdout_sink if stdout_sink is not None else BoundedOutput()
+    err_buf = BoundedOutput()
+    try:
+        if input is not None:
+            process.stdin.write(input.encode("utf-8"))
+        process.stdin.write_eof()
+        if timeout is None:
+            exit_status = await drain_process(process, out_buf, err_buf, idle_timeout=SSH_COMMAND_TIMEOUT)
+        else:
+            exit_status = await drain_process(process, out_buf, err_buf, deadline=time.monotonic() + timeout)
+    except BaseException:
+        if stdout_sink is None:
+            out_buf.discard()
+        err_buf.discard()
+        raise
+    finally:
+        process.close()
+    stderr = err_buf.text()
+    stdout = out_buf.text(keep_spill=keep_spill) if stdout_sink is None else ""
+    return _Completed(exit_status, stdout, stderr)
+
+
+async def _run(
+    host: Host,
+    command: str,
+    manager: Optional[AsyncSSHConnectionManager],
+    input: Optional[str] = None,
+    keep_spill: bool = False,
+    stdout_sink=None,
+    timeout: Optional[float] = None,
+) -> _Completed:
+    """
+    Run command on a channel. With a manager the pooled connection is used (reconnecting
+    once if it dropped, backing off when sshd refuses more sessions); without one a
+    dedicated connection is opened and closed. Output is read in chunks and bounded by
+    OUTPUT_MEMORY_LIMIT; with keep_spill an oversized stdout is a SpilledText. As on the
+    paramiko path the command is stopped once it produces no output for SSH_COMMAND_TIMEOUT
+    seconds; with `timeout` it may instead run quietly for up to that many seconds in total.
+    """
+    if manager is None:
+        async with await _open_connection(host) as conn:
+            return await _execute(conn, command, input, keep_spill, stdout_sink, timeout)
+
+    refusals = 0
+    reconnected = False
+    while True:
+        try:
+            async with manager.channel_slots(host):
+                conn = await manager.get(host)
+                return await _execute(conn, command, input, keep_spill, stdout_sink, timeout)
+        except asyncssh.ChannelOpenError:
+            refusals += 1
+            if refusals > SSH_CHANNEL_OPEN_RETRIES:
+                raise
+            await asyncio.sleep(min(0.5 * 2 ** (refusals - 1), 5))
+        except asyncssh.PermissionDenied:
+            raise
+        except _transport_errors() as e:
+            if reconnected or manager.is_connected(host):
+                raise
+            reconnected = True
+            logger.warning(f"SSH transport to {host.hostname}:{host.port} lost ({e}), retrying on a new connection")
+
+
+def _failure_message(e: Exception) -> str:
+    if isinstance(e, asyncssh.PermissionDenied):
+        return f"Authentication failed: {str(e)}"
+    if isinstance(e, TimeoutError):
+        return f"Command timeout: {str(e)}"
+    if isinstance(e, asyncssh.Error):
+        return f"SSH error: {str(e)}"
+    return f"Connection error: {str(e)}"
+
+
+async def ssh_connect_and_execute(
+    host: Host,
+    command: str,
+    manager: Optional[AsyncSSHConnectionManager] = None,
+    input: Optional[str] = None,
+    keep_spill: bool = False,
+) -> Tuple[bool, str, str, int]:
+    """
+    Async equivalent of _ssh_connect_and_execute.
+    input: data written to the command's stdin;
+    keep_spill: oversized stdout is returned as SpilledText whose file the caller must discard.
+    Returns: (success, output, error, exit_code); exit_code 1 on connection/execution errors.
+    """
+    try:
+        result = await _run(host, command, manager, input=input, keep_spill=keep_spill)
+        exit_code = result.exit_status if result.exit_status is not None else 1
+        output = result.stdout or ""
+        error = (result.stderr or "") if exit_code != 0 else ""
+        log_ssh_command(
+            host=host,
+            command=command,
+            stdout=output,
+            stderr=error,
+            exit_code=exit_code,
+            success=(exit_code == 0)
+        )
+        return exit_code == 0, output, error, exit_code
+    except Exception as e:
+        error_msg = _failure_message(e)
+    log_ssh_command(host=host, command=command, stderr=error_msg, success=False)
+    return False, "", error_msg, 1
+
+
+async def ssh_stream_command(
+    host: Host,
+    command: str,
+    manager: Optional[AsyncSSHConnectionManager],
+    stdout_sink,
+    input: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> Tuple[str, int]:
+    """
+    Run command feeding its stdout into stdout_sink as it arrives (the caller parses and
+    logs it); timeout as in _run. Returns (error, exit_code); exit_code 1 on
+    connection/execution errors.
+    """
+    try:
+        result = await _run(host, command, manager, input=input, timeout=timeout, stdout_sink=stdout_sink)
+    except Exception as e:
+        return _failure_message(e), 1
+    exit_code = result.exit_status if result.exit_status is not None else 1
+    return (result.stderr or "") if exit_code != 0 else "", exit_code
+
+
+async def check_ssh_login(host: Host, manager: Optional[AsyncSSHConnectionManager] = None) -> Tuple[bool, str]:
+    """Async equivalent of _check_ssh_login"""
+    try:
+        if manager is not None:
+            await manager.get(host)
+        else:
+            conn = await _open_connection(host)
+            await AsyncSSHConnectionManager._close(conn)
+        log_ssh_connection(host, "login", success=True)
+        return True, "SSH login OK"
+    except asyncssh.PermissionDenied as e:
+        log_ssh_connection(host, "login", success=False, error=str(e))
+        return False, "Неверные учётные данные"
+    except (OSError, asyncio.TimeoutError) as e:
+        log_ssh_connection(host, "login", success=False, error=str(e))
+        return False, f"Нет сетевого доступа: {str(e)}"
+    except asyncssh.Error as e:
+        log_ssh_connection(host, "login", success=False, error=str(e))
+        return False, f"Ошибка SSH: {str(e)}"
+    except Exception as e:
+        log_ssh_connection(host, "login", success=False, error=str(e))
+        return False, "Неверные учётные данные: Ошибка при входе (логин/пароль/SSH-ключ)"
+
+
+async def check_sudo_access_linux(host: Host, manager: Optional[AsyncSSHConnectionManager] = None) -> Tuple[bool, str]:
+    """Async equivalent of _check_sudo_access_linux"""
+    command = "sudo -n id"
+    try:
+        result = await _run(host, command, manager)
+        exit_code = result.exit_status if result.exit_status is not None else 1
+        success = exit_code == 0
+        log_ssh_check(
+            host=host,
+            check_type="sudo",
+            command=command,
+            stdout=result.stdout or "",
+            stderr=result.stderr or "",
+            exit_code=exit_code,
+            success=success
+        )
+        if success:
+            return True, "Sudo access OK (no password required)"
+        return False, "Недостаточно прав (sudo): Нет полномочий на выполнение команды"
+    except asyncssh.PermissionDenied as e:
+        log_ssh_check(host=host, check_type="sudo", command=command, stderr=str(e), success=False)
+        return False, "Недостаточно прав (sudo): Ошибка аутентификации"
+    except Exception as e:
+        log_ssh_check(host=host, check_type="sudo", command=command, stderr=str(e), success=False)
+        return False, "Недостаточно прав (sudo): Нет полномочий на выполнение команды"
+
+
+async def check_ssh_login_and_sudo(
+    host: Host,
+    manager: Optional[AsyncSSHConnectionManager] = None,
+) -> Tuple[bool, str, bool, str]:
+    """
+    Async equivalent of _check_ssh_login_and_sudo.
+    Returns: (login_success, login_message, sudo_success, sudo_message)
+    """
+    login_ok, login_msg = await check_ssh_login(host, manager)
+    if not login_ok:
+        return False, login_msg, False, "Login failed"
+    sudo_ok, sudo_msg = await check_sudo_access_linux(host, manager)
+    return login_ok, login_msg, sudo_ok, sudo_msg
+
+
+async def execute_profile_linux(
+    host: Host,
+    script_content: str,
+    manager: Optional[AsyncSSHConnectionManager] = None,
+) -> Tuple[bool, str, str, int]:
+    """Async equivalent of _execute_profile_linux. Returns: (success, stdout, stderr, exit_code)"""
+    if not script_content:
+        return True, "", "", 0
+    try:
+        success, output, error, exit_code = await ssh_connect_and_execute(
+            host, _profile_linux_command(script_content), manager
+        )
+        if not success and not error and output:
+            error = output
+        return success, output or "", error or "", exit_code
+    except Exception as e:
+        return False, "", str(e), 1
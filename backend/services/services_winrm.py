@@ -0,0 +1,192 @@
+"""
+services/services_winrm.py
+Reusable WinRM shells: one authenticated session and one remote shell per Windows host.
+
+pywinrm's Session.run_cmd/run_ps open and close a remote shell for every command, and a
+new Session repeats the NTLM handshake. WinRMShellManager keeps both for the whole run:
+login/admin checks and all check commands of a host run as commands in the same shell.
+Long PowerShell scripts (bundle mode) are uploaded into %TEMP% in chunks over that shell,
+so they are not limited by the Windows command line length.
+"""
+
+import asyncio
+import base64
+import os
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+import requests
+from winrm.exceptions import WinRMTransportError, WSManFaultError  # pyright: ignore[reportMissingImports]
+
+from config.config_init import logger
+
+# Shells unused for this many seconds are closed (server-side idle timeout is longer)
+WINRM_SHELL_IDLE_SECONDS = int(os.environ.get('WINRM_SHELL_IDLE_SECONDS', '300'))
+
+# Characters of base64 per upload command (cmd.exe command lines are limited to 8191)
+_UPLOAD_CHUNK = 7000
+
+CommandOutput = Tuple[bytes, bytes, int]
+
+# Errors of a shell that is gone on the server or of a dropped connection: worth a fresh shell
+_SHELL_ERRORS = (WSManFaultError, WinRMTransportError, requests.exceptions.ConnectionError, ConnectionError)
+
+
+def encode_powershell(script: str) -> str:
+    """-EncodedCommand argument for a PowerShell script (base64 of UTF-16LE)."""
+    return base64.b64encode(script.encode("utf_16_le")).decode("ascii")
+
+
+class WinRMShell:
+    """An authenticated winrm.Session with one open remote shell."""
+
+    def __init__(self, session):
+        self.session = session
+        self.protocol = session.protocol
+        self.shell_id = self.protocol.open_shell()
+        self.last_used = time.monotonic()
+
+    def run_cmd(self, command: str, args=()) -> CommandOutput:
+        """Run a command in the shell (cmd.exe semantics, like Session.run_cmd)."""
+        self.last_used = time.monotonic()
+        command_id = self.protocol.run_command(self.shell_id, command, args)
+        try:
+            return self.protocol.get_command_output(self.shell_id, command_id)
+        finally:
+            try:
+                self.protocol.cleanup_command(self.shell_id, command_id)
+            except Exception:
+                pass
+
+    def run_ps(self, script: str) -> CommandOutput:
+        """Run a short PowerShell script (like Session.run_ps), CLIXML stderr cleaned up."""
+        out, err, status = self.run_cmd(f"powershell -NoProfile -NonInteractive -EncodedCommand {encode_powershell(script)}")
+        if err:
+            err = self.session._clean_error_msg(err)
+        return out, err, status
+
+    def run_ps_file(self, script: str, name: str) -> CommandOutput:
+        """
+        Run a PowerShell script of any length: upload it as base64 into %TEMP%\\<name>.b64
+        with `echo` commands, then decode and run it from a small loader.
+        """
+        encoded = base64.b64encode(script.encode("utf-8")).decode("ascii")
+        if not encoded:
+            return b"", b"", 0
+        path = f"%TEMP%\\{name}.b64"
+        first = True
+        for start in range(0, len(encoded), _UPLOAD_CHUNK):
+            chunk = encoded[start:start + _UPLOAD_CHUNK]
+            # Redirection first: a trailing digit of the chunk must not become a handle number
+            _, err, status = self.run_cmd(f'{">" if first else ">>"}"{path}" echo {chunk}')
+            if status != 0:
+                return b"", err or b"Failed to upload script", status
+            first = False
+        loader = (
+            f"$__p = Join-Path $env:TEMP '{name}.b64'\n"
+            "$__s = [Text.Encoding]::UTF8.GetString([Convert]::FromBase64String([IO.File]::ReadAllText($__p)))\n"
+            "Remove-Item -LiteralPath $__p -Force -ErrorAction SilentlyContinue\n"
+            "& ([ScriptBlock]::Create($__s))\n"
+            "exit $LASTEXITCODE"
+        )
+        return self.run_ps(loader)
+
+    def close(self) -> None:
+        try:
+            self.protocol.close_shell(self.shell_id)
+        except Exception:
+            pass
+
+
+class WinRMShellManager:
+    """
+    One WinRM shell per host, shared by all operations of a run.
+
+    Commands of one host are serialized on its shell, so callers run one command per host
+    at a time instead of parking executor threads on the host lock. A command failing on a
+    reused shell (expired on the server, connection dropped) is retried once on a fresh
+    shell; a timed-out command is not repeated. Thread-safe: the blocking pywinrm calls run
+    in executor threads.
+    """
+
+    def __init__(self, session_factory: Callable, idle_timeout: int = WINRM_SHELL_IDLE_SECONDS):
+        self._session_factory = session_factory
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._shells: Dict[str, WinRMShell] = {}
+        self._host_locks: Dict[str, threading.Lock] = {}
+
+    def _host_lock(self, host_id: str) -> threading.Lock:
+        with self._lock:
+            return self._host_locks.setdefault(host_id, threading.Lock())
+
+    def _call(self, host, operation: Callable[[WinRMShell], CommandOutput]) -> CommandOutput:
+        self.evict_idle()
+        with self._host_lock(host.id):
+            with self._lock:
+                shell = self._shells.get(host.id)
+            if shell is not None:
+                try:
+                    return operation(shell)
+                except requests.exceptions.Timeout:
+                    # The command may still be running: it is not repeated, its shell is closed
+                    self._discard(host.id)
+                    raise
+                except _SHELL_ERRORS as e:
+                    logger.info(f"WinRM shell on {host.hostname} failed ({e}), reopening")
+                    self._discard(host.id)
+            shell = WinRMShell(self._session_factory(host))
+            with self._lock:
+                self._shells[host.id] = shell
+            return operation(shell)
+
+    def run_cmd(self, host, command: str) -> CommandOutput:
+        return self._call(host, lambda shell: shell.run_cmd(command))
+
+    def run_ps(self, host, script: str) -> CommandOutput:
+        return self._call(host, lambda shell: shell.run_ps(script))
+
+    def run_ps_file(self, host, script: str, name: str) -> CommandOutput:
+        return self._call(host, lambda shell: shell.run_ps_file(script, name))
+
+    def _discard(self, host_id: str) -> None:
+        with self._lock:
+            shell = self._shells.pop(host_id, None)
+        if shell is not None:
+            shell.close()
+
+    def release(self, host_id: str) -> None:
+        """Close the shell of a host once the run is done with it."""
+        with self._host_lock(host_id):
+            self._discard(host_id)
+
+    def evict_idle(self) -> None:
+        """Close shells that have not been used for idle_timeout seconds."""
+        if self.idle_timeout <= 0:
+            return
+        deadline = time.monotonic() - self.idle_timeout
+        with self._lock:
+            stale = [host_id for host_id, shell in self._shells.items() if shell.last_used < deadline]
+        for host_id in stale:
+            lock = self._host_lock(host_id)
+            if lock.acquire(blocking=False):
+                try:
+                    self._discard(host_id)
+                finally:
+                    lock.release()
+
+    def close_all(self) -> None:
+        with self._lock:
+            shells = list(self._shells.values())
+            self._shells.clear()
+        for shell in shells:
+            shell.close()
+
+    async def arelease(self, host_id: str) -> None:
+        """release() without blocking the event loop."""
+        await asyncio.get_running_loop().run_in_executor(None, self.release, host_id)
+
+    async def aclose_all(self) -> None:
+        """close_all() without blocking the event loop."""
+        await asyncio.get_running_loop().run_in_executor(None, self.close_all)
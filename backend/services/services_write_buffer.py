@@ -0,0 +1,129 @@
+"""
+services/services_write_buffer.py
+Write-behind buffer for project run results.
+
+Execution documents and project task status changes are collected in memory and written
+with unordered insert_many / bulk_write once EXECUTION_WRITE_BATCH_SIZE documents are
+pending or EXECUTION_WRITE_FLUSH_SECONDS have passed. Task statuses are coalesced: only
+the latest status of a task is written. A run flushes its buffer before the `complete`
+event; buffers still open at shutdown are flushed by flush_write_buffers().
+"""
+
+import asyncio
+import os
+import weakref
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from config.config_init import db, logger
+
+# Pending execution documents that trigger an immediate flush
+EXECUTION_WRITE_BATCH_SIZE = int(os.environ.get('EXECUTION_WRITE_BATCH_SIZE', '200'))
+# Max delay between a write and its flush
+EXECUTION_WRITE_FLUSH_SECONDS = float(os.environ.get('EXECUTION_WRITE_FLUSH_SECONDS', '1.0'))
+
+_open_buffers: "weakref.WeakSet[ExecutionWriteBuffer]" = weakref.WeakSet()
+
+
+class ExecutionWriteBuffer:
+    """Batches db.executions inserts and db.project_tasks status updates of one run."""
+
+    def __init__(
+        self,
+        batch_size: int = EXECUTION_WRITE_BATCH_SIZE,
+        flush_interval: float = EXECUTION_WRITE_FLUSH_SECONDS,
+    ):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._executions: List[dict] = []
+        self._task_status: Dict[str, str] = {}
+        self._flush_lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        _open_buffers.add(self)
+
+    @property
+    def pending(self) -> int:
+        return len(self._executions) + len(self._task_status)
+
+    async def add_execution(self, doc: dict) -> None:
+        self._executions.append(doc)
+        await self._after_write()
+
+    async def add_executions(self, docs: List[dict]) -> None:
+        self._executions.extend(docs)
+        await self._after_write()
+
+    async def set_task_status(self, task_id: str, status: str) -> None:
+        self._task_status[task_id] = status
+        await self._after_write()
+
+    async def _after_write(self) -> None:
+        if len(self._executions) >= self.batch_size or self.flush_interval <= 0:
+            await self.flush()
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        try:
+            # Shielded: close() cancelling the timer must not abort a write in progress
+            await asyncio.shield(self.flush())
+        except Exception as e:
+            logger.error(f"Deferred flush of execution results failed: {e}")
+
+    async def flush(self) -> None:
+        """Write everything pending. Failed batches (other than rejected documents) are kept for retry."""
+        async with self._flush_lock:
+            executions, self._executions = self._executions, []
+            statuses, self._task_status = self._task_status, {}
+            if executions:
+                try:
+                    await db.executions.insert_many(executions, ordered=False)
+                except BulkWriteError as e:
+                    # Unordered: the rest of the batch is written, rejected documents are not retried
+                    logger.error(f"{len(e.details.get('writeErrors', []))} execution results were rejected: {e}")
+                except Exception:
+                    self._executions[:0] = executions
+                    for task_id, status in statuses.items():
+                        self._task_status.setdefault(task_id, status)
+                    raise
+            if statuses:
+                try:
+                    await db.project_tasks.bulk_write(
+                        [UpdateOne({"id": task_id}, {"$set": {"status": status}}) for task_id, status in statuses.items()],
+                        ordered=False,
+                    )
+                except Exception:
+                    for task_id, status in statuses.items():
+                        self._task_status.setdefault(task_id, status)
+                    raise
+
+    async def close(self) -> None:
+        """Stop the flush timer and write everything pending."""
+        if self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+        self._timer = None
+        try:
+            await self.flush()
+        finally:
+            _open_buffers.discard(self)
+
+    def discard(self) -> None:
+        """Stop the flush timer and drop everything pending (the results must not be written)."""
+        if self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+        self._timer = None
+        self._executions = []
+        self._task_status = {}
+        _open_buffers.discard(self)
+
+
+async def flush_write_buffers() -> None:
+    """Flush buffers of runs still in progress (application shutdown)."""
+    for buffer in list(_open_buffers):
+        try:
+            await buffer.close()
+        except Exception as e:
+            logger.error(f"Could not flush {buffer.pending} pending execution writes: {e}")
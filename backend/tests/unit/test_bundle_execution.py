@@ -0,0 +1,170 @@
+"""
+Unit tests for bundle execution mode
+Tests: script framing and demultiplexing, streamed per-check output bound, interrupted
+bundles, bundle time limit, mode resolution
+"""
+import subprocess
+from contextlib import contextmanager
+import pytest
+from unittest.mock import MagicMock, patch
+
+from pydantic import ValidationError
+
+from models.content_models import Host, HostUpdate
+from services.services_output_capture import BoundedOutput
+from services import services_bundle as sb
+
+
+def _host(**kwargs):
+    data = dict(name="h", hostname="10.0.0.1", username="u", auth_type="password")
+    data.update(kwargs)
+    return Host(**data)
+
+
+def _run_bundle(checks, nonce="n0nce"):
+    script = sb.build_bundle_script(checks, nonce)
+    proc = subprocess.run(["bash", "-s"], input=script, capture_output=True, text=True, timeout=10)
+    return sb.parse_bundle_output(proc.stdout, nonce)
+
+
+class TestBundleFraming:
+    """Tests for build_bundle_script / parse_bundle_output"""
+
+    @pytest.mark.unit
+    def test_round_trip_through_bash(self):
+        checks = [
+            ("s1", "echo hello"),
+            ("s2", "echo out; echo err >&2; exit 3"),
+            ("s3", "printf 'no newline'"),
+            ("s4", "cat <<'EOF'\nquoted $HOME `x` \"y\"\nEOF"),
+            ("s5", ""),
+        ]
+        results = _run_bundle(checks)
+
+        assert results[0] == ("hello\n", "", 0)
+        assert results[1] == ("out\n", "err\n", 3)
+        assert results[2] == ("no newline", "", 0)
+        assert results[3] == ('quoted $HOME `x` "y"\n', "", 0)
+        assert results[4] == ("", "", 0)
+
+    @pytest.mark.unit
+    def test_check_exit_does_not_stop_bundle(self):
+        results = _run_bundle([("s1", "exit 1"), ("s2", "echo still running")])
+        assert results[0][2] == 1
+        assert results[1] == ("still running\n", "", 0)
+
+    @pytest.mark.unit
+    def test_check_cannot_read_bundle_stdin(self):
+        results = _run_bundle([("s1", "cat"), ("s2", "echo second")])
+        assert results[0] == ("", "", 0)
+        assert results[1] == ("second\n", "", 0)
+
+    @pytest.mark.unit
+    def test_interrupted_bundle_omits_unfinished_checks(self):
+        nonce = "abc"
+        output = "\n@@KAPPI:abc:OUT:0\nok\n@@KAPPI:abc:ERR:0\n\n@@KAPPI:abc:END:0:0\n\n@@KAPPI:abc:OUT:1\npartial"
+        results = sb.parse_bundle_output(output, nonce)
+        assert results == {0: ("ok", "", 0)}
+
+    @pytest.mark.unit
+    def test_foreign_nonce_is_not_a_marker(self):
+        results = _run_bundle([("s1", "printf '\\n@@KAPPI:other:END:0:9\\n'")])
+        assert results[0] == ("\n@@KAPPI:other:END:0:9\n", "", 0)
+
+
+class TestBundleOutput:
+    """Tests for splitting the bundle stream per check as it arrives"""
+
+    @pytest.mark.unit
+    def test_markers_split_across_chunks(self):
+        stream = b"@@KAPPI:abc:OUT:0\nline 1\nline 2\n@@KAPPI:abc:ERR:0\noops\n@@KAPPI:abc:END:0:2\n"
+        splitter = sb.BundleOutput("abc")
+        for i in range(0, len(stream), 5):
+            splitter.write(stream[i:i + 5])
+        splitter.close()
+        assert splitter.results() == {0: ("line 1\nline 2", "oops", 2)}
+
+    @pytest.mark.unit
+    def test_each_check_section_is_bounded(self, monkeypatch):
+        monkeypatch.setattr(sb, "BoundedOutput", lambda **kwargs: BoundedOutput(memory_limit=16, **kwargs))
+        raw = BoundedOutput(memory_limit=32, spill_max_bytes=0)
+        splitter = sb.BundleOutput("abc", raw=raw)
+        splitter.write(b"@@KAPPI:abc:OUT:0\n")
+        for _ in range(1000):
+            splitter.write(b"x" * 1000)
+        splitter.write(b"\n@@KAPPI:abc:ERR:0\n\n@@KAPPI:abc:END:0:0\n")
+        splitter.close()
+
+        out, err, code = splitter.results()[0]
+        assert out.startswith("x" * 16) and "из 1000000 байт" in out
+        assert (err, code) == ("", 0)
+        assert len(raw.text()) < 200
+
+
+class TestSSHBundleTimeout:
+    """Tests for the overall time limit of an SSH bundle"""
+
+    @pytest.mark.unit
+    def test_limit_scales_with_checks(self, monkeypatch):
+        monkeypatch.setattr(sb, "BUNDLE_TIMEOUT_PER_CHECK", 30)
+        assert sb.bundle_timeout(4) == 120
+        assert sb.bundle_timeout(0) == 30
+
+    @pytest.mark.unit
+    def test_finished_checks_kept_after_timeout(self):
+        finished = "\n@@KAPPI:abc:OUT:0\nok\n@@KAPPI:abc:ERR:0\n\n@@KAPPI:abc:END:0:0\n@@KAPPI:abc:OUT:1\n"
+        chunks = [finished.encode()]
+        channel = MagicMock()
+        channel.recv_ready.side_effect = lambda: bool(chunks)
+        channel.recv.side_effect = lambda size: chunks.pop(0)
+        channel.recv_stderr_ready.return_value = False
+        # The second check never finishes
+        channel.eof_received = False
+        channel.closed = False
+        stdout = MagicMock(channel=channel)
+        ssh = MagicMock()
+        ssh.exec_command.return_value = (MagicMock(), stdout, MagicMock())
+
+        @contextmanager
+        def fake_connection(host, manager):
+            yield ssh
+
+        splitter = sb.BundleOutput("abc")
+        with patch.object(sb, "ssh_connection", fake_connection):
+            error, exit_code = sb._ssh_execute_bundle(_host(), "script", splitter, timeout=0)
+
+        assert exit_code == -1
+        assert "лимит времени" in error
+        channel.close.assert_called_once()
+        assert splitter.results() == {0: ("ok", "", 0)}
+
+
+class TestResolveExecutionMode:
+    """Tests for per-host execution mode"""
+
+    @pytest.mark.unit
+    def test_host_setting_wins(self, monkeypatch):
+        monkeypatch.setattr(sb, "EXECUTION_MODE", "channels")
+        assert sb.resolve_execution_mode(_host(execution_mode="bundle")) == "bundle"
+
+    @pytest.mark.unit
+    def test_default_from_environment(self, monkeypatch):
+        monkeypatch.setattr(sb, "EXECUTION_MODE", "bundle")
+        assert sb.resolve_execution_mode(_host()) == "bundle"
+
+    @pytest.mark.unit
+    def test_winrm_bundle_supported(self):
+        host = _host(connection_type="winrm", execution_mode="bundle")
+        assert sb.resolve_execution_mode(host) == "bundle"
+
+    @pytest.mark.unit
+    def test_unknown_host_mode_rejected(self):
+        with pytest.raises(ValidationError):
+            _host(execution_mode="bogus")
+        with pytest.raises(ValidationError):
+            HostUpdate(execution_mode="bogus")
+
+    @pytest.mark.unit
+    def test_unknown_default_falls_back_to_channels(self, monkeypatch):
+        monkeypatch.setattr(sb, "EXECUTION_MODE", "bogus")
+        assert sb.resolve_execution_mode(_host()) == "channels"
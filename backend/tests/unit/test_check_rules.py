@@ -0,0 +1,117 @@
+"""
+Unit tests for the declarative processor
+Tests: rule evaluation, error codes, invalid rules, dispatch from run_processor_on_output
+"""
+import time
+import pytest
+
+from services import services_execution as se
+from services.services_check_rules import RuleError, compile_rules, evaluate_rules
+
+
+def _evaluate(output, rules, reference=None):
+    return evaluate_rules("h1", "host", output, rules, reference)
+
+
+class TestEvaluateRules:
+    """Tests for evaluate_rules"""
+
+    @pytest.mark.unit
+    def test_contains_passes(self):
+        result = _evaluate("PermitRootLogin no\n", [{"type": "contains", "value": "PermitRootLogin no"}])
+        assert result.check_status == "Пройдена"
+        assert result.success is True
+        assert result.error_code is None
+
+    @pytest.mark.unit
+    def test_contains_fails_with_41(self):
+        result = _evaluate("", [{"type": "contains", "value": "x"}])
+        assert result.check_status == "Не пройдена"
+        assert result.error_code == 41
+        assert result.error_description.startswith("Конфигурация: Строка не найдена")
+
+    @pytest.mark.unit
+    def test_key_equals_uses_etalon(self):
+        rules = [{"type": "key_equals", "key": "PASS_MAX_DAYS", "separator": " "}]
+        assert _evaluate("PASS_MAX_DAYS 90\n", rules, "90").check_status == "Пройдена"
+        failed = _evaluate("PASS_MAX_DAYS 99999\n", rules, "90")
+        assert failed.error_code == 44
+        assert failed.actual_data == "99999"
+
+    @pytest.mark.unit
+    def test_commented_key_gives_42(self):
+        result = _evaluate("# MaxAuthTries = 4\n", [{"type": "key_equals", "key": "MaxAuthTries", "value": "4"}])
+        assert result.error_code == 42
+        assert result.actual_data is None
+
+    @pytest.mark.unit
+    def test_missing_key_gives_41(self):
+        result = _evaluate("Other=1\n", [{"type": "key_equals", "key": "MaxAuthTries", "value": "4"}])
+        assert result.error_code == 41
+
+    @pytest.mark.unit
+    def test_subset_of_etalon(self):
+        rules = [{"type": "subset_of_etalon", "key": "Ciphers", "separator": " "}]
+        reference = "aes256-ctr, aes192-ctr, aes128-ctr"
+        assert _evaluate("Ciphers aes256-ctr,aes128-ctr\n", rules, reference).check_status == "Пройдена"
+        failed = _evaluate("Ciphers aes256-ctr,3des-cbc\n", rules, reference)
+        assert failed.check_status == "Не пройдена"
+        assert failed.error_code == 44
+
+    @pytest.mark.unit
+    def test_numeric_comparison(self):
+        rules = [{"type": "numeric_le", "value": "5"}]
+        assert _evaluate("4\n", rules).check_status == "Пройдена"
+        assert _evaluate("6\n", rules).error_code == 44
+        assert _evaluate("n/a\n", rules).error_code == 43
+
+    @pytest.mark.unit
+    def test_first_failing_rule_decides(self):
+        rules = [
+            {"type": "regex", "value": r"^Protocol\s+2$"},
+            {"type": "not_contains", "value": "PermitEmptyPasswords yes", "error_code": 43},
+        ]
+        result = _evaluate("Protocol 2\nPermitEmptyPasswords yes\n", rules)
+        assert result.error_code == 43
+
+    @pytest.mark.unit
+    def test_invalid_regex_is_error_52(self):
+        result = _evaluate("x", [{"type": "regex", "value": "("}])
+        assert result.check_status == "Ошибка"
+        assert result.error_code == 52
+
+    @pytest.mark.unit
+    def test_compile_rejects_bad_threshold(self):
+        with pytest.raises(RuleError):
+            compile_rules([{"type": "numeric_ge", "value": "ten"}])
+
+    @pytest.mark.unit
+    def test_many_evaluations_are_fast(self):
+        rules = [{"type": "key_equals", "key": "MaxAuthTries", "value": "4"}]
+        output = "\n".join(f"Option{i} yes" for i in range(50)) + "\nMaxAuthTries 4\n"
+        started = time.monotonic()
+        for _ in range(2000):
+            _evaluate(output, [{**rules[0], "separator": " "}])
+        assert time.monotonic() - started < 2
+
+
+class TestProcessorDispatch:
+    """Tests for processor_rules in run_processor_on_output"""
+
+    @pytest.mark.unit
+    async def test_rules_bypass_bash(self, monkeypatch):
+        async def fail(*args, **kwargs):
+            raise AssertionError("bash processor must not run")
+
+        monkeypatch.setattr(se, "_run_processor_process", fail)
+        result = await se.run_processor_on_output(
+            host_id="h1",
+            host_name="host",
+            raw_output="enabled",
+            processor_script="echo ignored",
+            reference_data=None,
+            script_id="s1",
+            script_name="check",
+            processor_rules=[{"type": "contains", "value": "enabled"}],
+        )
+        assert result.check_status == "Пройдена"
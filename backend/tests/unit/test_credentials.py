@@ -0,0 +1,99 @@
+"""
+Unit tests for the host credential cache
+Tests: cached decryption, key type detection, invalidation, TTL
+"""
+import io
+import pytest
+from unittest.mock import patch
+
+import paramiko
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+from config.config_init import encrypt_password
+from models.content_models import Host
+from services import services_credentials as sc
+
+
+def _rsa_pem() -> str:
+    buffer = io.StringIO()
+    paramiko.RSAKey.generate(1024).write_private_key(buffer)
+    return buffer.getvalue()
+
+
+def _ed25519_openssh() -> str:
+    key = ed25519.Ed25519PrivateKey.generate()
+    return key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.OpenSSH, serialization.NoEncryption()
+    ).decode()
+
+
+def _host(**kwargs):
+    data = dict(id="h1", name="h", hostname="10.0.0.1", username="u", auth_type="password")
+    data.update(kwargs)
+    return Host(**data)
+
+
+class TestCredentialCache:
+    """Tests for cached credentials"""
+
+    def setup_method(self):
+        sc.clear_credential_cache()
+
+    @pytest.mark.unit
+    def test_password_decrypted_once(self):
+        host = _host(password=encrypt_password("secret"))
+        with patch.object(sc, "decrypt_password", wraps=sc.decrypt_password) as decrypt:
+            assert sc.host_password(host) == "secret"
+            assert sc.host_password(host) == "secret"
+        assert decrypt.call_count == 1
+
+    @pytest.mark.unit
+    def test_changed_ciphertext_misses(self):
+        sc.host_password(_host(password=encrypt_password("old")))
+        assert sc.host_password(_host(password=encrypt_password("new"))) == "new"
+
+    @pytest.mark.unit
+    def test_invalidate_host(self):
+        host = _host(password=encrypt_password("secret"))
+        sc.host_password(host)
+        sc.host_password(_host(id="h2", password=encrypt_password("other")))
+        assert sc.invalidate_host_credentials("h1") == 1
+        assert len(sc._cache) == 1
+
+    @pytest.mark.unit
+    def test_private_key_parsed_once(self):
+        stored = encrypt_password(_rsa_pem())
+        with patch.object(sc, "parse_private_key", wraps=sc.parse_private_key) as parse:
+            first = sc.load_private_key(stored, "h1")
+            second = sc.load_private_key(stored, "h1")
+        assert parse.call_count == 1
+        assert first is second
+        assert isinstance(first, paramiko.RSAKey)
+
+    @pytest.mark.unit
+    def test_without_host_id_not_cached(self):
+        sc.load_private_key(encrypt_password(_rsa_pem()))
+        assert len(sc._cache) == 0
+
+
+class TestKeyTypeDetection:
+    """Tests for detect_key_type / parse_private_key"""
+
+    @pytest.mark.unit
+    def test_pem_rsa(self):
+        assert sc.detect_key_type(_rsa_pem()) == "rsa"
+
+    @pytest.mark.unit
+    def test_openssh_ed25519_parsed_first_try(self):
+        text = _ed25519_openssh()
+        assert sc.detect_key_type(text) == "ed25519"
+        with patch.object(paramiko.RSAKey, "from_private_key", side_effect=AssertionError("tried RSA")):
+            key, key_type = sc.parse_private_key(text)
+        assert key_type == "ed25519"
+        assert isinstance(key, paramiko.Ed25519Key)
+
+    @pytest.mark.unit
+    def test_invalid_key_raises_ssh_exception(self):
+        with pytest.raises(paramiko.SSHException):
+            sc.parse_private_key("not a key")
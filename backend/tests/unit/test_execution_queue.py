@@ -0,0 +1,172 @@
+"""
+Unit tests for the execution queue
+Tests: worker publishes events and outcome, lost leases abort, retries replace results,
+run relays events in order, abandoned items
+"""
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from services import services_execution_queue as eq
+from services import services_execution_worker as ew
+
+
+def _queue_db():
+    db = MagicMock()
+    db.execution_queue.update_one = AsyncMock()
+    db.execution_queue.update_many = AsyncMock()
+    db.execution_queue.delete_one = AsyncMock()
+    return db
+
+
+def _item(**extra):
+    return {"id": "i1", "session_id": "s1", "project_id": "p1", "user_id": "u1", "host_id": "h1",
+            "task": {"id": "t1", "host_id": "h1"}, "network": [True, "ok"], **extra}
+
+
+def _writer():
+    writer = MagicMock()
+    writer.close = AsyncMock()
+    return writer
+
+
+class TestExecutionWorker:
+    """Tests for ExecutionWorker.run_item"""
+
+    @pytest.mark.unit
+    async def test_events_and_outcome_published(self):
+        async def fake_execute_task(task, *, project_id, session_id, user_id, emit, writer, plan,
+                                    ssh_manager=None, network=None, winrm_manager=None):
+            assert network == {"h1": (True, "ok")}
+            await emit({"type": "task_start", "host_name": "h1"})
+            await emit({"type": "task_complete", "host_name": "h1"})
+            return True
+
+        writer = _writer()
+        worker = ew.ExecutionWorker(owner="w1")
+        with patch.object(ew, "_execute_task", side_effect=fake_execute_task), \
+                patch.object(ew, "load_run_plan", AsyncMock()), \
+                patch.object(ew, "ExecutionWriteBuffer", return_value=writer), \
+                patch.object(ew, "publish_events", AsyncMock()) as publish, \
+                patch.object(ew, "complete_task", AsyncMock()) as complete:
+            assert await worker.run_item(_item(attempts=1)) is True
+
+        published = [event for call in publish.call_args_list for event in call.args[2]]
+        assert [e["type"] for e in published] == ["task_start", "task_complete"]
+        writer.close.assert_awaited_once()
+        complete.assert_awaited_once_with("i1", "w1", True)
+
+    @pytest.mark.unit
+    async def test_shared_host_released_after_last_item(self):
+        done = asyncio.Event()
+
+        async def fake_execute_task(task, **kwargs):
+            if task["id"] == "t1":
+                await done.wait()
+            return True
+
+        ssh_manager = MagicMock()
+        ssh_manager.arelease = AsyncMock()
+        worker = ew.ExecutionWorker(owner="w1")
+        with patch.object(ew, "_execute_task", side_effect=fake_execute_task), \
+                patch.object(ew, "load_run_plan", AsyncMock()), \
+                patch.object(ew, "ExecutionWriteBuffer", side_effect=lambda: _writer()), \
+                patch.object(ew, "publish_events", AsyncMock()), \
+                patch.object(ew, "complete_task", AsyncMock()):
+            first = asyncio.create_task(worker.run_item(_item(), ssh_manager))
+            await asyncio.sleep(0)
+            second = _item(id="i2", session_id="s2", task={"id": "t2", "host_id": "h1"})
+            assert await worker.run_item(second, ssh_manager) is True
+            # The first item still runs on the host's connection
+            ssh_manager.arelease.assert_not_awaited()
+            done.set()
+            assert await first is True
+        ssh_manager.arelease.assert_awaited_once_with("h1")
+
+    @pytest.mark.unit
+    async def test_lost_lease_aborts_item(self, monkeypatch):
+        monkeypatch.setattr(ew, "EXECUTION_QUEUE_POLL_SECONDS", 0)
+        monkeypatch.setattr(ew, "EXECUTION_QUEUE_LEASE_SECONDS", 0)
+
+        async def hung_execute_task(*args, **kwargs):
+            await asyncio.sleep(3600)
+            return True
+
+        writer = _writer()
+        worker = ew.ExecutionWorker(owner="w1")
+        with patch.object(ew, "_execute_task", side_effect=hung_execute_task), \
+                patch.object(ew, "load_run_plan", AsyncMock()), \
+                patch.object(ew, "ExecutionWriteBuffer", return_value=writer), \
+                patch.object(ew, "publish_events", AsyncMock()), \
+                patch.object(ew, "renew_lease", AsyncMock(return_value=False)), \
+                patch.object(ew, "complete_task", AsyncMock()) as complete:
+            assert await asyncio.wait_for(worker.run_item(_item(attempts=1)), 5) is False
+
+        writer.discard.assert_called_once()
+        writer.close.assert_not_awaited()
+        complete.assert_not_awaited()
+
+    @pytest.mark.unit
+    async def test_retry_removes_earlier_results(self):
+        db = MagicMock()
+        db.executions.delete_many = AsyncMock()
+        worker = ew.ExecutionWorker(owner="w2")
+        with patch.object(ew, "db", db), \
+                patch.object(ew, "_execute_task", AsyncMock(return_value=True)), \
+                patch.object(ew, "load_run_plan", AsyncMock()), \
+                patch.object(ew, "ExecutionWriteBuffer", return_value=_writer()), \
+                patch.object(ew, "publish_events", AsyncMock()), \
+                patch.object(ew, "complete_task", AsyncMock()):
+            assert await worker.run_item(_item(attempts=2)) is True
+
+        db.executions.delete_many.assert_awaited_once_with({"execution_session_id": "s1", "project_task_id": "t1"})
+
+
+class TestRunTaskViaQueue:
+    """Tests for run_task_via_queue"""
+
+    @pytest.mark.unit
+    async def test_events_relayed_until_done(self, monkeypatch):
+        monkeypatch.setattr(eq, "EXECUTION_QUEUE_POLL_SECONDS", 0)
+        events = [{"n": 1}, {"n": 2}, {"n": 3}]
+        polls = iter([
+            {"id": "i1", "status": "queued", "event_count": 0},
+            {"id": "i1", "status": "leased", "event_count": 2},
+            {"id": "i1", "status": "done", "ok": True, "event_count": 3},
+        ])
+        emitted = []
+
+        async def emit(event):
+            emitted.append(event)
+
+        db = _queue_db()
+        with patch.object(eq, "db", db), \
+                patch.object(eq, "enqueue_tasks", AsyncMock(return_value=["i1"])), \
+                patch.object(eq, "_item_state", AsyncMock(side_effect=lambda item_id: next(polls))), \
+                patch.object(eq, "_item_events", AsyncMock(side_effect=lambda item_id, skip, limit: events[skip:skip + limit])):
+            ok = await eq.run_task_via_queue({}, project_id="p1", session_id="s1", user_id="u1", emit=emit)
+
+        assert ok is True
+        assert [e["n"] for e in emitted] == [1, 2, 3]
+        db.execution_queue.delete_one.assert_awaited_once()
+
+    @pytest.mark.unit
+    async def test_abandoned_item_fails(self, monkeypatch):
+        monkeypatch.setattr(eq, "EXECUTION_QUEUE_POLL_SECONDS", 0)
+        item = {"id": "i1", "host_id": "h1", "status": "leased", "event_count": 0,
+                "attempts": eq.EXECUTION_QUEUE_MAX_ATTEMPTS, "lease_expires_at": "2000-01-01T00:00:00+00:00"}
+        emitted = []
+
+        async def emit(event):
+            emitted.append(event)
+
+        db = _queue_db()
+        with patch.object(eq, "db", db), \
+                patch.object(eq, "enqueue_tasks", AsyncMock(return_value=["i1"])), \
+                patch.object(eq, "_item_state", AsyncMock(return_value=item)):
+            ok = await eq.run_task_via_queue({}, project_id="p1", session_id="s1", user_id="u1", emit=emit)
+
+        assert ok is False
+        assert emitted[0]["type"] == "task_error"
+        assert db.execution_queue.update_one.call_args.args[1]["$set"]["status"] == eq.FAILED
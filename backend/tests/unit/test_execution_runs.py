@@ -0,0 +1,136 @@
+"""
+Unit tests for background project runs
+Tests: run independent of viewers, replay from Last-Event-ID, several viewers, event ids,
+in-process runs with a structured summary
+"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from models.models_init import User
+from services import services_execution_runs as er
+
+
+def _mock_db():
+    db = MagicMock()
+    db.execution_runs.insert_one = AsyncMock()
+    db.execution_runs.update_one = AsyncMock()
+    db.execution_events.insert_many = AsyncMock()
+    return db
+
+
+def _fake_events(release: asyncio.Event):
+    async def run_project_events(project_id, user_id, parallel_hosts=None, session_id=None):
+        yield {"type": "status", "session_id": session_id}
+        await release.wait()
+        yield {"type": "task_complete", "host_name": "h1"}
+        yield {"type": "complete", "status": "completed", "session_id": session_id}
+    return run_project_events
+
+
+async def _collect(gen):
+    return [item async for item in gen]
+
+
+class TestProjectRuns:
+    """Tests for start_project_run / stream_run_events"""
+
+    @pytest.mark.unit
+    async def test_run_finishes_without_viewers(self):
+        db = _mock_db()
+        release = asyncio.Event()
+        release.set()
+        with patch.object(er, "db", db), patch.object(er, "run_project_events", _fake_events(release)):
+            run = await er.start_project_run("p1", "u1")
+            await run.task
+        assert run.status == er.COMPLETED
+        assert [e["type"] for e in run.events] == ["status", "task_complete", "complete"]
+        saved = [doc for call in db.execution_events.insert_many.call_args_list for doc in call.args[0]]
+        assert [doc["seq"] for doc in saved] == [1, 2, 3]
+        final = db.execution_runs.update_one.call_args_list[-1].args[1]["$set"]
+        assert final["status"] == er.COMPLETED
+
+    @pytest.mark.unit
+    async def test_viewers_replay_and_follow(self):
+        release = asyncio.Event()
+        with patch.object(er, "db", _mock_db()), patch.object(er, "run_project_events", _fake_events(release)):
+            run = await er.start_project_run("p1", "u1")
+            first = asyncio.create_task(_collect(er.stream_run_events(run.session_id)))
+            await asyncio.sleep(0.01)
+            # A viewer reconnecting after event 1 gets only what follows it
+            resumed = asyncio.create_task(_collect(er.stream_run_events(run.session_id, after_seq=1)))
+            await asyncio.sleep(0.01)
+            release.set()
+            first_events, resumed_events = await asyncio.gather(first, resumed)
+            await run.task
+        assert [seq for seq, _ in first_events] == [1, 2, 3]
+        assert [seq for seq, _ in resumed_events] == [2, 3]
+
+    @pytest.mark.unit
+    async def test_failing_run_reports_generic_error(self):
+        async def broken(project_id, user_id, parallel_hosts=None, session_id=None):
+            raise RuntimeError("boom")
+            yield  # pragma: no cover
+
+        with patch.object(er, "db", _mock_db()), patch.object(er, "run_project_events", broken):
+            run = await er.start_project_run("p1", "u1")
+            await run.task
+        assert run.status == er.FAILED
+        assert run.events[-1]["type"] == "error"
+        assert "boom" not in run.events[-1]["message"]
+
+
+class TestEventIds:
+    """Tests for format_event_id / parse_event_id"""
+
+    @pytest.mark.unit
+    def test_round_trip(self):
+        assert er.parse_event_id(er.format_event_id("abc-1", 42)) == ("abc-1", 42)
+
+    @pytest.mark.unit
+    def test_malformed(self):
+        assert er.parse_event_id(None) == (None, 0)
+        assert er.parse_event_id("17") == (None, 0)
+        assert er.parse_event_id("abc:x") == (None, 0)
+
+
+class TestRunProject:
+    """Tests for run_project"""
+
+    @staticmethod
+    def _events(project_id, user_id, parallel_hosts=None, session_id=None):
+        async def gen():
+            yield {"type": "status", "session_id": session_id}
+            yield {"type": "task_start", "host_name": "h1", "scripts_count": 2}
+            yield {"type": "script_progress", "host_name": "h1", "completed": 1, "total": 2}
+            yield {"type": "script_progress", "host_name": "h1", "completed": 2, "total": 2}
+            yield {"type": "task_complete", "host_name": "h1", "success": True}
+            yield {"type": "task_error", "host_name": "h2", "error": "Хост недоступен"}
+            yield {"type": "complete", "status": "failed", "completed": 1, "failed": 1, "total": 2,
+                   "session_id": session_id}
+        return gen()
+
+    @pytest.mark.unit
+    async def test_returns_summary(self):
+        user = User(id="u1", username="user", full_name="User", password_hash="x")
+        with patch.object(er, "db", _mock_db()), patch.object(er, "run_project_events", self._events), \
+                patch.object(er, "has_permission", AsyncMock(return_value=True)), \
+                patch.object(er, "can_access_project", AsyncMock(return_value=True)):
+            summary = await er.run_project("p1", user)
+        assert summary.status == er.FAILED
+        assert (summary.total, summary.completed, summary.failed) == (2, 1, 1)
+        assert summary.duration_seconds is not None
+        hosts = {host.host_name: host for host in summary.hosts}
+        assert hosts["h1"].status == "completed" and hosts["h1"].scripts_completed == 2
+        assert hosts["h1"].duration_seconds is not None
+        assert hosts["h2"].status == "failed" and hosts["h2"].error == "Хост недоступен"
+
+    @pytest.mark.unit
+    async def test_requires_permission(self):
+        user = User(id="u1", username="user", full_name="User", password_hash="x")
+        with patch.object(er, "db", _mock_db()), \
+                patch.object(er, "has_permission", AsyncMock(return_value=False)), \
+                patch.object(er, "start_project_run", AsyncMock()) as start:
+            with pytest.raises(PermissionError):
+                await er.run_project("p1", user)
+        start.assert_not_awaited()
@@ -0,0 +1,209 @@
+"""
+Unit tests for the host health registry
+Tests: circuit opening and fail-fast, half-open probing and trials, TTLs, integration with network/login checks,
+classification of connect failures
+"""
+import asyncio
+import socket
+import paramiko
+import pytest
+from unittest.mock import patch
+
+from models.content_models import Host
+from services import services_config_integrity as ci
+from services import services_execution as se
+from services import services_host_health as hh
+
+
+def _closed_port() -> int:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class TestCircuitBreaker:
+    """Tests for HostHealthRegistry state transitions"""
+
+    def setup_method(self):
+        self.registry = hh.HostHealthRegistry()
+
+    @pytest.mark.unit
+    def test_opens_after_threshold(self, monkeypatch):
+        monkeypatch.setattr(hh, "HOST_BREAKER_FAILURE_THRESHOLD", 3)
+        for _ in range(2):
+            self.registry.record_failure("10.0.0.1", 22, hh.NETWORK, "Нет сетевого доступа: timeout")
+            assert self.registry.check("10.0.0.1", 22) is None
+        self.registry.record_failure("10.0.0.1", 22, hh.NETWORK, "Нет сетевого доступа: timeout")
+        kind, message = self.registry.check("10.0.0.1", 22)
+        assert kind == hh.NETWORK
+        assert message.startswith("Нет сетевого доступа: timeout")
+        assert self.registry.snapshot()[0]["state"] == hh.OPEN
+
+    @pytest.mark.unit
+    def test_success_resets_failures(self, monkeypatch):
+        monkeypatch.setattr(hh, "HOST_BREAKER_FAILURE_THRESHOLD", 2)
+        self.registry.record_failure("10.0.0.1", 22, hh.NETWORK, "x")
+        self.registry.record_success("10.0.0.1", 22)
+        self.registry.record_failure("10.0.0.1", 22, hh.NETWORK, "x")
+        assert self.registry.check("10.0.0.1", 22) is None
+
+    @pytest.mark.unit
+    def test_old_failures_expire(self, monkeypatch):
+        monkeypatch.setattr(hh, "HOST_BREAKER_FAILURE_THRESHOLD", 2)
+        monkeypatch.setattr(hh, "HOST_HEALTH_TTL_SECONDS", 60)
+        with patch.object(hh.time, "monotonic", side_effect=[100, 200, 201]):
+            self.registry.record_failure("10.0.0.1", 22, hh.NETWORK, "x")
+            self.registry.record_failure("10.0.0.1", 22, hh.NETWORK, "x")
+            assert self.registry.check("10.0.0.1", 22) is None
+
+    @pytest.mark.unit
+    def test_network_success_does_not_clear_login_failures(self, monkeypatch):
+        monkeypatch.setattr(hh, "HOST_BREAKER_FAILURE_THRESHOLD", 2)
+        for _ in range(2):
+            self.registry.record_success("10.0.0.1", 22, hh.NETWORK)
+            self.registry.record_failure("10.0.0.1", 22, hh.LOGIN, "Неверные учётные данные")
+        assert self.registry.check("10.0.0.1", 22, hh.NETWORK) is None
+        assert self.registry.check("10.0.0.1", 22, hh.LOGIN)[0] == hh.LOGIN
+
+    @pytest.mark.unit
+    def test_login_circuit_is_per_account(self, monkeypatch):
+        monkeypatch.setattr(hh, "HOST_BREAKER_FAILURE_THRESHOLD", 1)
+        self.registry.record_failure("10.0.0.1", 22, hh.LOGIN, "Неверные учётные данные", "afick")
+        assert self.registry.check("10.0.0.1", 22, hh.LOGIN, "afick")[0] == hh.LOGIN
+        assert self.registry.check("10.0.0.1", 22, hh.LOGIN, "runner") is None
+        assert self.registry.check("10.0.0.1", 22, username="runner") is None
+        assert self.registry.check("10.0.0.1", 22, hh.NETWORK) is None
+
+    @pytest.mark.unit
+    def test_network_circuit_shared_by_accounts(self, monkeypatch):
+        monkeypatch.setattr(hh, "HOST_BREAKER_FAILURE_THRESHOLD", 1)
+        self.registry.record_failure("10.0.0.1", 22, hh.NETWORK, "Нет сетевого доступа")
+        assert self.registry.check("10.0.0.1", 22, username="runner")[0] == hh.NETWORK
+
+    @pytest.mark.unit
+    def test_login_half_open_allows_one_trial(self, monkeypatch):
+        monkeypatch.setattr(hh, "HOST_BREAKER_FAILURE_THRESHOLD", 1)
+        monkeypatch.setattr(hh, "HOST_BREAKER_OPEN_SECONDS", 0)
+        self.registry.record_failure("10.0.0.1", 22, hh.LOGIN, "Неверные учётные данные")
+        monkeypatch.setattr(hh, "HOST_BREAKER_OPEN_SECONDS", 60)
+        assert self.registry.check("10.0.0.1", 22, hh.LOGIN) is None
+        assert self.registry.check("10.0.0.1", 22, hh.LOGIN) is not None
+        self.registry.record_success("10.0.0.1", 22, hh.LOGIN)
+        assert self.registry.check("10.0.0.1", 22, hh.LOGIN) is None
+
+    @pytest.mark.unit
+    async def test_network_half_open_probes_in_background(self, monkeypatch):
+        monkeypatch.setattr(hh, "HOST_BREAKER_FAILURE_THRESHOLD", 1)
+        monkeypatch.setattr(hh, "HOST_BREAKER_OPEN_SECONDS", 0)
+        listener = socket.socket()
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        port = listener.getsockname()[1]
+        try:
+            self.registry.record_failure("127.0.0.1", port, hh.NETWORK, "Нет сетевого доступа")
+            monkeypatch.setattr(hh, "HOST_BREAKER_OPEN_SECONDS", 60)
+            # Caller still fails fast while the probe runs
+            assert self.registry.check("127.0.0.1", port) is not None
+            await asyncio.gather(*list(self.registry._probes.values()))
+        finally:
+            listener.close()
+        assert self.registry.check("127.0.0.1", port) is None
+        assert self.registry.snapshot()[0]["state"] == hh.CLOSED
+
+    @pytest.mark.unit
+    def test_reset(self, monkeypatch):
+        monkeypatch.setattr(hh, "HOST_BREAKER_FAILURE_THRESHOLD", 1)
+        self.registry.record_failure("10.0.0.1", 22, hh.NETWORK, "x")
+        self.registry.record_failure("10.0.0.2", 22, hh.NETWORK, "x")
+        self.registry.record_failure("10.0.0.1", 22, hh.LOGIN, "x", "u")
+        assert self.registry.reset("10.0.0.1", 22) == 2
+        assert self.registry.check("10.0.0.1", 22, username="u") is None
+        assert self.registry.reset() == 1
+        assert self.registry.snapshot() == []
+
+
+class TestHealthIntegration:
+    """Tests for the registry in network and login checks"""
+
+    def setup_method(self):
+        hh.host_health.reset()
+
+    def teardown_method(self):
+        hh.host_health.reset()
+
+    @pytest.mark.unit
+    async def test_open_circuit_skips_connect(self, monkeypatch):
+        monkeypatch.setattr(hh, "HOST_BREAKER_FAILURE_THRESHOLD", 2)
+        monkeypatch.setattr(se, "NETWORK_PROBE_TIMEOUT", 1)
+        host = Host(id="h1", name="h1", hostname="127.0.0.1", port=_closed_port(), username="u", auth_type="password")
+        for _ in range(2):
+            assert (await se.probe_network_access(host))[0] is False
+        with patch.object(se.asyncio, "open_connection") as connect:
+            ok, message = await se.probe_network_access(host)
+        assert ok is False
+        assert "хост временно исключён" in message
+        connect.assert_not_called()
+
+    @pytest.mark.unit
+    async def test_recent_success_reused(self, monkeypatch):
+        monkeypatch.setattr(hh, "HOST_REACHABILITY_TTL_SECONDS", 30)
+        listener = socket.socket()
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(4)
+        host = Host(id="h1", name="h1", hostname="127.0.0.1", port=listener.getsockname()[1], username="u", auth_type="password")
+        try:
+            assert (await se.probe_network_access(host))[0] is True
+        finally:
+            listener.close()
+        with patch.object(se.asyncio, "open_connection") as connect:
+            assert await se.probe_network_access(host) == (True, "Сетевой доступ получен")
+        connect.assert_not_called()
+
+    @pytest.mark.unit
+    async def test_login_failures_open_login_circuit(self, monkeypatch):
+        monkeypatch.setattr(hh, "HOST_BREAKER_FAILURE_THRESHOLD", 1)
+        host = Host(id="h1", name="h1", hostname="10.0.0.9", username="u", auth_type="password", connection_type="winrm")
+        with patch.object(se, "_check_winrm_login", return_value=(False, "Неверные учётные данные")) as login:
+            assert (await se.run_winrm_login(host))[0] is False
+            ok, message = await se.run_winrm_login(host)
+        assert ok is False
+        assert message.startswith("Неверные учётные данные")
+        assert login.call_count == 1
+
+    @pytest.mark.unit
+    async def test_unreachable_host_during_login_is_network_failure(self, monkeypatch):
+        monkeypatch.setattr(hh, "HOST_BREAKER_FAILURE_THRESHOLD", 1)
+        host = Host(id="h1", name="h1", hostname="10.0.0.9", username="u", auth_type="password")
+        with patch.object(se, "ssh_connection", side_effect=socket.timeout("timed out")):
+            login_ok, login_msg, _, _ = await se.run_ssh_login_and_sudo(host)
+        assert login_ok is False
+        assert login_msg.startswith("Нет сетевого доступа")
+        assert hh.host_health.check("10.0.0.9", 22, hh.NETWORK)[0] == hh.NETWORK
+        assert hh.host_health.check("10.0.0.9", 22, hh.LOGIN, "u") is None
+
+
+class TestConfigIntegrityConnect:
+    """Tests for failure classification of config integrity connects"""
+
+    def setup_method(self):
+        hh.host_health.reset()
+
+    def teardown_method(self):
+        hh.host_health.reset()
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("error, kind", [
+        (paramiko.AuthenticationException("denied"), hh.LOGIN),
+        (paramiko.SSHException("no acceptable kex algorithm"), hh.LOGIN),
+        (socket.timeout("timed out"), hh.NETWORK),
+        (paramiko.ssh_exception.NoValidConnectionsError({("10.0.0.9", 22): OSError("refused")}), hh.NETWORK),
+    ])
+    def test_failure_recorded_against_matching_circuit(self, monkeypatch, error, kind):
+        monkeypatch.setattr(hh, "HOST_BREAKER_FAILURE_THRESHOLD", 1)
+        with patch.object(ci, "_connect_ssh", side_effect=error), pytest.raises(type(error)):
+            ci._connect_tracked("10.0.0.9", 22, "u", "password", None, None)
+        other = hh.NETWORK if kind == hh.LOGIN else hh.LOGIN
+        assert hh.host_health.check("10.0.0.9", 22, kind, "u")[0] == kind
+        assert hh.host_health.check("10.0.0.9", 22, other, "u" if other == hh.LOGIN else None) is None
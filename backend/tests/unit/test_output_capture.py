@@ -0,0 +1,256 @@
+"""
+Unit tests for bounded command output capture
+Tests: in-memory cap, spill to file, channel draining, CHECK_OUTPUT_FILE for processors
+"""
+import asyncio
+import os
+import time
+import pytest
+from unittest.mock import MagicMock
+
+from models.content_models import Host
+from models.execution_models import ExecutionResult
+from services import services_execution as se
+from services import services_processor_pool as pool_module
+from services.services_output_capture import BoundedOutput, SpilledText, drain_channel, drain_process
+
+
+def _channel(out, err, exit_status):
+    chunks = {"out": [out[:2], out[2:]], "err": [err]}
+    channel = MagicMock()
+    channel.recv_ready.side_effect = lambda: bool(chunks["out"])
+    channel.recv.side_effect = lambda size: chunks["out"].pop(0)
+    channel.recv_stderr_ready.side_effect = lambda: bool(chunks["err"])
+    channel.recv_stderr.side_effect = lambda size: chunks["err"].pop(0)
+    channel.eof_received = True
+    channel.recv_exit_status.return_value = exit_status
+    return channel
+
+
+class TestBoundedOutput:
+    """Tests for BoundedOutput"""
+
+    @pytest.mark.unit
+    def test_small_output_stays_in_memory(self):
+        buf = BoundedOutput(memory_limit=10)
+        buf.write(b"hello")
+        assert buf.text() == "hello"
+        assert buf.spilled is False
+
+    @pytest.mark.unit
+    def test_large_output_spills_full_stream(self):
+        buf = BoundedOutput(memory_limit=4)
+        buf.write(b"abc")
+        buf.write(b"defgh")
+        text = buf.text(keep_spill=True)
+        try:
+            assert isinstance(text, SpilledText)
+            assert text.startswith("abcd\n... [вывод усечён: показано 4 из 8 байт")
+            with open(text.path, "rb") as f:
+                assert f.read() == b"abcdefgh"
+        finally:
+            os.unlink(text.path)
+
+    @pytest.mark.unit
+    def test_spill_removed_unless_kept(self):
+        buf = BoundedOutput(memory_limit=1)
+        buf.write(b"xyz")
+        path = buf.path
+        buf.text()
+        assert not os.path.exists(path)
+
+    @pytest.mark.unit
+    def test_spill_size_is_capped(self):
+        buf = BoundedOutput(memory_limit=2, spill_max_bytes=5)
+        buf.write(b"12345678")
+        text = buf.text(keep_spill=True)
+        try:
+            assert buf.truncated is True
+            assert os.path.getsize(text.path) == 5
+        finally:
+            os.unlink(text.path)
+
+
+class TestDrainChannel:
+    """Tests for drain_channel"""
+
+    @pytest.mark.unit
+    def test_reads_both_streams_and_exit_status(self):
+        out, err = BoundedOutput(), BoundedOutput()
+        exit_code = drain_channel(_channel(b"out", b"err", exit_status=3), out, err)
+        assert exit_code == 3
+        assert out.text() == "out"
+        assert err.text() == "err"
+
+    @pytest.mark.unit
+    def test_last_chunk_arriving_with_eof_is_read(self):
+        class _EofChannel:
+            """Delivers its last chunk at the moment EOF becomes visible."""
+            closed = False
+
+            def __init__(self):
+                self.chunks = [b"head-"]
+                self._eof = False
+
+            @property
+            def eof_received(self):
+                if not self._eof:
+                    self._eof = True
+                    self.chunks.append(b"tail")
+                return True
+
+            def recv_ready(self):
+                return bool(self.chunks)
+
+            def recv(self, size):
+                return self.chunks.pop(0)
+
+            def recv_stderr_ready(self):
+                return False
+
+            def recv_exit_status(self):
+                return 0
+
+        out, err = BoundedOutput(), BoundedOutput()
+        assert drain_channel(_EofChannel(), out, err) == 0
+        assert out.text() == "head-tail"
+
+    @pytest.mark.unit
+    def test_deadline_stops_running_command(self):
+        channel = _channel(b"partial", b"", exit_status=0)
+        channel.eof_received = False
+        channel.closed = False
+        out, err = BoundedOutput(), BoundedOutput()
+        with pytest.raises(TimeoutError):
+            drain_channel(channel, out, err, deadline=time.monotonic())
+        assert out.text() == "partial"
+        channel.recv_exit_status.assert_not_called()
+
+    @pytest.mark.unit
+    def test_idle_timeout_stops_quiet_command(self):
+        channel = _channel(b"partial", b"", exit_status=0)
+        channel.eof_received = False
+        channel.closed = False
+        out, err = BoundedOutput(), BoundedOutput()
+        with pytest.raises(TimeoutError, match="no output"):
+            drain_channel(channel, out, err, idle_timeout=0)
+        assert out.text() == "partial"
+
+
+class _Stream:
+    def __init__(self, chunks, stall=False, delay=0):
+        self.chunks = list(chunks)
+        self.stall = stall
+        self.delay = delay
+
+    async def read(self, size):
+        if self.chunks:
+            await asyncio.sleep(self.delay)
+            return self.chunks.pop(0)
+        if self.stall:
+            await asyncio.sleep(3600)
+        return b""
+
+
+class _Process:
+    def __init__(self, out, err, exit_status=0, stall=False, delay=0):
+        self.stdout = _Stream(out, stall, delay)
+        self.stderr = _Stream(err)
+        self.exit_status = exit_status
+
+    async def wait_closed(self):
+        pass
+
+
+class TestDrainProcess:
+    """Tests for drain_process (asyncssh backend)"""
+
+    @pytest.mark.unit
+    async def test_output_bounded_and_spilled(self):
+        out, err = BoundedOutput(memory_limit=4), BoundedOutput()
+        assert await drain_process(_Process([b"abc", b"defgh"], [b"warn"], exit_status=2), out, err) == 2
+        text = out.text(keep_spill=True)
+        try:
+            assert text.startswith("abcd\n... [вывод усечён")
+            with open(text.path, "rb") as f:
+                assert f.read() == b"abcdefgh"
+        finally:
+            os.unlink(text.path)
+        assert err.text() == "warn"
+
+    @pytest.mark.unit
+    async def test_deadline_stops_running_command(self):
+        out, err = BoundedOutput(), BoundedOutput()
+        with pytest.raises(TimeoutError):
+            await drain_process(_Process([b"partial"], [], stall=True), out, err, deadline=time.monotonic() + 0.05)
+        assert out.text() == "partial"
+
+    @pytest.mark.unit
+    async def test_idle_timeout_counts_from_last_output(self):
+        out, err = BoundedOutput(), BoundedOutput()
+        process = _Process([b"a", b"b", b"c", b"d", b"e"], [], delay=0.03)
+        # Runs longer than idle_timeout in total, but is never quiet that long
+        assert await drain_process(process, out, err, idle_timeout=0.1) == 0
+        assert out.text() == "abcde"
+
+        out, err = BoundedOutput(), BoundedOutput()
+        with pytest.raises(TimeoutError, match="no output"):
+            await drain_process(_Process([b"partial"], [], stall=True), out, err, idle_timeout=0.05)
+        assert out.text() == "partial"
+
+
+class TestSpilledProcessorInput:
+    """Tests for handing spilled output to the processor"""
+
+    @pytest.mark.unit
+    async def test_processor_reads_output_file_and_file_is_removed(self):
+        host = Host(id="h1", name="h1", hostname="10.0.0.1", username="u", auth_type="password")
+        buf = BoundedOutput(memory_limit=3)
+        buf.write(b"head-and-the-rest\n")
+        output = buf.text(keep_spill=True)
+        main_result = ExecutionResult(
+            host_id="h1", host_name="h1", success=True, output=output, output_file=output.path
+        )
+        try:
+            result = await se.process_command_result(
+                host, main_result, 'grep -q "the-rest" "$CHECK_OUTPUT_FILE" && echo "Пройдена"', None, "s1", "check"
+            )
+        finally:
+            if pool_module.processor_pool is not None:
+                await pool_module.processor_pool.close()
+        assert result.check_status == "Пройдена"
+        assert not os.path.exists(output.path)
+
+    @pytest.mark.unit
+    async def test_note_only_in_stored_output(self, monkeypatch):
+        monkeypatch.setattr(se, "OUTPUT_MEMORY_LIMIT", 4)
+        host = Host(id="h1", name="h1", hostname="10.0.0.1", username="u", auth_type="password")
+        buf = BoundedOutput(memory_limit=4)
+        buf.write(b"headtail\n")
+        output = buf.text(keep_spill=True)
+        main_result = ExecutionResult(
+            host_id="h1", host_name="h1", success=True, output=output, output_file=output.path
+        )
+        processor = '[ "$CHECK_OUTPUT" = "head" ] && echo "Пройдена" || echo "Не пройдена"'
+        try:
+            result = await se.process_command_result(host, main_result, processor, None, "s1", "check")
+        finally:
+            if pool_module.processor_pool is not None:
+                await pool_module.processor_pool.close()
+        assert result.check_status == "Пройдена"
+        assert result.output.startswith(str(output))
+
+    @pytest.mark.unit
+    async def test_rules_see_whole_spilled_output(self):
+        host = Host(id="h1", name="h1", hostname="10.0.0.1", username="u", auth_type="password")
+        buf = BoundedOutput(memory_limit=3)
+        buf.write(b"head-and-the-rest\n")
+        output = buf.text(keep_spill=True)
+        main_result = ExecutionResult(
+            host_id="h1", host_name="h1", success=True, output=output, output_file=output.path
+        )
+        rules = [{"type": "contains", "value": "the-rest"}, {"type": "not_contains", "value": "усечён"}]
+        result = await se.process_command_result(host, main_result, None, None, "s1", "check", rules)
+        assert result.check_status == "Пройдена"
+        assert result.output == str(output)
+        assert not os.path.exists(output.path)
@@ -0,0 +1,124 @@
+"""
+Unit tests for processor script caches
+Tests: syntax validation cache keyed by normalized script hash, processor result cache
+"""
+import pytest
+from unittest.mock import patch
+
+from services import services_execution as se
+from services import services_processor_cache as pc
+from services import services_processor_pool as pool_module
+
+
+async def _process(script, output, reference=None, host_name="host"):
+    try:
+        return await se.run_processor_on_output(
+            host_id="h1",
+            host_name=host_name,
+            raw_output=output,
+            processor_script=script,
+            reference_data=reference,
+            script_id="s1",
+            script_name="check",
+        )
+    finally:
+        if pool_module.processor_pool is not None:
+            await pool_module.processor_pool.close()
+
+
+class TestSyntaxCache:
+    """Tests for check_processor_syntax caching"""
+
+    def setup_method(self):
+        pc._syntax_cache.clear()
+
+    @pytest.mark.unit
+    async def test_valid_script_checked_once(self):
+        real_run = se._run_local_process
+        with patch.object(se, "_run_local_process", side_effect=real_run) as runner:
+            assert await se.check_processor_syntax("echo ok\n") == (True, "")
+            assert await se.check_processor_syntax("echo ok\n") == (True, "")
+        assert runner.call_count == 1
+
+    @pytest.mark.unit
+    async def test_line_endings_share_cache_entry(self):
+        await se.check_processor_syntax("if true; then\n echo ok\nfi\n")
+        assert pc.get_cached_syntax("if true; then\r\n echo ok\r\nfi\r\n") == (True, "")
+
+    @pytest.mark.unit
+    async def test_syntax_error_cached_with_message(self):
+        valid, error = await se.check_processor_syntax("if then fi")
+        assert valid is False
+        assert "syntax error" in error
+        assert pc.get_cached_syntax("if then fi") == (False, error)
+
+    @pytest.mark.unit
+    async def test_warm_ignores_empty_script(self):
+        await se.warm_processor_syntax_cache("   ")
+        assert len(pc._syntax_cache) == 0
+
+    @pytest.mark.unit
+    def test_lru_evicts_oldest(self):
+        cache = pc.LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+
+class TestResultCache:
+    """Tests for the processor result cache"""
+
+    def setup_method(self):
+        pc.clear_processor_caches()
+
+    @pytest.mark.unit
+    async def test_identical_input_runs_processor_once(self):
+        real_run = se._run_processor_process
+        with patch.object(se, "_run_processor_process", side_effect=real_run) as runner:
+            first = await _process('echo "Пройдена"', "same output", host_name="a")
+            second = await _process('echo "Пройдена"', "same output", host_name="b")
+        assert runner.call_count == 1
+        assert second.check_status == first.check_status == "Пройдена"
+        assert second.host_name == "b"
+        assert pc.processor_cache_stats()["result_cache"]["hits"] == 1
+
+    @pytest.mark.unit
+    async def test_key_includes_output_and_reference(self):
+        script = '[ "$CHECK_OUTPUT" = "$ETALON_INPUT" ] && echo "Пройдена" || echo "Не пройдена"'
+        assert (await _process(script, "a", "a")).check_status == "Пройдена"
+        assert (await _process(script, "b", "a")).check_status == "Не пройдена"
+        assert (await _process(script, "a", "b")).check_status == "Не пройдена"
+        assert pc.processor_cache_stats()["result_cache"]["misses"] == 3
+
+    @pytest.mark.unit
+    async def test_cached_error_keeps_stderr_section(self):
+        first = await _process("nosuchcommand_kappi; exit 7", "raw")
+        second = await _process("nosuchcommand_kappi; exit 7", "raw")
+        assert first.check_status == "Ошибка"
+        assert second.output == first.output
+        assert second.output.startswith("raw\n\n=== Ошибка скрипта-обработчика ===")
+
+    @pytest.mark.unit
+    async def test_timeout_not_cached(self, monkeypatch):
+        monkeypatch.setattr(se, "PROCESSOR_TIMEOUT", 0.3)
+        result = await _process("sleep 10", "x")
+        assert result.error_code == 34
+        assert len(pc._result_cache) == 0
+
+    @pytest.mark.unit
+    async def test_disabled_cache(self, monkeypatch):
+        monkeypatch.setattr(pc, "PROCESSOR_RESULT_CACHE_SIZE", 0)
+        await _process('echo "Пройдена"', "x")
+        assert len(pc._result_cache) == 0
+
+    @pytest.mark.unit
+    def test_ttl_expiry(self):
+        cache = pc.LRUCache(10, ttl=60)
+        with patch.object(pc.time, "monotonic", side_effect=[100, 120, 200]):
+            cache.put("a", 1)
+            assert cache.get("a") == 1
+            assert cache.get("a") is None
@@ -0,0 +1,153 @@
+"""
+Unit tests for local processor script execution
+Tests: non-blocking subprocesses, timeout kill, status classification, worker pool
+"""
+import asyncio
+import subprocess
+import time
+import pytest
+
+from services import services_execution as se
+from services import services_processor_pool as pool_module
+from services.services_processor_pool import ProcessorPool
+
+
+async def _process(script, output="", reference=None):
+    try:
+        return await se.run_processor_on_output(
+            host_id="h1",
+            host_name="host",
+            raw_output=output,
+            processor_script=script,
+            reference_data=reference,
+            script_id="s1",
+            script_name="check",
+        )
+    finally:
+        # Workers belong to the test's event loop: stop them before the loop closes
+        if pool_module.processor_pool is not None:
+            await pool_module.processor_pool.close()
+
+
+class TestRunLocalProcess:
+    """Tests for _run_local_process"""
+
+    @pytest.mark.unit
+    async def test_captures_output_and_return_code(self):
+        result = await se._run_local_process(
+            ["bash", "-c", "cat; echo err >&2; exit 3"], input="data", timeout=5
+        )
+        assert result.stdout == "data"
+        assert result.stderr == "err\n"
+        assert result.returncode == 3
+
+    @pytest.mark.unit
+    async def test_timeout_kills_process_group(self):
+        started = time.monotonic()
+        with pytest.raises(subprocess.TimeoutExpired):
+            await se._run_local_process(["bash", "-c", "sleep 30 & wait"], timeout=0.3)
+        assert time.monotonic() - started < 5
+
+    @pytest.mark.unit
+    async def test_event_loop_not_blocked(self):
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        await se._run_local_process(["sleep", "0.3"], timeout=5)
+        task.cancel()
+        assert ticks > 10
+
+
+class TestRunProcessorOnOutput:
+    """Tests for processor status classification"""
+
+    @pytest.mark.unit
+    async def test_passed_by_keyword(self):
+        result = await _process('echo "Пройдена"', output="ok")
+        assert result.check_status == "Пройдена"
+        assert result.success is True
+
+    @pytest.mark.unit
+    async def test_check_output_available_in_env(self):
+        result = await _process('[ "$CHECK_OUTPUT" = "enabled" ] && echo "Пройдена" || echo "Не пройдена"', output="enabled")
+        assert result.check_status == "Пройдена"
+
+    @pytest.mark.unit
+    async def test_known_exit_code_is_classified(self):
+        result = await _process("exit 41", output="x")
+        assert result.check_status == "Не пройдена"
+        assert result.error_code == 41
+
+    @pytest.mark.unit
+    async def test_timeout_reports_error_34(self, monkeypatch):
+        monkeypatch.setattr(se, "PROCESSOR_TIMEOUT", 0.3)
+        result = await _process("sleep 10", output="x")
+        assert result.check_status == "Ошибка"
+        assert result.error_code == 34
+
+
+class TestProcessorPool:
+    """Tests for the pre-forked processor worker pool"""
+
+    @pytest.mark.unit
+    async def test_worker_reused_and_recycled(self):
+        pool = ProcessorPool(size=1, max_jobs=2)
+        try:
+            first = await pool.run("echo $$", "", "", timeout=5)
+            second = await pool.run("echo $$", "", "", timeout=5)
+            third = await pool.run("echo $$", "", "", timeout=5)
+        finally:
+            await pool.close()
+        worker_of = lambda r: r.stdout.strip()
+        assert worker_of(first) == worker_of(second)
+        assert worker_of(third) != worker_of(second)
+
+    @pytest.mark.unit
+    async def test_result_matches_bash_x(self):
+        pool = ProcessorPool(size=1)
+        try:
+            result = await pool.run('echo "$CHECK_OUTPUT|$ETALON_INPUT"; echo e >&2; exit 42', "out\n\n", "ref", timeout=5)
+        finally:
+            await pool.close()
+        assert result.returncode == 42
+        assert result.stdout == "out\n\n|ref\n"
+        assert "exit 42" in result.stderr
+        assert "e\n" in result.stderr
+
+    @pytest.mark.unit
+    async def test_state_does_not_leak_between_jobs(self):
+        pool = ProcessorPool(size=1)
+        try:
+            await pool.run("LEAK=1; cd /; exit 0", "", "", timeout=5)
+            result = await pool.run('echo "${LEAK:-none} $PWD"', "", "", timeout=5)
+        finally:
+            await pool.close()
+        assert result.stdout.split()[0] == "none"
+        assert result.stdout.split()[1] != "/"
+
+    @pytest.mark.unit
+    async def test_large_output_visible_but_not_exported(self, monkeypatch):
+        monkeypatch.setattr(pool_module, "PROCESSOR_ENV_MAX_BYTES", 10)
+        pool = ProcessorPool(size=1)
+        try:
+            result = await pool.run('echo ${#CHECK_OUTPUT}; printenv CHECK_OUTPUT || echo unset', "x" * 100, "", timeout=5)
+        finally:
+            await pool.close()
+        assert result.stdout.split() == ["100", "unset"]
+
+    @pytest.mark.unit
+    async def test_timeout_kills_worker(self):
+        pool = ProcessorPool(size=1)
+        try:
+            with pytest.raises(subprocess.TimeoutExpired):
+                await pool.run("sleep 30", "", "", timeout=0.3)
+            result = await pool.run("echo alive", "", "", timeout=5)
+        finally:
+            await pool.close()
+        assert result.stdout == "alive\n"
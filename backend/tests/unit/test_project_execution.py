@@ -0,0 +1,254 @@
+"""
+Unit tests for concurrent project execution
+Tests: per-run host concurrency, event interleaving, final counts, run plan, reachability sweep
+"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from services import services_project_execution as pe
+
+
+def _cursor(docs):
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(return_value=docs)
+    return cursor
+
+
+def _mock_db(tasks, hosts=(), systems=(), scripts=()):
+    db = MagicMock()
+    db.projects.find_one = AsyncMock(return_value={"id": "p1", "name": "Project"})
+    db.project_tasks.find = MagicMock(return_value=_cursor(tasks))
+    db.hosts.find = MagicMock(return_value=_cursor(list(hosts)))
+    db.systems.find = MagicMock(return_value=_cursor(list(systems)))
+    db.scripts.find = MagicMock(return_value=_cursor(list(scripts)))
+    return db
+
+
+async def _collect(gen):
+    return [event async for event in gen]
+
+
+class TestResolveParallelHosts:
+    """Tests for per-run concurrency resolution"""
+
+    @pytest.mark.unit
+    def test_default_when_not_requested(self):
+        assert pe.resolve_parallel_hosts(None) == min(pe.EXECUTION_PARALLEL_HOSTS, pe.EXECUTION_GLOBAL_PARALLEL_HOSTS)
+
+    @pytest.mark.unit
+    def test_clamped_to_global_limit(self):
+        assert pe.resolve_parallel_hosts(10_000) == pe.EXECUTION_GLOBAL_PARALLEL_HOSTS
+
+    @pytest.mark.unit
+    def test_minimum_is_one(self):
+        assert pe.resolve_parallel_hosts(-5) == 1
+
+
+class TestRunProjectEvents:
+    """Tests for run_project_events concurrency and counters"""
+
+    @pytest.mark.unit
+    async def test_hosts_run_concurrently_within_limit(self):
+        tasks = [{"id": f"t{i}", "host_id": f"h{i}"} for i in range(6)]
+        in_flight = 0
+        peak = 0
+
+        async def fake_execute_task(task, *, project_id, session_id, user_id, emit, writer, plan, ssh_manager=None, network=None, winrm_manager=None):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await emit({"type": "task_start", "host_name": task["host_id"]})
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            ok = task["id"] != "t3"
+            await emit({"type": "task_complete" if ok else "task_error", "host_name": task["host_id"]})
+            return ok
+
+        with patch.object(pe, "db", _mock_db(tasks)), \
+                patch.object(pe, "start_ssh_log_session"), \
+                patch.object(pe, "end_ssh_log_session"), \
+                patch.object(pe, "_execute_task", side_effect=fake_execute_task):
+            events = await _collect(pe.run_project_events("p1", "u1", parallel_hosts=3))
+
+        assert peak == 3
+        types = [e["type"] for e in events]
+        # Events of several hosts are interleaved: more than one task_start before first completion
+        first_done = min(i for i, t in enumerate(types) if t in ("task_complete", "task_error"))
+        assert types[:first_done].count("task_start") >= 2
+        complete = events[-1]
+        assert complete["type"] == "complete"
+        assert complete["completed"] == 5
+        assert complete["failed"] == 1
+        assert complete["total"] == 6
+        assert complete["status"] == "failed"
+        assert complete["session_id"] == events[0]["session_id"]
+
+    @pytest.mark.unit
+    async def test_queued_hosts_within_limit(self, monkeypatch):
+        monkeypatch.setattr(pe, "EXECUTION_QUEUE_ENABLED", True)
+        tasks = [{"id": f"t{i}", "host_id": f"h{i}"} for i in range(5)]
+        in_flight = 0
+        peak = 0
+
+        async def fake_run_task_via_queue(task, *, project_id, session_id, user_id, emit, network=None):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return True
+
+        with patch.object(pe, "db", _mock_db(tasks)), \
+                patch.object(pe, "start_ssh_log_session"), \
+                patch.object(pe, "end_ssh_log_session"), \
+                patch.object(pe, "_execute_task", AsyncMock()) as execute_task, \
+                patch.object(pe, "run_task_via_queue", side_effect=fake_run_task_via_queue):
+            events = await _collect(pe.run_project_events("p1", "u1", parallel_hosts=2))
+
+        assert peak == 2
+        execute_task.assert_not_awaited()
+        assert events[-1]["completed"] == 5
+
+    @pytest.mark.unit
+    async def test_shared_host_released_after_its_last_task(self):
+        tasks = [{"id": "t1", "host_id": "h1"}, {"id": "t2", "host_id": "h1"}]
+        in_flight = 0
+        released_in_flight = []
+
+        async def fake_execute_task(task, **kwargs):
+            nonlocal in_flight
+            in_flight += 1
+            await asyncio.sleep(0.01 if task["id"] == "t1" else 0.03)
+            in_flight -= 1
+            return True
+
+        def manager():
+            m = MagicMock()
+            m.arelease = AsyncMock(side_effect=lambda host_id: released_in_flight.append(in_flight))
+            m.aclose_all = AsyncMock()
+            return m
+
+        ssh_manager = manager()
+        with patch.object(pe, "db", _mock_db(tasks)), \
+                patch.object(pe, "start_ssh_log_session"), \
+                patch.object(pe, "end_ssh_log_session"), \
+                patch.object(pe, "create_ssh_manager", return_value=ssh_manager), \
+                patch.object(pe, "create_winrm_manager", return_value=manager()), \
+                patch.object(pe, "_execute_task", side_effect=fake_execute_task):
+            await _collect(pe.run_project_events("p1", "u1", parallel_hosts=2))
+
+        ssh_manager.arelease.assert_awaited_once_with("h1")
+        assert released_in_flight[0] == 0
+
+    @pytest.mark.unit
+    async def test_unexpected_task_exception_counts_as_failed(self):
+        tasks = [{"id": "t1", "host_id": "h1"}]
+
+        with patch.object(pe, "db", _mock_db(tasks)), \
+                patch.object(pe, "start_ssh_log_session"), \
+                patch.object(pe, "end_ssh_log_session"), \
+                patch.object(pe, "_execute_task", side_effect=RuntimeError("boom")):
+            events = await _collect(pe.run_project_events("p1", "u1"))
+
+        assert any(e["type"] == "task_error" for e in events)
+        assert events[-1]["failed"] == 1
+        assert events[-1]["completed"] == 0
+
+
+class TestLoadRunPlan:
+    """Tests for the up-front run plan"""
+
+    @pytest.mark.unit
+    async def test_one_query_per_collection_and_scripts_decoded_once(self):
+        tasks = [
+            {"id": f"t{i}", "host_id": f"h{i}", "system_id": "sys1", "script_ids": ["s2", "s1", "missing"]}
+            for i in range(50)
+        ]
+        hosts = [
+            {"id": f"h{i}", "name": f"h{i}", "hostname": "10.0.0.1", "username": "u", "auth_type": "password"}
+            for i in range(50)
+        ]
+        systems = [{"id": "sys1", "category_id": "c1", "name": "Linux"}]
+        scripts = [
+            {"id": "s1", "system_id": "sys1", "name": "one", "content": "echo 1"},
+            {"id": "s2", "system_id": "sys1", "name": "two", "content": "echo 2"},
+        ]
+        db = _mock_db(tasks, hosts, systems, scripts)
+        real_decode = pe.decode_script_from_storage
+
+        with patch.object(pe, "db", db), \
+                patch.object(pe, "decode_script_from_storage", side_effect=real_decode) as decode:
+            plan = await pe.load_run_plan(tasks)
+
+        assert db.hosts.find.call_count == db.systems.find.call_count == db.scripts.find.call_count == 1
+        assert decode.call_count == 2
+        assert len(plan.hosts) == 50
+        task_obj = pe.ProjectTask(**tasks[0], project_id="p1")
+        assert [s.name for s in plan.task_scripts(task_obj)] == ["two", "one"]
+        with pytest.raises(TypeError):
+            plan.scripts["s3"] = plan.scripts["s1"]
+
+
+class TestNetworkSweep:
+    """Tests for the pre-run TCP reachability sweep"""
+
+    @pytest.mark.unit
+    async def test_dead_hosts_cost_one_timeout_window(self, monkeypatch):
+        import socket
+        from models.content_models import Host
+        from services import services_execution as se
+
+        listener = socket.socket()
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(16)
+        closed = socket.socket()
+        closed.bind(("127.0.0.1", 0))
+        closed_port = closed.getsockname()[1]
+        closed.close()
+
+        def _host(host_id, port):
+            return Host(id=host_id, name=host_id, hostname="127.0.0.1", port=port, username="u", auth_type="password")
+
+        hosts = [_host("up", listener.getsockname()[1])] + [_host(f"down{i}", closed_port) for i in range(20)]
+        monkeypatch.setattr(se, "NETWORK_PROBE_TIMEOUT", 1)
+        started = asyncio.get_running_loop().time()
+        try:
+            results = await se.sweep_network_access(hosts)
+        finally:
+            listener.close()
+
+        assert asyncio.get_running_loop().time() - started < 3
+        assert results["up"] == (True, "Сетевой доступ получен")
+        assert all(not results[f"down{i}"][0] for i in range(20))
+
+    @pytest.mark.unit
+    async def test_unreachable_host_fails_with_code_11_without_probe(self):
+        from models.content_models import Host, System, Script
+
+        host = Host(id="h1", name="h1", hostname="10.0.0.1", username="u", auth_type="password")
+        plan = pe.RunPlan(
+            hosts={"h1": host},
+            systems={"sys1": System(id="sys1", category_id="c1", name="Linux")},
+            scripts={"s1": Script(id="s1", system_id="sys1", name="one", content="echo 1")},
+        )
+        task = {"id": "t1", "project_id": "p1", "host_id": "h1", "system_id": "sys1", "script_ids": ["s1"]}
+        events = []
+
+        async def emit(event):
+            events.append(event)
+
+        writer = MagicMock()
+        writer.set_task_status = AsyncMock()
+        with patch.object(pe, "_check_network_access") as blocking_probe, \
+                patch.object(pe, "save_failed_executions", AsyncMock()) as save_failed:
+            ok = await pe._execute_task(
+                task, project_id="p1", session_id="s", user_id="u", emit=emit,
+                writer=writer, plan=plan, network={"h1": (False, "Нет сетевого доступа")},
+            )
+
+        assert ok is False
+        blocking_probe.assert_not_called()
+        assert save_failed.await_args.kwargs["check_type"] == "network"
+        network_event = next(e for e in events if e["type"] == "check_network")
+        assert network_event["error_code"] == 11
@@ -0,0 +1,205 @@
+"""
+Unit tests for scheduler job dispatch
+Tests: concurrent dispatch under a limit, per-project overlap policy, dispatch delay,
+lease-based claiming and reclaim of orphaned jobs
+"""
+import asyncio
+import importlib
+from datetime import datetime, timedelta, timezone
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from models.execution_models import ProjectRunSummary
+from scheduler import scheduler_execution as se
+
+# The package re-exports the scheduler_worker function under the module's name
+sw = importlib.import_module("scheduler.scheduler_worker")
+
+
+
+@pytest.fixture(autouse=True)
+def _claims(monkeypatch):
+    """Every due occurrence is won by this instance unless a test says otherwise."""
+    monkeypatch.setattr(sw, "claim_due_scheduler_job", AsyncMock(return_value=True))
+    monkeypatch.setattr(sw, "release_scheduler_job_claim", AsyncMock())
+
+def _job(job_id, project_id, minutes_ago=1):
+    due = datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)
+    return {"id": job_id, "name": job_id, "project_id": project_id, "job_type": "one_time",
+            "status": "active", "next_run_at": due.isoformat(), "created_by": "u1"}
+
+
+def _summary(status="completed"):
+    return ProjectRunSummary(session_id="s1", project_id="p1", status=status, total=1, completed=1,
+                             started_at=datetime.now(timezone.utc), duration_seconds=1.5)
+
+
+def _scheduler_db(jobs, running_project=None):
+    db = MagicMock()
+    cursor = MagicMock()
+    cursor.sort.return_value.to_list = AsyncMock(return_value=jobs)
+    db.scheduler_jobs.find = MagicMock(return_value=cursor)
+    db.execution_runs.find_one = AsyncMock(
+        side_effect=lambda query, projection: {"_id": 1} if query["project_id"] == running_project else None
+    )
+    return db
+
+
+class TestDispatchDueJobs:
+    """Tests for dispatch_due_jobs"""
+
+    def setup_method(self):
+        sw._running_jobs.clear()
+        sw._running_projects.clear()
+
+    @pytest.mark.unit
+    async def test_jobs_run_concurrently_up_to_limit(self, monkeypatch):
+        monkeypatch.setattr(sw, "SCHEDULER_MAX_CONCURRENT_JOBS", 2)
+        release = asyncio.Event()
+        started = []
+
+        async def fake_handle(job_doc, claimed=False):
+            started.append(job_doc["id"])
+            await release.wait()
+
+        jobs = [_job("j1", "p1"), _job("j2", "p2"), _job("j3", "p3")]
+        with patch.object(sw, "db", _scheduler_db(jobs)), patch.object(sw, "handle_due_scheduler_job", side_effect=fake_handle):
+            assert await sw.dispatch_due_jobs() == 2
+            await asyncio.sleep(0)
+            assert started == ["j1", "j2"]
+            # No free slot while both run
+            assert await sw.dispatch_due_jobs() == 0
+            release.set()
+            await asyncio.gather(*sw._running_jobs.values())
+        assert not sw._running_projects
+
+    @pytest.mark.unit
+    async def test_busy_project_is_queued(self, monkeypatch):
+        monkeypatch.setattr(sw, "SCHEDULER_OVERLAP_POLICY", "queue")
+        jobs = [_job("j1", "p1"), _job("j2", "p2")]
+        with patch.object(sw, "db", _scheduler_db(jobs, running_project="p1")), \
+                patch.object(sw, "handle_due_scheduler_job", AsyncMock()) as handle, \
+                patch.object(sw, "skip_due_scheduler_job", AsyncMock()) as skip:
+            assert await sw.dispatch_due_jobs() == 1
+            await asyncio.gather(*sw._running_jobs.values())
+        assert [call.args[0]["id"] for call in handle.call_args_list] == ["j2"]
+        skip.assert_not_awaited()
+
+    @pytest.mark.unit
+    async def test_busy_project_is_skipped(self, monkeypatch):
+        monkeypatch.setattr(sw, "SCHEDULER_OVERLAP_POLICY", "skip")
+        jobs = [_job("j1", "p1")]
+        with patch.object(sw, "db", _scheduler_db(jobs, running_project="p1")), \
+                patch.object(sw, "handle_due_scheduler_job", AsyncMock()) as handle, \
+                patch.object(sw, "skip_due_scheduler_job", AsyncMock()) as skip:
+            assert await sw.dispatch_due_jobs() == 0
+        handle.assert_not_awaited()
+        assert skip.call_args.args[0]["id"] == "j1"
+
+    @pytest.mark.unit
+    async def test_due_jobs_beyond_fetch_limit_are_deferred(self, monkeypatch):
+        monkeypatch.setattr(sw, "SCHEDULER_MAX_CONCURRENT_JOBS", 1)
+        # capacity 1 + 20: the fetch is full and j21, j22 were not fetched
+        jobs = [_job(f"j{i}", "p1") for i in range(21)]
+        due_ids = [f"j{i}" for i in range(23)]
+        with patch.object(sw, "db", _scheduler_db(jobs)), patch.object(sw, "handle_due_scheduler_job", AsyncMock()):
+            assert await sw.dispatch_due_jobs(due_ids) == 1
+            await asyncio.gather(*sw._running_jobs.values())
+        assert {"j21", "j22"} <= sw._deferred_jobs
+        assert "j0" not in sw._deferred_jobs
+
+    @pytest.mark.unit
+    async def test_unfetched_keys_dropped_below_fetch_limit(self):
+        jobs = [_job("j1", "p1")]
+        with patch.object(sw, "db", _scheduler_db(jobs)), patch.object(sw, "handle_due_scheduler_job", AsyncMock()):
+            assert await sw.dispatch_due_jobs(["j1", "j2"]) == 1
+            await asyncio.gather(*sw._running_jobs.values())
+        assert "j2" not in sw._deferred_jobs
+
+    @pytest.mark.unit
+    async def test_same_project_not_started_twice(self):
+        jobs = [_job("j1", "p1"), _job("j2", "p1")]
+        with patch.object(sw, "db", _scheduler_db(jobs)), patch.object(sw, "handle_due_scheduler_job", AsyncMock()):
+            assert await sw.dispatch_due_jobs() == 1
+            await asyncio.gather(*sw._running_jobs.values())
+
+
+class TestDispatchDelay:
+    """Tests for dispatch delay recorded on SchedulerRun"""
+
+    @pytest.mark.unit
+    async def test_delay_recorded(self):
+        db = MagicMock()
+        db.scheduler_jobs.find_one_and_update = AsyncMock(return_value={"id": "j1"})
+        db.scheduler_jobs.update_one = AsyncMock()
+        db.scheduler_runs.insert_one = AsyncMock()
+        db.scheduler_runs.update_one = AsyncMock()
+        with patch.object(se, "db", db), \
+                patch.object(se, "execute_scheduler_job", AsyncMock(return_value=_summary())), \
+                patch.object(se, "update_job_after_run", AsyncMock()):
+            await se.handle_due_scheduler_job(_job("j1", "p1", minutes_ago=2))
+        run_doc = db.scheduler_runs.insert_one.call_args.args[0]
+        assert 119 <= run_doc["dispatch_delay_seconds"] < 130
+        assert isinstance(run_doc["scheduled_for"], str)
+
+
+class TestJobLease:
+    """Tests for claiming due jobs with a lease"""
+
+    @pytest.mark.unit
+    async def test_claim_matches_due_time_and_sets_lease(self):
+        db = MagicMock()
+        db.scheduler_jobs.find_one_and_update = AsyncMock(return_value={"id": "j1"})
+        job_doc = _job("j1", "p1")
+        with patch.object(se, "db", db):
+            assert await se.claim_due_scheduler_job(job_doc) is True
+        query, update = db.scheduler_jobs.find_one_and_update.call_args.args
+        assert query["next_run_at"] == job_doc["next_run_at"]
+        assert update["$set"]["next_run_at"] is None
+        assert update["$set"]["lease_owner"] == se.SCHEDULER_OWNER
+        assert update["$set"]["lease_expires_at"] > datetime.now(timezone.utc).isoformat()
+
+    @pytest.mark.unit
+    async def test_job_claimed_elsewhere_is_not_run(self):
+        db = MagicMock()
+        db.scheduler_jobs.find_one_and_update = AsyncMock(return_value=None)
+        db.scheduler_runs.insert_one = AsyncMock()
+        with patch.object(se, "db", db), patch.object(se, "execute_scheduler_job", AsyncMock()) as execute:
+            await se.handle_due_scheduler_job(_job("j1", "p1"))
+            await se.skip_due_scheduler_job(_job("j1", "p1"), "busy")
+        execute.assert_not_awaited()
+        db.scheduler_runs.insert_one.assert_not_awaited()
+
+    @pytest.mark.unit
+    async def test_run_records_owner_and_releases_lease(self):
+        db = MagicMock()
+        db.scheduler_jobs.find_one_and_update = AsyncMock(return_value={"id": "j1"})
+        db.scheduler_jobs.update_one = AsyncMock()
+        db.scheduler_runs.insert_one = AsyncMock()
+        db.scheduler_runs.update_one = AsyncMock()
+        with patch.object(se, "db", db), \
+                patch.object(se, "execute_scheduler_job", AsyncMock(return_value=_summary())):
+            await se.handle_due_scheduler_job(_job("j1", "p1"))
+        assert db.scheduler_runs.insert_one.call_args.args[0]["lease_owner"] == se.SCHEDULER_OWNER
+        run_update = db.scheduler_runs.update_one.call_args.args[1]["$set"]
+        assert run_update["status"] == "success" and run_update["session_id"] == "s1"
+        assert run_update["summary"] == {"total": 1, "completed": 1, "failed": 0, "duration_seconds": 1.5}
+        job_update = db.scheduler_jobs.update_one.call_args.args[1]["$set"]
+        assert job_update["lease_owner"] is None and job_update["status"] == "completed"
+
+    @pytest.mark.unit
+    async def test_orphaned_job_is_reclaimed(self):
+        orphan = dict(_job("j1", "p1"), job_type="recurring", next_run_at=None,
+                      schedule_config={"recurrence_frequency": "hours", "recurrence_interval": 1},
+                      lease_owner="dead-host:1:abc", lease_expires_at="2000-01-01T00:00:00+00:00")
+        db = MagicMock()
+        db.scheduler_jobs.find_one_and_update = AsyncMock(side_effect=[orphan, None])
+        db.scheduler_jobs.update_one = AsyncMock()
+        db.scheduler_runs.update_many = AsyncMock()
+        with patch.object(se, "db", db):
+            assert await se.reclaim_orphaned_scheduler_jobs() == 1
+        runs_query, runs_update = db.scheduler_runs.update_many.call_args.args
+        assert runs_query == {"job_id": "j1", "status": "running", "lease_owner": "dead-host:1:abc"}
+        assert runs_update["$set"]["status"] == "failed"
+        job_update = db.scheduler_jobs.update_one.call_args.args[1]["$set"]
+        assert job_update["last_run_status"] == "failed" and job_update["lease_owner"] is None
@@ -0,0 +1,164 @@
+"""
+Unit tests for scheduler load spreading
+Tests: jitter offsets, jittered next runs of recurring jobs, fleet-wide hosts-per-minute budget
+"""
+import asyncio
+import importlib
+from datetime import datetime, timedelta, timezone
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from pymongo.errors import DuplicateKeyError
+
+from models.execution_models import SchedulerJob
+from scheduler import scheduler_utils as su
+
+# The package re-exports the scheduler_worker function under the module's name
+sw = importlib.import_module("scheduler.scheduler_worker")
+
+
+
+@pytest.fixture(autouse=True)
+def _claims(monkeypatch):
+    """Every due occurrence is won by this instance unless a test says otherwise."""
+    monkeypatch.setattr(sw, "claim_due_scheduler_job", AsyncMock(return_value=True))
+    monkeypatch.setattr(sw, "release_scheduler_job_claim", AsyncMock())
+
+def _recurring(job_id, **config):
+    return SchedulerJob(id=job_id, name=job_id, project_id="p1", job_type="recurring", created_by="u1",
+                        schedule_config={"schedule_mode": "simple", "recurrence_frequency": "daily",
+                                         "recurrence_time": "09:00", **config})
+
+
+class TestJitter:
+    """Tests for jitter_offset / calculate_next_run"""
+
+    @pytest.mark.unit
+    def test_hash_offset_is_stable_and_in_window(self):
+        offsets = {su.jitter_offset(600, key=f"job-{n}") for n in range(50)}
+        assert all(timedelta(0) <= offset < timedelta(seconds=600) for offset in offsets)
+        assert len(offsets) > 10
+        assert su.jitter_offset(600, key="job-1") == su.jitter_offset(600, key="job-1")
+
+    @pytest.mark.unit
+    def test_no_window_no_offset(self):
+        assert su.jitter_offset(0, key="job-1", mode="random") == timedelta(0)
+
+    @pytest.mark.unit
+    def test_daily_job_shifted_within_window(self):
+        reference = datetime(2030, 1, 1, 12, 0, tzinfo=timezone.utc)
+        nominal = datetime(2030, 1, 2, 9, 0, tzinfo=timezone.utc)
+        next_run = su.calculate_next_run(_recurring("j1", jitter_seconds=900), reference=reference)
+        assert nominal <= next_run < nominal + timedelta(seconds=900)
+        # The jittered run does not move the following occurrence
+        assert su.calculate_next_run(_recurring("j1", jitter_seconds=900), reference=next_run) == next_run + timedelta(days=1)
+
+    @pytest.mark.unit
+    def test_default_window_applies_to_jobs_without_setting(self, monkeypatch):
+        monkeypatch.setattr(su, "SCHEDULER_JITTER_SECONDS", 900)
+        reference = datetime(2030, 1, 1, 12, 0, tzinfo=timezone.utc)
+        runs = {su.calculate_next_run(_recurring(f"j{n}"), reference=reference) for n in range(20)}
+        assert len(runs) > 1
+        assert su.calculate_next_run(_recurring("j0", jitter_seconds=0), reference=reference) == \
+            datetime(2030, 1, 2, 9, 0, tzinfo=timezone.utc)
+
+    @pytest.mark.unit
+    def test_interval_schedules_not_shifted(self):
+        reference = datetime(2030, 1, 1, 12, 0, tzinfo=timezone.utc)
+        job = _recurring("j1", recurrence_frequency="minutes", recurrence_interval=15, jitter_seconds=900)
+        assert su.calculate_next_run(job, reference=reference) == reference + timedelta(minutes=15)
+
+
+class TestHostBudget:
+    """Tests for the hosts-per-minute budget in dispatch_due_jobs"""
+
+    def setup_method(self):
+        sw._running_jobs.clear()
+        sw._running_projects.clear()
+
+    @staticmethod
+    def _db(jobs, hosts_per_project, admitted):
+        db = MagicMock()
+        cursor = MagicMock()
+        cursor.sort.return_value.to_list = AsyncMock(return_value=jobs)
+        db.scheduler_jobs.find = MagicMock(return_value=cursor)
+        db.execution_runs.find_one = AsyncMock(return_value=None)
+        db.project_tasks.count_documents = AsyncMock(side_effect=lambda query: hosts_per_project)
+        outcomes = iter(admitted)
+
+        async def update_one(query, update, upsert):
+            if not next(outcomes):
+                raise DuplicateKeyError("window")
+        db.scheduler_host_budget.update_one = update_one
+        return db
+
+    @pytest.mark.unit
+    async def test_spent_budget_defers_remaining_jobs(self, monkeypatch):
+        monkeypatch.setattr(sw, "SCHEDULER_MAX_HOSTS_PER_MINUTE", 10)
+        due = (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat()
+        jobs = [{"id": f"j{n}", "project_id": f"p{n}", "next_run_at": due} for n in range(3)]
+        db = self._db(jobs, 6, [True, False, False])
+        with patch.object(sw, "db", db), \
+                patch.object(sw, "handle_due_scheduler_job", AsyncMock()) as handle:
+            assert await sw.dispatch_due_jobs() == 1
+            await asyncio.gather(*sw._running_jobs.values())
+        assert [call.args[0]["id"] for call in handle.call_args_list] == ["j0"]
+        assert sw._deferred_jobs == {"j1", "j2"}
+        assert sw._budget_window_end.second == 0 and sw._budget_window_end > datetime.now(timezone.utc)
+        # The claim of the job that did not fit is given back
+        assert sw.release_scheduler_job_claim.call_args.args[0]["id"] == "j1"
+
+    @pytest.mark.unit
+    async def test_budget_charged_once_across_instances(self, monkeypatch):
+        monkeypatch.setattr(sw, "SCHEDULER_MAX_HOSTS_PER_MINUTE", 10)
+        due = (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat()
+        jobs = [{"id": "j0", "project_id": "p0", "next_run_at": due}]
+        db = self._db(jobs, 6, [True, True])
+        # The occurrence is claimed once for the whole fleet
+        monkeypatch.setattr(sw, "claim_due_scheduler_job", AsyncMock(side_effect=[True, False]))
+        reservations = []
+
+        async def update_one(query, update, upsert):
+            reservations.append(update["$inc"]["hosts"])
+        db.scheduler_host_budget.update_one = update_one
+        with patch.object(sw, "db", db), patch.object(sw, "handle_due_scheduler_job", AsyncMock()) as handle:
+            # Two instances dispatch the same due job
+            tasks = []
+            for _ in range(2):
+                sw._running_jobs.clear()
+                sw._running_projects.clear()
+                started = await sw.dispatch_due_jobs()
+                tasks.extend(sw._running_jobs.values())
+            await asyncio.gather(*tasks)
+        assert started == 0
+        assert reservations == [6]
+        assert handle.await_count == 1 and handle.call_args.kwargs == {"claimed": True}
+
+    @pytest.mark.unit
+    async def test_new_minute_race_is_retried(self, monkeypatch):
+        monkeypatch.setattr(sw, "SCHEDULER_MAX_HOSTS_PER_MINUTE", 10)
+        db = self._db([], 4, [False, True])
+        with patch.object(sw, "db", db):
+            assert await sw._take_host_budget("p1") is True
+        db = self._db([], 4, [False, False])
+        with patch.object(sw, "db", db):
+            assert await sw._take_host_budget("p1") is False
+
+    @pytest.mark.unit
+    async def test_unlimited_budget_skips_counting(self, monkeypatch):
+        monkeypatch.setattr(sw, "SCHEDULER_MAX_HOSTS_PER_MINUTE", 0)
+        db = MagicMock()
+        with patch.object(sw, "db", db):
+            assert await sw._take_host_budget("p1") is True
+        db.project_tasks.count_documents.assert_not_called()
+
+    @pytest.mark.unit
+    async def test_reservation_leaves_room_for_hosts(self, monkeypatch):
+        monkeypatch.setattr(sw, "SCHEDULER_MAX_HOSTS_PER_MINUTE", 10)
+        db = MagicMock()
+        db.project_tasks.count_documents = AsyncMock(return_value=4)
+        db.scheduler_host_budget.update_one = AsyncMock()
+        with patch.object(sw, "db", db):
+            assert await sw._take_host_budget("p1") is True
+        query, update = db.scheduler_host_budget.update_one.call_args.args
+        assert query["hosts"] == {"$lte": 6}
+        assert update["$inc"] == {"hosts": 4}
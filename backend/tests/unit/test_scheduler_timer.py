@@ -0,0 +1,71 @@
+"""
+Unit tests for the scheduler timer heap
+Tests: due order, rescheduling and removal, wake-ups, sleeping until the next due time
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+
+from scheduler import scheduler_timer as st
+
+
+def _in(seconds):
+    return datetime.now(timezone.utc) + timedelta(seconds=seconds)
+
+
+class TestSchedulerTimer:
+    """Tests for SchedulerTimer"""
+
+    @pytest.mark.unit
+    def test_pop_due_in_order(self):
+        timer = st.SchedulerTimer()
+        timer.set((st.JOB, "late"), _in(-1))
+        timer.set((st.JOB, "early"), _in(-10).isoformat())
+        timer.set((st.JOB, "future"), _in(60))
+        assert timer.pop_due(datetime.now(timezone.utc)) == [(st.JOB, "early"), (st.JOB, "late")]
+        assert len(timer) == 1
+
+    @pytest.mark.unit
+    def test_reschedule_and_remove(self):
+        timer = st.SchedulerTimer()
+        timer.set((st.JOB, "a"), _in(-5))
+        timer.set((st.JOB, "a"), _in(60))
+        timer.set((st.JOB, "b"), _in(-5))
+        timer.set((st.JOB, "b"), None)
+        assert timer.pop_due(datetime.now(timezone.utc)) == []
+        assert timer.next_due() > datetime.now(timezone.utc)
+
+    @pytest.mark.unit
+    def test_naive_time_is_utc(self):
+        timer = st.SchedulerTimer()
+        timer.set((st.JOB, "a"), "2000-01-01T00:00:00")
+        assert timer.next_due() == datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+    @pytest.mark.unit
+    async def test_earlier_entry_wakes_waiter(self):
+        timer = st.SchedulerTimer()
+        timer.set((st.JOB, "a"), _in(60))
+        timer._wakeup.clear()
+        waiter = asyncio.create_task(timer.wait(60))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        timer.set((st.JOB, "b"), _in(-1))
+        await asyncio.wait_for(waiter, 1)
+
+    @pytest.mark.unit
+    async def test_later_entry_does_not_wake(self):
+        timer = st.SchedulerTimer()
+        timer.set((st.JOB, "a"), _in(60))
+        timer._wakeup.clear()
+        timer.set((st.JOB, "b"), _in(120))
+        assert not timer._wakeup.is_set()
+
+    @pytest.mark.unit
+    async def test_sleeps_until_next_due(self):
+        timer = st.SchedulerTimer()
+        timer.set((st.JOB, "a"), _in(0.05))
+        timer._wakeup.clear()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await timer.wait(60)
+        assert 0.03 <= loop.time() - started < 1
@@ -0,0 +1,243 @@
+"""
+Unit tests for SSH backend selection
+Tests: paramiko default, asyncssh fallback when not installed, startup warning, dispatch helpers,
+asyncssh command execution and login/sudo checks against a stubbed asyncssh
+"""
+import asyncio
+import types
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from models.content_models import Host
+from services import services_execution as se
+from services import services_ssh_async as sa
+
+
+def _host():
+    return Host(id="h1", name="h1", hostname="10.0.0.1", username="u", auth_type="password")
+
+
+class _Error(Exception):
+    pass
+
+
+def _asyncssh_stub(connect):
+    """The part of the asyncssh API the backend uses (asyncssh is optional)."""
+    return types.SimpleNamespace(
+        Error=_Error,
+        PermissionDenied=type("PermissionDenied", (_Error,), {}),
+        ChannelOpenError=type("ChannelOpenError", (_Error,), {}),
+        ConnectionLost=type("ConnectionLost", (_Error,), {}),
+        DisconnectError=type("DisconnectError", (_Error,), {}),
+        connect=connect,
+    )
+
+
+class _Stream:
+    def __init__(self, chunks, delay=0.0, stall=False):
+        self.chunks = list(chunks)
+        self.delay = delay
+        self.stall = stall
+
+    async def read(self, size):
+        if self.chunks:
+            await asyncio.sleep(self.delay)
+            return self.chunks.pop(0)
+        if self.stall:
+            await asyncio.sleep(3600)
+        return b""
+
+
+class _Process:
+    def __init__(self, out=(), err=(), exit_status=0, delay=0.0, stall=False):
+        self.stdin = MagicMock()
+        self.stdout = _Stream(out, delay, stall)
+        self.stderr = _Stream(err)
+        self.exit_status = exit_status
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    async def wait_closed(self):
+        pass
+
+
+class _Connection:
+    def __init__(self, *processes):
+        self.processes = list(processes)
+        self.commands = []
+
+    async def create_process(self, command, encoding):
+        self.commands.append(command)
+        return self.processes.pop(0)
+
+    def is_closed(self):
+        return False
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class TestSSHBackendSelection:
+    """Tests for SSH_BACKEND handling"""
+
+    @pytest.mark.unit
+    def test_paramiko_is_default(self, monkeypatch):
+        monkeypatch.setattr(sa, "SSH_BACKEND", "paramiko")
+        assert sa.async_ssh_enabled() is False
+        assert isinstance(se.create_ssh_manager(), se.SSHConnectionManager)
+
+    @pytest.mark.unit
+    def test_asyncssh_missing_falls_back_to_paramiko(self, monkeypatch):
+        monkeypatch.setattr(sa, "SSH_BACKEND", "asyncssh")
+        monkeypatch.setattr(sa, "HAS_ASYNCSSH", False)
+        assert sa.async_ssh_enabled() is False
+        assert isinstance(se.create_ssh_manager(), se.SSHConnectionManager)
+
+    @pytest.mark.unit
+    def test_startup_warns_when_asyncssh_missing(self, monkeypatch):
+        monkeypatch.setattr(sa, "SSH_BACKEND", "asyncssh")
+        monkeypatch.setattr(sa, "HAS_ASYNCSSH", False)
+        monkeypatch.setattr(sa, "_fallback_warned", False)
+        with patch.object(sa, "logger") as logger:
+            sa.warn_unavailable_ssh_backend()
+        assert "asyncssh is not installed" in logger.warning.call_args.args[0]
+
+    @pytest.mark.unit
+    def test_startup_warns_on_unknown_backend(self, monkeypatch):
+        monkeypatch.setattr(sa, "SSH_BACKEND", "libssh")
+        with patch.object(sa, "logger") as logger:
+            sa.warn_unavailable_ssh_backend()
+        assert "libssh" in logger.warning.call_args.args[0]
+
+    @pytest.mark.unit
+    def test_asyncssh_selected_when_available(self, monkeypatch):
+        monkeypatch.setattr(sa, "SSH_BACKEND", "asyncssh")
+        monkeypatch.setattr(sa, "HAS_ASYNCSSH", True)
+        assert isinstance(se.create_ssh_manager(), sa.AsyncSSHConnectionManager)
+
+    @pytest.mark.unit
+    async def test_run_ssh_command_dispatches_to_async_backend(self, monkeypatch):
+        monkeypatch.setattr(sa, "SSH_BACKEND", "asyncssh")
+        monkeypatch.setattr(sa, "HAS_ASYNCSSH", True)
+        fake = AsyncMock(return_value=(True, "ok", "", 0))
+        with patch.object(sa, "ssh_connect_and_execute", fake), \
+                patch.object(se, "_ssh_connect_and_execute") as threaded:
+            result = await se.run_ssh_command(_host(), "id")
+        assert result == (True, "ok", "", 0)
+        threaded.assert_not_called()
+
+    @pytest.mark.unit
+    async def test_run_ssh_command_uses_paramiko_by_default(self, monkeypatch):
+        monkeypatch.setattr(sa, "SSH_BACKEND", "paramiko")
+        with patch.object(se, "_ssh_connect_and_execute", return_value=(True, "ok", "", 0)) as threaded:
+            result = await se.run_ssh_command(_host(), "id")
+        assert result == (True, "ok", "", 0)
+        threaded.assert_called_once()
+
+
+class TestAsyncSSHExecution:
+    """Tests for the asyncssh backend with a stubbed asyncssh"""
+
+    @pytest.mark.unit
+    async def test_run_returns_output_and_writes_input(self, monkeypatch):
+        process = _Process([b"hello ", b"world"], [b"warn"], exit_status=3)
+        monkeypatch.setattr(sa, "asyncssh", _asyncssh_stub(AsyncMock(return_value=_Connection(process))))
+        result = await sa._run(_host(), "cat", None, input="data")
+
+        assert result == (3, "hello world", "warn")
+        process.stdin.write.assert_called_once_with(b"data")
+        process.stdin.write_eof.assert_called_once()
+        assert process.closed
+
+    @pytest.mark.unit
+    async def test_execute_reports_exit_code_and_stderr(self, monkeypatch):
+        conn = _Connection(_Process([b"out"], [b"err"], exit_status=2))
+        monkeypatch.setattr(sa, "asyncssh", _asyncssh_stub(AsyncMock(return_value=conn)))
+        result = await sa.ssh_connect_and_execute(_host(), "false")
+
+        assert result == (False, "out", "err", 2)
+        assert conn.commands == ["false"]
+
+    @pytest.mark.unit
+    async def test_long_command_with_output_is_not_stopped(self, monkeypatch):
+        """Like paramiko's channel timeout, SSH_COMMAND_TIMEOUT limits silence, not the whole run."""
+        monkeypatch.setattr(sa, "SSH_COMMAND_TIMEOUT", 0.1)
+        process = _Process([b"1", b"2", b"3", b"4", b"5"], delay=0.04)
+        monkeypatch.setattr(sa, "asyncssh", _asyncssh_stub(AsyncMock(return_value=_Connection(process))))
+        assert await sa.ssh_connect_and_execute(_host(), "slow") == (True, "12345", "", 0)
+
+    @pytest.mark.unit
+    async def test_quiet_command_times_out(self, monkeypatch):
+        monkeypatch.setattr(sa, "SSH_COMMAND_TIMEOUT", 0.05)
+        process = _Process([b"partial"], stall=True)
+        monkeypatch.setattr(sa, "asyncssh", _asyncssh_stub(AsyncMock(return_value=_Connection(process))))
+        success, output, error, exit_code = await sa.ssh_connect_and_execute(_host(), "sleep 3600")
+
+        assert (success, output, exit_code) == (False, "", 1)
+        assert error.startswith("Command timeout")
+        assert process.closed
+
+    @pytest.mark.unit
+    async def test_refused_channel_is_retried_on_pooled_connection(self, monkeypatch):
+        stub = _asyncssh_stub(None)
+        conn = _Connection(_Process([b"ok"]))
+        create_process = conn.create_process
+        refusals = [stub.ChannelOpenError("administratively prohibited")]
+
+        async def refuse_once(command, encoding):
+            if refusals:
+                raise refusals.pop()
+            return await create_process(command, encoding)
+
+        conn.create_process = refuse_once
+        stub.connect = AsyncMock(return_value=conn)
+        monkeypatch.setattr(sa, "asyncssh", stub)
+        with patch.object(sa.asyncio, "sleep", AsyncMock()):
+            result = await sa._run(_host(), "id", sa.AsyncSSHConnectionManager())
+
+        assert result.stdout == "ok"
+        stub.connect.assert_awaited_once()
+
+
+class TestAsyncSSHLoginAndSudo:
+    """Tests for check_ssh_login_and_sudo on the asyncssh backend"""
+
+    @pytest.mark.unit
+    async def test_login_and_sudo_share_pooled_connection(self, monkeypatch):
+        connect = AsyncMock(return_value=_Connection(_Process([b"uid=0(root)"])))
+        monkeypatch.setattr(sa, "asyncssh", _asyncssh_stub(connect))
+        result = await sa.check_ssh_login_and_sudo(_host(), sa.AsyncSSHConnectionManager())
+
+        assert result == (True, "SSH login OK", True, "Sudo access OK (no password required)")
+        connect.assert_awaited_once()
+
+    @pytest.mark.unit
+    async def test_sudo_denied(self, monkeypatch):
+        conn = _Connection(_Process([], [b"sudo: a password is required"], exit_status=1))
+        monkeypatch.setattr(sa, "asyncssh", _asyncssh_stub(AsyncMock(return_value=conn)))
+        login_ok, _, sudo_ok, sudo_msg = await sa.check_ssh_login_and_sudo(_host(), sa.AsyncSSHConnectionManager())
+
+        assert login_ok is True
+        assert sudo_ok is False
+        assert sudo_msg.startswith("Недостаточно прав (sudo)")
+
+    @pytest.mark.unit
+    async def test_wrong_credentials_skip_sudo_check(self, monkeypatch):
+        stub = _asyncssh_stub(None)
+        stub.connect = AsyncMock(side_effect=stub.PermissionDenied("denied"))
+        monkeypatch.setattr(sa, "asyncssh", stub)
+        result = await sa.check_ssh_login_and_sudo(_host())
+
+        assert result == (False, "Неверные учётные данные", False, "Login failed")
+        stub.connect.assert_awaited_once()
@@ -0,0 +1,170 @@
+"""
+Unit tests for pooled SSH connections
+Tests: connection reuse, reconnect of dropped transports, idle eviction, release, channel limits
+"""
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+
+from models.content_models import Host
+from services import services_execution as se
+
+
+def _host(host_id="h1"):
+    return Host(
+        id=host_id,
+        name=host_id,
+        hostname="10.0.0.1",
+        port=22,
+        username="user",
+        auth_type="password",
+        password="",
+        connection_type="ssh",
+    )
+
+
+def _channel(out=b"", err=b"", exit_status=0):
+    """paramiko Channel stand-in that delivers one chunk per stream and then EOF"""
+    chunks = {"out": [out] if out else [], "err": [err] if err else []}
+    channel = MagicMock()
+    channel.recv_ready.side_effect = lambda: bool(chunks["out"])
+    channel.recv.side_effect = lambda size: chunks["out"].pop(0)
+    channel.recv_stderr_ready.side_effect = lambda: bool(chunks["err"])
+    channel.recv_stderr.side_effect = lambda size: chunks["err"].pop(0)
+    channel.eof_received = True
+    channel.recv_exit_status.return_value = exit_status
+    return channel
+
+
+def _client(alive=True):
+    ssh = MagicMock()
+    ssh.get_transport.return_value.is_active.return_value = alive
+    return ssh
+
+
+class TestSSHConnectionManager:
+    """Tests for SSHConnectionManager"""
+
+    @pytest.mark.unit
+    def test_connection_reused_for_same_host(self):
+        manager = se.SSHConnectionManager()
+        with patch.object(se, "_open_ssh_client", side_effect=lambda h: _client()) as opener:
+            first = manager.get(_host())
+            second = manager.get(_host())
+        assert first is second
+        assert opener.call_count == 1
+
+    @pytest.mark.unit
+    def test_dropped_transport_is_reconnected(self):
+        manager = se.SSHConnectionManager()
+        dead = _client()
+        with patch.object(se, "_open_ssh_client", side_effect=[dead, _client()]) as opener:
+            manager.get(_host())
+            dead.get_transport.return_value.is_active.return_value = False
+            fresh = manager.get(_host())
+        assert fresh is not dead
+        assert opener.call_count == 2
+        dead.close.assert_called_once()
+
+    @pytest.mark.unit
+    def test_idle_connections_are_evicted(self):
+        manager = se.SSHConnectionManager(idle_timeout=10)
+        ssh = _client()
+        with patch.object(se, "_open_ssh_client", return_value=ssh), \
+                patch.object(se.time, "monotonic", side_effect=[100.0, 100.0, 200.0]):
+            manager.get(_host())
+            manager.evict_idle()
+        ssh.close.assert_called_once()
+        assert not manager.is_connected(_host())
+
+    @pytest.mark.unit
+    def test_release_and_close_all(self):
+        manager = se.SSHConnectionManager()
+        clients = {"h1": _client(), "h2": _client()}
+        with patch.object(se, "_open_ssh_client", side_effect=lambda h: clients[h.id]):
+            manager.get(_host("h1"))
+            manager.get(_host("h2"))
+        manager.release("h1")
+        clients["h1"].close.assert_called_once()
+        assert manager.is_connected(_host("h2"))
+        manager.close_all()
+        clients["h2"].close.assert_called_once()
+        assert not manager.is_connected(_host("h2"))
+
+    @pytest.mark.unit
+    def test_command_retried_once_after_transport_drop(self):
+        manager = se.SSHConnectionManager()
+        broken = _client()
+
+        def exec_fail(*args, **kwargs):
+            broken.get_transport.return_value.is_active.return_value = False
+            raise EOFError("connection reset")
+
+        broken.exec_command.side_effect = exec_fail
+        healthy = _client()
+        stdout = MagicMock()
+        stdout.channel = _channel(b"ok")
+        healthy.exec_command.return_value = (MagicMock(), stdout, MagicMock())
+
+        with patch.object(se, "_open_ssh_client", side_effect=[broken, healthy]), \
+                patch.object(se, "log_ssh_command"):
+            success, output, _, exit_code = se._ssh_connect_and_execute(_host(), "id", manager)
+
+        assert success is True
+        assert output == "ok"
+        assert exit_code == 0
+
+    @pytest.mark.unit
+    def test_channel_refusal_shrinks_limit_and_retries(self):
+        manager = se.SSHConnectionManager(max_sessions=8)
+        ssh = _client()
+        stdout = MagicMock()
+        stdout.channel = _channel(b"ok")
+        ssh.exec_command.side_effect = [
+            se.paramiko.ChannelException(1, "Administratively prohibited"),
+            (MagicMock(), stdout, MagicMock()),
+        ]
+
+        with patch.object(se, "_open_ssh_client", return_value=ssh), \
+                patch.object(se, "log_ssh_command"), \
+                patch.object(se.time, "sleep"):
+            success, output, _, _ = se._ssh_connect_and_execute(_host(), "id", manager)
+
+        assert success is True
+        assert output == "ok"
+        assert manager.channel_limiter(_host()).limit == 1
+
+
+class TestChannelLimiter:
+    """Tests for per-connection channel limiting"""
+
+    @pytest.mark.unit
+    def test_concurrency_bounded_by_limit(self):
+        limiter = se._ChannelLimiter(2)
+        in_flight = 0
+        peak = 0
+        lock = threading.Lock()
+
+        def work():
+            nonlocal in_flight, peak
+            with limiter.slot():
+                with lock:
+                    in_flight += 1
+                    peak = max(peak, in_flight)
+                time.sleep(0.01)
+                with lock:
+                    in_flight -= 1
+
+        threads = [threading.Thread(target=work) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert peak == 2
+
+    @pytest.mark.unit
+    def test_refused_limits_to_other_channels_in_flight(self):
+        limiter = se._ChannelLimiter(8)
+        with limiter.slot(), limiter.slot(), limiter.slot():
+            assert limiter.refused() == 2
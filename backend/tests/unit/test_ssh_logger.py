@@ -0,0 +1,165 @@
+"""
+Unit tests for the SSH operations log
+Tests: deferred rendering, payload truncation, processor entries, per-session files, session context,
+tail reading
+"""
+import asyncio
+import logging
+import pytest
+
+from models.content_models import Host
+from utils import ssh_logger as sl
+
+
+def _record(message, **extra):
+    record = logging.LogRecord("ssh_operations", logging.INFO, __file__, 0, message, None, None)
+    for name, value in extra.items():
+        setattr(record, name, value)
+    return record
+
+
+def _host():
+    return Host(id="h1", name="srv", hostname="10.0.0.1", username="u", auth_type="password")
+
+
+class TestRendering:
+    """Tests for lazy entries and truncation"""
+
+    @pytest.mark.unit
+    def test_entry_rendered_once(self):
+        calls = []
+
+        def render(text):
+            calls.append(text)
+            return text.upper()
+
+        entry = sl._LazyEntry(render, "ok")
+        assert calls == []
+        assert str(entry) == "OK"
+        assert str(entry) == "OK"
+        assert calls == ["ok"]
+
+    @pytest.mark.unit
+    def test_payload_clipped(self, monkeypatch):
+        monkeypatch.setattr(sl, "SSH_LOG_PAYLOAD_LIMIT", 10)
+        clipped = sl._clip("x" * 25)
+        assert clipped.startswith("x" * 10 + "\n")
+        assert "25" in clipped
+        assert sl._clip("short") == "short"
+
+    @pytest.mark.unit
+    def test_command_block_uses_limit(self, monkeypatch):
+        monkeypatch.setattr(sl, "SSH_LOG_PAYLOAD_LIMIT", 5)
+        text = sl._render_command("ts", sl._host_fields(_host()), "cat /etc/passwd", "a" * 100, "", 0, "SUCCESS")
+        assert "cat /" in text and "cat /etc" not in text
+        assert "a" * 6 not in text
+
+
+class TestProcessorLog:
+    """Tests for log_processor_script"""
+
+    @pytest.mark.unit
+    def test_entry_written_for_offline_host_stub(self, monkeypatch):
+        class _OfflineHost:
+            name = "srv"
+            hostname = "(offline)"
+            port = 0
+
+        records = []
+        capture = logging.getLogger("test_ssh_operations")
+        capture.propagate = False
+        capture.setLevel(logging.INFO)
+        handler = logging.Handler()
+        handler.emit = records.append
+        capture.addHandler(handler)
+        monkeypatch.setattr(sl, "ssh_logger", capture)
+        try:
+            sl.log_processor_script(_OfflineHost(), script_id="s1", script_name="check-ssh",
+                                    processor_script="echo ok", input_data="out", stdout="ok", exit_code=0)
+        finally:
+            capture.removeHandler(handler)
+        assert len(records) == 1
+        text = str(records[0].msg)
+        assert "check-ssh" in text and "(offline)" in text
+
+    @pytest.mark.unit
+    def test_failure_is_reported(self, monkeypatch, caplog):
+        def broken(*args):
+            raise RuntimeError("disk gone")
+
+        monkeypatch.setattr(sl, "_log", broken)
+        with caplog.at_level(logging.WARNING, logger="ssh_runner"):
+            sl.log_processor_script(_host(), script_name="check-ssh")
+        assert "disk gone" in caplog.text
+
+
+class TestSessionFiles:
+    """Tests for _SessionFileHandler"""
+
+    @pytest.mark.unit
+    def test_records_routed_by_session(self, tmp_path):
+        handler = sl._SessionFileHandler(tmp_path)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        try:
+            handler.handle(_record("first", session_id="s1"))
+            handler.handle(_record("second", session_id="s2"))
+            handler.handle(_record("global only"))
+            handler.handle(_record("", session_id="s1", session_end=True))
+            assert "s1" not in handler._handlers
+        finally:
+            handler.close()
+        assert (tmp_path / "s1.log").read_text(encoding="utf-8") == "first\n"
+        assert (tmp_path / "s2.log").read_text(encoding="utf-8") == "second\n"
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["s1.log", "s2.log"]
+
+    @pytest.mark.unit
+    def test_old_sessions_pruned(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(sl, "SSH_LOG_SESSIONS_KEEP", 2)
+        handler = sl._SessionFileHandler(tmp_path)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        try:
+            for index in range(4):
+                handler.handle(_record("line", session_id=f"s{index}"))
+                handler.handle(_record("", session_id=f"s{index}", session_end=True))
+        finally:
+            handler.close()
+        assert len(list(tmp_path.glob("*.log"))) == 2
+        assert (tmp_path / "s3.log").exists()
+
+
+class TestSessionContext:
+    """Tests for ssh_log_context"""
+
+    @pytest.mark.unit
+    def test_session_follows_task_into_threads(self):
+        seen = []
+
+        async def work():
+            seen.append(sl._current_session.get())
+            seen.append(await asyncio.to_thread(sl._current_session.get))
+
+        async def main():
+            await asyncio.create_task(work(), context=sl.ssh_log_context("run-1"))
+            seen.append(sl._current_session.get())
+
+        asyncio.run(main())
+        assert seen == ["run-1", "run-1", None]
+
+
+class TestReadSessionLog:
+    """Tests for session_log_path / read_session_log"""
+
+    @pytest.mark.unit
+    def test_invalid_session_id(self):
+        assert sl.session_log_path("../../etc/passwd") is None
+        assert sl.read_session_log("../x") is None
+
+    @pytest.mark.unit
+    def test_tail_of_large_log(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(sl, "SSH_SESSION_LOG_DIR", tmp_path)
+        (tmp_path / "s1.log").write_text("".join(f"line {i}\n" for i in range(1000)), encoding="utf-8")
+        text = sl.read_session_log("s1", max_bytes=100)
+        assert text.endswith("line 999\n")
+        assert "line 0\n" not in text
+        assert text.startswith("... ")
+        assert sl.read_session_log("missing") is None
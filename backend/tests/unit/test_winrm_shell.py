@@ -0,0 +1,155 @@
+"""
+Unit tests for reusable WinRM shells
+Tests: one shell per host, reopen after failure, chunked script upload, PowerShell bundle
+"""
+import base64
+import re
+import pytest
+import requests
+
+from models.content_models import Host
+from services import services_bundle as sb
+from services import services_winrm as sw
+
+
+class _FakeProtocol:
+    def __init__(self, fail_next=None):
+        self.opened = 0
+        self.closed = 0
+        self.commands = []
+        self.fail_next = fail_next
+
+    def open_shell(self):
+        self.opened += 1
+        return f"shell-{self.opened}"
+
+    def run_command(self, shell_id, command, args=()):
+        if self.fail_next is not None:
+            error, self.fail_next = self.fail_next, None
+            raise error
+        self.commands.append((shell_id, command))
+        return f"cmd-{len(self.commands)}"
+
+    def get_command_output(self, shell_id, command_id):
+        return b"ok", b"", 0
+
+    def cleanup_command(self, shell_id, command_id):
+        pass
+
+    def close_shell(self, shell_id):
+        self.closed += 1
+
+
+class _FakeSession:
+    def __init__(self, protocol):
+        self.protocol = protocol
+
+    def _clean_error_msg(self, msg):
+        return msg
+
+
+def _host():
+    return Host(id="w1", name="win", hostname="10.0.0.5", port=5985, username="u",
+                auth_type="password", connection_type="winrm")
+
+
+class TestWinRMShellManager:
+    """Tests for WinRMShellManager"""
+
+    @pytest.mark.unit
+    def test_commands_share_one_shell(self):
+        protocol = _FakeProtocol()
+        sessions = []
+
+        def factory(host):
+            sessions.append(host.id)
+            return _FakeSession(protocol)
+
+        manager = sw.WinRMShellManager(factory)
+        for command in ("echo test", "whoami", "ver"):
+            assert manager.run_cmd(_host(), command) == (b"ok", b"", 0)
+        assert sessions == ["w1"]
+        assert protocol.opened == 1
+        assert {shell for shell, _ in protocol.commands} == {"shell-1"}
+        manager.close_all()
+        assert protocol.closed == 1
+
+    @pytest.mark.unit
+    def test_failed_shell_is_reopened_once(self):
+        protocol = _FakeProtocol()
+        manager = sw.WinRMShellManager(lambda host: _FakeSession(protocol))
+        manager.run_cmd(_host(), "echo 1")
+        protocol.fail_next = requests.exceptions.ConnectionError("connection dropped")
+        assert manager.run_cmd(_host(), "echo 2") == (b"ok", b"", 0)
+        assert protocol.opened == 2
+        assert protocol.commands[-1] == ("shell-2", "echo 2")
+
+    @pytest.mark.unit
+    def test_timed_out_command_not_repeated(self):
+        protocol = _FakeProtocol()
+        manager = sw.WinRMShellManager(lambda host: _FakeSession(protocol))
+        manager.run_cmd(_host(), "echo 1")
+        protocol.fail_next = requests.exceptions.ReadTimeout("read timed out")
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            manager.run_cmd(_host(), "echo 2")
+        assert protocol.commands == [("shell-1", "echo 1")]
+        assert protocol.closed == 1
+
+    @pytest.mark.unit
+    def test_command_error_not_retried(self):
+        protocol = _FakeProtocol()
+        manager = sw.WinRMShellManager(lambda host: _FakeSession(protocol))
+        manager.run_cmd(_host(), "echo 1")
+        protocol.fail_next = ValueError("bad output")
+        with pytest.raises(ValueError):
+            manager.run_cmd(_host(), "echo 2")
+        assert protocol.opened == 1
+
+    @pytest.mark.unit
+    def test_release_closes_shell(self):
+        protocol = _FakeProtocol()
+        manager = sw.WinRMShellManager(lambda host: _FakeSession(protocol))
+        manager.run_cmd(_host(), "echo 1")
+        manager.release("w1")
+        manager.run_cmd(_host(), "echo 2")
+        assert protocol.closed == 1
+        assert protocol.opened == 2
+
+    @pytest.mark.unit
+    def test_long_script_uploaded_in_chunks(self, monkeypatch):
+        monkeypatch.setattr(sw, "_UPLOAD_CHUNK", 100)
+        protocol = _FakeProtocol()
+        manager = sw.WinRMShellManager(lambda host: _FakeSession(protocol))
+        script = "Write-Output 'проверка'\n" * 40
+        manager.run_ps_file(_host(), script, "kappi_bundle_x")
+
+        uploads = [command for _, command in protocol.commands if " echo " in command]
+        assert len(uploads) > 1
+        assert uploads[0].startswith('>"%TEMP%\\kappi_bundle_x.b64" echo ')
+        assert all(command.startswith('>>"') for command in uploads[1:])
+        uploaded = "".join(command.split(" echo ", 1)[1] for command in uploads)
+        assert base64.b64decode(uploaded).decode("utf-8") == script
+        assert protocol.commands[-1][1].startswith("powershell -NoProfile -NonInteractive -EncodedCommand ")
+
+
+class TestPowerShellBundle:
+    """Tests for build_powershell_bundle"""
+
+    @pytest.mark.unit
+    def test_bodies_embedded_as_base64(self):
+        script = sb.build_powershell_bundle([("s1", "echo 'a'"), ("s2", "")], "n0nce")
+        bodies = re.findall(r"__KappiRun (\d+) '([A-Za-z0-9+/=]+)'", script)
+        assert [(idx, base64.b64decode(body).decode()) for idx, body in bodies] == [("0", "echo 'a'"), ("1", "rem")]
+        assert "@@KAPPI:n0nce:END:${idx}:$rc" in script
+
+    @pytest.mark.unit
+    def test_framed_output_parsed_like_bash_bundle(self):
+        output = (
+            "\n@@KAPPI:n0nce:OUT:0\nfirst\r\n"
+            "\n@@KAPPI:n0nce:ERR:0\n"
+            "\n@@KAPPI:n0nce:END:0:0\n"
+            "\n@@KAPPI:n0nce:OUT:1\n"
+            "\n@@KAPPI:n0nce:ERR:1\ndenied\r\n"
+            "\n@@KAPPI:n0nce:END:1:5\n"
+        )
+        assert sb.parse_bundle_output(output, "n0nce") == {0: ("first\r\n", "", 0), 1: ("", "denied\r\n", 5)}
@@ -0,0 +1,80 @@
+"""
+Unit tests for the write-behind buffer of project runs
+Tests: batching by size and time, status coalescing, retry after failure, flush on close
+"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from services import services_write_buffer as wb
+
+
+def _mock_db():
+    db = MagicMock()
+    db.executions.insert_many = AsyncMock()
+    db.project_tasks.bulk_write = AsyncMock()
+    return db
+
+
+class TestExecutionWriteBuffer:
+    """Tests for ExecutionWriteBuffer"""
+
+    @pytest.mark.unit
+    async def test_flush_by_batch_size(self):
+        db = _mock_db()
+        with patch.object(wb, "db", db):
+            buffer = wb.ExecutionWriteBuffer(batch_size=3, flush_interval=60)
+            for i in range(3):
+                await buffer.add_execution({"id": i})
+            await buffer.close()
+        db.executions.insert_many.assert_awaited_once_with([{"id": 0}, {"id": 1}, {"id": 2}], ordered=False)
+
+    @pytest.mark.unit
+    async def test_flush_by_time(self):
+        db = _mock_db()
+        with patch.object(wb, "db", db):
+            buffer = wb.ExecutionWriteBuffer(batch_size=100, flush_interval=0.05)
+            await buffer.add_execution({"id": 1})
+            assert db.executions.insert_many.await_count == 0
+            await asyncio.sleep(0.2)
+            assert db.executions.insert_many.await_count == 1
+            await buffer.close()
+
+    @pytest.mark.unit
+    async def test_task_status_coalesced(self):
+        db = _mock_db()
+        with patch.object(wb, "db", db):
+            buffer = wb.ExecutionWriteBuffer(flush_interval=60)
+            await buffer.set_task_status("t1", "running")
+            await buffer.set_task_status("t2", "running")
+            await buffer.set_task_status("t1", "completed")
+            await buffer.close()
+        requests = db.project_tasks.bulk_write.await_args.args[0]
+        assert [(r._filter, r._doc) for r in requests] == [
+            ({"id": "t1"}, {"$set": {"status": "completed"}}),
+            ({"id": "t2"}, {"$set": {"status": "running"}}),
+        ]
+
+    @pytest.mark.unit
+    async def test_failed_flush_keeps_documents(self):
+        db = _mock_db()
+        db.executions.insert_many.side_effect = [ConnectionError("down"), None]
+        with patch.object(wb, "db", db):
+            buffer = wb.ExecutionWriteBuffer(flush_interval=60)
+            await buffer.add_execution({"id": 1})
+            with pytest.raises(ConnectionError):
+                await buffer.flush()
+            assert buffer.pending == 1
+            await buffer.close()
+        assert db.executions.insert_many.await_args.args[0] == [{"id": 1}]
+        assert buffer.pending == 0
+
+    @pytest.mark.unit
+    async def test_flush_write_buffers_closes_open_buffers(self):
+        db = _mock_db()
+        with patch.object(wb, "db", db):
+            buffer = wb.ExecutionWriteBuffer(flush_interval=60)
+            await buffer.add_execution({"id": 1})
+            await wb.flush_write_buffers()
+        db.executions.insert_many.assert_awaited_once()
+        assert buffer not in wb._open_buffers
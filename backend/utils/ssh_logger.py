@@ -1,17 +1,124 @@
 """
 SSH Logger Utility
 Логирует все SSH команды и их ответы в отдельный файл для отладки
+
+Записи уходят в очередь (QueueHandler) и пишутся в файлы отдельным потоком
+(QueueListener): вызывающий поток (event loop или executor) не форматирует блоки и не
+ждёт диска. Общий файл ssh_operations.log и файлы сессий (ssh_sessions/<session_id>.log)
+ротируются по размеру; stdout/stderr/скрипты усекаются до SSH_LOG_PAYLOAD_LIMIT символов.
+Сессия определяется контекстом выполнения (см. ssh_log_context).
 """
 
 import os
+import re
+import queue
 import logging
+import contextvars
+from collections import OrderedDict
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
+
+# Размер файла лога до ротации и число архивных копий (общий файл и файлы сессий)
+SSH_LOG_MAX_BYTES = int(os.environ.get('SSH_LOG_MAX_BYTES', str(20 * 1024 * 1024)))
+SSH_LOG_BACKUP_COUNT = int(os.environ.get('SSH_LOG_BACKUP_COUNT', '5'))
+# Максимум символов одного блока (stdout, stderr, скрипт, входные данные); 0 - без усечения
+SSH_LOG_PAYLOAD_LIMIT = int(os.environ.get('SSH_LOG_PAYLOAD_LIMIT', '20000'))
+# Сколько последних файлов логов сессий хранить
+SSH_LOG_SESSIONS_KEEP = int(os.environ.get('SSH_LOG_SESSIONS_KEEP', '200'))
+
+# Файлов сессий, открытых одновременно
+_MAX_OPEN_SESSION_FILES = 32
+_SESSION_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Сессия (запуск проекта), к которой относятся записи текущего контекста
+_current_session: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('ssh_log_session', default=None)
+
+
+class _LazyEntry:
+    """Блок лога, который форматируется в потоке записи при первом обращении."""
+
+    __slots__ = ('_render', '_args', '_text')
+
+    def __init__(self, render: Callable[..., str], *args):
+        self._render = render
+        self._args = args
+        self._text: Optional[str] = None
+
+    def __str__(self) -> str:
+        if self._text is None:
+            self._text = self._render(*self._args)
+            self._args = ()
+        return self._text
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """QueueHandler без форматирования в вызывающем потоке (очередь внутри процесса)."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class _SessionFileHandler(logging.Handler):
+    """Раскладывает записи с session_id по файлам сессий; старые файлы удаляет."""
+
+    def __init__(self, directory: Path):
+        super().__init__(logging.DEBUG)
+        self.directory = directory
+        self._handlers: "OrderedDict[str, RotatingFileHandler]" = OrderedDict()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        session_id = getattr(record, 'session_id', None)
+        if not session_id:
+            return
+        if getattr(record, 'session_end', False):
+            handler = self._handlers.pop(session_id, None)
+            if handler is not None:
+                handler.close()
+            return
+        handler = self._handlers.get(session_id)
+        if handler is None:
+            handler = self._open(session_id)
+        self._handlers.move_to_end(session_id)
+        handler.handle(record)
+
+    def _open(self, session_id: str) -> RotatingFileHandler:
+        path = self.directory / f'{session_id}.log'
+        if not path.exists():
+            self._prune()
+        handler = RotatingFileHandler(
+            path, maxBytes=SSH_LOG_MAX_BYTES, backupCount=SSH_LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+        handler.setFormatter(self.formatter)
+        self._handlers[session_id] = handler
+        while len(self._handlers) > _MAX_OPEN_SESSION_FILES:
+            _, oldest = self._handlers.popitem(last=False)
+            oldest.close()
+        return handler
+
+    def _prune(self) -> None:
+        if SSH_LOG_SESSIONS_KEEP <= 0:
+            return
+        try:
+            logs = sorted(self.directory.glob('*.log'), key=lambda p: p.stat().st_mtime, reverse=True)
+            for path in logs[SSH_LOG_SESSIONS_KEEP - 1:]:
+                for rotated in [path, *self.directory.glob(f'{path.name}.*')]:
+                    rotated.unlink(missing_ok=True)
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        for handler in self._handlers.values():
+            handler.close()
+        self._handlers.clear()
+        super().close()
+
 
 # Настройка пути для логов
 # В Docker контейнере логи должны быть в /app/logs (см. docker-compose)
 # Вне контейнера - в logs/ относительно корня проекта
+_listener: Optional[QueueListener] = None
 try:
     if os.path.exists('/app/logs'):
         LOG_DIR = Path('/app/logs')
@@ -19,9 +126,10 @@ try:
         ROOT_DIR = Path(__file__).parent.parent.parent
         LOG_DIR = Path(os.environ.get('SSH_LOG_DIR', ROOT_DIR / 'logs'))
     SSH_LOG_FILE = LOG_DIR / 'ssh_operations.log'
+    SSH_SESSION_LOG_DIR = LOG_DIR / 'ssh_sessions'
 
-    # Создаем директорию для логов, если её нет
-    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    # Создаем директории для логов, если их нет
+    SSH_SESSION_LOG_DIR.mkdir(parents=True, exist_ok=True)
 
     # Настройка логгера для SSH операций
     ssh_logger = logging.getLogger('ssh_operations')
@@ -31,20 +139,30 @@ try:
     if ssh_logger.handlers:
         ssh_logger.handlers.clear()
 
-    # Создаем обработчик файла
-    file_handler = logging.FileHandler(SSH_LOG_FILE, encoding='utf-8')
-    file_handler.setLevel(logging.DEBUG)
-
     # Формат логов: дата/время, уровень, сообщение
     formatter = logging.Formatter(
         '%(asctime)s [%(levelname)s] %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'
     )
+
+    # Общий файл с ротацией по размеру (служебные записи сессий в него не попадают)
+    file_handler = RotatingFileHandler(
+        SSH_LOG_FILE, maxBytes=SSH_LOG_MAX_BYTES, backupCount=SSH_LOG_BACKUP_COUNT, encoding='utf-8'
+    )
+    file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(formatter)
+    file_handler.addFilter(lambda record: not getattr(record, 'session_end', False))
+
+    session_handler = _SessionFileHandler(SSH_SESSION_LOG_DIR)
+    session_handler.setFormatter(formatter)
 
-    ssh_logger.addHandler(file_handler)
+    _log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    ssh_logger.addHandler(_DeferredQueueHandler(_log_queue))
     ssh_logger.propagate = False  # Не передаем логи в корневой логгер
-    
+
+    _listener = QueueListener(_log_queue, file_handler, session_handler, respect_handler_level=True)
+    _listener.start()
+
     # Флаг успешной инициализации
     _logger_initialized = True
 except Exception as e:
@@ -53,22 +171,112 @@ except Exception as e:
     ssh_logger = std_logging.getLogger('ssh_operations')
     ssh_logger.warning(f"Failed to initialize SSH logger: {e}. Using standard logger.")
     _logger_initialized = False
-    # Инициализируем SSH_LOG_FILE как None, чтобы clear_ssh_logs могла проверить его наличие
-    try:
-        if os.path.exists('/app/logs'):
-            LOG_DIR = Path('/app/logs')
-        else:
-            ROOT_DIR = Path(__file__).parent.parent.parent
-            LOG_DIR = Path(os.environ.get('SSH_LOG_DIR', ROOT_DIR / 'logs'))
-        SSH_LOG_FILE = LOG_DIR / 'ssh_operations.log'
-    except:
-        SSH_LOG_FILE = None
+    SSH_SESSION_LOG_DIR = None
+
+
+def _clip(text: Optional[str]) -> str:
+    """Усечение блока до SSH_LOG_PAYLOAD_LIMIT символов."""
+    text = text or ''
+    if SSH_LOG_PAYLOAD_LIMIT > 0 and len(text) > SSH_LOG_PAYLOAD_LIMIT:
+        return f"{text[:SSH_LOG_PAYLOAD_LIMIT]}\n... (усечено: {len(text)} символов)"
+    return text
+
+
+def _timestamp() -> str:
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+
+def _host_fields(host) -> tuple:
+    # Обработчики без SSH (офлайн-результаты) передают заглушку только с name/hostname/port
+    return (
+        host.name, host.hostname, host.port,
+        getattr(host, 'username', None), getattr(host, 'auth_type', None), getattr(host, 'connection_type', None),
+    )
+
+
+def _report_failure(entry: str, error: Exception) -> None:
+    # Сбой записи не ломает выполнение, но и не теряется молча
+    logging.getLogger('ssh_runner').warning(f"SSH log: failed to record {entry} entry: {error!r}")
+
+
+def _log(render: Callable[..., str], *args) -> None:
+    ssh_logger.info(_LazyEntry(render, *args), extra={'session_id': _current_session.get()})
+
+
+def ssh_log_context(session_id: Optional[str]) -> contextvars.Context:
+    """Копия текущего контекста, в котором записи SSH-лога относятся к сессии session_id."""
+    context = contextvars.copy_context()
+    context.run(_current_session.set, session_id)
+    return context
+
+
+def start_ssh_log_session(session_id: str, title: str = "") -> None:
+    """Заголовок файла лога сессии (файл создаётся потоком записи)."""
+    ssh_logger.info(
+        f"SSH LOG SESSION STARTED{(' - ' + title) if title else ''}\n{'='*80}\n",
+        extra={'session_id': session_id},
+    )
+
+
+def end_ssh_log_session(session_id: str) -> None:
+    """Закрывает файл лога сессии после записи всех её записей."""
+    ssh_logger.info("SSH LOG SESSION FINISHED", extra={'session_id': session_id})
+    ssh_logger.info("", extra={'session_id': session_id, 'session_end': True})
+
+
+def session_log_path(session_id: str) -> Optional[Path]:
+    """Путь к файлу лога сессии (None для некорректного идентификатора)."""
+    if SSH_SESSION_LOG_DIR is None or not _SESSION_ID_RE.match(session_id or ''):
+        return None
+    return SSH_SESSION_LOG_DIR / f'{session_id}.log'
+
+
+def read_session_log(session_id: str, max_bytes: int = 1024 * 1024) -> Optional[str]:
+    """Последние max_bytes байт лога сессии; None, если лога нет."""
+    path = session_log_path(session_id)
+    if path is None or not path.exists():
+        return None
+    with open(path, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        if size > max_bytes:
+            f.seek(size - max_bytes)
+            data = f.read()
+            text = data.decode('utf-8', errors='ignore')
+            return f"... (показаны последние {max_bytes} из {size} байт)\n{text[text.find(chr(10)) + 1:]}"
+        f.seek(0)
+        return f.read().decode('utf-8', errors='ignore')
+
+
+def stop_ssh_logger() -> None:
+    """Дописывает очередь и закрывает файлы (остановка приложения)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        for handler in (file_handler, session_handler):
+            handler.close()
+
+
+def _render_connection(timestamp, host, operation, status, error) -> str:
+    name, hostname, port, username, auth_type, connection_type = host
+    log_entry = f"""
+{'='*80}
+[{timestamp}] SSH CONNECTION: {operation} - {status}
+Host: {name} ({hostname}:{port})
+Username: {username}
+Auth Type: {auth_type}
+Connection Type: {connection_type}
+"""
+    if error:
+        log_entry += f"Error: {error}\n"
+    log_entry += f"{'='*80}\n"
+    return log_entry
 
 
 def log_ssh_connection(host, operation: str, success: bool = True, error: Optional[str] = None):
     """
     Логирует попытку SSH подключения
-    
+
     Args:
         host: Объект хоста (Host)
         operation: Тип операции (например, 'login', 'sudo_check', 'command_execution')
@@ -76,33 +284,39 @@ def log_ssh_connection(host, operation: str, success: bool = True, error: Option
         error: Сообщение об ошибке (если есть)
     """
     try:
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
         status = "SUCCESS" if success else "FAILED"
-        
-        log_entry = f"""
+        _log(_render_connection, _timestamp(), _host_fields(host), operation, status, error)
+    except Exception as e:
+        # Ошибка логирования не должна ломать основную функциональность
+        _report_failure("connection", e)
+
+
+def _render_command(timestamp, host, command, stdout, stderr, exit_code, status) -> str:
+    name, hostname, port, username = host[:4]
+    return f"""
+{'='*80}
+[{timestamp}] SSH COMMAND EXECUTION - {status}
+Host: {name} ({hostname}:{port})
+Username: {username}
+
+>>> COMMAND SENT:
+{_clip(command)}
+
+>>> EXIT CODE: {exit_code if exit_code is not None else 'N/A'}
+
+>>> STDOUT:
+{_clip(stdout) if stdout else '(empty)'}
+
+>>> STDERR:
+{_clip(stderr) if stderr else '(empty)'}
 {'='*80}
-[{timestamp}] SSH CONNECTION: {operation} - {status}
-Host: {host.name} ({host.hostname}:{host.port})
-Username: {host.username}
-Auth Type: {host.auth_type}
-Connection Type: {host.connection_type}
 """
-        
-        if error:
-            log_entry += f"Error: {error}\n"
-        
-        log_entry += f"{'='*80}\n"
-        
-        ssh_logger.info(log_entry)
-    except Exception:
-        # Игнорируем ошибки логирования, чтобы не ломать основную функциональность
-        pass
 
 
 def log_ssh_command(host, command: str, stdout: str = "", stderr: str = "", exit_code: Optional[int] = None, success: bool = True):
     """
     Логирует SSH команду и её результат
-    
+
     Args:
         host: Объект хоста (Host)
         command: Выполненная команда
@@ -112,38 +326,37 @@ def log_ssh_command(host, command: str, stdout: str = "", stderr: str = "", exit
         success: Успешность выполнения
     """
     try:
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
         status = "SUCCESS" if success else "FAILED"
-        
-        log_entry = f"""
-{'='*80}
-[{timestamp}] SSH COMMAND EXECUTION - {status}
-Host: {host.name} ({host.hostname}:{host.port})
-Username: {host.username}
-
->>> COMMAND SENT:
-{command}
+        _log(_render_command, _timestamp(), _host_fields(host), command, stdout, stderr, exit_code, status)
+    except Exception as e:
+        # Ошибка логирования не должна ломать основную функциональность
+        _report_failure("command", e)
 
->>> EXIT CODE: {exit_code if exit_code is not None else 'N/A'}
 
->>> STDOUT:
-{stdout if stdout else '(empty)'}
-
->>> STDERR:
-{stderr if stderr else '(empty)'}
+def _render_check(timestamp, host, check_type, command, stdout, stderr, exit_code, status) -> str:
+    name, hostname, port, username = host[:4]
+    log_entry = f"""
 {'='*80}
+[{timestamp}] SSH CHECK: {check_type.upper()} - {status}
+Host: {name} ({hostname}:{port})
+Username: {username}
 """
-        
-        ssh_logger.info(log_entry)
-    except Exception:
-        # Игнорируем ошибки логирования, чтобы не ломать основную функциональность
-        pass
+    if command:
+        log_entry += f"\n>>> COMMAND SENT:\n{_clip(command)}\n"
+    if exit_code is not None:
+        log_entry += f"\n>>> EXIT CODE: {exit_code}\n"
+    if stdout:
+        log_entry += f"\n>>> STDOUT:\n{_clip(stdout)}\n"
+    if stderr:
+        log_entry += f"\n>>> STDERR:\n{_clip(stderr)}\n"
+    log_entry += f"{'='*80}\n"
+    return log_entry
 
 
 def log_ssh_check(host, check_type: str, command: str = "", stdout: str = "", stderr: str = "", exit_code: Optional[int] = None, success: bool = True):
     """
     Логирует SSH проверку (login, sudo и т.д.)
-    
+
     Args:
         host: Объект хоста (Host)
         check_type: Тип проверки ('login', 'sudo', 'network')
@@ -154,137 +367,104 @@ def log_ssh_check(host, check_type: str, command: str = "", stdout: str = "", st
         success: Успешность проверки
     """
     try:
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-        status = "SUCCESS" if success else "FAILED"
-        
-        log_entry = f"""
-{'='*80}
-[{timestamp}] SSH CHECK: {check_type.upper()} - {status}
-Host: {host.name} ({host.hostname}:{host.port})
-Username: {host.username}
-"""
-        
-        if command:
-            log_entry += f"\n>>> COMMAND SENT:\n{command}\n"
-        
-        if exit_code is not None:
-            log_entry += f"\n>>> EXIT CODE: {exit_code}\n"
-        
-        if stdout:
-            log_entry += f"\n>>> STDOUT:\n{stdout}\n"
-        
-        if stderr:
-            log_entry += f"\n>>> STDERR:\n{stderr}\n"
-        
-        log_entry += f"{'='*80}\n"
-        
-        ssh_logger.info(log_entry)
-    except Exception:
-        # Игнорируем ошибки логирования, чтобы не ломать основную функциональность
-        pass
-
-
-def log_processor_script(host, script_id: str = "", script_name: str = "", processor_script: str = "", 
-                         input_data: str = "", reference_data: str = "", stdout: str = "", 
-                         stderr: str = "", exit_code: Optional[int] = None, success: bool = True):
-    """
-    Логирует выполнение скрипта-обработчика
-    
-    Args:
-        host: Объект хоста (Host)
-        script_id: ID скрипта
-        script_name: Имя скрипта
-        processor_script: Текст скрипта-обработчика
-        input_data: Входные данные (CHECK_OUTPUT)
-        reference_data: Эталонные данные (ETALON_INPUT)
-        stdout: Стандартный вывод скрипта
-        stderr: Стандартный поток ошибок
-        exit_code: Код возврата скрипта
-        success: Успешность выполнения
-    """
-    try:
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
         status = "SUCCESS" if success else "FAILED"
-        
-        # Prepare script preview (first 20 lines or first 1000 chars)
-        script_preview = ""
-        if processor_script:
-            script_lines = processor_script.split('\n')
-            preview_lines = script_lines[:20]
-            script_preview = '\n'.join(preview_lines)
-            if len(script_lines) > 20:
-                script_preview += f"\n... (total {len(script_lines)} lines, {len(processor_script)} chars)"
-        
-        # Analyze exit code
-        exit_code_info = f"{exit_code if exit_code is not None else 'N/A'}"
-        if exit_code is not None:
-            if exit_code == 0:
-                exit_code_info += " (SUCCESS)"
-            elif 11 <= exit_code <= 52:
-                # Known error codes from error_codes.py
-                error_descriptions = {
-                    41: " (Строка не найдена)",
-                    42: " (Строка закомментирована)",
-                    43: " (Неверный формат)",
-                    44: " (Неверное значение)",
-                    51: " (Отсутствует переменная)",
-                }
-                exit_code_info += error_descriptions.get(exit_code, f" (Custom error code)")
-            elif exit_code == 127:
-                exit_code_info += " (Command not found)"
-            elif exit_code == 126:
-                exit_code_info += " (Command not executable)"
-            elif exit_code == 130:
-                exit_code_info += " (Script terminated by SIGINT)"
-            elif exit_code > 128:
-                exit_code_info += f" (Signal {exit_code - 128})"
-            else:
-                exit_code_info += " (Script error)"
-        
-        log_entry = f"""
+        _log(_render_check, _timestamp(), _host_fields(host), check_type, command, stdout, stderr, exit_code, status)
+    except Exception as e:
+        # Ошибка логирования не должна ломать основную функциональность
+        _report_failure("check", e)
+
+
+def _describe_exit_code(exit_code: Optional[int]) -> str:
+    exit_code_info = f"{exit_code if exit_code is not None else 'N/A'}"
+    if exit_code is not None:
+        if exit_code == 0:
+            exit_code_info += " (SUCCESS)"
+        elif 11 <= exit_code <= 52:
+            # Known error codes from error_codes.py
+            error_descriptions = {
+                41: " (Строка не найдена)",
+                42: " (Строка закомментирована)",
+                43: " (Неверный формат)",
+                44: " (Неверное значение)",
+                51: " (Отсутствует переменная)",
+            }
+            exit_code_info += error_descriptions.get(exit_code, f" (Custom error code)")
+        elif exit_code == 127:
+            exit_code_info += " (Command not found)"
+        elif exit_code == 126:
+            exit_code_info += " (Command not executable)"
+        elif exit_code == 130:
+            exit_code_info += " (Script terminated by SIGINT)"
+        elif exit_code > 128:
+            exit_code_info += f" (Signal {exit_code - 128})"
+        else:
+            exit_code_info += " (Script error)"
+    return exit_code_info
+
+
+def _render_processor(timestamp, host, script_id, script_name, processor_script, input_data,
+                      reference_data, stdout, stderr, exit_code, status) -> str:
+    name, hostname, port = host[:3]
+    # Prepare script preview (first 20 lines or first 1000 chars)
+    script_preview = ""
+    if processor_script:
+        script_lines = processor_script.split('\n')
+        preview_lines = script_lines[:20]
+        script_preview = '\n'.join(preview_lines)
+        if len(script_lines) > 20:
+            script_preview += f"\n... (total {len(script_lines)} lines, {len(processor_script)} chars)"
+
+    return f"""
 {'='*80}
 [{timestamp}] PROCESSOR SCRIPT EXECUTION - {status}
-Host: {host.name} ({host.hostname}:{host.port})
+Host: {name} ({hostname}:{port})
 Script ID: {script_id if script_id else 'N/A'}
 Script Name: {script_name if script_name else 'N/A'}
 
 >>> PROCESSOR SCRIPT (preview):
-{script_preview if script_preview else '(empty)'}
+{_clip(script_preview) if script_preview else '(empty)'}
 
 >>> INPUT DATA (CHECK_OUTPUT) - {len(input_data)} chars, {len(input_data.split(chr(10)))} lines:
-{input_data if input_data else '(empty)'}
+{_clip(input_data) if input_data else '(empty)'}
 
 >>> REFERENCE DATA (ETALON_INPUT) - {len(reference_data)} chars, {len(reference_data.split(chr(10)))} lines:
-{reference_data if reference_data else '(empty)'}
+{_clip(reference_data) if reference_data else '(empty)'}
 
->>> EXIT CODE: {exit_code_info}
+>>> EXIT CODE: {_describe_exit_code(exit_code)}
 
 >>> STDOUT ({len(stdout)} chars):
-{stdout if stdout else '(empty)'}
+{_clip(stdout) if stdout else '(empty)'}
 
 >>> STDERR ({len(stderr)} chars):
-{stderr if stderr else '(empty)'}
+{_clip(stderr) if stderr else '(empty)'}
 {'='*80}
 """
-        
-        ssh_logger.info(log_entry)
-    except Exception:
-        # Игнорируем ошибки логирования, чтобы не ломать основную функциональность
-        pass
 
 
-def clear_ssh_logs():
+def log_processor_script(host, script_id: str = "", script_name: str = "", processor_script: str = "",
+                         input_data: str = "", reference_data: str = "", stdout: str = "",
+                         stderr: str = "", exit_code: Optional[int] = None, success: bool = True):
     """
-    Очищает файл логов SSH операций перед новым запуском проекта
+    Логирует выполнение скрипта-обработчика
+
+    Args:
+        host: Объект хоста (Host)
+        script_id: ID скрипта
+        script_name: Имя скрипта
+        processor_script: Текст скрипта-обработчика
+        input_data: Входные данные (CHECK_OUTPUT)
+        reference_data: Эталонные данные (ETALON_INPUT)
+        stdout: Стандартный вывод скрипта
+        stderr: Стандартный поток ошибок
+        exit_code: Код возврата скрипта
+        success: Успешность выполнения
     """
     try:
-        if _logger_initialized and SSH_LOG_FILE and SSH_LOG_FILE.exists():
-            # Очищаем файл, открывая его в режиме записи
-            with open(SSH_LOG_FILE, 'w', encoding='utf-8') as f:
-                timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-                f.write(f"[{timestamp}] SSH LOG FILE CLEARED - Starting new project execution\n")
-                f.write(f"{'='*80}\n\n")
-            ssh_logger.info(f"SSH log file cleared at {timestamp}")
-    except Exception:
-        # Игнорируем ошибки очистки, чтобы не ломать основную функциональность
-        pass
+        status = "SUCCESS" if success else "FAILED"
+        _log(
+            _render_processor, _timestamp(), _host_fields(host), script_id, script_name, processor_script,
+            input_data or "", reference_data or "", stdout or "", stderr or "", exit_code, status,
+        )
+    except Exception as e:
+        # Ошибка логирования не должна ломать основную функциональность
+        _report_failure("processor script", e)